@@ -9,12 +9,9 @@ import logging
 import argparse
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Tuple
-import matplotlib.pyplot as plt
-from matplotlib.ticker import MaxNLocator
-import pandas as pd
-from tabulate import tabulate
 
 from config import BOT_SETTINGS, APP_SETTINGS, setup_log_directory, setup_conversations_directory
+from conversation_journal import ConversationJournal
 
 # إعداد التسجيل
 logging.basicConfig(
@@ -75,6 +72,18 @@ class ChatBotAnalytics:
             except Exception as e:
                 logger.error(f"خطأ في قراءة ملف {filename}: {e}")
         
+        # قراءة سجل المحادثات (JSONL) وتجميع التبادلات لكل مستخدم
+        try:
+            journal = ConversationJournal(directory=os.path.join(self.conversations_dir, "journal"))
+            for record in journal.iter_records():
+                key = f"journal_{record.get('user_id', '')}"
+                if record.get('source') == "facebook_comment":
+                    self.facebook_comments.setdefault(key, []).append(record)
+                else:
+                    self.messenger_conversations.setdefault(key, []).append(record)
+        except Exception as e:
+            logger.error(f"خطأ في قراءة سجل المحادثات: {e}")
+        
         logger.info(f"تم تحميل {len(self.messenger_conversations)} ملف محادثات ماسنجر")
         logger.info(f"تم تحميل {len(self.facebook_comments)} ملف تعليقات فيسبوك")
         
@@ -190,6 +199,13 @@ class ChatBotAnalytics:
         
         :param output_dir: مجلد الإخراج للرسوم البيانية
         """
+        try:
+            # استيراد متأخر: matplotlib مطلوبة فقط لإنشاء الرسوم البيانية
+            import matplotlib.pyplot as plt
+        except ImportError:
+            logger.error("فشل في استيراد matplotlib، لن يتم إنشاء الرسوم البيانية. يرجى تثبيتها باستخدام pip install matplotlib")
+            return
+        
         if output_dir is None:
             output_dir = os.path.join(self.conversations_dir, "analytics")
         
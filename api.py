@@ -7,9 +7,12 @@ import json
 import logging
 import requests
 import re
-from typing import Dict, List, Any, Optional
+import threading
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Tuple
 
 from config import API_SETTINGS, APP_SETTINGS
+from http_client import PooledHTTPClient, get_http_client
+from resilience import ResilientEndpoint, get_endpoint, upstream_error
 
 # إعداد التسجيل
 logging.basicConfig(
@@ -19,18 +22,180 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+
+# علامة نهاية البث في DeepSeek API وواجهات OpenAI المتوافقة
+SSE_DONE = "[DONE]"
+
+
+def sse_line_data(line) -> Optional[str]:
+    """
+    محتوى حقل data في سطر من أحداث البث (Server-Sent Events)
+    (تُفك السطور كـ UTF-8 يدوياً لأن text/event-stream لا يحدد ترميزاً وتفترض requests حينها ISO-8859-1)
+    
+    :param line: السطر (bytes أو str)
+    :return: المحتوى أو None للسطور الأخرى
+    """
+    if isinstance(line, bytes):
+        line = line.decode("utf-8")
+    # السطور الفارغة تفصل الأحداث والسطور التي تبدأ بـ ":" تعليقات (keep-alive)
+    if not line.startswith("data:"):
+        return None
+    return line[5:].strip() or None
+
+
+def iter_sse_data(lines: Iterable[bytes]) -> Iterator[str]:
+    """
+    استخراج حقول data من أحداث البث حتى [DONE]
+    
+    :param lines: سطور الاستجابة
+    :return: مولد لمحتوى كل حدث
+    """
+    for line in lines:
+        data = sse_line_data(line)
+        if data is None:
+            continue
+        if data == SSE_DONE:
+            return
+        yield data
+
+
+# استهلاك الرموز لكل مزود (إصابات ذاكرة البادئات تُحسب من حقل usage في الردود)
+_usage_lock = threading.Lock()
+_usage_stats: Dict[str, Dict[str, int]] = {}
+
+
+def record_usage(provider: str, usage: Optional[Dict[str, Any]]) -> None:
+    """
+    تسجيل استهلاك الرموز من حقل usage في رد المحادثة
+    (DeepSeek: prompt_cache_hit_tokens و prompt_cache_miss_tokens،
+    OpenAI: prompt_tokens_details.cached_tokens)
+    
+    :param provider: اسم المزود
+    :param usage: حقل usage من الرد (يُتجاهل إذا كان فارغاً)
+    """
+    if not usage:
+        return
+    prompt_tokens = usage.get("prompt_tokens") or 0
+    if "prompt_cache_hit_tokens" in usage:
+        hit_tokens = usage.get("prompt_cache_hit_tokens") or 0
+        miss_tokens = usage.get("prompt_cache_miss_tokens") or max(prompt_tokens - hit_tokens, 0)
+    else:
+        hit_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+        miss_tokens = max(prompt_tokens - hit_tokens, 0)
+    with _usage_lock:
+        stats = _usage_stats.setdefault(provider, {
+            "responses": 0, "prompt_tokens": 0, "completion_tokens": 0,
+            "cache_hit_tokens": 0, "cache_miss_tokens": 0
+        })
+        stats["responses"] += 1
+        stats["prompt_tokens"] += prompt_tokens
+        stats["completion_tokens"] += usage.get("completion_tokens") or 0
+        stats["cache_hit_tokens"] += hit_tokens
+        stats["cache_miss_tokens"] += miss_tokens
+
+
+def get_usage_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    إحصائيات استهلاك الرموز وإصابات ذاكرة البادئات لكل مزود
+    
+    :return: قاموس بالإحصائيات لكل مزود مع نسبة الإصابة
+    """
+    with _usage_lock:
+        result = {provider: dict(stats) for provider, stats in _usage_stats.items()}
+    for stats in result.values():
+        cached = stats["cache_hit_tokens"] + stats["cache_miss_tokens"]
+        stats["cache_hit_ratio"] = round(stats["cache_hit_tokens"] / cached, 3) if cached else 0
+    return result
+
+
+def stream_event_content(data: str, provider: str = "deepseek") -> List[str]:
+    """
+    أجزاء النص في حدث بث واحد (مع تسجيل usage في الحدث الأخير إن وُجد)
+    
+    :param data: محتوى الحدث (JSON)
+    :param provider: اسم المزود لتسجيل الاستهلاك
+    :return: أجزاء النص (فارغة للحدث غير الصالح)
+    :raises: Exception إذا كان الحدث خطأ من API
+    """
+    try:
+        event = json.loads(data)
+    except json.JSONDecodeError:
+        logger.warning(f"حدث بث غير صالح من DeepSeek API: {data[:100]}")
+        return []
+    if "error" in event:
+        error_message = f"خطأ في استجابة DeepSeek API: {event['error']}"
+        logger.error(error_message)
+        raise Exception(error_message)
+    record_usage(provider, event.get("usage"))
+    return [
+        content for content in ((choice.get("delta") or {}).get("content") for choice in event.get("choices", []))
+        if content
+    ]
+
+
+def build_chat_request(api_key: Optional[str], prompt: str, context: str = None, model: str = None,
+                       max_tokens: int = None, temperature: float = None,
+                       stream: bool = False) -> Tuple[Dict[str, str], Dict[str, Any]]:
+    """
+    بناء ترويسات وحمولة طلب المحادثة (chat/completions)
+    
+    :param api_key: مفتاح API
+    :param prompt: سؤال المستخدم
+    :param context: سياق المحادثة (اختياري)
+    :param model: اسم النموذج
+    :param max_tokens: الحد الأقصى للرد
+    :param temperature: درجة العشوائية
+    :param stream: طلب الرد كبث SSE
+    :return: (الترويسات، الحمولة)
+    :raises: Exception إذا لم يكن مفتاح API متوفراً
+    """
+    if not api_key:
+        raise Exception("مفتاح DeepSeek API غير متوفر")
+    
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+    
+    messages = []
+    
+    # إضافة السياق كرسالة نظام إذا كان موجودًا
+    if context:
+        messages.append({"role": "system", "content": context})
+    
+    # إضافة سؤال المستخدم
+    messages.append({"role": "user", "content": prompt})
+    
+    payload = {
+        "model": model,
+        "messages": messages,
+        "max_tokens": max_tokens,
+        "temperature": temperature
+    }
+    if stream:
+        payload["stream"] = True
+        # حدث أخير بحقل usage (عدد الرموز وإصابات ذاكرة البادئات)
+        payload["stream_options"] = {"include_usage": True}
+    
+    return headers, payload
+
 class DeepSeekAPI:
     """
     واجهة للتفاعل مع DeepSeek API
     """
     
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, http_client: Optional[PooledHTTPClient] = None,
+                 resilience: Optional[ResilientEndpoint] = None):
         """
         تهيئة واجهة DeepSeek API
         
         :param api_key: مفتاح API (اختياري، سيتم استخدام القيمة من الإعدادات إذا لم يتم تحديدها)
+        :param http_client: عميل HTTP بتجمع اتصالات (اختياري، يستخدم العميل المشترك افتراضياً)
+        :param resilience: قاطع الدائرة وسياسة إعادة المحاولة (اختياري، المشترك لـ DeepSeek افتراضياً)
         """
         self.api_key = api_key or API_SETTINGS.get("DEEPSEEK_API_KEY")
+        self.http_client = http_client or get_http_client()
+        self.resilience = resilience or get_endpoint("deepseek")
         self.api_url = API_SETTINGS.get("DEEPSEEK_API_URL", "https://api.deepseek.com/v1/chat/completions")
         self.default_model = API_SETTINGS.get("DEFAULT_MODEL", "deepseek-chat")
         self.max_tokens = API_SETTINGS.get("MAX_TOKENS", 1000)
@@ -38,6 +203,21 @@ class DeepSeekAPI:
         
         logger.info(f"تم تهيئة واجهة DeepSeek API بنموذج افتراضي: {self.default_model}")
     
+    def _build_request(self, prompt: str, context: str = None, model: str = None,
+                       stream: bool = False) -> Tuple[Dict[str, str], Dict[str, Any]]:
+        """
+        بناء ترويسات وحمولة طلب المحادثة
+        
+        :param prompt: سؤال المستخدم
+        :param context: سياق المحادثة (اختياري)
+        :param model: اسم النموذج (اختياري)
+        :param stream: طلب الرد كبث SSE
+        :return: (الترويسات، الحمولة)
+        :raises: Exception إذا لم يكن مفتاح API متوفراً
+        """
+        return build_chat_request(self.api_key, prompt, context, model or self.default_model,
+                                  self.max_tokens, self.temperature, stream)
+    
     def generate_response(self, prompt: str, context: str = None, model: str = None) -> str:
         """
         توليد رد باستخدام DeepSeek API
@@ -48,48 +228,70 @@ class DeepSeekAPI:
         :return: النص المولد
         :raises: Exception في حالة وجود خطأ
         """
-        if not self.api_key:
-            raise Exception("مفتاح DeepSeek API غير متوفر")
+        headers, payload = self._build_request(prompt, context, model)
+        response_data = self.resilience.call(lambda: self._post(headers, payload).json())
+        record_usage("deepseek", response_data.get("usage"))
         
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        messages = []
-        
-        # إضافة السياق كرسالة نظام إذا كان موجودًا
-        if context:
-            messages.append({"role": "system", "content": context})
+        if "choices" in response_data and len(response_data["choices"]) > 0:
+            content = response_data["choices"][0].get("message", {}).get("content", "")
+            return content
+        else:
+            error_message = f"خطأ في استجابة DeepSeek API: {response_data}"
+            logger.error(error_message)
+            raise Exception(error_message)
+    
+    def _post(self, headers: Dict[str, str], payload: Dict[str, Any], stream: bool = False) -> requests.Response:
+        """
+        محاولة واحدة لطلب المحادثة
         
-        # إضافة سؤال المستخدم
-        messages.append({"role": "user", "content": prompt})
+        :return: الاستجابة الناجحة
+        :raises: UpstreamError في حالة فشل الاتصال أو رمز حالة خطأ
+        """
+        try:
+            if stream:
+                response = self.http_client.post(self.api_url, headers=headers, json=payload, stream=True)
+            else:
+                response = self.http_client.post(self.api_url, headers=headers, json=payload)
+            response.raise_for_status()
+            return response
+        except requests.exceptions.RequestException as e:
+            error_message = f"خطأ في الاتصال بـ DeepSeek API: {str(e)}"
+            logger.error(error_message)
+            # أخطاء إنشاء الاتصال مؤقتة، أما انتهاء مهلة القراءة فقد استهلك وقت المستخدم بالفعل
+            raise upstream_error(error_message, e.response,
+                                 retryable=isinstance(e, requests.exceptions.ConnectionError))
+    
+    def stream_response(self, prompt: str, context: str = None, model: str = None) -> Iterator[str]:
+        """
+        توليد رد باستخدام DeepSeek API كبث (stream=true) يعيد أجزاء النص فور وصولها
         
-        payload = {
-            "model": model or self.default_model,
-            "messages": messages,
-            "max_tokens": self.max_tokens,
-            "temperature": self.temperature
-        }
+        :param prompt: سؤال المستخدم
+        :param context: سياق المحادثة (اختياري)
+        :param model: اسم النموذج (اختياري)
+        :return: مولد لأجزاء النص بالترتيب
+        :raises: UpstreamError في حالة وجود خطأ (حتى أثناء البث)
+        """
+        headers, payload = self._build_request(prompt, context, model, stream=True)
+        # إعادة المحاولة وقاطع الدائرة حتى بدء البث فقط (لا يمكن إعادة أجزاء أُرسلت للمستخدم)
+        # نتيجة المحاولة في القاطع تُسجل عند انتهاء البث لا عند وصول الترويسات
+        response = self.resilience.call(lambda: self._post(headers, payload, stream=True), settle_later=True)
         
         try:
-            response = requests.post(self.api_url, headers=headers, json=payload)
-            response.raise_for_status()
-            
-            response_data = response.json()
-            
-            if "choices" in response_data and len(response_data["choices"]) > 0:
-                content = response_data["choices"][0].get("message", {}).get("content", "")
-                return content
-            else:
-                error_message = f"خطأ في استجابة DeepSeek API: {response_data}"
-                logger.error(error_message)
-                raise Exception(error_message)
+            with response:
+                for data in iter_sse_data(response.iter_lines()):
+                    yield from stream_event_content(data)
                 
         except requests.exceptions.RequestException as e:
-            error_message = f"خطأ في الاتصال بـ DeepSeek API: {str(e)}"
+            error_message = f"انقطع بث DeepSeek API: {str(e)}"
             logger.error(error_message)
-            raise Exception(error_message)
+            error = upstream_error(error_message)
+            self.resilience.record_failure(error)
+            raise error from e
+        except BaseException:
+            # المستهلك توقف عن القراءة قبل اكتمال البث
+            self.resilience.breaker.release()
+            raise
+        self.resilience.record_success()
     
     def extract_response_text(self, response):
         """
@@ -146,11 +348,14 @@ class LLMAPI:
     واجهة للتفاعل مع نماذج اللغة الكبيرة مثل DeepSeek أو OpenAI
     """
     
-    def __init__(self):
+    def __init__(self, http_client: Optional[PooledHTTPClient] = None):
         """
         تهيئة الواجهة
+        
+        :param http_client: عميل HTTP بتجمع اتصالات (اختياري، يستخدم العميل المشترك افتراضياً)
         """
         self.api_key = API_SETTINGS.get("DEEPSEEK_API_KEY")
+        self.http_client = http_client or get_http_client()
         self.api_url = API_SETTINGS.get("DEEPSEEK_API_URL")
         self.default_model = API_SETTINGS.get("DEFAULT_MODEL", "deepseek-chat")
         self.max_tokens = API_SETTINGS.get("MAX_TOKENS", 1000)
@@ -220,10 +425,11 @@ class LLMAPI:
         }
         
         try:
-            response = requests.post(self.api_url, headers=headers, json=payload)
+            response = self.http_client.post(self.api_url, headers=headers, json=payload)
             response.raise_for_status()
             
             response_data = response.json()
+            record_usage("deepseek", response_data.get("usage"))
             
             if "choices" in response_data and len(response_data["choices"]) > 0:
                 content = response_data["choices"][0].get("message", {}).get("content", "")
@@ -6,6 +6,7 @@
 import logging
 from typing import Dict, List, Any, Optional, Tuple
 from config import API_SETTINGS, APP_SETTINGS
+from data_repository import get_data_repository
 import re
 import random
 import json
@@ -35,7 +36,9 @@ class OpenAIClientAPI:
             from openai import OpenAI
             self.client = OpenAI(
                 api_key=self.api_key, 
-                base_url="https://api.deepseek.com"  # عنوان API الأساسي
+                base_url="https://api.deepseek.com",  # عنوان API الأساسي
+                # مكتبة OpenAI تدير تجمع اتصالاتها الخاص، نوحد فقط المهلة مع العميل المشترك
+                timeout=API_SETTINGS.get("HTTP_READ_TIMEOUT", 60)
             )
             logger.info("تم تهيئة OpenAI Client للتواصل مع DeepSeek API")
         except ImportError:
@@ -147,21 +150,21 @@ def get_api_client(implementation: str = "default", api_key: Optional[str] = Non
         except ImportError:
             logger.warning("فشل في استخدام OpenAI Client، العودة إلى التنفيذ الافتراضي")
     
-    # العودة إلى التنفيذ الافتراضي
+    # العودة إلى التنفيذ الافتراضي مع مشاركة تجمع اتصالات HTTP
     from api import DeepSeekAPI
-    return DeepSeekAPI(api_key)
+    from http_client import get_http_client
+    return DeepSeekAPI(api_key, http_client=get_http_client())
 
 
 def load_data_file(data_file: str = "data.json") -> Dict:
     """
-    تحميل بيانات من ملف JSON
+    تحميل بيانات من ملف JSON (من المستودع المشترك، يعاد التحليل فقط عند تغير الملف)
     
     :param data_file: مسار ملف البيانات
-    :return: البيانات المحملة كقاموس
+    :return: البيانات المحملة كقاموس (مشتركة، يجب عدم تعديلها)
     """
     try:
-        with open(data_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return get_data_repository().load(data_file)
     except Exception as e:
         print(f"خطأ في تحميل ملف البيانات: {e}")
         return {}
@@ -261,9 +264,8 @@ def handle_local_response(user_message: str, data_file: str = "data.json") -> Tu
     :return: الرد المناسب ومؤشر على ما إذا تم العثور على رد
     """
     try:
-        # تحميل البيانات
-        with open(data_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        # تحميل البيانات (من الذاكرة ما لم يتغير الملف)
+        data = get_data_repository().load(data_file)
         
         # تنظيف رسالة المستخدم
         user_message = user_message.strip().lower()
@@ -0,0 +1,459 @@
+"""
+عميل غير متزامن (asyncio + httpx) لنماذج اللغة بنفس عقد generate_response
+كل طلب جارٍ يكلف مهمة asyncio بدلاً من خيط كامل، مع حد أقصى للطلبات المتزامنة لكل مزود (Semaphore)
+ومهلة لكل طلب (تشمل الانتظار في الطابور) وإلغاء الطلب عند تجاوزها أو عند إلغاء المستدعي
+
+الواجهة المتزامنة SyncLLMFacade تشغل العميل على حلقة أحداث واحدة في خيط خلفي
+حتى يعمل المستدعون الحاليون (CachedLLMClient وخيوط gunicorn) دون تغيير
+"""
+
+import queue
+import asyncio
+import logging
+import threading
+import concurrent.futures
+from contextlib import asynccontextmanager
+from typing import Dict, Any, AsyncIterator, Iterator, Optional
+
+from config import API_SETTINGS
+from api import DeepSeekAPI, build_chat_request, record_usage, sse_line_data, stream_event_content, SSE_DONE
+from resilience import ResilientEndpoint, get_endpoint, upstream_error
+
+logger = logging.getLogger(__name__)
+
+# المزودون المتوافقون مع واجهة chat/completions
+PROVIDERS = {
+    "deepseek": {
+        "api_url": API_SETTINGS.get("DEEPSEEK_API_URL", "https://api.deepseek.com/v1/chat/completions"),
+        "api_key": API_SETTINGS.get("DEEPSEEK_API_KEY"),
+        "model": API_SETTINGS.get("DEFAULT_MODEL", "deepseek-chat")
+    },
+    "openai": {
+        "api_url": API_SETTINGS.get("OPENAI_API_URL", "https://api.openai.com/v1/chat/completions"),
+        "api_key": API_SETTINGS.get("OPENAI_API_KEY"),
+        "model": API_SETTINGS.get("OPENAI_MODEL", "gpt-4o-mini")
+    }
+}
+
+
+class LLMDeadlineExceeded(TimeoutError):
+    """
+    تجاوز طلب نموذج اللغة مهلته (شاملة الانتظار في الطابور) وتم إلغاؤه
+    """
+
+
+class AsyncLLMClient:
+    """
+    عميل غير متزامن لمزود واحد بحد للطلبات المتزامنة ومهلة لكل طلب
+    """
+
+    def __init__(self, provider: str = "deepseek", api_key: str = None, api_url: str = None,
+                 max_concurrency: int = None, deadline: float = None, http_client=None,
+                 resilience: Optional[ResilientEndpoint] = None):
+        """
+        تهيئة العميل
+
+        :param provider: اسم المزود ("deepseek" أو "openai")
+        :param api_key: مفتاح API (اختياري، من الإعدادات)
+        :param api_url: عنوان chat/completions (اختياري، من الإعدادات)
+        :param max_concurrency: الحد الأقصى للطلبات المتزامنة لهذا المزود (الباقي ينتظر في الطابور)
+        :param deadline: المهلة الافتراضية لكل طلب بالثواني
+        :param http_client: عميل httpx.AsyncClient (اختياري، يتم إنشاؤه عند أول طلب)
+        :param resilience: قاطع الدائرة وسياسة إعادة المحاولة (اختياري، المشترك للمزود افتراضياً)
+        """
+        settings = PROVIDERS.get(provider, PROVIDERS["deepseek"])
+        self.provider = provider
+        self.api_key = api_key or settings["api_key"]
+        self.api_url = api_url or settings["api_url"]
+        self.default_model = settings["model"]
+        self.max_tokens = API_SETTINGS.get("MAX_TOKENS", 1000)
+        self.temperature = API_SETTINGS.get("TEMPERATURE", 0.7)
+        self.max_concurrency = max_concurrency or API_SETTINGS.get("ASYNC_LLM_MAX_CONCURRENCY", {}).get(provider, 64)
+        self.deadline = deadline or API_SETTINGS.get("ASYNC_LLM_DEADLINE", 30)
+        self.resilience = resilience or get_endpoint(provider)
+
+        self._http_client = http_client
+        # يرتبط بحلقة الأحداث عند أول انتظار (كل الطلبات تعمل على نفس الحلقة)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+
+        self._stats = {
+            "requests": 0,
+            "completed": 0,
+            "failed": 0,
+            "deadline_exceeded": 0,
+            "cancelled": 0,
+            "queued": 0,
+            "in_flight": 0,
+            "max_in_flight": 0
+        }
+
+    def _client(self):
+        if self._http_client is None:
+            import httpx
+            self._http_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(API_SETTINGS.get("HTTP_READ_TIMEOUT", 60),
+                                      connect=API_SETTINGS.get("HTTP_CONNECT_TIMEOUT", 5)),
+                limits=httpx.Limits(max_connections=self.max_concurrency,
+                                    max_keepalive_connections=self.max_concurrency)
+            )
+        return self._http_client
+
+    def _count(self, name: str, delta: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += delta
+            if name == "in_flight":
+                self._stats["max_in_flight"] = max(self._stats["max_in_flight"], self._stats["in_flight"])
+
+    @asynccontextmanager
+    async def _slot(self, timeout: Optional[float] = None):
+        """
+        مكان من حد الطلبات المتزامنة للمزود
+
+        :param timeout: أقصى انتظار في الطابور بالثواني (اختياري)
+        :raises: asyncio.TimeoutError إذا انتهى الانتظار قبل تحرر مكان
+        """
+        self._count("queued")
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout)
+        finally:
+            self._count("queued", -1)
+        self._count("in_flight")
+        try:
+            yield
+        finally:
+            self._count("in_flight", -1)
+            self._semaphore.release()
+
+    def _request_error(self, error: Exception) -> Exception:
+        import httpx
+
+        error_message = f"خطأ في الاتصال بـ {self.provider} API: {str(error)}"
+        logger.error(error_message)
+        # أخطاء إنشاء الاتصال مؤقتة، أما انتهاء مهلة القراءة فقد استهلك وقت المستخدم بالفعل
+        return upstream_error(error_message, getattr(error, "response", None),
+                              retryable=isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout)))
+
+    async def _post(self, headers: Dict[str, str], payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        محاولة واحدة لطلب المحادثة
+        """
+        import httpx
+
+        try:
+            response = await self._client().post(self.api_url, headers=headers, json=payload)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            raise self._request_error(e)
+        return response.json()
+
+    async def _open_stream(self, headers: Dict[str, str], payload: Dict[str, Any]):
+        """
+        محاولة واحدة لبدء البث
+
+        :return: استجابة httpx مفتوحة (يجب إغلاقها بـ aclose)
+        """
+        import httpx
+
+        client = self._client()
+        try:
+            response = await client.send(client.build_request("POST", self.api_url, headers=headers, json=payload),
+                                         stream=True)
+        except httpx.HTTPError as e:
+            raise self._request_error(e)
+        try:
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            await response.aclose()
+            raise self._request_error(e)
+        return response
+
+    async def _generate(self, prompt: str, context: Optional[str], model: Optional[str], expires: float) -> str:
+        headers, payload = build_chat_request(self.api_key, prompt, context, model or self.default_model,
+                                              self.max_tokens, self.temperature)
+        response_data = await self.resilience.acall(lambda: self._post(headers, payload), expires=expires)
+        record_usage(self.provider, response_data.get("usage"))
+
+        if "choices" in response_data and len(response_data["choices"]) > 0:
+            return response_data["choices"][0].get("message", {}).get("content", "")
+        error_message = f"خطأ في استجابة {self.provider} API: {response_data}"
+        logger.error(error_message)
+        raise Exception(error_message)
+
+    async def generate_response(self, prompt: str, context: str = None, model: str = None,
+                                deadline: float = None) -> str:
+        """
+        توليد رد (نفس عقد DeepSeekAPI.generate_response)
+
+        :param prompt: سؤال المستخدم
+        :param context: سياق المحادثة (اختياري)
+        :param model: اسم النموذج (اختياري)
+        :param deadline: مهلة هذا الطلب بالثواني (اختياري، تشمل الانتظار في الطابور)
+        :return: النص المولد
+        :raises: LLMDeadlineExceeded عند تجاوز المهلة، Exception لباقي الأخطاء
+        """
+        deadline = deadline or self.deadline
+        loop = asyncio.get_running_loop()
+        expires = loop.time() + deadline
+        self._count("requests")
+        try:
+            # المكان يُحجز قبل إذن القاطع (الانتظار في الطابور لا يشغل طلباً اختبارياً) ويبقى حتى انتهاء الطلب
+            async with self._slot(deadline):
+                response = await self._generate(prompt, context, model, expires)
+        except asyncio.TimeoutError:
+            # القاطع سجل المحاولة المعلقة التي قطعتها المهلة (في acall)، أما الانتظار في الطابور
+            # أو بين المحاولات فليس فشلاً جديداً للواجهة
+            self._count("deadline_exceeded")
+            raise LLMDeadlineExceeded(f"تجاوز طلب {self.provider} API المهلة ({deadline} ث)")
+        except asyncio.CancelledError:
+            self._count("cancelled")
+            raise
+        except Exception:
+            self._count("failed")
+            raise
+        self._count("completed")
+        return response
+
+    async def stream_response(self, prompt: str, context: str = None, model: str = None,
+                              deadline: float = None) -> AsyncIterator[str]:
+        """
+        توليد رد كبث يعيد أجزاء النص فور وصولها
+
+        :param prompt: سؤال المستخدم
+        :param context: سياق المحادثة (اختياري)
+        :param model: اسم النموذج (اختياري)
+        :param deadline: مهلة البث كاملاً بالثواني (اختياري)
+        :return: مولد غير متزامن لأجزاء النص
+        :raises: LLMDeadlineExceeded عند تجاوز المهلة، Exception لباقي الأخطاء
+        """
+        import httpx
+
+        deadline = deadline or self.deadline
+        loop = asyncio.get_running_loop()
+        expires = loop.time() + deadline
+
+        headers, payload = build_chat_request(self.api_key, prompt, context, model or self.default_model,
+                                              self.max_tokens, self.temperature, stream=True)
+        self._count("requests")
+        try:
+            async with self._slot(deadline):
+                # إعادة المحاولة وقاطع الدائرة حتى بدء البث فقط (لا يمكن إعادة أجزاء أُرسلت للمستخدم)
+                # نتيجة المحاولة في القاطع تُسجل عند انتهاء البث لا عند وصول الترويسات
+                response = await self.resilience.acall(lambda: self._open_stream(headers, payload),
+                                                       expires=expires, settle_later=True)
+                try:
+                    lines = response.aiter_lines()
+                    while True:
+                        try:
+                            line = await asyncio.wait_for(lines.__anext__(), timeout=max(expires - loop.time(), 0))
+                        except StopAsyncIteration:
+                            break
+                        data = sse_line_data(line)
+                        if data is None:
+                            continue
+                        if data == SSE_DONE:
+                            break
+                        for content in stream_event_content(data, self.provider):
+                            yield content
+                except asyncio.TimeoutError:
+                    # البث توقف بعد بدئه حتى انتهت المهلة
+                    self.resilience.record_failure()
+                    raise
+                except httpx.HTTPError as e:
+                    # البث انقطع بعد بدئه
+                    error = self._request_error(e)
+                    self.resilience.record_failure(error)
+                    raise error from e
+                except BaseException:
+                    # المستهلك توقف عن القراءة أو أُلغي الطلب قبل اكتمال البث
+                    self.resilience.breaker.release()
+                    raise
+                else:
+                    self.resilience.record_success()
+                finally:
+                    await response.aclose()
+        except asyncio.TimeoutError:
+            # القاطع سجل ما يخص الواجهة، أما الانتظار في الطابور أو بين المحاولات فليس فشلاً لها
+            self._count("deadline_exceeded")
+            raise LLMDeadlineExceeded(f"تجاوز بث {self.provider} API المهلة ({deadline} ث)")
+        except httpx.HTTPError as e:
+            self._count("failed")
+            raise self._request_error(e)
+        except (asyncio.CancelledError, GeneratorExit):
+            self._count("cancelled")
+            raise
+        except Exception:
+            self._count("failed")
+            raise
+        self._count("completed")
+
+    async def aclose(self) -> None:
+        """
+        إغلاق اتصالات عميل httpx
+        """
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        إحصائيات العميل
+
+        :return: قاموس بعدد الطلبات والمكتملة والفاشلة والمتجاوزة للمهلة والملغاة والجارية والمنتظرة
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({"provider": self.provider, "max_concurrency": self.max_concurrency, "deadline": self.deadline})
+        return stats
+
+
+class SyncLLMFacade:
+    """
+    واجهة متزامنة أمام AsyncLLMClient: حلقة أحداث واحدة في خيط خلفي تحمل كل الطلبات الجارية
+    والخيط المستدعي ينتظر نتيجته فقط، باقي خصائص العميل (api_key، default_model...) تمر إليه كما هي
+    """
+
+    def __init__(self, client: AsyncLLMClient):
+        """
+        تهيئة الواجهة وتشغيل حلقة الأحداث
+
+        :param client: العميل غير المتزامن
+        """
+        self.client = client
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-event-loop", daemon=True)
+        self._thread.start()
+
+    def __getattr__(self, name: str) -> Any:
+        # يُستدعى فقط للخصائص غير الموجودة في الواجهة نفسها
+        if name == "client":
+            raise AttributeError(name)
+        return getattr(self.client, name)
+
+    def _submit(self, coroutine) -> concurrent.futures.Future:
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def generate_response(self, prompt: str, context: str = None, model: str = None) -> str:
+        """
+        توليد رد (ينتظر الخيط المستدعي حتى انتهاء الطلب على حلقة الأحداث)
+
+        :param prompt: سؤال المستخدم
+        :param context: سياق المحادثة (اختياري)
+        :param model: اسم النموذج (اختياري)
+        :return: النص المولد
+        :raises: LLMDeadlineExceeded عند تجاوز المهلة، Exception لباقي الأخطاء
+        """
+        future = self._submit(self.client.generate_response(prompt, context=context, model=model))
+        try:
+            # المهلة تُطبق داخل الحلقة، وهذه حماية إضافية إذا توقفت الحلقة نفسها
+            return future.result(timeout=self.client.deadline + 5)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise LLMDeadlineExceeded(f"تجاوز طلب {self.client.provider} API المهلة ({self.client.deadline} ث)")
+        except BaseException:
+            # إلغاء الطلب إذا توقف المستدعي (مثل KeyboardInterrupt)
+            future.cancel()
+            raise
+
+    def stream_response(self, prompt: str, context: str = None, model: str = None) -> Iterator[str]:
+        """
+        توليد رد كبث (الأجزاء تنتقل من حلقة الأحداث إلى الخيط المستدعي عبر طابور)
+
+        :param prompt: سؤال المستخدم
+        :param context: سياق المحادثة (اختياري)
+        :param model: اسم النموذج (اختياري)
+        :return: مولد لأجزاء النص
+        :raises: LLMDeadlineExceeded عند تجاوز المهلة، Exception لباقي الأخطاء
+        """
+        parts: "queue.Queue" = queue.Queue()
+        end = object()
+
+        async def pump() -> None:
+            try:
+                async for part in self.client.stream_response(prompt, context=context, model=model):
+                    parts.put((part, None))
+                parts.put((end, None))
+            except BaseException as e:
+                parts.put((None, e))
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+
+        future = self._submit(pump())
+        try:
+            while True:
+                try:
+                    part, error = parts.get(timeout=self.client.deadline + 5)
+                except queue.Empty:
+                    raise LLMDeadlineExceeded(f"تجاوز بث {self.client.provider} API المهلة ({self.client.deadline} ث)")
+                if error is not None:
+                    raise error
+                if part is end:
+                    return
+                yield part
+        finally:
+            # المستهلك أوقف البث أو حدث خطأ: إلغاء الطلب على الحلقة
+            if not future.done():
+                future.cancel()
+
+    def validate_connection(self) -> Dict[str, Any]:
+        """
+        التحقق من صحة الاتصال بـ API
+
+        :return: قاموس يحتوي على حالة الاتصال
+        """
+        result = {"status": "غير متصل", "error": None}
+        if not self.client.api_key:
+            result["error"] = "مفتاح API غير متوفر"
+            return result
+        try:
+            test_response = self.generate_response("مرحبا", "هذا اختبار اتصال. رد بكلمة 'متصل' فقط.")
+            if "متصل" in test_response.lower():
+                result["status"] = "متصل"
+            else:
+                result["error"] = "رد غير متوقع من API"
+        except Exception as e:
+            result["error"] = str(e)
+        return result
+
+    def close(self, timeout: float = 5) -> None:
+        """
+        إغلاق اتصالات العميل وإيقاف حلقة الأحداث
+
+        :param timeout: أقصى مدة انتظار بالثواني
+        """
+        if not self._thread.is_alive():
+            return
+        try:
+            self._submit(self.client.aclose()).result(timeout=timeout)
+        except Exception as e:
+            logger.warning(f"تعذر إغلاق اتصالات {self.client.provider} API: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+        self._loop.close()
+
+
+def create_llm_client(api_key: str = None, provider: str = "deepseek"):
+    """
+    إنشاء عميل نموذج اللغة المتزامن المستخدم في الشات بوت:
+    الواجهة المتزامنة أمام العميل غير المتزامن إذا كان ASYNC_LLM_CLIENT مفعلاً و httpx مثبتاً، وإلا DeepSeekAPI
+    (مع موزع الطلبات الاحتياطية إلى OpenAI إذا كان HEDGE_ENABLED مفعلاً ومفتاح OpenAI متوفراً)
+
+    :param api_key: مفتاح API (اختياري)
+    :param provider: اسم المزود
+    :return: عميل بدالة generate_response(prompt, context, model)
+    """
+    if API_SETTINGS.get("ASYNC_LLM_CLIENT", False):
+        try:
+            import httpx  # noqa: F401
+        except ImportError:
+            logger.error("مكتبة httpx غير مثبتة، سيتم استخدام عميل DeepSeek API المتزامن")
+        else:
+            client = AsyncLLMClient(provider, api_key=api_key)
+            if API_SETTINGS.get("HEDGE_ENABLED", False) and provider != "openai":
+                if PROVIDERS["openai"]["api_key"]:
+                    from llm_dispatcher import HedgedLLMClient
+                    client = HedgedLLMClient(client, AsyncLLMClient("openai"))
+                else:
+                    logger.warning("HEDGE_ENABLED مفعل دون مفتاح OpenAI، لن تُرسل طلبات احتياطية")
+            return SyncLLMFacade(client)
+    return DeepSeekAPI(api_key)
@@ -0,0 +1,92 @@
+"""
+قياس زمن الإقلاع البارد للشات بوت: البناء من data.json مقارنة بتحميل اللقطة المترجمة
+كل قياس يتم في عملية Python جديدة (مثل عامل جديد على Render أو Railway) ويقيس
+استيراد bot وإنشاء ChatBot حتى يصبح جاهزاً، ثم زمن أول إجابة من الأسئلة الشائعة
+
+الاستخدام:
+    python benchmarks/bench_cold_start.py --runs 5
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# إضافة مجلد المشروع إلى مسار Python
+sys.path.append(PROJECT_DIR)
+
+# الكود الذي يُشغل في كل عملية جديدة
+CHILD_SCRIPT = """
+import sys, time, json
+started = time.perf_counter()
+sys.path.insert(0, {project_dir!r})
+from bot import ChatBot
+from state_store import InMemoryStateStore
+chatbot = ChatBot(state_store=InMemoryStateStore())
+ready_ms = (time.perf_counter() - started) * 1000
+question = chatbot.prompts[0]["question"] if chatbot.prompts else "سؤال"
+chatbot.faq_index.answer(question, chatbot.similarity_threshold, chatbot.faq_min_margin)
+first_answer_ms = (time.perf_counter() - started) * 1000
+print(json.dumps({{"ready_ms": ready_ms, "first_answer_ms": first_answer_ms, "source": chatbot.knowledge.source}}))
+"""
+
+
+def run_child(snapshot_file: str, work_dir: str) -> dict:
+    """
+    تشغيل عملية جديدة وقراءة أزمنتها
+
+    :param snapshot_file: مسار اللقطة المترجمة (فارغ لتعطيلها)
+    :param work_dir: مجلد العمل (لملفات السجلات والمحادثات)
+    :return: قاموس الأزمنة
+    """
+    env = dict(os.environ)
+    env["KNOWLEDGE_SNAPSHOT_FILE"] = snapshot_file
+    env["DATA_FILE"] = os.path.join(PROJECT_DIR, "data.json")
+    env["LOG_LEVEL"] = "WARNING"
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD_SCRIPT.format(project_dir=PROJECT_DIR)],
+        cwd=work_dir, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run_benchmark(runs: int) -> None:
+    """
+    تشغيل المقارنة وطباعة الوسيط لكل مسار
+
+    :param runs: عدد العمليات لكل مسار
+    """
+    work_dir = tempfile.mkdtemp(prefix="cold_start_")
+    snapshot_file = os.path.join(work_dir, "knowledge.snapshot")
+    try:
+        # خطوة البناء مرة واحدة
+        subprocess.run(
+            [sys.executable, os.path.join(PROJECT_DIR, "knowledge_snapshot.py"), "--output", snapshot_file,
+             "--data-file", os.path.join(PROJECT_DIR, "data.json")],
+            cwd=work_dir, env=dict(os.environ, LOG_LEVEL="WARNING"), capture_output=True, check=True
+        )
+        print(f"حجم اللقطة المترجمة: {os.path.getsize(snapshot_file)} بايت")
+        print(f"{'المسار':>10} | {'جاهز ms (وسيط)':>16} | {'أول إجابة ms (وسيط)':>20}")
+
+        for label, path in (("json", ""), ("compiled", snapshot_file)):
+            results = [run_child(path, work_dir) for _ in range(runs)]
+            assert all(result["source"] == label for result in results), "لم يُستخدم المسار المتوقع"
+            ready = statistics.median(result["ready_ms"] for result in results)
+            first = statistics.median(result["first_answer_ms"] for result in results)
+            print(f"{label:>10} | {ready:>16.1f} | {first:>20.1f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="قياس زمن الإقلاع البارد مع وبدون اللقطة المترجمة")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    run_benchmark(args.runs)
@@ -0,0 +1,129 @@
+"""
+قياس أداء البحث في الأسئلة الشائعة (local_response.search_faq) مقارنة بالتنفيذ السابق
+(إعادة تقسيم كل سؤال إلى كلمات بـ re.findall لكل رسالة وحساب الدرجات واحداً تلو الآخر)
+مع تكبير عدد الأسئلة حتى 10 آلاف
+
+الاستخدام:
+    python benchmarks/bench_faq_search.py --sizes 25 1000 10000 --messages 200
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+
+# إضافة مجلد المشروع إلى مسار Python
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from local_response import search_faq, search_faq_batch
+
+
+def legacy_search_faq(user_message: str, data: dict) -> tuple:
+    """
+    التنفيذ السابق لـ search_faq (للمقارنة فقط)
+    """
+    prompts = data.get("prompts", [])
+    best_match = None
+    best_confidence = 0.0
+
+    user_message = user_message.lower()
+
+    for prompt in prompts:
+        question = prompt.get("question", "").lower()
+        answer = prompt.get("answer", "")
+
+        question_words = set(re.findall(r'\b\w+\b', question))
+        message_words = set(re.findall(r'\b\w+\b', user_message))
+
+        if not question_words:
+            continue
+
+        common_words = question_words.intersection(message_words)
+
+        if len(common_words) > 0:
+            confidence = len(common_words) / len(question_words)
+            if question in user_message:
+                confidence += 0.3
+            if confidence > best_confidence:
+                best_confidence = confidence
+                best_match = answer
+
+    return best_match, best_confidence
+
+
+def build_dataset(size: int, message_count: int, rng: random.Random) -> tuple:
+    """
+    توليد أسئلة ورسائل محاكاة من مفردات أسئلة data.json
+
+    :param size: عدد الأسئلة
+    :param message_count: عدد الرسائل
+    :param rng: مولد الأرقام العشوائية
+    :return: (البيانات، الرسائل)
+    """
+    data_file = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data.json")
+    with open(data_file, "r", encoding="utf-8") as f:
+        base_prompts = json.load(f).get("prompts", [])
+
+    vocabulary = sorted({word for prompt in base_prompts for word in re.findall(r'\b\w+\b', prompt["question"])})
+    vocabulary += [f"كلمة{i}" for i in range(max(0, size // 2))]
+
+    prompts = list(base_prompts[:size])
+    while len(prompts) < size:
+        question = " ".join(rng.choice(vocabulary) for _ in range(rng.randint(3, 9))) + "؟"
+        prompts.append({"id": len(prompts) + 1, "question": question, "answer": f"إجابة {len(prompts) + 1}"})
+
+    messages = []
+    for _ in range(message_count):
+        if rng.random() < 0.5:
+            messages.append("من فضلك " + rng.choice(prompts)["question"])
+        else:
+            messages.append(" ".join(rng.choice(vocabulary) for _ in range(rng.randint(2, 12))))
+    return {"prompts": prompts}, messages
+
+
+def run_benchmark(sizes: list, message_count: int, legacy_limit: int) -> None:
+    """
+    تشغيل المقارنة وطباعة النتائج لكل حجم
+
+    :param sizes: أحجام مجموعة الأسئلة
+    :param message_count: عدد الرسائل لكل حجم
+    :param legacy_limit: أقصى عدد رسائل يُقاس به التنفيذ السابق (بطيء مع الأحجام الكبيرة)
+    """
+    rng = random.Random(42)
+    print(f"{'الأسئلة':>8} | {'السابق ms/رسالة':>16} | {'المتجه ms/رسالة':>16} | {'دفعة ms/رسالة':>14} | {'التسريع (دفعة)':>14}")
+
+    for size in sizes:
+        data, messages = build_dataset(size, message_count, rng)
+        legacy_messages = messages[:legacy_limit]
+
+        started = time.perf_counter()
+        expected = [legacy_search_faq(message, data) for message in legacy_messages]
+        legacy_ms = (time.perf_counter() - started) * 1000 / len(legacy_messages)
+
+        # البناء الأول للمصفوفة خارج القياس (يتم مرة واحدة لكل تحميل بيانات)
+        search_faq(messages[0], data)
+
+        started = time.perf_counter()
+        single = [search_faq(message, data) for message in messages]
+        single_ms = (time.perf_counter() - started) * 1000 / len(messages)
+
+        started = time.perf_counter()
+        search_faq_batch(messages, data)
+        batch_ms = (time.perf_counter() - started) * 1000 / len(messages)
+
+        assert single[:len(expected)] == expected, "اختلفت النتائج عن التنفيذ السابق"
+
+        print(f"{size:>8} | {legacy_ms:>16.3f} | {single_ms:>16.3f} | {batch_ms:>14.3f} | {legacy_ms / batch_ms:>13.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="قياس أداء البحث في الأسئلة الشائعة")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[25, 100, 1000, 10000])
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--legacy-limit", type=int, default=100)
+    args = parser.parse_args()
+
+    run_benchmark(args.sizes, args.messages, args.legacy_limit)
@@ -0,0 +1,113 @@
+"""
+معايرة حد التشابه والهامش لفهرس الأسئلة الشائعة على أسئلة data.json
+برسائل بصياغات العملاء: رسائل تطابق سؤالاً معروفاً (يجب أن تُجاب بإجابته) ورسائل لا يغطيها أي سؤال
+(يجب ألا تُجاب من الأسئلة الشائعة، فالإجابة الخاطئة بثقة أسوأ من استدعاء نموذج اللغة أو الرد الاحتياطي)
+
+لكل حد وهامش: عدد الإجابات الصحيحة والخاطئة والرسائل غير المطابقة التي أُجيبت
+
+الاستخدام:
+    python benchmarks/bench_faq_thresholds.py --thresholds 0.4 0.5 0.62 --margins 0 0.1 0.4
+"""
+
+import os
+import sys
+import json
+import argparse
+
+# إضافة مجلد المشروع إلى مسار Python
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from faq_index import FAQIndex
+from config import BOT_SETTINGS
+
+# (الرسالة، السؤال المتوقع)
+MATCHING = [
+    ("ما هو مجمع عمال مصر", "ما هو مجمع عمال مصر؟"),
+    ("مين بيدير المجمع", "من يدير المجمع؟"),
+    ("ايه مشروعات المجمع", "ما هي أبرز مشروعات المجمع؟"),
+    ("ازاي اقدم على الوظائف", "كيف يمكنني التقديم للوظائف؟"),
+    ("التقديم للوظائف", "كيفية التقديم للوظائف؟"),
+    ("مجالات التدريب", "ما هي مجالات التدريب المتاحة؟"),
+    ("ايه مجالات التدريب المتاحة", "ما هي مجالات التدريب المتاحة؟"),
+    ("المستثمرين يتعاونوا ازاي مع المجمع", "كيف يمكن للمستثمرين التعاون مع المجمع؟"),
+    ("مبادرات المجمع", "ما هي مبادرات المجمع؟"),
+    ("فين مقر المجمع", "أين يقع مقر المجمع؟"),
+    ("عايز خدمة فض المنازعات", "خدمة فض المنازعات"),
+    ("دراسة جدوى", "دراسات الجدوى الاقتصادية"),
+    ("دراسات الجدوى", "دراسات الجدوى الاقتصادية"),
+    ("محتاج استشارة قانونية", "خدمات الاستشارات القانونية"),
+    ("الاستشارات القانونية", "خدمات الاستشارات القانونية"),
+    ("التعاون الدولي للمجمع", "هل يوجد تعاون دولي للمجمع؟"),
+    ("عقارات صناعية", "العقارات الصناعية"),
+    ("تسويق المنتجات", "التسويق المحلي للمنتجات"),
+    ("الموارد البشرية", "خدمات الموارد البشرية"),
+    ("خدمات الاستثمار", "خدمات الاستثمار"),
+    ("الشراكة الاستراتيجية", "الشراكة الاستراتيجية"),
+    ("تكنولوجيا المعلومات", "تكنولوجيا المعلومات"),
+    ("محتاج عمال", "البحث عن عمال"),
+]
+
+# صياغتان لنفس الاستفسار في data.json: أي منهما إجابة صحيحة
+EQUIVALENT = {"كيف يمكنني التقديم للوظائف؟": "كيفية التقديم للوظائف؟"}
+
+UNCOVERED = [
+    "كم سعر الخدمة", "فين العنوان", "حالة الطقس غداً", "ازيك عامل ايه", "عايز ارقام التليفون",
+    "امتى مواعيد العمل", "انا عندي مشكلة في الدفع", "هل في خصم للطلاب", "عايز اكلم حد", "الخدمة وحشة جدا",
+    "بكام الاشتراك", "ايه المستندات المطلوبة", "هل المجمع حكومي", "شكرا ليكم", "ممكن رقم الواتساب",
+    "اسعار الخدمات", "تكلفة الخدمة كام", "هل يوجد فرع في اسكندرية", "عايز الغي طلبي", "المرتب كام",
+    "الخدمات الطبية", "خدمات النقل والشحن",
+]
+
+
+def same_question(found: str, expected: str) -> bool:
+    """
+    هل السؤال المطابق هو المتوقع أو صياغة مكافئة له
+    """
+    return found == expected or EQUIVALENT.get(found) == expected or EQUIVALENT.get(expected) == found
+
+
+def run_calibration(thresholds: list, margins: list, show: bool) -> None:
+    """
+    تشغيل المعايرة وطباعة النتائج
+    """
+    data_file = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data.json")
+    with open(data_file, "r", encoding="utf-8") as f:
+        index = FAQIndex(json.load(f)["prompts"])
+
+    matching = [(message, expected, index.rank(message)) for message, expected in MATCHING]
+    uncovered = [(message, index.rank(message)) for message in UNCOVERED]
+
+    if show:
+        for message, expected, (match, score, margin) in matching:
+            status = "✓" if same_question(match["question"], expected) else "✗"
+            print(f"{status} {score:.3f} هامش {margin:.3f} | {message} -> {match['question']}")
+        for message, (match, score, margin) in uncovered:
+            print(f"- {score:.3f} هامش {margin:.3f} | {message} -> {match['question'] if match else None}")
+        print()
+
+    print(f"{len(MATCHING)} رسالة مطابقة، {len(UNCOVERED)} رسالة غير مغطاة "
+          f"(الحالي: حد {BOT_SETTINGS['SIMILARITY_THRESHOLD']} هامش {BOT_SETTINGS['FAQ_MIN_MARGIN']}، "
+          f"الاحتياطي: حد {BOT_SETTINGS['FALLBACK_FAQ_THRESHOLD']} هامش {BOT_SETTINGS['FALLBACK_FAQ_MIN_MARGIN']})")
+    print(f"{'الحد':>6} | {'الهامش':>6} | {'صحيحة':>6} | {'خاطئة':>6} | {'غير مغطاة أُجيبت':>16}")
+    for threshold in thresholds:
+        for margin in margins:
+            correct = wrong = 0
+            for _, expected, (match, score, gap) in matching:
+                if match is not None and score >= threshold and gap >= margin:
+                    if same_question(match["question"], expected):
+                        correct += 1
+                    else:
+                        wrong += 1
+            false_hits = sum(1 for _, (match, score, gap) in uncovered
+                             if match is not None and score >= threshold and gap >= margin)
+            print(f"{threshold:>6.2f} | {margin:>6.2f} | {correct:>6} | {wrong:>6} | {false_hits:>16}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="معايرة حد التشابه والهامش لفهرس الأسئلة الشائعة")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.25, 0.4, 0.5, 0.55, 0.62])
+    parser.add_argument("--margins", type=float, nargs="+", default=[0.0, 0.1, 0.4])
+    parser.add_argument("--show", action="store_true", help="عرض الدرجة والهامش لكل رسالة")
+    args = parser.parse_args()
+
+    run_calibration(args.thresholds, args.margins, args.show)
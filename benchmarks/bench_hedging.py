@@ -0,0 +1,133 @@
+"""
+قياس أثر الطلبات الاحتياطية (hedging) على زمن الاستجابة الطرفي
+يشغل خادماً محلياً يحاكي DeepSeek (سريع غالباً مع نسبة من الطلبات البطيئة جداً) و OpenAI (أبطأ قليلاً وثابت)
+ثم يقارن p50/p95/p99 للمزود الأساسي وحده مع الموزع HedgedLLMClient
+
+الاستخدام:
+    python benchmarks/bench_hedging.py --requests 400 --concurrency 20 --tail-rate 0.03 --tail-ms 1500 --warmup 100
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# إضافة مجلد المشروع إلى مسار Python
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_api import AsyncLLMClient
+from llm_dispatcher import HedgedLLMClient, HedgeBudget
+
+
+def make_handler(latencies):
+    """
+    معالج الخادم المحلي: زمن كل مسار من دالة latencies[path]()
+    """
+    class MockLLMHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latencies[self.path]() / 1000)
+            body = json.dumps({"choices": [{"message": {"content": f"رد من {self.path}"}}]}).encode("utf-8")
+            try:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                # الطلب الخاسر أُلغي وأُغلق اتصاله
+                pass
+
+        def log_message(self, format, *args):
+            pass
+
+    return MockLLMHandler
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[max(0, int(len(values) * q / 100 + 0.999999) - 1)]
+
+
+async def run_load(client, requests: int, concurrency: int, warmup: int):
+    """
+    تشغيل الطلبات بحد للتزامن وإرجاع أزمنتها بالمللي ثانية ومن أجاب
+    (طلبات الإحماء تملأ مدرج الزمن ولا تدخل في النتائج)
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, winners = [], []
+
+    async def one(i, record=True):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.generate_response(f"سؤال {i}")
+            if record:
+                latencies.append((time.perf_counter() - started) * 1000)
+                winners.append(response)
+
+    await asyncio.gather(*(one(i, record=False) for i in range(warmup)))
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    await client.aclose()
+    return latencies, winners
+
+
+def run_benchmark(requests: int, concurrency: int, tail_rate: float, tail_ms: float,
+                  primary_ms: float, secondary_ms: float, budget: float, warmup: int) -> None:
+    """
+    تشغيل المقارنة وطباعة النتائج
+    """
+    latencies = {
+        "/deepseek": lambda: tail_ms if random.random() < tail_rate else random.uniform(primary_ms * 0.5, primary_ms * 1.5),
+        "/openai": lambda: random.uniform(secondary_ms * 0.8, secondary_ms * 1.2)
+    }
+    # طابور الاتصالات الافتراضي (5) يسقط الاتصالات تحت التزامن ويضيف ثانية إعادة إرسال لكل منها
+    ThreadingHTTPServer.request_queue_size = concurrency * 8
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(latencies))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def provider(name):
+        return AsyncLLMClient(name, api_key="bench", api_url=f"{base_url}/{name}",
+                              max_concurrency=concurrency * 2, deadline=tail_ms / 1000 + 5)
+
+    print(f"DeepSeek المحاكى: ~{primary_ms}ms و {tail_rate:.0%} من الطلبات {tail_ms}ms | OpenAI المحاكى: ~{secondary_ms}ms")
+    print(f"{'الوضع':>10} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8} | {'max ms':>8} | {'احتياطي':>8} | {'رد OpenAI':>9}")
+
+    try:
+        for label in ("primary", "hedged"):
+            if label == "primary":
+                client = provider("deepseek")
+            else:
+                client = HedgedLLMClient(provider("deepseek"), provider("openai"),
+                                         budget=HedgeBudget(ratio=budget, burst=10))
+            times, winners = asyncio.run(run_load(client, requests, concurrency, warmup))
+            hedged = client.get_stats()["hedged"] if label == "hedged" else 0
+            secondary_share = sum(1 for winner in winners if "openai" in winner) / len(winners)
+            print(f"{label:>10} | {percentile(times, 50):>8.1f} | {percentile(times, 95):>8.1f} | "
+                  f"{percentile(times, 99):>8.1f} | {max(times):>8.1f} | {hedged:>8} | {secondary_share:>9.1%}")
+            if label == "hedged":
+                print(f"مهلة الطلب الاحتياطي (p95 لزمن DeepSeek): {client.get_stats()['hedge_delay_ms']}ms")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="قياس أثر الطلبات الاحتياطية على زمن الاستجابة الطرفي")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--tail-rate", type=float, default=0.03, help="نسبة طلبات DeepSeek البطيئة")
+    parser.add_argument("--tail-ms", type=float, default=1500)
+    parser.add_argument("--primary-ms", type=float, default=40)
+    parser.add_argument("--secondary-ms", type=float, default=80)
+    parser.add_argument("--budget", type=float, default=0.1, help="أقصى نسبة للطلبات الاحتياطية")
+    parser.add_argument("--warmup", type=int, default=100, help="طلبات إحماء لملء مدرج الزمن")
+    args = parser.parse_args()
+
+    run_benchmark(args.requests, args.concurrency, args.tail_rate, args.tail_ms,
+                  args.primary_ms, args.secondary_ms, args.budget, args.warmup)
@@ -0,0 +1,108 @@
+"""
+قياس أداء مطابق الكلمات المفتاحية مقارنة بالتنفيذ السابق
+(حلقة بحث منفصلة لكل قائمة كلمات: خدمة العملاء، القوائم، فئات التعليقات)
+
+الاستخدام:
+    python benchmarks/bench_keyword_matcher.py --messages 2000 --iterations 20
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+# إضافة مجلد المشروع إلى مسار Python
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot import ChatBot
+from facebook_comments import FacebookCommentsHandler
+from state_store import InMemoryStateStore
+
+SAMPLE_MESSAGES = [
+    "السلام عليكم، أريد أن أعرف كيف أقدم على وظيفة في المصنع",
+    "عندي شركة ونحتاج توفير عمالة مدربة في أسرع وقت",
+    "ما هي فرص الاستثمار المتاحة في المجال الزراعي؟",
+    "شكرا جزيلا على المجهود الرائع",
+    "أريد التحدث مع ممثل خدمة العملاء بخصوص طلبي",
+    "Hello, I would like more information about your services",
+    "هل يمكنني زيارة المقر يوم السبت القادم؟",
+    "أنا صحفي وأرغب في إجراء مقابلة مع الإدارة"
+]
+
+
+def legacy_route(bot: ChatBot, handler: FacebookCommentsHandler, message: str) -> tuple:
+    """
+    التنفيذ السابق: كل قائمة تُفحص بحلقة مستقلة (للمقارنة فقط)
+    """
+    text = message.lower()
+    human = any(keyword in text for keyword in bot.customer_service_keywords)
+    menu_key = None
+    for keyword, key in bot.menu_keywords.items():
+        if keyword in text and key in bot.main_menu:
+            menu_key = key
+            break
+    praise = any(expr in text for expr in bot.praise_expressions)
+    unwanted = any(keyword in text for keyword in handler.unwanted_keywords)
+    job = any(keyword in text for keyword in handler.job_keywords)
+    investor = any(keyword in text for keyword in handler.investor_keywords)
+    media = any(keyword in text for keyword in handler.media_keywords)
+    return human, menu_key, praise, unwanted, job, investor, media
+
+
+def matcher_route(bot: ChatBot, handler: FacebookCommentsHandler, message: str) -> tuple:
+    """
+    التنفيذ الحالي: فحص واحد لكل المجموعات
+    """
+    matches = bot.keyword_matcher.scan(message)
+    menu_key = next((key for _, key in matches.get("menu", []) if key in bot.main_menu), None)
+    return (
+        "customer_service" in matches, menu_key, "praise" in matches, "comment_unwanted" in matches,
+        "comment_job" in matches, "comment_investor" in matches, "comment_media" in matches
+    )
+
+
+def measure(func, bot, handler, messages, iterations: int) -> float:
+    """
+    متوسط زمن توجيه رسالة واحدة بالميكروثانية
+    """
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for message in messages:
+            func(bot, handler, message)
+    return (time.perf_counter() - started) * 1_000_000 / (iterations * len(messages))
+
+
+def run_benchmark(message_count: int, iterations: int) -> None:
+    """
+    تشغيل المقارنة وطباعة النتائج
+
+    :param message_count: عدد الرسائل المحاكاة
+    :param iterations: عدد مرات التكرار
+    """
+    bot = ChatBot(state_store=InMemoryStateStore())
+    handler = FacebookCommentsHandler(bot)
+    rng = random.Random(42)
+    messages = [rng.choice(SAMPLE_MESSAGES) for _ in range(message_count)]
+
+    for message in SAMPLE_MESSAGES:
+        assert legacy_route(bot, handler, message) == matcher_route(bot, handler, message), message
+
+    legacy_us = measure(legacy_route, bot, handler, messages, iterations)
+    matcher_us = measure(matcher_route, bot, handler, messages, iterations)
+
+    print(f"عدد الرسائل: {message_count} | التكرارات: {iterations}")
+    print(f"التنفيذ السابق (حلقة لكل قائمة): {legacy_us:.2f}µs لكل رسالة")
+    print(f"المطابق متعدد الأنماط (فحص واحد): {matcher_us:.2f}µs لكل رسالة")
+    print(f"التسريع: {legacy_us / matcher_us:.1f}x")
+
+    bot.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="قياس أداء مطابق الكلمات المفتاحية")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    run_benchmark(args.messages, args.iterations)
@@ -0,0 +1,92 @@
+"""
+قياس حجم سياق نموذج اللغة (بالرموز) مع ميزانية PromptBuilder مقارنة بالسياق الكامل السابق
+(موجه النظام وآخر التبادلات كاملة) على محادثات محاكاة من أسئلة وأجوبة data.json
+بردود تشبه ردود البوت: تحية ثم الإجابة ثم قائمة روابط الخدمات ثم عبارة استمرارية
+
+الاستخدام:
+    python benchmarks/bench_prompt_tokens.py --conversations 200 --turns 5 --budget 1200
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+
+# إضافة مجلد المشروع إلى مسار Python
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prompt_builder import PromptBuilder, get_template, legacy_context, estimate_tokens
+
+CONTINUE_PHRASES = [
+    "هل تحتاج مزيداً من المعلومات؟",
+    "هل لديك أسئلة أخرى؟",
+    "هل ترغب في معرفة المزيد؟"
+]
+
+SERVICE_LIST = """يمكنك الاستفادة من خدماتنا:
+1. بوابة التوظيف للباحثين عن عمل: https://omalmisrservices.com/ar/jobs
+2. بوابة توفير الموظفين للشركات: https://omalmisrservices.com/ar/workers
+3. خدمات الشركات والمستثمرين: https://omalmisrservices.com/ar/companies"""
+
+
+def build_conversations(count: int, turns: int, rng: random.Random) -> list:
+    """
+    توليد محادثات محاكاة من أسئلة وأجوبة data.json
+    """
+    data_file = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data.json")
+    with open(data_file, "r", encoding="utf-8") as f:
+        prompts = json.load(f)["prompts"]
+
+    conversations = []
+    for _ in range(count):
+        history = []
+        for prompt in rng.sample(prompts, turns):
+            response = f"أهلاً بك!\n\n{prompt['answer']}"
+            if rng.random() < 0.6:
+                response += f"\n\n{SERVICE_LIST}"
+            response += f"\n\n{rng.choice(CONTINUE_PHRASES)}"
+            history.append({"user_message": prompt["question"], "bot_response": response})
+        conversations.append(history)
+    return conversations
+
+
+def run_benchmark(count: int, turns: int, budget: int, seed: int) -> None:
+    """
+    تشغيل القياس وطباعة النتائج
+    """
+    rng = random.Random(seed)
+    conversations = build_conversations(count, turns, rng)
+    builder = PromptBuilder(max_tokens=budget, boilerplate=CONTINUE_PHRASES, count_tokens=estimate_tokens)
+    system_prompt = get_template("messenger").render(user_name="أحمد")
+
+    legacy, compact, build_ms = [], [], []
+    for history in conversations:
+        legacy.append(estimate_tokens(legacy_context(system_prompt, history)))
+        started = time.perf_counter()
+        context, report = builder.build(system_prompt, history)
+        build_ms.append((time.perf_counter() - started) * 1000)
+        compact.append(report["tokens"])
+
+    stats = builder.get_stats()
+    print(f"{count} محادثة × {turns} تبادل، ميزانية {budget} رمز، موجه النظام {estimate_tokens(system_prompt)} رمز")
+    print(f"{'السياق':>10} | {'متوسط':>8} | {'p95':>8} | {'أقصى':>8}")
+    for label, values in (("legacy", legacy), ("budgeted", compact)):
+        values = sorted(values)
+        print(f"{label:>10} | {statistics.mean(values):>8.0f} | {values[int(len(values) * 0.95) - 1]:>8} | {values[-1]:>8}")
+    print(f"التوفير: {stats['saved_ratio']:.1%} | تبادلات مختصرة: {stats['truncated_turns']} | "
+          f"ملخصة: {stats['summarized_turns']} | محذوفة: {stats['dropped_turns']} | "
+          f"زمن البناء: {statistics.mean(build_ms):.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="قياس حجم سياق نموذج اللغة مع ميزانية الرموز")
+    parser.add_argument("--conversations", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--budget", type=int, default=1200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    run_benchmark(args.conversations, args.turns, args.budget, args.seed)
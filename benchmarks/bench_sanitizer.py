@@ -0,0 +1,90 @@
+"""
+قياس أداء محرك تنقية الإشارات للذكاء الاصطناعي مقارنة بالتنفيذ السابق
+(استدعاء re.sub منفصل لكل عبارة مع إعادة بناء القواميس في كل رد)
+
+الاستخدام:
+    python benchmarks/bench_sanitizer.py --paragraphs 40 --iterations 500
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+
+# إضافة مجلد المشروع إلى مسار Python
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from text_sanitizer import TextSanitizer, DEFAULT_AI_REPLACEMENTS
+
+SAMPLE_PARAGRAPH = (
+    "مرحباً بك في مجمع عمال مصر. كنموذج للذكاء الاصطناعي أستطيع مساعدتك في التعرف على خدماتنا، "
+    "ويمكنك التقديم على الوظائف من خلال الرابط المخصص. As an AI assistant I can explain the process. "
+    "نحن نعمل في قطاعات الصناعة والزراعة والخدمات، ونوفر فرص عمل للشباب في كل المحافظات. "
+    "للتواصل مع خدمة العملاء يرجى الاتصال على الرقم المخصص أو زيارة موقعنا الرسمي.\n\n"
+)
+
+
+# تعبيرات حذف الجمل كما كانت في التنفيذ السابق
+LEGACY_STATEMENTS = [
+    r"أنا مساعد ذكاء اصطناعي.*?\.",
+    r"أنا لست إنسانًا حقيقيًا.*?\.",
+    r"I'm an AI.*?\.",
+    r"I am an AI.*?\.",
+    r"As an AI.*?\.",
+    r"كنموذج ذكاء اصطناعي.*?\.",
+]
+
+
+def legacy_filter(text: str) -> str:
+    """
+    التنفيذ السابق لـ ChatBot._filter_ai_references (للمقارنة فقط)
+    """
+    replacements = dict(DEFAULT_AI_REPLACEMENTS)
+    filtered_text = text
+    for ref, replacement in replacements.items():
+        filtered_text = re.sub(re.escape(ref), replacement, filtered_text, flags=re.IGNORECASE)
+
+    for statement in list(LEGACY_STATEMENTS):
+        filtered_text = re.sub(statement, "", filtered_text, flags=re.IGNORECASE | re.DOTALL)
+
+    return filtered_text.strip()
+
+
+def measure(func, text: str, iterations: int) -> float:
+    """
+    متوسط زمن استدعاء واحد بالمللي ثانية
+    """
+    func(text)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func(text)
+    return (time.perf_counter() - started) * 1000 / iterations
+
+
+def run_benchmark(paragraphs: int, iterations: int) -> None:
+    """
+    تشغيل المقارنة وطباعة النتائج
+
+    :param paragraphs: عدد الفقرات في الرد المحاكى
+    :param iterations: عدد مرات التكرار لكل تنفيذ
+    """
+    text = SAMPLE_PARAGRAPH * paragraphs
+    sanitizer = TextSanitizer.from_config()
+
+    legacy_ms = measure(legacy_filter, text, iterations)
+    engine_ms = measure(lambda value: sanitizer.sanitize(value).strip(), text, iterations)
+
+    print(f"طول الرد: {len(text)} حرف | عدد العبارات: {len(DEFAULT_AI_REPLACEMENTS)} | التكرارات: {iterations}")
+    print(f"التنفيذ السابق (re.sub لكل عبارة): {legacy_ms:.3f}ms لكل رد")
+    print(f"المحرك المترجم مسبقاً (مرور واحد): {engine_ms:.3f}ms لكل رد")
+    print(f"التسريع: {legacy_ms / engine_ms:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="قياس أداء محرك تنقية النصوص")
+    parser.add_argument("--paragraphs", type=int, default=40)
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    run_benchmark(args.paragraphs, args.iterations)
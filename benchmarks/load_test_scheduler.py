@@ -0,0 +1,87 @@
+"""
+اختبار تحميل لموزع أحداث webhook المقسم حسب المرسل
+يحاكي آلاف المرسلين ويقيس الإنتاجية وتأخر الشرائح ويتحقق من ترتيب رسائل كل مستخدم
+
+الاستخدام:
+    python benchmarks/load_test_scheduler.py --senders 5000 --messages 4 --shards 8 --work-ms 2
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+from collections import defaultdict
+
+# إضافة مجلد المشروع إلى مسار Python
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from webhook_queue import ShardedEventScheduler
+
+
+def run_load_test(senders: int, messages: int, shards: int, work_ms: float) -> None:
+    """
+    تشغيل اختبار التحميل وطباعة النتائج
+
+    :param senders: عدد المرسلين المحاكين
+    :param messages: عدد الرسائل لكل مرسل
+    :param shards: عدد الشرائح
+    :param work_ms: زمن المعالجة المحاكى لكل رسالة بالمللي ثانية
+    """
+    received = defaultdict(list)
+    lock = threading.Lock()
+    peak = {"lag_ms": 0.0, "depth": 0}
+
+    def handler(event):
+        time.sleep(work_ms / 1000)
+        with lock:
+            received[event["sender"]["id"]].append(event["seq"])
+
+    scheduler = ShardedEventScheduler(
+        handler,
+        key_func=lambda event: event["sender"]["id"],
+        num_shards=shards,
+        max_queue_size=senders * messages * 2
+    )
+    scheduler.start()
+
+    events = []
+    for seq in range(messages):
+        batch = [{"sender": {"id": f"sim_{i}"}, "seq": seq} for i in range(senders)]
+        random.shuffle(batch)
+        events.extend(batch)
+
+    started = time.perf_counter()
+    rejected = sum(0 if scheduler.submit(event) else 1 for event in events)
+
+    # مراقبة التأخر أثناء التفريغ
+    while scheduler.get_stats()["queue_depth"] > 0:
+        stats = scheduler.get_stats()
+        peak["lag_ms"] = max(peak["lag_ms"], stats["max_lag_ms"])
+        peak["depth"] = max(peak["depth"], stats["queue_depth"])
+        time.sleep(0.05)
+
+    scheduler.shutdown(timeout=60)
+    elapsed = time.perf_counter() - started
+
+    out_of_order = sum(1 for seq in received.values() if seq != sorted(seq))
+    stats = scheduler.get_stats()
+
+    print(f"المرسلون: {senders} | رسائل لكل مرسل: {messages} | الشرائح: {shards} | زمن المعالجة: {work_ms}ms")
+    print(f"الأحداث المعالجة: {stats['processed']} | المرفوضة: {rejected}")
+    print(f"الزمن الكلي: {elapsed:.2f}ث | الإنتاجية: {stats['processed'] / elapsed:.0f} حدث/ث")
+    print(f"متوسط الانتظار: {stats['avg_wait_ms']}ms | أقصى انتظار: {stats['max_wait_ms']}ms")
+    print(f"أقصى عمق للطابور: {peak['depth']} | أقصى تأخر لشريحة: {peak['lag_ms']}ms")
+    print(f"مرسلون بترتيب خاطئ: {out_of_order}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="اختبار تحميل موزع أحداث webhook")
+    parser.add_argument("--senders", type=int, default=5000)
+    parser.add_argument("--messages", type=int, default=4)
+    parser.add_argument("--shards", type=int, default=8)
+    parser.add_argument("--work-ms", type=float, default=1.0)
+    args = parser.parse_args()
+
+    run_load_test(args.senders, args.messages, args.shards, args.work_ms)
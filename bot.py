@@ -5,13 +5,31 @@
 """
 
 import json
-import re
 import os
 import random
 import logging
 import datetime
+import threading
 from typing import Dict, List, Tuple, Optional, Any
-from api import DeepSeekAPI
+from api import DeepSeekAPI, get_usage_stats
+from async_api import create_llm_client
+from response_cache import CachedLLMClient
+from semantic_cache import SemanticCache
+from prompt_builder import PromptBuilder, get_template
+from resilience import CircuitOpenError, get_resilience_stats
+from conversation_context import ConversationContext
+from conversation_journal import ConversationJournal
+from persistence_writer import WriteBehindWriter
+from state_store import create_state_store, UserStateView
+from conversation_cache import ConversationHistoryCache
+from knowledge_snapshot import (
+    KnowledgeSnapshot,
+    build_knowledge_snapshot,
+    snapshot_fingerprint,
+    save_compiled_snapshot,
+    load_compiled_snapshot
+)
+from data_repository import get_data_repository
 from config import BOT_SETTINGS, APP_SETTINGS
 
 # إعداد التسجيل
@@ -22,48 +40,93 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+
+def _knowledge_field(name: str) -> property:
+    """
+    خاصية للقراءة فقط تُرجع الحقل من لقطة قاعدة المعرفة الحالية
+    """
+    return property(lambda self: getattr(self.knowledge, name), doc=f"{name} من لقطة قاعدة المعرفة الحالية")
+
+
 class ChatBot:
     """
     شات بوت ذكي للرد على استفسارات زوار صفحة مجمع عمال مصر على فيسبوك
     سواء عبر الماسنجر أو التعليقات
     """
     
-    def __init__(self, data_file: str = None, api_key: Optional[str] = None):
+    # حقول قاعدة المعرفة تُقرأ دائماً من اللقطة الحالية
+    prompts = _knowledge_field("prompts")
+    human_expressions = _knowledge_field("human_expressions")
+    contact_info = _knowledge_field("contact_info")
+    requires_human_contact = _knowledge_field("requires_human_contact")
+    user_categories = _knowledge_field("user_categories")
+    job_sectors = _knowledge_field("job_sectors")
+    service_links = _knowledge_field("service_links")
+    service_categories = _knowledge_field("service_categories")
+    keyword_groups = _knowledge_field("keyword_groups")
+    faq_index = _knowledge_field("faq_index")
+    keyword_matcher = _knowledge_field("keyword_matcher")
+    ai_sanitizer = _knowledge_field("ai_sanitizer")
+    comment_sanitizer = _knowledge_field("comment_sanitizer")
+    
+    def __init__(self, data_file: str = None, api_key: Optional[str] = None, state_store=None):
         """
         تهيئة الشات بوت وتحميل البيانات من ملف JSON
         
         :param data_file: مسار ملف البيانات بصيغة JSON
         :param api_key: مفتاح API لخدمة DeepSeek (اختياري)
+        :param state_store: مخزن الحالة (اختياري، حسب STATE_BACKEND افتراضياً)
         """
         self.bot_name = "محمد سلامة"  # اسم الشات بوت
         self.data_file = data_file or BOT_SETTINGS.get("DATA_FILE", "data.json")
-        self.prompts = []
-        self.human_expressions = {}
-        self.contact_info = {}
-        self.requires_human_contact = []
-        self.user_categories = []
-        self.job_sectors = []
         self.personalize_response = BOT_SETTINGS.get("PERSONALIZE_RESPONSE", True)
         self.similarity_threshold = BOT_SETTINGS.get("SIMILARITY_THRESHOLD", 0.4)
+        self.faq_min_margin = BOT_SETTINGS.get("FAQ_MIN_MARGIN", 0.1)
         
-        # بيانات الخدمات والروابط
-        self.service_links = {}
-        self.service_categories = {}
+        # الإجابة محلياً من فهرس الأسئلة الشائعة قبل استدعاء API
+        self.faq_local_answers = BOT_SETTINGS.get("FAQ_LOCAL_ANSWERS", True)
+        self.fallback_faq_threshold = BOT_SETTINGS.get("FALLBACK_FAQ_THRESHOLD", 0.25)
+        self.fallback_faq_min_margin = BOT_SETTINGS.get("FALLBACK_FAQ_MIN_MARGIN", 0.1)
         
-        # تحميل البيانات من ملف JSON
-        self.load_data()
+        # لقطة قاعدة المعرفة الحالية (البيانات وفهارسها) تُستبدل كاملة عند كل تحميل
+        # (تُحمّل في نهاية التهيئة بعد تعريف القوائم والكلمات المفتاحية)
+        self.knowledge: Optional[KnowledgeSnapshot] = None
+        self._knowledge_lock = threading.Lock()
+        self._knowledge_version = 0
+        
+        # مجموعات كلمات مفتاحية تسجلها وحدات أخرى (مثل معالج التعليقات) وتُضاف لكل لقطة
+        self.extra_keyword_groups = {}
         
         # تهيئة واجهة API
-        self.api = DeepSeekAPI(api_key)
+        # (مع ذاكرة للردود المتكررة والذاكرة الدلالية للصياغات المختلفة أمام العميل، وباقي خصائص العميل متاحة كما هي)
+        semantic_cache = SemanticCache() if BOT_SETTINGS.get("SEMANTIC_CACHE_ENABLED", False) else None
+        self.api = CachedLLMClient(create_llm_client(api_key), semantic=semantic_cache)
         
-        # تاريخ المحادثات السابقة يتضمن الآن أسماء المستخدمين
-        self.conversation_history = {}
+        # آخر تبادلات كل مستخدم في الذاكرة بحدود على العمق وعدد المستخدمين والذاكرة
+        # (المستخدمون المُخرجون يُقرأ تاريخهم من مخزن الحالة)
+        self.conversation_history = ConversationHistoryCache()
         
-        # حالة المحادثة الحالية
-        self.conversation_state = {}
+        # مخزن الحالة الدائم (SQLite أو الذاكرة) المشترك بين العمال
+        self.state_store = state_store or create_state_store()
         
-        # تعيين مصدر المحادثة الحالي
+        # عدد التبادلات السابقة المستخدمة في سياق المحادثة
+        self.context_history_turns = BOT_SETTINGS.get("CONTEXT_HISTORY_TURNS", 5)
+        
+        # سجل المحادثات على القرص (إلحاق سجل واحد لكل تبادل)
+        self.journal = ConversationJournal()
+        
+        # كاتب خلفي يحفظ التبادلات على دفعات خارج مسار الرد
+        self.persistence = WriteBehindWriter(self._persist_exchanges, name="conversations")
+        
+        # حالة المحادثة الحالية (اسم المستخدم وغيره) محفوظة في مخزن الحالة
+        self.conversation_state = UserStateView(self.state_store, "user_state")
+        
+        # مصدر المحادثة الافتراضي للاستدعاءات التي لا تمرر سياق طلب
+        # (المصدر الفعلي لكل طلب يُحمل في ConversationContext)
         self.conversation_source = "messenger"  # messenger أو facebook_comment
+        
+        # قفل لحماية تعديل الحالة المشتركة بين المستخدمين عند التشغيل بعدة خيوط
+        self._state_lock = threading.RLock()
 
         # إعدادات الاستمرارية في المحادثة
         self.continue_conversation = BOT_SETTINGS.get("CONTINUE_CONVERSATION", True)
@@ -75,6 +138,18 @@ class ChatBot:
             "هل أستطيع مساعدتك في شيء آخر؟"
         ]
         
+        # ملاحظة تنهي ردّاً مبثوثاً انقطع بعد إرسال جزء منه
+        self.stream_interrupted_message = "عذراً، انقطع الرد قبل اكتماله. يمكنك إعادة إرسال سؤالك وسنكمل معك."
+        
+        # بناء سياق نموذج اللغة بميزانية رموز (عبارات الاستمرارية لا تتكرر في تاريخ المحادثة)
+        self.prompt_builder = PromptBuilder(boilerplate=self.continue_phrases)
+        
+        # قوالب موجه النظام (بادئة ثابتة تصيبها ذاكرة البادئات لدى المزود ثم أجزاء الطلب)
+        self.messenger_template = get_template("messenger")
+        self.comment_template = get_template("comment")
+        for template in (self.messenger_template, self.comment_template):
+            logger.info(f"قالب موجه {template.name}: الإصدار {template.version} (بصمة البادئة {template.prefix_hash})")
+        
         # خيارات التواصل مع ممثل خدمة العملاء (محمد سلامة)
         self.customer_service_phrases = [
             "للتواصل المباشر مع ممثل خدمة العملاء، أرسل كلمة 'ممثل خدمة العملاء'",
@@ -268,41 +343,88 @@ class ChatBot:
             }
         }
         
-        # حالة التحقق من كلمة المرور للمطور
-        self.dev_auth_state = {}
+        # كلمات مفتاحية للبحث في القائمة (الكلمة -> مفتاح القائمة، الترتيب يحدد الأولوية)
+        self.menu_keywords = {
+            "وظائف": "أبحث عن عمل",
+            "توظيف": "أبحث عن عمل",
+            "عمل": "أبحث عن عمل",
+            "وظيفة": "أبحث عن عمل",
+            "فرصة عمل": "أبحث عن عمل",
+            "باحث عن عمل": "أبحث عن عمل",
+            "سيرة ذاتية": "أبحث عن عمل",
+        
+            "موظفين": "أبحث عن موظفين وعمال",
+            "عمال": "أبحث عن موظفين وعمال",
+            "عمالة": "أبحث عن موظفين وعمال",
+            "توفير عمال": "أبحث عن موظفين وعمال",
+        
+            "شركات": "خدمات الشركات",
+            "استثمار": "خدمات الشركات",
+            "فرص استثمارية": "خدمات الشركات",
+            "جدوى": "خدمات الشركات",
+            "منتجات": "خدمات الشركات",
+            "خامات": "خدمات الشركات",
+            "تسويق": "خدمات الشركات",
+            "مالية": "خدمات الشركات",
+            "قانونية": "خدمات الشركات",
+            "تعليم": "خدمات الشركات",
+        
+            "نزاع": "بوابة فض المنازعات",
+            "منازعات": "بوابة فض المنازعات",
+            "مشكلة": "بوابة فض المنازعات",
+            "تسوية": "بوابة فض المنازعات",
+            "شكوى": "بوابة فض المنازعات",
+        
+            "تواصل": "تواصل معنا",
+            "اتصل": "تواصل معنا",
+            "هاتف": "تواصل معنا",
+            "عنوان": "تواصل معنا",
+            "سوشيال": "تواصل معنا",
+            "فيسبوك": "تواصل معنا",
+            "يوتيوب": "تواصل معنا",
+        
+            "معلومات": "من نحن",
+            "من هم": "من نحن",
+            "رؤية": "من نحن",
+            "رسالة": "من نحن",
+            "هدف": "من نحن",
+            "أهداف": "من نحن"
+        }
+        
+        # تعبيرات الثناء في التعليقات (التعليق القصير الذي يحتوي أحدها لا يحتاج إلى رد)
+        self.praise_expressions = [
+            "شكرا", "جزاكم الله خيرا", "ما شاء الله", "رائع", "تمام", "جميل", "احسنتم", 
+            "تسلم", "بارك الله فيكم", "جزاكم الله", "thank", "thanks", "❤"
+        ]
+        
+        # عبارات طلب القائمة الرئيسية
+        self.main_menu_aliases = ["القائمة", "القائمة الرئيسية", "الخدمات", "خدمات", "الخيارات", "قائمة", "menu", "services"]
+        
+        # تحميل البيانات وبناء الفهارس المشتقة منها
+        self.load_data()
+        
+        # حالة التحقق من كلمة المرور للمطور ووضع المطور لكل مستخدم (محفوظة في مخزن الحالة)
+        self.dev_auth_state = UserStateView(self.state_store, "dev_auth")
         
         logger.info(f"تم تهيئة ChatBot بنجاح. اسم الشات بوت: {self.bot_name}، ملف البيانات: {self.data_file}")
     
-    def load_data(self) -> None:
+    def load_data(self, revalidate: bool = False) -> bool:
         """
-        تحميل البيانات من ملف JSON
+        تحميل البيانات من ملف JSON وبناء لقطة جديدة لقاعدة المعرفة ثم استبدالها بشكل ذري
+        (الطلبات الجارية تكمل على اللقطة السابقة ولا ترى حالة نصف مبنية)
+        
+        :param revalidate: فحص الملف فوراً دون انتظار فترة فحص مستودع البيانات
+        :return: True إذا تمت القراءة (المحتوى الجديد أو آخر نسخة صالحة يحتفظ بها المستودع)
         """
+        data = None
+        
+        # عند الإقلاع: استخدام اللقطة المترجمة مسبقاً إذا كانت مطابقة للبيانات الحالية
+        if self.knowledge is None and self._load_compiled_knowledge():
+            return True
+        
         try:
-            with open(self.data_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                self.prompts = data.get("prompts", [])
-                self.human_expressions = data.get("human_expressions", {})
-                self.contact_info = data.get("contact_info", {})
-                self.requires_human_contact = data.get("requires_human_contact", [])
-                self.user_categories = data.get("user_categories", [])
-                self.job_sectors = data.get("job_sectors", [])
-                self.personalize_response = data.get("personalize_response", self.personalize_response)
-                
-                # تحميل بيانات الخدمات والروابط
-                self.service_links = data.get("service_links", {})
-                self.service_categories = data.get("service_categories", {})
-                
-            logger.info(f"تم تحميل {len(self.prompts)} سؤال وجواب من قاعدة البيانات")
-            
-            if self.human_expressions:
-                logger.info(f"تم تحميل تعبيرات بشرية لـ {len(self.human_expressions)} فئة مختلفة")
-            
-            if self.user_categories:
-                logger.info(f"تم تحميل {len(self.user_categories)} فئة من المستخدمين")
-            
-            if self.service_links:
-                logger.info(f"تم تحميل {len(self.service_links)} رابط لخدمات المجمع")
-            
+            # القراءة من المستودع المشترك (يعاد التحليل فقط عند تغير الملف، ويُفحص الملف دائماً في التحميل الأول)
+            data = get_data_repository().load(self.data_file, revalidate=revalidate or self.knowledge is None)
         except FileNotFoundError:
             error_msg = f"خطأ: لم يتم العثور على ملف البيانات '{self.data_file}'"
             logger.error(error_msg)
@@ -315,10 +437,186 @@ class ChatBot:
             error_msg = f"خطأ غير متوقع أثناء تحميل البيانات: {e}"
             logger.error(error_msg)
             print(error_msg)
+        
+        if data is None and self.knowledge is not None:
+            # فشل إعادة التحميل: الاستمرار باللقطة الحالية
+            return False
+        
+        with self._knowledge_lock:
+            current = self.knowledge
+            if current is not None and data is current.data:
+                # المستودع أرجع نفس المحتوى: لا حاجة لإعادة البناء
+                return True
+            
+            self._knowledge_version += 1
+            snapshot = build_knowledge_snapshot(
+                data or {},
+                self._knowledge_version,
+                self._keyword_groups(),
+                self.main_menu,
+                self.main_menu_aliases,
+                previous=current,
+                # عند الإقلاع يُبنى فهرس الأسئلة في الخلفية بدلاً من تأخير جاهزية العامل
+                defer_faq=current is None
+            )
+            self.knowledge = snapshot
+        
+        if current is None:
+            self._warm_knowledge(snapshot)
+        
+        if data is not None:
+            self.personalize_response = data.get("personalize_response", self.personalize_response)
+        
+        logger.info(
+            f"تم تحميل قاعدة المعرفة (الإصدار {snapshot.version}): {len(snapshot.prompts)} سؤال وجواب، "
+            f"خلال {snapshot.build_ms:.1f}ms"
+        )
+        
+        if snapshot.human_expressions:
+            logger.info(f"تم تحميل تعبيرات بشرية لـ {len(snapshot.human_expressions)} فئة مختلفة")
+        
+        if snapshot.user_categories:
+            logger.info(f"تم تحميل {len(snapshot.user_categories)} فئة من المستخدمين")
+        
+        if snapshot.service_links:
+            logger.info(f"تم تحميل {len(snapshot.service_links)} رابط لخدمات المجمع")
+        
+        return data is not None
+    
+    def _read_data_file(self) -> Tuple[bytes, Tuple[int, int]]:
+        """
+        قراءة ملف البيانات كما هو مع توقيعه (التوقيع يؤخذ قبل القراءة حتى يُكتشف أي تعديل لاحق)
+        """
+        stat = os.stat(self.data_file)
+        with open(self.data_file, "rb") as f:
+            raw = f.read()
+        return raw, (stat.st_mtime_ns, stat.st_size)
+    
+    def _load_compiled_knowledge(self) -> bool:
+        """
+        تحميل لقطة قاعدة المعرفة من الملف المترجم (KNOWLEDGE_SNAPSHOT_FILE) بدلاً من تحليل JSON وبناء الفهارس
+        
+        :return: True إذا تم استخدام الملف المترجم
+        """
+        path = BOT_SETTINGS.get("KNOWLEDGE_SNAPSHOT_FILE")
+        if not path:
+            return False
+        
+        try:
+            raw, signature = self._read_data_file()
+        except OSError:
+            return False
+        
+        fingerprint = snapshot_fingerprint(raw, self._keyword_groups(), self.main_menu, self.main_menu_aliases)
+        snapshot = load_compiled_snapshot(path, fingerprint)
+        if snapshot is None:
+            return False
+        
+        # تسجيل البيانات في المستودع المشترك حتى لا تعيد الوحدات الأخرى تحليل الملف
+        get_data_repository().prime(self.data_file, snapshot.data, raw, signature)
+        
+        with self._knowledge_lock:
+            self._knowledge_version += 1
+            snapshot.version = self._knowledge_version
+            self.knowledge = snapshot
+        
+        self.personalize_response = snapshot.data.get("personalize_response", self.personalize_response)
+        
+        self._warm_knowledge(snapshot)
+        logger.info(
+            f"تم تحميل قاعدة المعرفة من اللقطة المترجمة {path}: {len(snapshot.prompts)} سؤال وجواب، "
+            f"خلال {snapshot.build_ms:.1f}ms"
+        )
+        return True
+    
+    def _warm_knowledge(self, snapshot: KnowledgeSnapshot) -> None:
+        """
+        تجهيز فهرس الأسئلة الشائعة المؤجل في خيط خلفي (استيراد scikit-learn) بدلاً من تأخير الإقلاع
+        """
+        if self.faq_local_answers:
+            threading.Thread(target=snapshot.faq_index.warm, name="faq-index-warmup", daemon=True).start()
+    
+    def save_knowledge_snapshot(self, path: str) -> Optional[int]:
+        """
+        ترجمة قاعدة المعرفة الحالية إلى ملف ثنائي يُحمّل عند الإقلاع (خطوة البناء)
+        
+        :param path: مسار الملف المترجم
+        :return: حجم الملف بالبايت، أو None إذا تعذر تحميل ملف البيانات
+        """
+        try:
+            raw, _ = self._read_data_file()
+        except OSError as e:
+            logger.error(f"تعذر قراءة ملف البيانات {self.data_file}: {e}")
+            return None
+        
+        if not self.load_data(revalidate=True):
+            return None
+        
+        # اللقطة المحفوظة يجب أن تحتوي على الفهرس مبنياً
+        self.knowledge.faq_index.warm()
+        fingerprint = snapshot_fingerprint(raw, self._keyword_groups(), self.main_menu, self.main_menu_aliases)
+        size = save_compiled_snapshot(self.knowledge, path, fingerprint)
+        logger.info(f"تم حفظ اللقطة المترجمة لقاعدة المعرفة في {path} ({size} بايت)")
+        return size
+    
+    def reload_knowledge(self) -> bool:
+        """
+        إعادة تحميل قاعدة المعرفة فوراً (يستخدمها مراقب الملفات)
+        
+        :return: True إذا نجحت إعادة التحميل
+        """
+        return self.load_data(revalidate=True)
+    
+    def _keyword_groups(self) -> Dict[str, Any]:
+        """
+        مجموعات الكلمات المفتاحية للشات بوت والمجموعات المسجلة من الوحدات الأخرى
+        (يمكن تجاوز أي مجموعة من مفتاح keyword_groups في data.json)
+        """
+        groups = {
+            "customer_service": self.customer_service_keywords,
+            "menu": self.menu_keywords,
+            "praise": self.praise_expressions
+        }
+        groups.update(self.extra_keyword_groups)
+        return groups
+    
+    def register_keyword_groups(self, groups: Dict[str, Any]) -> None:
+        """
+        تسجيل مجموعات كلمات مفتاحية إضافية في المطابق المشترك (تبقى مسجلة بعد إعادة التحميل)
+        
+        :param groups: قاموس اسم الفئة -> قائمة كلمات أو قاموس كلمة -> قيمة
+        """
+        with self._knowledge_lock:
+            self.extra_keyword_groups.update(groups)
+            matcher = self.knowledge.keyword_matcher
+            overrides = self.knowledge.keyword_groups
+            for category, keywords in groups.items():
+                matcher.set_group(category, overrides.get(category, keywords))
+            matcher.build()
+    
+    def get_knowledge_status(self) -> Dict[str, Any]:
+        """
+        حالة قاعدة المعرفة الحالية (الإصدار وزمن البناء وأحجام الفهارس)
+        
+        :return: قاموس الحالة
+        """
+        status = self.knowledge.get_status()
+        status["data_file"] = self.data_file
+        return status
+    
+    def search_knowledge_base(self, query: str) -> Tuple[Optional[Dict[str, Any]], float]:
+        """
+        البحث عن أقرب سؤال في قاعدة المعرفة للرسالة
+        
+        :param query: رسالة المستخدم
+        :return: زوج من السؤال والجواب الأقرب (أو None) ودرجة التشابه
+        """
+        return self.faq_index.search(query)
     
     def set_conversation_source(self, source: str) -> None:
         """
-        تعيين مصدر المحادثة (ماسنجر أو تعليق فيسبوك)
+        تعيين مصدر المحادثة الافتراضي (ماسنجر أو تعليق فيسبوك)
+        يُستخدم فقط عندما لا يتم تمرير ConversationContext مع الطلب
         
         :param source: مصدر المحادثة ("messenger" أو "facebook_comment")
         """
@@ -383,107 +681,65 @@ class ChatBot:
         
         return menu_text
     
-    def process_menu_request(self, user_message: str) -> Optional[str]:
+    def process_menu_request(self, user_message: str, matches: Optional[Dict[str, List[Tuple[str, Any]]]] = None) -> Optional[str]:
         """
         معالجة طلبات المستخدم المتعلقة بالقوائم
         
         :param user_message: رسالة المستخدم
+        :param matches: نتيجة فحص الرسالة بمطابق الكلمات المفتاحية (اختياري، لتجنب فحصها مرة أخرى)
         :return: رد القائمة المطلوبة أو None إذا لم تكن الرسالة متعلقة بالقوائم
         """
         user_message = user_message.strip().lower()
+        knowledge = self.knowledge
+        
+        # طلب القائمة الرئيسية أو عنصر منها أو من قوائمها الفرعية (جدول مبني مع لقطة قاعدة المعرفة)
+        target = knowledge.menu_lookup.get(user_message)
+        if target is not None:
+            main_key, sub_key = target
+            if main_key is None:
+                return self.generate_menu_buttons(menu_type="main")
+            
+            item = self.main_menu[main_key]
+            if sub_key is not None:
+                sub_item = item["submenu"][sub_key]
+                service_info = f"📋 {sub_item['title']}\n\n{sub_item['description']}\n\n🔗 الرابط: {sub_item['link']}"
+                return service_info
+            if "submenu" in item:
+                return self.generate_menu_buttons(menu_type="submenu", submenu_key=main_key)
+            service_info = f"📋 {item['title']}\n\n{item['description']}\n\n🔗 الرابط: {item['link']}"
+            return service_info
         
-        # طلب القائمة الرئيسية
-        if user_message in ["القائمة", "القائمة الرئيسية", "الخدمات", "خدمات", "الخيارات", "قائمة", "menu", "services"]:
-            return self.generate_menu_buttons(menu_type="main")
+        # البحث عن كلمات مفتاحية في رسالة المستخدم
+        if matches is None:
+            matches = knowledge.keyword_matcher.scan(user_message)
         
-        # طلب قائمة فرعية
-        for key, item in self.main_menu.items():
-            if user_message in [key.lower(), item["title"].lower()]:
+        for keyword, menu_key in matches.get("menu", []):
+            if menu_key in self.main_menu:
+                item = self.main_menu[menu_key]
                 if "submenu" in item:
-                    return self.generate_menu_buttons(menu_type="submenu", submenu_key=key)
+                    return self.generate_menu_buttons(menu_type="submenu", submenu_key=menu_key)
                 else:
                     service_info = f"📋 {item['title']}\n\n{item['description']}\n\n🔗 الرابط: {item['link']}"
                     return service_info
         
-        # البحث في القوائم الفرعية
-        for main_key, main_item in self.main_menu.items():
-            if "submenu" in main_item:
-                for sub_key, sub_item in main_item["submenu"].items():
-                    if user_message in [sub_key.lower(), sub_item["title"].lower()]:
-                        service_info = f"📋 {sub_item['title']}\n\n{sub_item['description']}\n\n🔗 الرابط: {sub_item['link']}"
-                        return service_info
-        
-        # البحث في القائمة باستخدام كلمات مفتاحية
-        keywords_map = {
-            "وظائف": "أبحث عن عمل",
-            "توظيف": "أبحث عن عمل",
-            "عمل": "أبحث عن عمل",
-            "وظيفة": "أبحث عن عمل",
-            "فرصة عمل": "أبحث عن عمل",
-            "باحث عن عمل": "أبحث عن عمل",
-            "سيرة ذاتية": "أبحث عن عمل",
-            
-            "موظفين": "أبحث عن موظفين وعمال",
-            "عمال": "أبحث عن موظفين وعمال",
-            "عمالة": "أبحث عن موظفين وعمال",
-            "توفير عمال": "أبحث عن موظفين وعمال",
-            
-            "شركات": "خدمات الشركات",
-            "استثمار": "خدمات الشركات",
-            "فرص استثمارية": "خدمات الشركات",
-            "جدوى": "خدمات الشركات",
-            "منتجات": "خدمات الشركات",
-            "خامات": "خدمات الشركات",
-            "تسويق": "خدمات الشركات",
-            "مالية": "خدمات الشركات",
-            "قانونية": "خدمات الشركات",
-            "تعليم": "خدمات الشركات",
-            
-            "نزاع": "بوابة فض المنازعات",
-            "منازعات": "بوابة فض المنازعات",
-            "مشكلة": "بوابة فض المنازعات",
-            "تسوية": "بوابة فض المنازعات",
-            "شكوى": "بوابة فض المنازعات",
-            
-            "تواصل": "تواصل معنا",
-            "اتصل": "تواصل معنا",
-            "هاتف": "تواصل معنا",
-            "عنوان": "تواصل معنا",
-            "سوشيال": "تواصل معنا",
-            "فيسبوك": "تواصل معنا",
-            "يوتيوب": "تواصل معنا",
-            
-            "معلومات": "من نحن",
-            "من هم": "من نحن",
-            "رؤية": "من نحن",
-            "رسالة": "من نحن",
-            "هدف": "من نحن",
-            "أهداف": "من نحن"
-        }
-        
-        # البحث عن كلمات مفتاحية في رسالة المستخدم
-        for keyword, menu_key in keywords_map.items():
-            if keyword in user_message:
-                if menu_key in self.main_menu:
-                    item = self.main_menu[menu_key]
-                    if "submenu" in item:
-                        return self.generate_menu_buttons(menu_type="submenu", submenu_key=menu_key)
-                    else:
-                        service_info = f"📋 {item['title']}\n\n{item['description']}\n\n🔗 الرابط: {item['link']}"
-                        return service_info
-        
         # لم يتم العثور على طلب قائمة
         return None
 
-    def generate_messenger_response(self, user_id: str, message: str) -> str:
+    def generate_messenger_response(self, user_id: str, message: str,
+                                    request_context: Optional[ConversationContext] = None,
+                                    delivery=None) -> str:
         """
         توليد رد للمستخدم عبر ماسنجر فيسبوك
         
         :param user_id: معرف المستخدم
         :param message: رسالة المستخدم
+        :param request_context: سياق الطلب (اختياري، يتم إنشاؤه تلقائياً)
+        :param delivery: مرحلة إرسال تدريجي MessengerDelivery (اختياري): رد نموذج اللغة يُبث إليها
+                         ويُرسل أثناء توليده، وتكون delivery.finished صحيحة بعد إرساله كاملاً
         :return: الرد المولد
         """
-        self.set_conversation_source("messenger")
+        ctx = request_context or ConversationContext(user_id, "messenger", message)
+        ctx.flags["developer"] = self._is_developer_mode(user_id)
         
         # التحقق من تدفق المصادقة التفاعلي للمطور
         auth_response = self.handle_developer_auth(user_id, message)
@@ -492,79 +748,132 @@ class ChatBot:
         
         # التحقق من كلمة السر للمهندس محمد شعبان
         if message.strip() == "افتح يا سمسم انا محمد شعبان":
-            response = self._generate_special_developer_message()
-            self._save_conversation(user_id, message, response)
+            response = self._generate_special_developer_message(user_id)
+            self._save_conversation(user_id, message, response, ctx)
             return response
         
         # التحقق من طلبات المطور بعد التحقق من الهوية
-        if hasattr(self, '_last_dev_auth') and self._last_dev_auth:
+        if ctx.flags["developer"]:
             # عرض الإحصائيات
             if message.strip() in ["عرض الإحصائيات", "احصائيات", "الاحصائيات", "statistics"]:
                 response = self._generate_stats_report()
-                self._save_conversation(user_id, message, response)
+                self._save_conversation(user_id, message, response, ctx)
                 return response
             
             # عرض المميزات الفنية
             if message.strip() in ["عرض المميزات", "المميزات", "مميزات", "مميزاتك", "features"]:
                 response = self._generate_features_report()
-                self._save_conversation(user_id, message, response)
+                self._save_conversation(user_id, message, response, ctx)
                 return response
                 
             # فتح قائمة الإعدادات
             if message.strip() in ["فتح الإعدادات", "الإعدادات", "اعدادات", "settings"]:
                 response = self._generate_settings_menu()
-                self._save_conversation(user_id, message, response)
+                self._save_conversation(user_id, message, response, ctx)
                 return response
                 
             # العودة للوضع العادي
             if message.strip() in ["العودة", "عودة", "exit", "normal"]:
-                self._last_dev_auth = False
+                self._set_developer_mode(user_id, False)
                 response = "تم العودة للوضع العادي. يمكنك استخدام كلمة السر للعودة لوضع المطوّر في أي وقت."
-                self._save_conversation(user_id, message, response)
+                self._save_conversation(user_id, message, response, ctx)
                 return response
             
             # معالجة طلبات تغيير الإعدادات
             dev_settings_response = self.process_developer_settings(user_id, message)
             if dev_settings_response:
-                self._save_conversation(user_id, message, dev_settings_response)
+                self._save_conversation(user_id, message, dev_settings_response, ctx)
                 return dev_settings_response
         
+        # لقطة واحدة من قاعدة المعرفة لكامل الطلب (حتى لو أعيد التحميل أثناءه)
+        knowledge = self.knowledge
+        
+        # فحص الرسالة مرة واحدة لكل مجموعات الكلمات المفتاحية
+        matches = knowledge.keyword_matcher.scan(message)
+        
         # التحقق مما إذا كان المستخدم يطلب التحدث مع ممثل خدمة العملاء
-        for keyword in self.customer_service_keywords:
-            if keyword in message.lower():
-                return self._generate_human_representative_response(user_id)
+        if "customer_service" in matches:
+            return self._generate_human_representative_response(user_id)
         
         # التحقق من طلبات القائمة
-        menu_response = self.process_menu_request(message)
+        menu_response = self.process_menu_request(message, matches)
         if menu_response:
             logger.info(f"تم إرسال قائمة للمستخدم {user_id}")
             return menu_response
         
+        # الإجابة محلياً من الأسئلة الشائعة إذا تجاوز التشابه الحد (بدون رحلة شبكة إلى API)
+        if self.faq_local_answers:
+            faq_match = knowledge.faq_index.answer(message, self.similarity_threshold, self.faq_min_margin)
+            if faq_match:
+                response = faq_match["answer"]
+                self._save_conversation(user_id, message, response, ctx)
+                logger.info(f"تم الرد على المستخدم {user_id} من الأسئلة الشائعة دون استدعاء API")
+                return response
+        
         # بناء المحادثة السابقة للمستخدم
         conversation_history = self._get_user_conversation_history(user_id)
         
         # إنشاء سياق المحادثة
         context = self._build_conversation_context(user_id, conversation_history)
         
+        # السياق شخصي إذا احتوى على اسم المستخدم أو تاريخ محادثته (لا يُخزن رده في ذاكرة الردود افتراضياً)
+        personalized = bool(conversation_history) or "user_name" in self.conversation_state.get(user_id, {})
+        
         # توليد رد باستخدام DeepSeek API
         try:
-            response = self.api.generate_response(message, context=context)
-            
-            # تنقية الرد من أي إشارات للذكاء الاصطناعي
-            response = self._filter_ai_references(response)
-            
-            # إضافة عبارة استمرارية للمحادثة إذا كانت مفعلة
-            if self.continue_conversation and random.random() < 0.7:  # 70% من الوقت
-                response += f"\n\n{random.choice(self.continue_phrases)}"
+            if delivery is not None:
+                # بث الرد وإرسال كل فقرة مكتملة بعد تنقيتها من أي إشارات للذكاء الاصطناعي
+                delivery.sanitize = self._filter_ai_references
+                for part in self.api.stream_response(message, context=context, personalized=personalized,
+                                                     intents=matches.keys()):
+                    delivery.feed(part)
+                
+                # إضافة عبارة استمرارية للمحادثة إذا كانت مفعلة
+                if self.continue_conversation and random.random() < 0.7:  # 70% من الوقت
+                    delivery.feed(f"\n\n{random.choice(self.continue_phrases)}")
+                
+                response = delivery.finish()
+                logger.debug(f"أول رسالة للمستخدم {user_id} بعد {delivery.first_message_ms} مللي ثانية")
+            else:
+                response = self.api.generate_response(message, context=context, personalized=personalized,
+                                                      intents=matches.keys())
+                
+                # تنقية الرد من أي إشارات للذكاء الاصطناعي
+                response = self._filter_ai_references(response)
+                
+                # إضافة عبارة استمرارية للمحادثة إذا كانت مفعلة
+                if self.continue_conversation and random.random() < 0.7:  # 70% من الوقت
+                    response += f"\n\n{random.choice(self.continue_phrases)}"
             
             # تخزين المحادثة
-            self._save_conversation(user_id, message, response)
+            self._save_conversation(user_id, message, response, ctx)
             
+            logger.debug(f"تم توليد رد للمستخدم {user_id} خلال {ctx.elapsed_ms()} مللي ثانية")
             return response
             
         except Exception as e:
-            error_msg = f"حدث خطأ أثناء توليد الرد: {str(e)}"
-            logger.error(error_msg)
+            if isinstance(e, CircuitOpenError):
+                # الدائرة مفتوحة: رُفض الطلب فوراً دون انتظار فشل جديد من API
+                logger.warning(f"تم تجاوز API للمستخدم {user_id}: {e}")
+            else:
+                error_msg = f"حدث خطأ أثناء توليد الرد: {str(e)}"
+                logger.error(error_msg)
+            
+            # انقطع البث بعد وصول جزء من الرد للمستخدم: لا يُرسل رد احتياطي بعده، بل ملاحظة قصيرة
+            # ويُحفظ ما أُرسل فعلاً
+            if delivery is not None and delivery.sent:
+                response = delivery.interrupt(self.stream_interrupted_message)
+                self._save_conversation(user_id, message, response, ctx)
+                logger.warning(f"انقطع بث الرد للمستخدم {user_id} بعد إرسال جزء منه")
+                return response
+            
+            # أقرب إجابة من الأسئلة الشائعة (بحد تشابه أقل) قبل الرد الاحتياطي الثابت
+            faq_match = knowledge.faq_index.answer(message, self.fallback_faq_threshold, self.fallback_faq_min_margin)
+            if faq_match:
+                response = faq_match["answer"]
+                self._save_conversation(user_id, message, response, ctx)
+                logger.info(f"تم الرد على المستخدم {user_id} من الأسئلة الشائعة لتعذر الوصول إلى API")
+                return response
             
             # استخدام رد احتياطي
             fallback_response = """
@@ -578,54 +887,39 @@ class ChatBot:
             """
             return fallback_response
     
-    def generate_comment_response(self, comment_id: str, comment_text: str, user_id: str = None) -> str:
+    def generate_comment_response(self, comment_id: str, comment_text: str, user_id: str = None,
+                                  request_context: Optional[ConversationContext] = None) -> str:
         """
         توليد رد لتعليق على منشور فيسبوك
         
         :param comment_id: معرف التعليق
         :param comment_text: نص التعليق
         :param user_id: معرف المستخدم (اختياري)
+        :param request_context: سياق الطلب (اختياري، يتم إنشاؤه تلقائياً)
         :return: الرد المولد
         """
-        self.set_conversation_source("facebook_comment")
+        ctx = request_context or ConversationContext(user_id or comment_id, "facebook_comment", comment_text)
+        ctx.flags["comment_id"] = comment_id
         
-        # تحقق من نص التعليق للتأكد من أنه ليس ثناءً فقط
-        praise_expressions = [
-            "شكرا", "جزاكم الله خيرا", "ما شاء الله", "رائع", "تمام", "جميل", "احسنتم", 
-            "تسلم", "بارك الله فيكم", "جزاكم الله", "thank", "thanks", "❤"
-        ]
+        # فحص التعليق مرة واحدة لكل مجموعات الكلمات المفتاحية
+        matches = self.knowledge.keyword_matcher.scan(comment_text)
         
         # فحص إذا كان التعليق مجرد ثناء ولا يحتاج إلى رد
         if len(comment_text.strip().split()) <= 3:  # تعليق قصير جداً
-            is_praise_only = False
-            for expr in praise_expressions:
-                if expr in comment_text.lower():
-                    is_praise_only = True
-                    break
+            is_praise_only = "praise" in matches
                     
             if is_praise_only:
                 logger.info(f"تم تجاهل تعليق ثناء قصير: {comment_text}")
                 return "IGNORE_PRAISE_COMMENT"
         
         # التحقق من طلبات القائمة
-        menu_response = self.process_menu_request(comment_text)
+        menu_response = self.process_menu_request(comment_text, matches)
         if menu_response:
             logger.info(f"تم إرسال قائمة لتعليق {comment_id}")
             return menu_response
         
-        # إنشاء سياق محادثة محدود لتعليقات الفيسبوك
-        context = f"""أنت 'محمد سلامة'، المساعد الرسمي لمجمع عمال مصر. تقوم بالرد على تعليقات الفيسبوك بأسلوب ودود واحترافي.
-مهمتك هي فهم استفسار العميل وتوجيهه للخدمة المناسبة من خدمات مجمع عمال مصر.
-
-معلومات مهمة:
-- لا تذكر أبداً أنك ذكاء اصطناعي، بل اظهر نفسك كممثل خدمة عملاء محترف.
-- كن مختصراً في ردودك على التعليقات (2-4 أسطر بحد أقصى).
-- قدم رابط صفحة الخدمة المناسبة عند الرد.
-- شجع المستخدم على طلب المزيد من المعلومات في نهاية الرد.
-- تعامل بأسلوب رسمي لكن ودود مع المستفسرين.
-
-استفسار المستخدم في تعليق على فيسبوك: {comment_text}
-"""
+        # إنشاء سياق محادثة محدود لتعليقات الفيسبوك (نص التعليق نفسه هو رسالة المستخدم)
+        context = self.comment_template.render(comment_text=comment_text)
         
         # توليد رد باستخدام DeepSeek API
         try:
@@ -652,16 +946,15 @@ class ChatBot:
                 shortened_response.append("\nهل لديك أسئلة أخرى؟")
                 response = "\n".join(shortened_response)
             
-            logger.info(f"تم توليد رد لتعليق {comment_id}: {response[:50]}...")
+            logger.info(f"تم توليد رد لتعليق {comment_id} خلال {ctx.elapsed_ms()} مللي ثانية: {response[:50]}...")
             return response
             
         except Exception as e:
             error_msg = f"حدث خطأ أثناء توليد الرد لتعليق {comment_id}: {str(e)}"
             logger.error(error_msg)
             
-            # استخدام رد احتياطي
-            with open('facebook_responses.json', 'r', encoding='utf-8') as f:
-                fallback_responses = json.load(f)
+            # استخدام رد احتياطي (الملف محمل في الذاكرة ولا يُعاد تحليله مع كل خطأ)
+            fallback_responses = get_data_repository().get('facebook_responses.json', [])
             
             default_response = """
 أهلاً وسهلاً!
@@ -689,36 +982,38 @@ class ChatBot:
         :return: رد المصادقة أو None إذا لم تكن جزءًا من تدفق المصادقة
         """
         # إذا لم تكن هناك حالة مصادقة للمستخدم، نقوم بتهيئتها
-        if user_id not in self.dev_auth_state:
-            self.dev_auth_state[user_id] = {"step": 0, "timestamp": datetime.datetime.now().isoformat()}
+        state = self.dev_auth_state.get(user_id)
+        if state is None:
+            state = {"step": 0, "timestamp": datetime.datetime.now().isoformat()}
         
         # الخطوة 0: المستخدم يدخل "افتح يا سمسم"
-        if self.dev_auth_state[user_id]["step"] == 0:
+        if state["step"] == 0:
             if message.strip() == "افتح يا سمسم":
-                self.dev_auth_state[user_id]["step"] = 1
+                state["step"] = 1
+                self.dev_auth_state[user_id] = state
                 return "من أنت؟"
             return None
         
         # الخطوة 1: المستخدم يدخل اسمه
-        elif self.dev_auth_state[user_id]["step"] == 1:
+        elif state["step"] == 1:
             if message.strip() in ["محمد شعبان", "محمد", "شعبان", "المهندس محمد شعبان", "م محمد شعبان", "م/محمد شعبان"]:
-                self.dev_auth_state[user_id]["step"] = 2
+                state["step"] = 2
+                self.dev_auth_state[user_id] = state
                 return "احلف"
             else:
                 # إعادة تعيين حالة المصادقة إذا كان الاسم غير صحيح
-                self.dev_auth_state[user_id] = {"step": 0, "timestamp": datetime.datetime.now().isoformat()}
+                self._reset_dev_auth_step(user_id)
                 return "عفواً، لا يمكنني التعرف عليك. يرجى المحاولة مرة أخرى."
         
         # الخطوة 2: المستخدم يحلف
-        elif self.dev_auth_state[user_id]["step"] == 2:
+        elif state["step"] == 2:
             if message.strip() in ["والله", "اقسم بالله", "والله العظيم", "أقسم", "اقسم"]:
                 # تأكيد المصادقة ومسح حالة المصادقة لبدء وضع المطور
-                self.dev_auth_state[user_id] = {"step": 0, "timestamp": datetime.datetime.now().isoformat()}
-                self._last_dev_auth = True
-                return "أمان خلاص صدقتك\n\n" + self._generate_special_developer_message()
+                self._reset_dev_auth_step(user_id)
+                return "أمان خلاص صدقتك\n\n" + self._generate_special_developer_message(user_id)
             else:
                 # إعادة تعيين حالة المصادقة إذا كان القسم غير صحيح
-                self.dev_auth_state[user_id] = {"step": 0, "timestamp": datetime.datetime.now().isoformat()}
+                self._reset_dev_auth_step(user_id)
                 return "عفواً، يبدو أنك لست المطور الحقيقي. يرجى المحاولة مرة أخرى."
         
         return None
@@ -730,52 +1025,8 @@ class ChatBot:
         :param text: النص المراد تنقيته
         :return: النص بعد التنقية
         """
-        ai_references = [
-            "كنموذج للذكاء الاصطناعي", "كذكاء اصطناعي", "كمساعد ذكاء اصطناعي",
-            "نموذج لغوي", "نموذج لغة كبير", "ذكاء اصطناعي", "deepseek", "deep seek",
-            "ai assistant", "ai model", "language model", "gpt", "llm", "ذكاء الاصطناعي",
-            "artificial intelligence", "ai", "تم تطويري", "as an ai", "كمساعد افتراضي"
-        ]
-        
-        # استبدال الإشارات بتعبيرات بديلة
-        replacements = {
-            "كنموذج للذكاء الاصطناعي": "كمساعد لخدمة العملاء",
-            "كذكاء اصطناعي": "كمساعد لخدمة العملاء",
-            "كمساعد ذكاء اصطناعي": "كمساعد لخدمة العملاء",
-            "نموذج لغوي": "مساعد خدمة العملاء",
-            "نموذج لغة كبير": "مساعد خدمة العملاء",
-            "ذكاء اصطناعي": "مساعد خدمة العملاء",
-            "deepseek": "مجمع عمال مصر",
-            "deep seek": "مجمع عمال مصر",
-            "ai assistant": "مساعد خدمة العملاء",
-            "ai model": "مساعد خدمة العملاء",
-            "language model": "مساعد خدمة العملاء",
-            "gpt": "مساعد خدمة العملاء",
-            "llm": "مساعد خدمة العملاء",
-            "ذكاء الاصطناعي": "فريق خدمة العملاء",
-            "artificial intelligence": "فريق خدمة العملاء",
-            "ai": "مساعد",
-            "تم تطويري": "تم تدريبي",
-            "as an ai": "كمساعد لخدمة العملاء",
-            "كمساعد افتراضي": "كمساعد لخدمة العملاء"
-        }
-        
-        filtered_text = text
-        for ref, replacement in replacements.items():
-            filtered_text = re.sub(re.escape(ref), replacement, filtered_text, flags=re.IGNORECASE)
-        
-        # تنقية العبارات التي تبدأ بـ "أنا مساعد" أو "أنا لست"
-        statements_to_remove = [
-            r"أنا مساعد ذكاء اصطناعي.*?\.",
-            r"أنا لست إنسانًا حقيقيًا.*?\.",
-            r"I'm an AI.*?\.",
-            r"I am an AI.*?\.",
-            r"As an AI.*?\.",
-            r"كنموذج ذكاء اصطناعي.*?\.",
-        ]
-        
-        for statement in statements_to_remove:
-            filtered_text = re.sub(statement, "", filtered_text, flags=re.IGNORECASE | re.DOTALL)
+        # محرك التنقية مترجم مسبقاً عند تحميل البيانات ويعمل في مرور واحد
+        filtered_text = self.ai_sanitizer.sanitize(text)
         
         return filtered_text.strip()
     
@@ -785,117 +1036,113 @@ class ChatBot:
         
         :param user_id: معرف المستخدم
         :param conversation_history: تاريخ المحادثة مع المستخدم
-        :return: نص السياق المبني
+        :return: نص السياق المبني (ضمن PROMPT_TOKEN_BUDGET)
         """
         # الاسم المستعار للمستخدم إذا كان موجوداً في حالة المحادثة
         user_name = self.conversation_state.get(user_id, {}).get('user_name', 'عزيزي الزائر')
         
-        # بناء سياق المحادثة
-        context = f"""أنت 'محمد سلامة'، المساعد الرسمي لمجمع عمال مصر. تتحدث مع {user_name} على ماسنجر فيسبوك.
-مهمتك هي فهم احتياجات العميل وتوجيهه للخدمة المناسبة من خدمات مجمع عمال مصر.
-
-معلومات مهمة:
-- لا تذكر أبداً أنك ذكاء اصطناعي، بل اظهر نفسك كممثل خدمة عملاء محترف.
-- كن ودوداً ومهنياً في ردودك.
-- شجع المستخدم على طلب المزيد من المعلومات عند الاقتضاء.
-- تجنب الكتابة بطريقة رسمية جداً، اكتب بشكل طبيعي مثل شخص حقيقي.
-- تأكد من إعطاء رابط الخدمة المناسبة عند الإجابة.
-- لا تستخدم مصطلحات أجنبية إذا كانت لها بديل عربي شائع.
-
-الخدمات الرئيسية لمجمع عمال مصر:
-1. بوابة التوظيف للباحثين عن عمل: https://omalmisrservices.com/ar/jobs
-2. بوابة توفير الموظفين للشركات: https://omalmisrservices.com/ar/workers
-3. خدمات الشركات والمستثمرين: https://omalmisrservices.com/ar/companies
-4. بوابة فض وتسوية المنازعات: https://omalmisrservices.com/ar/dispute
-
-"""
-        
-        # إضافة تاريخ المحادثة إذا كان موجوداً
-        if conversation_history:
-            context += "\nتاريخ المحادثة السابق:\n"
-            for i, exchange in enumerate(conversation_history[-5:]):  # آخر 5 تبادلات فقط
-                context += f"المستخدم: {exchange.get('user_message', '')}\n"
-                context += f"محمد سلامة: {exchange.get('bot_response', '')}\n"
+        # موجه النظام: البادئة الثابتة ثم اسم المستخدم
+        system_prompt = self.messenger_template.render(user_name=user_name)
         
+        # إضافة آخر التبادلات ضمن ميزانية الرموز (مختصرة وملخصة حسب عمرها)
+        context, _ = self.prompt_builder.build(system_prompt, conversation_history[-self.context_history_turns:])
         return context
     
-    def _get_user_conversation_history(self, user_id: str) -> List[Dict[str, str]]:
+    def _get_user_conversation_history(self, user_id: str, limit: Optional[int] = None) -> List[Dict[str, str]]:
         """
-        الحصول على تاريخ المحادثة لمستخدم معين
+        الحصول على آخر تبادلات المحادثة لمستخدم معين
         
         :param user_id: معرف المستخدم
+        :param limit: عدد التبادلات المطلوبة (اختياري، CONTEXT_HISTORY_TURNS افتراضياً)
         :return: قائمة بمحادثات المستخدم السابقة
         """
-        return self.conversation_history.get(user_id, [])
+        limit = limit if limit is not None else self.context_history_turns
+        
+        history = self.conversation_history.get(user_id)
+        if history:
+            return list(history)[-limit:] if limit > 0 else []
+        
+        # المستخدم غير موجود في ذاكرة هذا العامل (بعد إعادة التشغيل أو في عامل آخر)
+        try:
+            return self.state_store.get_recent_exchanges(user_id, limit)
+        except Exception as e:
+            logger.error(f"خطأ أثناء قراءة تاريخ المستخدم {user_id} من مخزن الحالة: {e}")
+            return []
     
-    def _save_conversation(self, user_id: str, user_message: str, bot_response: str) -> None:
+    def _save_conversation(self, user_id: str, user_message: str, bot_response: str,
+                           request_context: Optional[ConversationContext] = None) -> None:
         """
         حفظ المحادثة في تاريخ المحادثات
         
         :param user_id: معرف المستخدم
         :param user_message: رسالة المستخدم
         :param bot_response: رد البوت
+        :param request_context: سياق الطلب (اختياري، يحدد مصدر المحادثة)
         """
-        if user_id not in self.conversation_history:
-            self.conversation_history[user_id] = []
+        source = request_context.source if request_context else self.conversation_source
         
-        # إضافة المحادثة الحالية إلى تاريخ المحادثات
-        self.conversation_history[user_id].append({
+        record = {
             'timestamp': datetime.datetime.now().isoformat(),
             'user_message': user_message,
             'bot_response': bot_response,
-            'source': self.conversation_source
-        })
+            'source': source
+        }
         
-        # حفظ المحادثات في ملف إذا كان التخزين مفعل
-        if BOT_SETTINGS.get("SAVE_CONVERSATIONS", True):
-            self._save_conversation_to_file(user_id)
+        # إضافة المحادثة الحالية إلى تاريخ المحادثات
+        self.conversation_history.append(user_id, record)
+        
+        # حفظ التبادل في مخزن الحالة وسجل المحادثات في الخلفية
+        self._save_conversation_to_file(user_id, record)
     
-    def _save_conversation_to_file(self, user_id: str) -> None:
+    def _save_conversation_to_file(self, user_id: str, record: Dict[str, Any]) -> None:
         """
-        حفظ محادثة المستخدم في ملف JSON
+        إضافة تبادل واحد إلى طابور الحفظ الخلفي (مخزن الحالة وسجل المحادثات JSONL)
         
         :param user_id: معرف المستخدم
+        :param record: التبادل المراد حفظه
         """
-        if not BOT_SETTINGS.get("SAVE_CONVERSATIONS", True):
-            return
-        
         try:
-            # إنشاء مجلد للمحادثات إذا لم يكن موجوداً
-            conversations_dir = BOT_SETTINGS.get("CONVERSATIONS_DIR", "conversations")
-            os.makedirs(conversations_dir, exist_ok=True)
-            
-            # اسم الملف يعتمد على مصدر المحادثة
-            filename_prefix = "messenger_" if self.conversation_source == "messenger" else "facebook_comment_"
-            current_time = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            
-            # استخدام اختصار معرف المستخدم
-            user_id_short = user_id[-8:] if len(user_id) > 8 else user_id
-            
-            filename = f"{conversations_dir}/{filename_prefix}{user_id_short}_{current_time}.json"
-            
-            # تنسيق البيانات للحفظ
-            conversation_data = {
-                'user_id': user_id,
-                'source': self.conversation_source,
-                'timestamp': datetime.datetime.now().isoformat(),
-                'conversation': self.conversation_history[user_id]
-            }
+            entry = dict(record)
+            entry['user_id'] = user_id
             
             # يمكن إضافة بيانات إضافية لتعليقات الفيسبوك
-            if self.conversation_source == "facebook_comment":
-                conversation_data['platform'] = "facebook"
-                conversation_data['type'] = "comment"
-            
-            # حفظ البيانات في ملف JSON
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(conversation_data, f, ensure_ascii=False, indent=2)
+            if entry.get('source') == "facebook_comment":
+                entry['platform'] = "facebook"
+                entry['type'] = "comment"
             
-            logger.debug(f"تم حفظ المحادثة في الملف: {filename}")
+            self.persistence.write(entry)
             
         except Exception as e:
             logger.error(f"خطأ أثناء حفظ المحادثة للمستخدم {user_id}: {str(e)}")
     
+    def _persist_exchanges(self, records: List[Dict[str, Any]]) -> None:
+        """
+        كتابة دفعة تبادلات في مخزن الحالة وفي سجل المحادثات إذا كان التخزين مفعلاً
+        
+        :param records: قائمة التبادلات
+        """
+        self.state_store.append_exchanges(records)
+        
+        if BOT_SETTINGS.get("SAVE_CONVERSATIONS", True):
+            self.journal.append_many(records)
+    
+    def shutdown(self, timeout: Optional[float] = None) -> bool:
+        """
+        كتابة كل المحادثات المعلقة وإغلاق سجل المحادثات ومخزن الحالة
+        
+        :param timeout: أقصى مدة انتظار بالثواني (اختياري)
+        :return: True إذا تمت كتابة كل المحادثات المعلقة
+        """
+        flushed = self.persistence.shutdown(timeout)
+        self.journal.close()
+        self.state_store.close()
+        
+        # إيقاف حلقة أحداث عميل نموذج اللغة غير المتزامن (إن وُجد)
+        close_api = getattr(self.api.api, "close", None)
+        if close_api is not None:
+            close_api()
+        return flushed
+    
     def _generate_human_representative_response(self, user_id: str) -> str:
         """
         توليد رد لطلب التواصل مع ممثل خدمة العملاء البشري
@@ -935,14 +1182,51 @@ class ChatBot:
         
         return response
 
-    def _generate_special_developer_message(self) -> str:
+    def _reset_dev_auth_step(self, user_id: str) -> None:
+        """
+        إعادة خطوة المصادقة للبداية مع الاحتفاظ بحالة وضع المطور
+        
+        :param user_id: معرف المستخدم
+        """
+        self.dev_auth_state[user_id] = {
+            "step": 0,
+            "timestamp": datetime.datetime.now().isoformat(),
+            "developer_mode": self._is_developer_mode(user_id)
+        }
+    
+    def _is_developer_mode(self, user_id: str) -> bool:
+        """
+        التحقق مما إذا كان المستخدم في وضع المطور
+        
+        :param user_id: معرف المستخدم
+        :return: True إذا تم التحقق من هوية المطور لهذا المستخدم
+        """
+        return bool(self.dev_auth_state.get(user_id, {}).get("developer_mode", False))
+    
+    def _set_developer_mode(self, user_id: str, enabled: bool) -> None:
+        """
+        تفعيل أو تعطيل وضع المطور لمستخدم معين
+        
+        :param user_id: معرف المستخدم
+        :param enabled: حالة وضع المطور
+        """
+        with self._state_lock:
+            state = self.dev_auth_state.get(user_id) or {
+                "step": 0, "timestamp": datetime.datetime.now().isoformat()
+            }
+            state["developer_mode"] = enabled
+            self.dev_auth_state[user_id] = state
+    
+    def _generate_special_developer_message(self, user_id: str = None) -> str:
         """
         توليد رسالة خاصة للمطور والمهندس محمد شعبان
         
+        :param user_id: معرف المستخدم الذي تم التحقق من هويته كمطور
         :return: رسالة ترحيب وتقدير للمطور
         """
-        # تعيين متغير لتعقب الوصول المصرح به للمطور
-        self._last_dev_auth = True
+        # تعقب الوصول المصرح به للمطور لهذا المستخدم فقط
+        if user_id:
+            self._set_developer_mode(user_id, True)
         
         # رسالة ترحيب وأدعية للمهندس محمد شعبان
         special_message = """
@@ -1045,6 +1329,60 @@ class ChatBot:
 - متوسط طول الاستجابة: {avg_response_length:.1f} حرف
 """
 
+        # إحصائيات الإجابة المحلية من الأسئلة الشائعة
+        faq_stats = self.faq_index.get_stats()
+        stats += f"""
+📚 الأسئلة الشائعة (إجابة محلية):
+- عدد الاستعلامات: {faq_stats['lookups']}
+- نسبة الإصابة: {faq_stats['hit_rate'] * 100:.1f}%
+- استدعاءات API التي تم تجنبها: {faq_stats['avoided_llm_calls']}
+- متوسط زمن البحث: {faq_stats['avg_lookup_us']:.0f} ميكروثانية
+"""
+
+        # إحصائيات ذاكرة ردود نموذج اللغة
+        cache_stats = self.api.cache.get_stats()
+        stats += f"""
+♻️ ذاكرة الردود المتكررة:
+- الردود المحفوظة: {cache_stats['entries']}
+- نسبة الإصابة: {cache_stats['hit_rate'] * 100:.1f}%
+- السياقات الشخصية غير المخزنة: {cache_stats['skipped_personalized']}
+"""
+        if self.api.single_flight is not None:
+            stats += f"- الطلبات المتزامنة المدمجة في استدعاء واحد: {self.api.single_flight.get_stats()['coalesced']}\n"
+
+        # إحصائيات الذاكرة الدلالية (إذا كانت مفعلة)
+        if self.api.semantic is not None:
+            semantic_stats = self.api.semantic.get_stats()
+            stats += f"""
+🧭 الذاكرة الدلالية (صياغات مختلفة لنفس السؤال):
+- الأسئلة المحفوظة: {semantic_stats['entries']}
+- نسبة الإصابة: {semantic_stats['hit_rate'] * 100:.1f}% (حد التشابه {semantic_stats['threshold']})
+- النوايا المستثناة: {semantic_stats['skipped_intent']}
+"""
+
+        # حجم سياق نموذج اللغة
+        prompt_stats = self.prompt_builder.get_stats()
+        stats += f"""
+✂️ سياق نموذج اللغة:
+- متوسط الرموز لكل طلب: {prompt_stats['avg_tokens']} (بدلاً من {prompt_stats['avg_baseline_tokens']} بالسياق الكامل)
+- نسبة التوفير: {prompt_stats['saved_ratio'] * 100:.1f}%
+- تبادلات ملخصة: {prompt_stats['summarized_turns']}، محذوفة لتجاوز الميزانية: {prompt_stats['dropped_turns']}
+- قالب الموجه: الإصدار {self.messenger_template.version} (بصمة البادئة {self.messenger_template.prefix_hash})
+"""
+        for provider, usage in get_usage_stats().items():
+            stats += (f"- إصابات ذاكرة البادئات ({provider}): {usage['cache_hit_ratio'] * 100:.1f}% "
+                      f"من {usage['cache_hit_tokens'] + usage['cache_miss_tokens']} رمز\n")
+
+        # حالة قواطع الدائرة للواجهات الخارجية
+        resilience_stats = get_resilience_stats()
+        if resilience_stats:
+            stats += "\n🔌 قواطع الدائرة:\n"
+            for name, endpoint_stats in resilience_stats.items():
+                circuit = endpoint_stats["circuit"]
+                stats += (f"- {name}: {circuit['state']} (رُفض فوراً: {circuit['rejected']}، "
+                          f"إعادة محاولة: {endpoint_stats['retries']}، "
+                          f"مرات الفتح: {circuit['transitions'].get('closed->open', 0) + circuit['transitions'].get('half_open->open', 0)})\n")
+
         # إضافة معلومات التواريخ إذا كانت متوفرة
         if first_conversation_date and last_conversation_date:
             # حساب الفترة الزمنية الإجمالية للمحادثات
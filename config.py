@@ -19,17 +19,121 @@ API_SETTINGS = {
     "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY"),
     "DEFAULT_MODEL": os.getenv("DEFAULT_MODEL", "deepseek-chat"),
     "MAX_TOKENS": int(os.getenv("MAX_TOKENS", "1000")),
-    "TEMPERATURE": float(os.getenv("TEMPERATURE", "0.7"))
+    "TEMPERATURE": float(os.getenv("TEMPERATURE", "0.7")),
+    # إعدادات تجمع اتصالات HTTP المشترك (keep-alive)
+    "HTTP_POOL_CONNECTIONS": int(os.getenv("HTTP_POOL_CONNECTIONS", "10")),
+    "HTTP_POOL_MAXSIZE": int(os.getenv("HTTP_POOL_MAXSIZE", "20")),
+    "HTTP_CONNECT_TIMEOUT": float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+    "HTTP_READ_TIMEOUT": float(os.getenv("HTTP_READ_TIMEOUT", "60")),
+    # عميل نموذج اللغة غير المتزامن (asyncio + httpx) خلف واجهة متزامنة
+    "ASYNC_LLM_CLIENT": os.getenv("ASYNC_LLM_CLIENT", "False").lower() in ("true", "1", "yes"),
+    # الحد الأقصى للطلبات المتزامنة لكل مزود (الباقي ينتظر في الطابور)
+    "ASYNC_LLM_MAX_CONCURRENCY": {
+        provider: int(os.getenv(f"ASYNC_LLM_MAX_CONCURRENCY_{provider.upper()}", "64"))
+        for provider in ("deepseek", "openai")
+    },
+    # مهلة كل طلب بالثواني (تشمل الانتظار في الطابور)
+    "ASYNC_LLM_DEADLINE": float(os.getenv("ASYNC_LLM_DEADLINE", "30")),
+    "OPENAI_API_URL": os.getenv("OPENAI_API_URL", "https://api.openai.com/v1/chat/completions"),
+    "OPENAI_MODEL": os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+    # طلبات احتياطية إلى OpenAI عند تأخر DeepSeek عن النسبة المئوية HEDGE_PERCENTILE من زمنه (يتطلب ASYNC_LLM_CLIENT)
+    "HEDGE_ENABLED": os.getenv("HEDGE_ENABLED", "False").lower() in ("true", "1", "yes"),
+    "HEDGE_PERCENTILE": float(os.getenv("HEDGE_PERCENTILE", "95")),
+    # مهلة الطلب الاحتياطي بالثواني قبل تجمع HEDGE_MIN_SAMPLES قيمة من زمن DeepSeek
+    "HEDGE_INITIAL_DELAY": float(os.getenv("HEDGE_INITIAL_DELAY", "2")),
+    "HEDGE_MIN_SAMPLES": int(os.getenv("HEDGE_MIN_SAMPLES", "20")),
+    "HEDGE_LATENCY_WINDOW": int(os.getenv("HEDGE_LATENCY_WINDOW", "500")),
+    # سقف التكلفة: الطلبات الاحتياطية لا تتجاوز هذه النسبة من الطلبات (مع رصيد متراكم أقصاه HEDGE_BUDGET_BURST)
+    "HEDGE_BUDGET_RATIO": float(os.getenv("HEDGE_BUDGET_RATIO", "0.1")),
+    "HEDGE_BUDGET_BURST": float(os.getenv("HEDGE_BUDGET_BURST", "10")),
+    # قاطع الدائرة لكل واجهة خارجية: يُفتح بعد عدد من الإخفاقات المتتالية ويرفض الطلبات فوراً حتى مهلة التعافي
+    "CIRCUIT_FAILURE_THRESHOLD": int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5")),
+    "CIRCUIT_RECOVERY_TIMEOUT": float(os.getenv("CIRCUIT_RECOVERY_TIMEOUT", "30")),
+    "CIRCUIT_HALF_OPEN_MAX_CALLS": int(os.getenv("CIRCUIT_HALF_OPEN_MAX_CALLS", "1")),
+    # إعادة المحاولة للأخطاء المؤقتة بتأخير أسي عشوائي يحترم Retry-After (الأطول من RETRY_MAX_DELAY لا يُعاد)
+    "RETRY_MAX_ATTEMPTS": int(os.getenv("RETRY_MAX_ATTEMPTS", "3")),
+    "RETRY_BASE_DELAY": float(os.getenv("RETRY_BASE_DELAY", "0.5")),
+    "RETRY_MAX_DELAY": float(os.getenv("RETRY_MAX_DELAY", "8")),
+    # ميزانية إعادة المحاولة: المحاولات الإضافية لا تتجاوز هذه النسبة من الطلبات (مع رصيد أقصاه RETRY_BUDGET_BURST)
+    "RETRY_BUDGET_RATIO": float(os.getenv("RETRY_BUDGET_RATIO", "0.2")),
+    "RETRY_BUDGET_BURST": float(os.getenv("RETRY_BUDGET_BURST", "10"))
 }
 
 # إعدادات الشات بوت
 BOT_SETTINGS = {
     "DATA_FILE": os.getenv("DATA_FILE", "data.json"),
+    # أقل مدة بالثواني بين فحصين لتغير ملفات البيانات المحملة في الذاكرة (0 للفحص مع كل قراءة)
+    "DATA_CACHE_CHECK_INTERVAL": float(os.getenv("DATA_CACHE_CHECK_INTERVAL", "1")),
+    # الفترة بالثواني بين فحصين لتغير data.json لإعادة تحميل قاعدة المعرفة دون إعادة تشغيل (0 للتعطيل)
+    "KNOWLEDGE_RELOAD_INTERVAL": float(os.getenv("KNOWLEDGE_RELOAD_INTERVAL", "5")),
+    # لقطة قاعدة المعرفة المترجمة في خطوة البناء (python knowledge_snapshot.py) للإقلاع السريع (فارغ للتعطيل)
+    "KNOWLEDGE_SNAPSHOT_FILE": os.getenv("KNOWLEDGE_SNAPSHOT_FILE", "knowledge.snapshot"),
     "LOG_FILE": os.getenv("LOG_FILE", "logs/chatbot.log"),
+    # حد التشابه وهامش السؤال الأقرب على أقرب سؤال مختلف للإجابة من الأسئلة الشائعة
+    # (المقايضة بين الإجابات الصحيحة والخاطئة: python benchmarks/bench_faq_thresholds.py)
     "SIMILARITY_THRESHOLD": float(os.getenv("SIMILARITY_THRESHOLD", "0.4")),
+    "FAQ_MIN_MARGIN": float(os.getenv("FAQ_MIN_MARGIN", "0.1")),
+    # الإجابة محلياً من الأسئلة الشائعة عند تجاوز حد التشابه قبل استدعاء API
+    "FAQ_LOCAL_ANSWERS": os.getenv("FAQ_LOCAL_ANSWERS", "True").lower() in ("true", "1", "yes"),
+    # حد تشابه أقل للأسئلة الشائعة عندما يتعذر الوصول إلى API (إجابة قريبة أفضل من الرد الاحتياطي الثابت)
+    "FALLBACK_FAQ_THRESHOLD": float(os.getenv("FALLBACK_FAQ_THRESHOLD", "0.25")),
+    "FALLBACK_FAQ_MIN_MARGIN": float(os.getenv("FALLBACK_FAQ_MIN_MARGIN", "0.1")),
     "PERSONALIZE_RESPONSE": os.getenv("PERSONALIZE_RESPONSE", "True").lower() in ("true", "1", "yes"),
     "SAVE_CONVERSATIONS": os.getenv("SAVE_CONVERSATIONS", "True").lower() in ("true", "1", "yes"),
-    "CONVERSATIONS_DIR": os.getenv("CONVERSATIONS_DIR", "conversations")
+    "CONVERSATIONS_DIR": os.getenv("CONVERSATIONS_DIR", "conversations"),
+    # سجل المحادثات: تدوير المقطع عند تجاوز الحجم (بايت) أو العمر (ثانية)
+    "JOURNAL_SEGMENT_MAX_BYTES": int(os.getenv("JOURNAL_SEGMENT_MAX_BYTES", str(16 * 1024 * 1024))),
+    "JOURNAL_SEGMENT_MAX_AGE": int(os.getenv("JOURNAL_SEGMENT_MAX_AGE", "3600")),
+    # استدعاء fsync بعد كل N سجل (0 للاعتماد على نظام التشغيل)
+    "JOURNAL_FSYNC_EVERY": int(os.getenv("JOURNAL_FSYNC_EVERY", "0")),
+    # الكاتب الخلفي للمحادثات: async (دفعات في الخلفية) أو sync (كتابة قبل الرد)
+    "PERSISTENCE_MODE": os.getenv("PERSISTENCE_MODE", "async").lower(),
+    "PERSISTENCE_BATCH_SIZE": int(os.getenv("PERSISTENCE_BATCH_SIZE", "50")),
+    "PERSISTENCE_FLUSH_INTERVAL_MS": int(os.getenv("PERSISTENCE_FLUSH_INTERVAL_MS", "200")),
+    "PERSISTENCE_BUFFER_SIZE": int(os.getenv("PERSISTENCE_BUFFER_SIZE", "10000")),
+    "PERSISTENCE_SHUTDOWN_TIMEOUT": float(os.getenv("PERSISTENCE_SHUTDOWN_TIMEOUT", "10")),
+    # مخزن حالة المحادثات والمستخدمين: sqlite أو memory
+    "STATE_BACKEND": os.getenv("STATE_BACKEND", "sqlite").lower(),
+    "STATE_DB_PATH": os.getenv("STATE_DB_PATH", "conversations/state.db"),
+    "STATE_DB_BUSY_TIMEOUT_MS": int(os.getenv("STATE_DB_BUSY_TIMEOUT_MS", "5000")),
+    # عدد التبادلات السابقة المستخدمة في سياق المحادثة
+    "CONTEXT_HISTORY_TURNS": int(os.getenv("CONTEXT_HISTORY_TURNS", "5")),
+    # ميزانية رموز سياق المحادثة (موجه النظام والتاريخ): آخر PROMPT_FULL_TURNS تبادل مختصرة لحد PROMPT_MAX_TURN_TOKENS
+    # لكل رسالة، والأقدم ملخصة لحد PROMPT_SUMMARY_TOKENS، ويُحذف الأقدم عند تجاوز الميزانية
+    "PROMPT_TOKEN_BUDGET": int(os.getenv("PROMPT_TOKEN_BUDGET", "1200")),
+    "PROMPT_FULL_TURNS": int(os.getenv("PROMPT_FULL_TURNS", "2")),
+    "PROMPT_MAX_TURN_TOKENS": int(os.getenv("PROMPT_MAX_TURN_TOKENS", "150")),
+    "PROMPT_SUMMARY_TOKENS": int(os.getenv("PROMPT_SUMMARY_TOKENS", "40")),
+    # عد الرموز: estimate (تقدير محلي) أو tiktoken (إذا كانت المكتبة مثبتة)
+    "PROMPT_TOKENIZER": os.getenv("PROMPT_TOKENIZER", "estimate").lower(),
+    # إصدار قوالب موجه النظام: 2 (تعليمات ثابتة أولاً لذاكرة البادئات لدى المزود) أو 1 (الصيغة السابقة للتراجع)
+    "PROMPT_TEMPLATE_VERSION": os.getenv("PROMPT_TEMPLATE_VERSION", "2"),
+    # حدود تاريخ المحادثات في الذاكرة: عمق الحلقة لكل مستخدم، عدد المستخدمين، السقف بالبايت، مهلة الخمول بالثواني
+    "HISTORY_DEPTH": int(os.getenv("HISTORY_DEPTH", "10")),
+    "HISTORY_MAX_USERS": int(os.getenv("HISTORY_MAX_USERS", "10000")),
+    "HISTORY_MAX_BYTES": int(os.getenv("HISTORY_MAX_BYTES", str(64 * 1024 * 1024))),
+    "HISTORY_IDLE_TTL": int(os.getenv("HISTORY_IDLE_TTL", "3600")),
+    # ذاكرة ردود نموذج اللغة بالمطابقة التامة (النص بعد التطبيع + السياق + معاملات النموذج)
+    "RESPONSE_CACHE_ENABLED": os.getenv("RESPONSE_CACHE_ENABLED", "True").lower() in ("true", "1", "yes"),
+    "RESPONSE_CACHE_MAX_ENTRIES": int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2000")),
+    "RESPONSE_CACHE_MAX_BYTES": int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+    "RESPONSE_CACHE_TTL": int(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+    # تخزين ردود السياقات الشخصية (اسم المستخدم أو تاريخ محادثته)
+    "RESPONSE_CACHE_ALLOW_PERSONALIZED": os.getenv("RESPONSE_CACHE_ALLOW_PERSONALIZED", "False").lower() in ("true", "1", "yes"),
+    # بث ردود نموذج اللغة وإرسالها إلى ماسنجر فقرة بفقرة أثناء توليدها
+    "STREAM_RESPONSES": os.getenv("STREAM_RESPONSES", "True").lower() in ("true", "1", "yes"),
+    # دمج طلبات نموذج اللغة المتطابقة المتزامنة في استدعاء واحد
+    "SINGLE_FLIGHT_ENABLED": os.getenv("SINGLE_FLIGHT_ENABLED", "True").lower() in ("true", "1", "yes"),
+    # الذاكرة الدلالية للصياغات المختلفة (معطلة افتراضياً حتى يُختار الحد بأمر التقييم: python semantic_cache.py evaluate)
+    "SEMANTIC_CACHE_ENABLED": os.getenv("SEMANTIC_CACHE_ENABLED", "False").lower() in ("true", "1", "yes"),
+    "SEMANTIC_CACHE_THRESHOLD": float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.85")),
+    "SEMANTIC_CACHE_MAX_ENTRIES": int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2000")),
+    "SEMANTIC_CACHE_TTL": int(os.getenv("SEMANTIC_CACHE_TTL", "3600")),
+    "SEMANTIC_CACHE_DIMENSIONS": int(os.getenv("SEMANTIC_CACHE_DIMENSIONS", "2048")),
+    # فئات الكلمات المفتاحية التي لا تستخدم الذاكرة الدلالية (مفصولة بفواصل)
+    "SEMANTIC_CACHE_EXCLUDED_INTENTS": [
+        intent.strip() for intent in os.getenv("SEMANTIC_CACHE_EXCLUDED_INTENTS", "").split(",") if intent.strip()
+    ]
 }
 
 # إعدادات فيسبوك
@@ -39,7 +143,9 @@ FACEBOOK_SETTINGS = {
     "APP_SECRET": os.getenv("FB_APP_SECRET"),
     "PAGE_ID": os.getenv("FB_PAGE_ID"),
     "IGNORE_PRAISE_COMMENTS": os.getenv("FB_IGNORE_PRAISE", "True").lower() in ("true", "1", "yes"),
-    "COMMENT_LENGTH_THRESHOLD": int(os.getenv("FB_COMMENT_LENGTH", "3"))
+    "COMMENT_LENGTH_THRESHOLD": int(os.getenv("FB_COMMENT_LENGTH", "3")),
+    # مهلة قراءة رد Graph API عند إرسال رسالة بالثواني (الإرسال المعلق يُحسب فشلاً في قاطع الدائرة)
+    "SEND_TIMEOUT": float(os.getenv("FB_SEND_TIMEOUT", "10"))
 }
 
 # إعدادات الويب سيرفر
@@ -47,7 +153,11 @@ SERVER_SETTINGS = {
     "HOST": os.getenv("SERVER_HOST", "0.0.0.0"),
     "PORT": int(os.getenv("SERVER_PORT", "5000")),
     "DEBUG": os.getenv("DEBUG_MODE", "False").lower() in ("true", "1", "yes"),
-    "WEBHOOK_ROUTE": os.getenv("WEBHOOK_ROUTE", "/webhook")
+    "WEBHOOK_ROUTE": os.getenv("WEBHOOK_ROUTE", "/webhook"),
+    # معالجة أحداث webhook في الخلفية (عدد الشرائح، لكل شريحة مستهلك واحد)
+    "WEBHOOK_WORKERS": int(os.getenv("WEBHOOK_WORKERS", "4")),
+    "WEBHOOK_QUEUE_SIZE": int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000")),
+    "WEBHOOK_SHUTDOWN_TIMEOUT": float(os.getenv("WEBHOOK_SHUTDOWN_TIMEOUT", "25"))
 }
 
 # إعدادات التطبيق العامة
@@ -85,14 +195,80 @@ DEEPSEEK_API_URL=https://api.deepseek.com/v1/chat/completions
 DEFAULT_MODEL=deepseek-chat
 MAX_TOKENS=1000
 TEMPERATURE=0.7
+HTTP_POOL_CONNECTIONS=10
+HTTP_POOL_MAXSIZE=20
+HTTP_CONNECT_TIMEOUT=5
+HTTP_READ_TIMEOUT=60
+ASYNC_LLM_CLIENT=False
+ASYNC_LLM_MAX_CONCURRENCY_DEEPSEEK=64
+ASYNC_LLM_MAX_CONCURRENCY_OPENAI=64
+ASYNC_LLM_DEADLINE=30
+OPENAI_MODEL=gpt-4o-mini
+HEDGE_ENABLED=False
+HEDGE_PERCENTILE=95
+HEDGE_INITIAL_DELAY=2
+HEDGE_MIN_SAMPLES=20
+HEDGE_LATENCY_WINDOW=500
+HEDGE_BUDGET_RATIO=0.1
+HEDGE_BUDGET_BURST=10
+CIRCUIT_FAILURE_THRESHOLD=5
+CIRCUIT_RECOVERY_TIMEOUT=30
+CIRCUIT_HALF_OPEN_MAX_CALLS=1
+RETRY_MAX_ATTEMPTS=3
+RETRY_BASE_DELAY=0.5
+RETRY_MAX_DELAY=8
+RETRY_BUDGET_RATIO=0.2
+RETRY_BUDGET_BURST=10
 
 # إعدادات الشات بوت
 DATA_FILE=data.json
+DATA_CACHE_CHECK_INTERVAL=1
+KNOWLEDGE_RELOAD_INTERVAL=5
+KNOWLEDGE_SNAPSHOT_FILE=knowledge.snapshot
 LOG_FILE=logs/chatbot.log
 SIMILARITY_THRESHOLD=0.4
+FAQ_MIN_MARGIN=0.1
+FAQ_LOCAL_ANSWERS=True
+FALLBACK_FAQ_THRESHOLD=0.25
+FALLBACK_FAQ_MIN_MARGIN=0.1
 PERSONALIZE_RESPONSE=True
 SAVE_CONVERSATIONS=True
 CONVERSATIONS_DIR=conversations
+JOURNAL_SEGMENT_MAX_BYTES=16777216
+JOURNAL_SEGMENT_MAX_AGE=3600
+JOURNAL_FSYNC_EVERY=0
+PERSISTENCE_MODE=async
+PERSISTENCE_BATCH_SIZE=50
+PERSISTENCE_FLUSH_INTERVAL_MS=200
+PERSISTENCE_BUFFER_SIZE=10000
+PERSISTENCE_SHUTDOWN_TIMEOUT=10
+STATE_BACKEND=sqlite
+STATE_DB_PATH=conversations/state.db
+STATE_DB_BUSY_TIMEOUT_MS=5000
+CONTEXT_HISTORY_TURNS=5
+PROMPT_TOKEN_BUDGET=1200
+PROMPT_FULL_TURNS=2
+PROMPT_MAX_TURN_TOKENS=150
+PROMPT_SUMMARY_TOKENS=40
+PROMPT_TOKENIZER=estimate
+PROMPT_TEMPLATE_VERSION=2
+HISTORY_DEPTH=10
+HISTORY_MAX_USERS=10000
+HISTORY_MAX_BYTES=67108864
+HISTORY_IDLE_TTL=3600
+RESPONSE_CACHE_ENABLED=True
+RESPONSE_CACHE_MAX_ENTRIES=2000
+RESPONSE_CACHE_MAX_BYTES=16777216
+RESPONSE_CACHE_TTL=3600
+RESPONSE_CACHE_ALLOW_PERSONALIZED=False
+STREAM_RESPONSES=True
+SINGLE_FLIGHT_ENABLED=True
+SEMANTIC_CACHE_ENABLED=False
+SEMANTIC_CACHE_THRESHOLD=0.85
+SEMANTIC_CACHE_MAX_ENTRIES=2000
+SEMANTIC_CACHE_TTL=3600
+SEMANTIC_CACHE_DIMENSIONS=2048
+SEMANTIC_CACHE_EXCLUDED_INTENTS=
 
 # إعدادات فيسبوك
 FB_PAGE_TOKEN=your_page_access_token_here
@@ -101,11 +277,15 @@ FB_APP_SECRET=your_app_secret_here
 FB_PAGE_ID=your_page_id_here
 FB_IGNORE_PRAISE=True
 FB_COMMENT_LENGTH=3
+FB_SEND_TIMEOUT=10
 
 # إعدادات الويب سيرفر
 SERVER_HOST=0.0.0.0
 SERVER_PORT=5000
 WEBHOOK_ROUTE=/webhook
+WEBHOOK_WORKERS=4
+WEBHOOK_QUEUE_SIZE=1000
+WEBHOOK_SHUTDOWN_TIMEOUT=25
 
 # إعدادات التطبيق
 DEBUG_MODE=False
@@ -0,0 +1,253 @@
+"""
+ذاكرة مؤقتة محدودة لتاريخ المحادثات داخل العملية
+تحتفظ لكل مستخدم بحلقة (ring buffer) بآخر N تبادل فقط، وتطبق على مستوى المستخدمين
+سياسة LRU ومهلة خمول مع حساب تقريبي للذاكرة المستخدمة وسقف قابل للضبط.
+التبادلات المُخرجة من الذاكرة تبقى متاحة من مخزن الحالة الدائم
+"""
+
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+from collections.abc import MutableMapping
+from typing import Dict, Any, Iterable, Iterator, List, Optional
+
+from config import BOT_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+# تكلفة تقريبية ثابتة لكل تبادل (القاموس والمفاتيح والطابع الزمني) بالبايت
+RECORD_OVERHEAD_BYTES = 240
+
+# تكلفة تقريبية ثابتة لكل مستخدم (الحلقة ومدخل القاموس) بالبايت
+USER_OVERHEAD_BYTES = 640
+
+
+def estimate_record_bytes(record: Dict[str, Any]) -> int:
+    """
+    تقدير حجم تبادل واحد في الذاكرة
+
+    :param record: التبادل
+    :return: الحجم التقريبي بالبايت
+    """
+    size = RECORD_OVERHEAD_BYTES
+    for value in record.values():
+        if isinstance(value, str):
+            size += len(value.encode("utf-8"))
+    return size
+
+
+class _UserHistory:
+    """
+    حلقة تبادلات مستخدم واحد مع حجمها وآخر وقت وصول
+    """
+
+    __slots__ = ("records", "sizes", "bytes", "last_access")
+
+    def __init__(self, depth: int):
+        self.records = deque(maxlen=depth)
+        self.sizes = deque(maxlen=depth)
+        self.bytes = USER_OVERHEAD_BYTES
+        self.last_access = time.monotonic()
+
+    def append(self, record: Dict[str, Any]) -> int:
+        """
+        إضافة تبادل مع إخراج الأقدم عند امتلاء الحلقة
+
+        :return: التغير في الحجم بالبايت
+        """
+        size = estimate_record_bytes(record)
+        delta = size
+        if len(self.records) == self.records.maxlen:
+            delta -= self.sizes[0]
+        self.records.append(record)
+        self.sizes.append(size)
+        self.bytes += delta
+        return delta
+
+
+class ConversationHistoryCache(MutableMapping):
+    """
+    قاموس user_id -> آخر التبادلات بحدود على العمق وعدد المستخدمين والذاكرة ومدة الخمول
+    """
+
+    def __init__(self, depth: int = None, max_users: int = None, max_bytes: int = None,
+                 idle_ttl: float = None):
+        """
+        تهيئة الذاكرة المؤقتة
+
+        :param depth: عدد التبادلات المحفوظة لكل مستخدم
+        :param max_users: الحد الأقصى لعدد المستخدمين في الذاكرة
+        :param max_bytes: سقف الذاكرة التقريبي بالبايت
+        :param idle_ttl: مدة الخمول بالثواني قبل إخراج المستخدم (0 لتعطيلها)
+        """
+        self.depth = depth or BOT_SETTINGS.get("HISTORY_DEPTH", 10)
+        self.max_users = max_users or BOT_SETTINGS.get("HISTORY_MAX_USERS", 10000)
+        self.max_bytes = max_bytes or BOT_SETTINGS.get("HISTORY_MAX_BYTES", 64 * 1024 * 1024)
+        self.idle_ttl = idle_ttl if idle_ttl is not None else BOT_SETTINGS.get("HISTORY_IDLE_TTL", 3600)
+
+        self._users: "OrderedDict[str, _UserHistory]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evicted_lru": 0,
+            "evicted_memory": 0,
+            "evicted_idle": 0
+        }
+
+    # ------------------------------------------------------------------
+    # الإخراج
+    # ------------------------------------------------------------------
+
+    def _remove(self, user_id: str) -> None:
+        entry = self._users.pop(user_id)
+        self._bytes -= entry.bytes
+
+    def _expire_idle(self) -> None:
+        """
+        إخراج المستخدمين الخاملين (الأقدم وصولاً في بداية القاموس)
+        """
+        if not self.idle_ttl:
+            return
+        cutoff = time.monotonic() - self.idle_ttl
+        while self._users:
+            user_id, entry = next(iter(self._users.items()))
+            if entry.last_access > cutoff:
+                break
+            self._remove(user_id)
+            self._stats["evicted_idle"] += 1
+
+    def _enforce_limits(self, keep: Optional[str] = None) -> None:
+        """
+        إخراج الأقل استخداماً حتى يعود عدد المستخدمين والذاكرة تحت الحدود
+
+        :param keep: مستخدم لا يتم إخراجه (المستخدم الحالي)
+        """
+        self._expire_idle()
+
+        while len(self._users) > self.max_users:
+            user_id = next(iter(self._users))
+            if user_id == keep:
+                break
+            self._remove(user_id)
+            self._stats["evicted_lru"] += 1
+
+        while self._bytes > self.max_bytes and len(self._users) > 1:
+            user_id = next(iter(self._users))
+            if user_id == keep:
+                break
+            self._remove(user_id)
+            self._stats["evicted_memory"] += 1
+
+    def _touch(self, user_id: str) -> Optional[_UserHistory]:
+        """
+        جلب مدخل المستخدم وتحديثه كالأحدث استخداماً (أو إخراجه إذا انتهت مهلته)
+        """
+        entry = self._users.get(user_id)
+        if entry is None:
+            return None
+        if self.idle_ttl and time.monotonic() - entry.last_access > self.idle_ttl:
+            self._remove(user_id)
+            self._stats["evicted_idle"] += 1
+            return None
+        entry.last_access = time.monotonic()
+        self._users.move_to_end(user_id)
+        return entry
+
+    # ------------------------------------------------------------------
+    # واجهة القاموس
+    # ------------------------------------------------------------------
+
+    def append(self, user_id: str, record: Dict[str, Any]) -> None:
+        """
+        إضافة تبادل لمستخدم مع تطبيق الحدود
+
+        :param user_id: معرف المستخدم
+        :param record: التبادل
+        """
+        with self._lock:
+            entry = self._touch(user_id)
+            if entry is None:
+                entry = _UserHistory(self.depth)
+                self._users[user_id] = entry
+                self._bytes += entry.bytes
+            self._bytes += entry.append(record)
+            self._enforce_limits(keep=user_id)
+
+    def __getitem__(self, user_id: str) -> List[Dict[str, Any]]:
+        # نسخة تحت القفل: الحلقة نفسها تتغير من خيوط أخرى ولا تُعدل إلا عبر append
+        with self._lock:
+            entry = self._touch(user_id)
+            if entry is None:
+                self._stats["misses"] += 1
+                raise KeyError(user_id)
+            self._stats["hits"] += 1
+            return list(entry.records)
+
+    def __setitem__(self, user_id: str, records: Iterable[Dict[str, Any]]) -> None:
+        with self._lock:
+            if user_id in self._users:
+                self._remove(user_id)
+            entry = _UserHistory(self.depth)
+            self._users[user_id] = entry
+            self._bytes += entry.bytes
+            for record in records:
+                self._bytes += entry.append(record)
+            self._enforce_limits(keep=user_id)
+
+    def __delitem__(self, user_id: str) -> None:
+        with self._lock:
+            if user_id not in self._users:
+                raise KeyError(user_id)
+            self._remove(user_id)
+
+    def __contains__(self, user_id) -> bool:
+        with self._lock:
+            return self._touch(user_id) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            return iter(list(self._users.keys()))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._users)
+
+    def setdefault(self, user_id: str,
+                   default: Optional[Iterable[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """
+        إرجاع نسخة من تبادلات المستخدم مع إنشاء حلقته إذا لم تكن موجودة
+        """
+        with self._lock:
+            entry = self._touch(user_id)
+            if entry is None:
+                self[user_id] = default or []
+                entry = self._users[user_id]
+            return list(entry.records)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._users.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        إحصائيات الذاكرة المؤقتة
+
+        :return: قاموس بعدد المستخدمين والذاكرة المستخدمة وعمليات الإخراج
+        """
+        with self._lock:
+            self._expire_idle()
+            stats = dict(self._stats)
+            stats.update({
+                "users": len(self._users),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "max_users": self.max_users,
+                "depth": self.depth,
+                "idle_ttl": self.idle_ttl
+            })
+        return stats
@@ -0,0 +1,49 @@
+"""
+سياق الطلب الواحد أثناء توليد رد الشات بوت
+يحمل مصدر المحادثة والمستخدم والتوقيت والأعلام الخاصة بالطلب بدلاً من تخزينها
+في خصائص مشتركة على كائن الشات بوت، حتى يصبح الكائن آمناً للاستخدام من عدة خيوط
+"""
+
+import time
+import datetime
+from typing import Dict, Any, Optional
+
+# مصادر المحادثة المدعومة
+CONVERSATION_SOURCES = ("messenger", "facebook_comment")
+
+
+class ConversationContext:
+    """
+    بيانات طلب واحد تُمرر عبر مراحل توليد الرد
+    """
+
+    def __init__(self, user_id: str, source: str = "messenger", message: str = "",
+                 flags: Optional[Dict[str, Any]] = None):
+        """
+        تهيئة سياق الطلب
+
+        :param user_id: معرف المستخدم
+        :param source: مصدر المحادثة ("messenger" أو "facebook_comment")
+        :param message: رسالة المستخدم
+        :param flags: أعلام إضافية خاصة بالطلب (اختياري)
+        """
+        if source not in CONVERSATION_SOURCES:
+            source = "messenger"
+
+        self.user_id = user_id
+        self.source = source
+        self.message = message
+        self.flags = dict(flags or {})
+        self.received_at = datetime.datetime.now()
+        self._started = time.perf_counter()
+
+    def elapsed_ms(self) -> float:
+        """
+        الزمن المنقضي منذ بداية الطلب بالمللي ثانية
+
+        :return: الزمن المنقضي
+        """
+        return round((time.perf_counter() - self._started) * 1000, 2)
+
+    def __repr__(self) -> str:
+        return f"ConversationContext(user_id={self.user_id!r}, source={self.source!r}, flags={self.flags!r})"
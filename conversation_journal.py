@@ -0,0 +1,434 @@
+"""
+سجل محادثات بإلحاق فقط (append-only) بصيغة JSON Lines
+يكتب سجلاً مضغوطاً واحداً لكل تبادل (رسالة المستخدم ورد البوت) في ملفات مقاطع
+تُدوَّر حسب الحجم أو العمر، مع أداة ضغط للمقاطع القديمة وواجهة لإعادة بناء تاريخ المستخدم
+
+كل عملية كاتبة (مثل عمال gunicorn) تكتب في مقاطع باسمها (المضيف ورقم العملية)، ويُختم المقطع
+بملف علامة عند تدويره أو إغلاقه؛ الضغط لا يلمس إلا المقاطع المختومة وليس آخر مقطع لأي كاتب
+"""
+
+import os
+import re
+import json
+import time
+import socket
+import logging
+import argparse
+import threading
+from typing import Dict, List, Any, Iterator, Optional
+
+from config import BOT_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+# نمط أسماء ملفات المقاطع: segment-00000001-<الكاتب>.jsonl (والصيغة القديمة segment-00000001.jsonl)
+SEGMENT_PATTERN = re.compile(r"^segment-(\d{8})(?:-([\w.-]+))?\.jsonl$")
+
+# لاحقة ملف علامة الختم: المقطع لن يُكتب فيه مجدداً
+SEAL_SUFFIX = ".sealed"
+
+# كاتب المقاطع الناتجة عن الضغط (تُكتب مختومة ولا تكون نشطة أبداً)
+COMPACTED_WRITER = "compacted"
+
+# ملف القفل الذي يمنع عمليتي ضغط متزامنتين، ومهلة اعتباره متروكاً بعد توقف مفاجئ
+COMPACT_LOCK_NAME = "compact.lock"
+COMPACT_LOCK_STALE_SECONDS = 3600
+
+
+def writer_id() -> str:
+    """
+    معرف العملية الكاتبة: اسم المضيف ورقم العملية (يُحسب عند فتح كل مقطع ليختلف بعد fork)
+
+    :return: المعرف بأحرف صالحة لاسم ملف
+    """
+    return re.sub(r"[^\w.-]", "_", f"{socket.gethostname()}-{os.getpid()}")
+
+
+def parse_segment_name(path: str) -> Optional[tuple]:
+    """
+    رقم المقطع وكاتبه من اسم الملف
+
+    :param path: مسار المقطع
+    :return: (الرقم، الكاتب أو "" للصيغة القديمة) أو None إذا لم يكن مقطعاً
+    """
+    match = SEGMENT_PATTERN.match(os.path.basename(path))
+    if match is None:
+        return None
+    return int(match.group(1)), match.group(2) or ""
+
+
+class ConversationJournal:
+    """
+    كاتب وقارئ لسجل المحادثات المقسم إلى مقاطع
+    """
+
+    def __init__(self, directory: str = None, max_segment_bytes: int = None,
+                 max_segment_age: float = None, fsync_every: int = None):
+        """
+        تهيئة السجل
+
+        :param directory: مجلد المقاطع (اختياري، CONVERSATIONS_DIR/journal افتراضياً)
+        :param max_segment_bytes: الحجم الأقصى للمقطع قبل التدوير بالبايت
+        :param max_segment_age: العمر الأقصى للمقطع قبل التدوير بالثواني
+        :param fsync_every: استدعاء fsync بعد كل N سجل (0 لتعطيله)
+        """
+        self.directory = directory or os.path.join(
+            BOT_SETTINGS.get("CONVERSATIONS_DIR", "conversations"), "journal"
+        )
+        self.max_segment_bytes = max_segment_bytes or BOT_SETTINGS.get("JOURNAL_SEGMENT_MAX_BYTES", 16 * 1024 * 1024)
+        self.max_segment_age = max_segment_age or BOT_SETTINGS.get("JOURNAL_SEGMENT_MAX_AGE", 3600)
+        self.fsync_every = fsync_every if fsync_every is not None else BOT_SETTINGS.get("JOURNAL_FSYNC_EVERY", 0)
+
+        self._lock = threading.RLock()
+        self._file = None
+        self._file_pid = None
+        self._segment_seq = 0
+        self._segment_bytes = 0
+        self._segment_opened_at = 0.0
+        self._unsynced = 0
+
+        self._stats = {
+            "records_written": 0,
+            "bytes_written": 0,
+            "segments_rotated": 0,
+            "fsyncs": 0,
+            "compactions": 0
+        }
+
+    # ------------------------------------------------------------------
+    # الكتابة
+    # ------------------------------------------------------------------
+
+    def _segment_path(self, seq: int, writer: str) -> str:
+        """
+        مسار ملف المقطع لرقم تسلسلي وكاتب معينين
+        """
+        return os.path.join(self.directory, f"segment-{seq:08d}-{writer}.jsonl")
+
+    def _close_segment(self) -> None:
+        """
+        إغلاق المقطع الحالي وختمه (ملف مقطع موروث من العملية الأم بعد fork يُغلق دون ختم لأنها ما زالت تكتب فيه)
+        """
+        if self._file is None:
+            return
+        if self._file_pid == os.getpid():
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            with open(self._file.name + SEAL_SUFFIX, "w", encoding="utf-8"):
+                pass
+        else:
+            self._file.close()
+        self._file = None
+
+    def _open_new_segment(self) -> None:
+        """
+        ختم المقطع الحالي وفتح مقطع جديد برقم تسلسلي أكبر باسم هذه العملية
+        """
+        if self._file is not None:
+            self._close_segment()
+            self._stats["segments_rotated"] += 1
+
+        os.makedirs(self.directory, exist_ok=True)
+        existing = self.list_segments()
+        last_seq = parse_segment_name(existing[-1])[0] if existing else 0
+        self._segment_seq = max(self._segment_seq, last_seq) + 1
+
+        # الرقم قد يتكرر بين عمليات تفتح مقاطع في نفس اللحظة، لكن اسم الكاتب يجعل الملف فريداً
+        path = self._segment_path(self._segment_seq, writer_id())
+        self._file = open(path, "a", encoding="utf-8")
+        self._file_pid = os.getpid()
+        self._segment_bytes = 0
+        self._segment_opened_at = time.time()
+        self._unsynced = 0
+        logger.debug(f"تم فتح مقطع سجل جديد: {path}")
+
+    def _needs_rotation(self) -> bool:
+        """
+        التحقق من تجاوز المقطع الحالي للحجم أو العمر المسموح (أو أنه موروث من عملية أخرى)
+        """
+        if self._file is None or self._file_pid != os.getpid():
+            return True
+        if self._segment_bytes >= self.max_segment_bytes:
+            return True
+        return time.time() - self._segment_opened_at >= self.max_segment_age
+
+    def append_many(self, records: List[Dict[str, Any]]) -> None:
+        """
+        إلحاق مجموعة سجلات بالمقطع الحالي
+
+        :param records: قائمة السجلات
+        """
+        if not records:
+            return
+
+        with self._lock:
+            for record in records:
+                if self._needs_rotation():
+                    self._open_new_segment()
+
+                line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+                self._file.write(line)
+
+                size = len(line.encode("utf-8"))
+                self._segment_bytes += size
+                self._unsynced += 1
+                self._stats["records_written"] += 1
+                self._stats["bytes_written"] += size
+
+            self._file.flush()
+
+            if self.fsync_every and self._unsynced >= self.fsync_every:
+                self._fsync()
+
+    def append(self, record: Dict[str, Any]) -> None:
+        """
+        إلحاق سجل واحد بالمقطع الحالي
+
+        :param record: السجل (قاموس قابل للتحويل إلى JSON)
+        """
+        self.append_many([record])
+
+    def _fsync(self) -> None:
+        """
+        مزامنة المقطع الحالي مع القرص
+        """
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+            self._stats["fsyncs"] += 1
+
+    def flush(self, fsync: bool = True) -> None:
+        """
+        تفريغ المخزن المؤقت للمقطع الحالي
+
+        :param fsync: مزامنة الملف مع القرص أيضاً
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                if fsync:
+                    self._fsync()
+
+    def close(self) -> None:
+        """
+        إغلاق المقطع الحالي وختمه
+        """
+        with self._lock:
+            self._close_segment()
+
+    # ------------------------------------------------------------------
+    # القراءة
+    # ------------------------------------------------------------------
+
+    def list_segments(self) -> List[str]:
+        """
+        قائمة مسارات المقاطع مرتبة من الأقدم إلى الأحدث (حسب الرقم ثم الكاتب)
+
+        :return: قائمة المسارات
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory)]
+        return sorted((path for path in paths if parse_segment_name(path) is not None), key=parse_segment_name)
+
+    def sealed_segments(self) -> List[str]:
+        """
+        المقاطع التي يمكن ضغطها بأمان: مختومة وليست آخر مقطع لكاتبها
+        (مقاطع الصيغة القديمة بلا علامات ختم: كلها عدا الأحدث، كما كان الكاتب الوحيد يعمل)
+
+        :return: قائمة المسارات مرتبة
+        """
+        segments = self.list_segments()
+        newest = {}
+        for path in segments:
+            newest[parse_segment_name(path)[1]] = path
+
+        sealed = []
+        for path in segments:
+            writer = parse_segment_name(path)[1]
+            if writer == COMPACTED_WRITER:
+                sealed.append(path)
+            elif path != newest[writer] and (writer == "" or os.path.exists(path + SEAL_SUFFIX)):
+                sealed.append(path)
+        return sealed
+
+    def iter_records(self, user_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        المرور على كل السجلات بالترتيب الزمني
+
+        :param user_id: تصفية السجلات لمستخدم معين (اختياري)
+        :return: مولد للسجلات
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+            segments = self.list_segments()
+
+        # مرشح نصي سريع قبل تحليل JSON
+        needle = json.dumps(user_id, ensure_ascii=False) if user_id is not None else None
+
+        for path in segments:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if needle is not None and needle not in line:
+                            continue
+                        try:
+                            record = json.loads(line)
+                        except json.JSONDecodeError:
+                            # سطر غير مكتمل في نهاية مقطع بعد توقف مفاجئ
+                            continue
+                        if user_id is None or record.get("user_id") == user_id:
+                            yield record
+            except FileNotFoundError:
+                # تم حذف المقطع أثناء الضغط
+                continue
+
+    def read_user_history(self, user_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        إعادة بناء تاريخ محادثة مستخدم من المقاطع
+
+        :param user_id: معرف المستخدم
+        :param limit: عدد آخر التبادلات المطلوبة (اختياري)
+        :return: قائمة التبادلات مرتبة زمنياً
+        """
+        # مقاطع الكتاب المتزامنين تتداخل زمنياً، فالترتيب بالطابع الزمني (ترتيب مستقر)
+        history = sorted(self.iter_records(user_id), key=lambda record: record.get("timestamp", ""))
+        if limit is not None:
+            return history[-limit:] if limit > 0 else []
+        return history
+
+    # ------------------------------------------------------------------
+    # الضغط
+    # ------------------------------------------------------------------
+
+    def _acquire_compact_lock(self) -> bool:
+        """
+        قفل الضغط عبر العمليات (ملف يُنشأ حصرياً، ويُعتبر متروكاً بعد COMPACT_LOCK_STALE_SECONDS)
+
+        :return: True إذا تم أخذ القفل
+        """
+        lock_path = os.path.join(self.directory, COMPACT_LOCK_NAME)
+        for _ in range(2):
+            try:
+                os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return True
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(lock_path) < COMPACT_LOCK_STALE_SECONDS:
+                        return False
+                    logger.warning(f"إزالة قفل ضغط متروك: {lock_path}")
+                    os.remove(lock_path)
+                except FileNotFoundError:
+                    continue
+        return False
+
+    def compact(self, keep_last_per_user: Optional[int] = None) -> Dict[str, Any]:
+        """
+        دمج المقاطع المختومة في مقطع واحد مرتب حسب المستخدم والزمن
+        (المقاطع النشطة لأي عملية كاتبة لا تُلمس)
+
+        :param keep_last_per_user: الاحتفاظ بآخر N تبادل لكل مستخدم فقط (اختياري)
+        :return: ملخص عملية الضغط
+        """
+        empty = {"segments_merged": 0, "records_before": 0, "records_after": 0}
+        if not os.path.isdir(self.directory):
+            return empty
+        if not self._acquire_compact_lock():
+            logger.info("عملية ضغط أخرى جارية على سجل المحادثات، تم التخطي")
+            return dict(empty, skipped="locked")
+
+        try:
+            sealed = self.sealed_segments()
+            if not sealed or (len(sealed) < 2 and keep_last_per_user is None):
+                return empty
+
+            records_by_user: Dict[str, List[Dict[str, Any]]] = {}
+            records_before = 0
+            for path in sealed:
+                with open(path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue
+                        records_before += 1
+                        records_by_user.setdefault(record.get("user_id", ""), []).append(record)
+
+            # الكتابة في ملف مؤقت ثم استبداله بشكل ذري بمقطع مضغوط مختوم برقم آخر مقطع مدمج
+            target = self._segment_path(parse_segment_name(sealed[-1])[0], COMPACTED_WRITER)
+            temp_path = target + ".compacting"
+            records_after = 0
+            with open(temp_path, "w", encoding="utf-8") as f:
+                for user_id in sorted(records_by_user):
+                    user_records = sorted(records_by_user[user_id], key=lambda record: record.get("timestamp", ""))
+                    if keep_last_per_user is not None:
+                        user_records = user_records[-keep_last_per_user:] if keep_last_per_user > 0 else []
+                    for record in user_records:
+                        f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+                        records_after += 1
+                f.flush()
+                os.fsync(f.fileno())
+
+            os.replace(temp_path, target)
+            for path in sealed:
+                if os.path.abspath(path) == os.path.abspath(target):
+                    continue
+                os.remove(path)
+                if os.path.exists(path + SEAL_SUFFIX):
+                    os.remove(path + SEAL_SUFFIX)
+        finally:
+            os.remove(os.path.join(self.directory, COMPACT_LOCK_NAME))
+
+        with self._lock:
+            self._stats["compactions"] += 1
+
+        summary = {
+            "segments_merged": len(sealed),
+            "records_before": records_before,
+            "records_after": records_after
+        }
+        logger.info(f"تم ضغط سجل المحادثات: {summary}")
+        return summary
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        إحصائيات الكتابة والمقاطع
+
+        :return: قاموس بالإحصائيات
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["active_segment_bytes"] = self._segment_bytes
+        stats["segments"] = len(self.list_segments())
+        return stats
+
+
+def main():
+    """
+    أداة سطر أوامر لضغط السجل أو قراءة تاريخ مستخدم
+    """
+    parser = argparse.ArgumentParser(description="أدوات سجل محادثات شات بوت مجمع عمال مصر")
+    parser.add_argument("--dir", help="مجلد مقاطع السجل")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    compact_parser = subparsers.add_parser("compact", help="دمج المقاطع المختومة")
+    compact_parser.add_argument("--keep-last", type=int, default=None, help="الاحتفاظ بآخر N تبادل لكل مستخدم")
+
+    history_parser = subparsers.add_parser("history", help="عرض تاريخ محادثة مستخدم")
+    history_parser.add_argument("user_id")
+    history_parser.add_argument("--limit", type=int, default=None)
+
+    args = parser.parse_args()
+    journal = ConversationJournal(directory=args.dir)
+
+    if args.command == "compact":
+        print(json.dumps(journal.compact(args.keep_last), ensure_ascii=False, indent=2))
+    elif args.command == "history":
+        for record in journal.read_user_history(args.user_id, args.limit):
+            print(json.dumps(record, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+مستودع ملفات المعرفة (data.json و facebook_responses.json ...) المشترك بين الوحدات
+يقرأ كل ملف ويحلله مرة واحدة ويحتفظ به في الذاكرة، ثم يعيد تحميله فقط عند تغير
+وقت التعديل أو الحجم مع اختلاف بصمة المحتوى (تعديل وقت الملف دون تغيير محتواه لا يسبب إعادة تحليل)
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, Optional, Tuple
+
+from config import BOT_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+
+class _CachedFile:
+    """
+    آخر نسخة محللة من ملف مع توقيعه وإحصائياته
+    """
+
+    __slots__ = ("data", "signature", "digest", "checked_at", "stats")
+
+    def __init__(self):
+        self.data: Any = None
+        # (وقت التعديل بالنانو ثانية، الحجم) لآخر محتوى تم فحصه
+        self.signature: Optional[Tuple[int, int]] = None
+        self.digest: Optional[str] = None
+        self.checked_at = 0.0
+        self.stats = {
+            "loads": 0,
+            "cache_hits": 0,
+            "unchanged_reads": 0,
+            "parse_errors": 0,
+            "last_parse_ms": 0.0,
+            "total_parse_ms": 0.0,
+            "last_loaded_at": None
+        }
+
+
+class DataRepository:
+    """
+    ذاكرة مؤقتة لملفات JSON تعيد التحميل عند تغير الملف فقط
+    """
+
+    def __init__(self, check_interval: Optional[float] = None):
+        """
+        تهيئة المستودع
+
+        :param check_interval: أقل مدة بالثواني بين فحصين لوقت تعديل الملف (0 للفحص مع كل قراءة)
+        """
+        self.check_interval = (
+            check_interval if check_interval is not None
+            else BOT_SETTINGS.get("DATA_CACHE_CHECK_INTERVAL", 1.0)
+        )
+        self._files: Dict[str, _CachedFile] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.abspath(path)
+
+    def load(self, path: str, revalidate: bool = False) -> Any:
+        """
+        قراءة ملف JSON من الذاكرة المؤقتة (مع إعادة تحميله إذا تغير)
+        البيانات المرجعة مشتركة بين كل المستخدمين ويجب عدم تعديلها
+
+        :param path: مسار الملف
+        :param revalidate: فحص الملف فوراً دون انتظار انقضاء فترة الفحص
+        :return: محتوى الملف بعد التحليل
+        :raises FileNotFoundError: إذا لم يكن الملف موجوداً ولم يُحمّل من قبل
+        :raises json.JSONDecodeError: إذا كان الملف غير صالح ولم يُحمّل من قبل
+        """
+        key = self._key(path)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._files.get(key)
+            if entry is None:
+                entry = self._files[key] = _CachedFile()
+
+            if entry.signature is not None and not revalidate and now - entry.checked_at < self.check_interval:
+                entry.stats["cache_hits"] += 1
+                return entry.data
+
+            try:
+                stat = os.stat(key)
+            except FileNotFoundError:
+                if entry.digest is None:
+                    raise
+                # الملف حُذف أو يُستبدل الآن: نستمر بآخر نسخة صالحة
+                logger.warning(f"الملف {path} غير موجود، سيتم استخدام آخر نسخة محملة")
+                entry.checked_at = now
+                entry.stats["cache_hits"] += 1
+                return entry.data
+
+            entry.checked_at = now
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if signature == entry.signature:
+                entry.stats["cache_hits"] += 1
+                return entry.data
+
+            return self._reload(path, key, entry, signature)
+
+    def _reload(self, path: str, key: str, entry: _CachedFile, signature: Tuple[int, int]) -> Any:
+        """
+        قراءة الملف ومقارنة بصمته، وتحليله فقط إذا تغير المحتوى (يُستدعى مع الاحتفاظ بالقفل)
+        """
+        with open(key, "rb") as f:
+            raw = f.read()
+
+        digest = hashlib.sha256(raw).hexdigest()
+        entry.signature = signature
+        if digest == entry.digest:
+            entry.stats["unchanged_reads"] += 1
+            return entry.data
+
+        started = time.perf_counter()
+        try:
+            data = json.loads(raw.decode("utf-8"))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            entry.stats["parse_errors"] += 1
+            if entry.digest is None:
+                # لا توجد نسخة سابقة: لا يُحفظ التوقيع حتى تُعاد المحاولة في القراءة التالية
+                entry.signature = None
+                raise
+            logger.error(f"ملف {path} غير صالح ({e})، سيتم استخدام آخر نسخة محملة")
+            return entry.data
+
+        parse_ms = (time.perf_counter() - started) * 1000
+        entry.data = data
+        entry.digest = digest
+        entry.stats["loads"] += 1
+        entry.stats["last_parse_ms"] = round(parse_ms, 3)
+        entry.stats["total_parse_ms"] = round(entry.stats["total_parse_ms"] + parse_ms, 3)
+        entry.stats["last_loaded_at"] = time.time()
+
+        logger.info(f"تم تحميل {path} ({len(raw)} بايت) خلال {parse_ms:.1f}ms")
+        return data
+
+    def prime(self, path: str, data: Any, raw: bytes, signature: Tuple[int, int]) -> None:
+        """
+        تسجيل محتوى محلل مسبقاً لملف (مثل بيانات اللقطة المترجمة) دون تحليله مرة أخرى
+
+        :param path: مسار الملف
+        :param data: المحتوى بعد التحليل
+        :param raw: محتوى الملف كما هو (لحساب البصمة)
+        :param signature: توقيع الملف (وقت التعديل بالنانو ثانية، الحجم) قبل قراءته
+        """
+        with self._lock:
+            entry = self._files.get(self._key(path))
+            if entry is None:
+                entry = self._files[self._key(path)] = _CachedFile()
+            entry.data = data
+            entry.signature = signature
+            entry.digest = hashlib.sha256(raw).hexdigest()
+            entry.checked_at = time.monotonic()
+            entry.stats["last_loaded_at"] = time.time()
+
+    def get(self, path: str, default: Any = None) -> Any:
+        """
+        مثل load ولكن ترجع القيمة الافتراضية عند تعذر القراءة بدلاً من رفع استثناء
+
+        :param path: مسار الملف
+        :param default: القيمة المرجعة عند الفشل
+        :return: محتوى الملف أو القيمة الافتراضية
+        """
+        try:
+            return self.load(path)
+        except (OSError, ValueError) as e:
+            logger.error(f"خطأ في تحميل ملف البيانات {path}: {e}")
+            return default
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        """
+        إجبار إعادة الفحص في القراءة التالية (لملف واحد أو لكل الملفات)
+
+        :param path: مسار الملف (اختياري)
+        """
+        with self._lock:
+            entries = [self._files.get(self._key(path))] if path else list(self._files.values())
+            for entry in entries:
+                if entry is not None:
+                    entry.signature = None
+                    entry.digest = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        إحصائيات التحميل لكل ملف
+
+        :return: قاموس يحتوي على عدد مرات التحليل والقراءة من الذاكرة وأزمنة التحليل
+        """
+        with self._lock:
+            files = {key: dict(entry.stats) for key, entry in self._files.items()}
+        return {
+            "check_interval": self.check_interval,
+            "total_loads": sum(stats["loads"] for stats in files.values()),
+            "total_cache_hits": sum(stats["cache_hits"] for stats in files.values()),
+            "files": files
+        }
+
+
+# المستودع المشترك بين كل الوحدات في العملية
+_shared_repository: Optional[DataRepository] = None
+_shared_repository_lock = threading.Lock()
+
+
+def get_data_repository() -> DataRepository:
+    """
+    الحصول على مستودع البيانات المشترك (يتم إنشاؤه عند أول استخدام)
+
+    :return: كائن DataRepository
+    """
+    global _shared_repository
+
+    if _shared_repository is None:
+        with _shared_repository_lock:
+            if _shared_repository is None:
+                _shared_repository = DataRepository()
+
+    return _shared_repository
+
+
+def get_repository_stats() -> Dict[str, Any]:
+    """
+    إحصائيات المستودع المشترك
+
+    :return: قاموس بالإحصائيات أو قاموس فارغ إذا لم يتم إنشاء المستودع بعد
+    """
+    if _shared_repository is None:
+        return {}
+    return _shared_repository.get_stats()
@@ -13,6 +13,7 @@ from datetime import datetime
 from typing import Dict, List, Any, Optional, Tuple
 from config import BOT_SETTINGS, APP_SETTINGS, FACEBOOK_SETTINGS
 from bot import ChatBot
+from keyword_matcher import first_match
 
 # إعداد التسجيل
 logging.basicConfig(
@@ -73,6 +74,15 @@ class FacebookCommentsHandler:
             "احتيال", "فشل", "لا أنصح", "ابتعدوا", "هراء", "خدعة"
         ]
         
+        # تسجيل فئات التعليقات في مطابق الكلمات المفتاحية المشترك مع الشات بوت (تبقى بعد إعادة تحميل البيانات)
+        self.chatbot.register_keyword_groups({
+            "comment_job": self.job_keywords,
+            "comment_investor": self.investor_keywords,
+            "comment_media": self.media_keywords,
+            "comment_praise": self.praise_keywords,
+            "comment_unwanted": self.unwanted_keywords
+        })
+        
         # إضافة إحصائيات وتحليلات
         self.analytics = {
             "total_comments_processed": 0,
@@ -215,6 +225,7 @@ class FacebookCommentsHandler:
         :return: True إذا كان التعليق يستحق الرد
         """
         comment_text = comment_text.lower()
+        matches = self.chatbot.keyword_matcher.scan(comment_text)
         
         # تجاهل التعليقات القصيرة جداً (أقل من 3 أحرف)
         if len(comment_text.strip()) < 3:
@@ -222,23 +233,23 @@ class FacebookCommentsHandler:
             return False
         
         # تجاهل التعليقات التي تحتوي على كلمات غير مرغوب فيها
-        for keyword in self.unwanted_keywords:
-            if keyword in comment_text:
-                logger.info(f"تجاهل تعليق يحتوي على كلمة غير مرغوب فيها: {keyword}")
-                self.analytics["ignored_comments"] += 1
-                return False
+        unwanted = first_match(matches, "comment_unwanted")
+        if unwanted:
+            logger.info(f"تجاهل تعليق يحتوي على كلمة غير مرغوب فيها: {unwanted[0]}")
+            self.analytics["ignored_comments"] += 1
+            return False
         
         # تجاهل تعليقات الإشادة التي لا تحتوي على استفسار
-        contains_praise = any(keyword in comment_text for keyword in self.praise_keywords)
+        contains_praise = "comment_praise" in matches
         if contains_praise and len(comment_text.strip()) < 20:
             logger.info(f"تجاهل تعليق إشادة قصير: {comment_text[:20]}...")
             self.analytics["ignored_comments"] += 1
             return False
         
         # التحقق من وجود كلمات مفتاحية تستحق الرد
-        contains_job_keyword = any(keyword in comment_text for keyword in self.job_keywords)
-        contains_investor_keyword = any(keyword in comment_text for keyword in self.investor_keywords)
-        contains_media_keyword = any(keyword in comment_text for keyword in self.media_keywords)
+        contains_job_keyword = "comment_job" in matches
+        contains_investor_keyword = "comment_investor" in matches
+        contains_media_keyword = "comment_media" in matches
         
         # التحقق من وجود علامة استفهام
         contains_question = "؟" in comment_text or "?" in comment_text
@@ -262,21 +273,22 @@ class FacebookCommentsHandler:
         :return: فئة التعليق (وظائف، استثمار، إعلام، عام)
         """
         comment_text = comment_text.lower()
+        matches = self.chatbot.keyword_matcher.scan(comment_text)
         
         # التحقق من وجود كلمات مفتاحية للوظائف
-        if any(keyword in comment_text for keyword in self.job_keywords):
+        if "comment_job" in matches:
             logger.debug(f"تصنيف التعليق كاستفسار عن وظائف: {comment_text[:30]}...")
             self.analytics["responses_by_category"]["باحث عن عمل"] += 1
             return "باحث عن عمل"
         
         # التحقق من وجود كلمات مفتاحية للاستثمار
-        if any(keyword in comment_text for keyword in self.investor_keywords):
+        if "comment_investor" in matches:
             logger.debug(f"تصنيف التعليق كاستفسار عن الاستثمار: {comment_text[:30]}...")
             self.analytics["responses_by_category"]["مستثمر"] += 1
             return "مستثمر"
         
         # التحقق من وجود كلمات مفتاحية للإعلام
-        if any(keyword in comment_text for keyword in self.media_keywords):
+        if "comment_media" in matches:
             logger.debug(f"تصنيف التعليق كاستفسار إعلامي: {comment_text[:30]}...")
             self.analytics["responses_by_category"]["صحفي"] += 1
             return "صحفي"
@@ -327,17 +339,8 @@ class FacebookCommentsHandler:
         :param response: الرد الأصلي
         :return: الرد المنقى
         """
-        # استبدال أي إشارات للذكاء الاصطناعي
-        ai_terms = ["ذكاء اصطناعي", "روبوت", "بوت", "AI", "bot", "شات بوت", "chatbot"]
-        sanitized_response = response
-        
-        for term in ai_terms:
-            sanitized_response = re.sub(
-                r'\b' + re.escape(term) + r'\b', 
-                "المساعد الرسمي لمجمع عمال مصر", 
-                sanitized_response, 
-                flags=re.IGNORECASE
-            )
+        # محرك التنقية المشترك المترجم مسبقاً في الشات بوت من بيانات data.json
+        sanitized_response = self.chatbot.comment_sanitizer.sanitize(response)
         
         return sanitized_response
     
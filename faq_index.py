@@ -0,0 +1,273 @@
+"""
+فهرس محلي للأسئلة الشائعة (prompts في data.json) للإجابة قبل استدعاء DeepSeek API
+يحول الأسئلة إلى متجهات TF-IDF (مقاطع أحرف داخل الكلمات) مرة واحدة عند التحميل،
+ثم يحسب تشابه الرسالة مع كل الأسئلة بضرب مصفوفة متفرقة واحد،
+فإذا تجاوز التشابه حد SIMILARITY_THRESHOLD وتقدم السؤال الأقرب على أقرب سؤال مختلف بهامش
+FAQ_MIN_MARGIN يُرد بالإجابة المحفوظة دون رحلة شبكة (الرسالة القريبة من عدة أسئلة تذهب لنموذج اللغة)
+"""
+
+import re
+import time
+import pickle
+import logging
+import threading
+from typing import Dict, List, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# مقاطع الأحرف داخل حدود الكلمات تتحمل السوابق واللواحق العربية (ال، و، ب، ـات...)
+FAQ_NGRAM_RANGE = (3, 4)
+
+# سؤالان بهذا التشابه أو أكثر صياغتان لنفس الاستفسار (مثل "كيف يمكنني التقديم للوظائف؟" و"كيفية التقديم للوظائف؟")
+# فلا يُحسب الهامش بينهما
+DUPLICATE_QUESTION_SIMILARITY = 0.6
+
+_DIACRITICS = re.compile(r"[ً-ْـ]")
+_ALEF_FORMS = re.compile(r"[أإآ]")
+
+
+def normalize_text(text: str) -> str:
+    """
+    تطبيع النص العربي قبل الفهرسة أو البحث
+    (حذف التشكيل والتطويل وتوحيد أشكال الألف والياء والتاء المربوطة)
+
+    :param text: النص
+    :return: النص بعد التطبيع
+    """
+    if not text:
+        return ""
+    text = _DIACRITICS.sub("", text.lower())
+    text = _ALEF_FORMS.sub("ا", text)
+    return text.replace("ى", "ي").replace("ة", "ه")
+
+
+class FAQIndex:
+    """
+    فهرس TF-IDF للأسئلة الشائعة مع إحصائيات الإصابة
+    """
+
+    def __init__(self, prompts: Optional[List[Dict[str, Any]]] = None, previous: Optional["FAQIndex"] = None,
+                 defer: bool = False):
+        """
+        تهيئة الفهرس
+
+        :param prompts: قائمة الأسئلة والأجوبة (اختياري، يمكن البناء لاحقاً)
+        :param previous: فهرس سابق يحل محله هذا الفهرس (تستمر إحصائياته بدلاً من البدء من الصفر)
+        :param defer: تأجيل البناء (واستيراد scikit-learn) إلى أول بحث أو استدعاء warm()
+        """
+        # (المحول، مصفوفة الأسئلة، الأسئلة) تُستبدل معاً عند إعادة البناء
+        self._state: Optional[Tuple[Any, Any, List[Dict[str, Any]]]] = None
+        # الفهرس بعد تحميله من لقطة مترجمة: (بايتات المحول والمصفوفة، الأسئلة، عدد المقاطع)
+        # أو الأسئلة التي أُجل بناؤها؛ يُجهز الفهرس عند أول استخدام أو باستدعاء warm()
+        # حتى لا يتأخر الإقلاع باستيراد scikit-learn
+        self._packed: Optional[Tuple[bytes, List[Dict[str, Any]], int]] = None
+        self._pending: Optional[List[Dict[str, Any]]] = None
+        self._warm_lock = threading.Lock()
+
+        if previous is not None:
+            # مشاركة الإحصائيات وقفلها مع الفهرس السابق (قد تنتهي عليه طلبات جارية)
+            self._lock = previous._lock
+            self.stats = previous.stats
+        else:
+            self._lock = threading.Lock()
+            self.stats = {
+                "lookups": 0,
+                "hits": 0,
+                "ambiguous": 0,
+                "total_lookup_us": 0.0,
+                "builds": 0,
+                "last_build_ms": 0.0
+            }
+
+        if prompts and defer:
+            self._pending = list(prompts)
+        elif prompts:
+            self.build(prompts)
+
+    def build(self, prompts: List[Dict[str, Any]]) -> bool:
+        """
+        بناء الفهرس من الأسئلة واستبداله بشكل ذري
+
+        :param prompts: قائمة قواميس تحتوي على question و answer
+        :return: True إذا تم البناء بنجاح
+        """
+        prompts = [prompt for prompt in prompts or [] if normalize_text(prompt.get("question", "")).strip()]
+        if not prompts:
+            self._publish(None)
+            return False
+
+        try:
+            # استيراد متأخر: scikit-learn مطلوبة فقط عند وجود أسئلة للفهرسة
+            from sklearn.feature_extraction.text import TfidfVectorizer
+        except ImportError:
+            logger.error("فشل في استيراد scikit-learn، لن تتم الإجابة محلياً. يرجى تثبيتها باستخدام pip install scikit-learn")
+            self._publish(None)
+            return False
+
+        started = time.perf_counter()
+        vectorizer = TfidfVectorizer(
+            analyzer="char_wb",
+            ngram_range=FAQ_NGRAM_RANGE,
+            preprocessor=normalize_text,
+            sublinear_tf=True
+        )
+        try:
+            matrix = vectorizer.fit_transform([prompt["question"] for prompt in prompts])
+        except ValueError as e:
+            # لا توجد مقاطع صالحة (أسئلة قصيرة جداً مثلاً)
+            logger.error(f"تعذر بناء فهرس الأسئلة الشائعة: {e}")
+            self._publish(None)
+            return False
+
+        self._publish((vectorizer, matrix, prompts))
+        build_ms = (time.perf_counter() - started) * 1000
+
+        with self._lock:
+            self.stats["builds"] += 1
+            self.stats["last_build_ms"] = round(build_ms, 3)
+
+        logger.info(f"تم بناء فهرس الأسئلة الشائعة: {len(prompts)} سؤال، {matrix.shape[1]} مقطع، خلال {build_ms:.1f}ms")
+        return True
+
+    def _publish(self, state: Optional[Tuple[Any, Any, List[Dict[str, Any]]]]) -> None:
+        # الحالة الجديدة تُنشر قبل مسح الفهرس المؤجل حتى لا يرى بحث متزامن فهرساً فارغاً
+        self._state = state
+        self._packed = None
+        self._pending = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # الأقفال لا تُحفظ مع الفهرس المترجم مسبقاً (knowledge_snapshot)، والمحول يُحفظ كبايتات منفصلة
+        self.warm()
+        state = self.__dict__.copy()
+        del state["_lock"]
+        del state["_warm_lock"]
+        if self._state is not None:
+            vectorizer, matrix, prompts = self._state
+            blob = pickle.dumps((vectorizer, matrix), protocol=pickle.HIGHEST_PROTOCOL)
+            state["_state"] = None
+            state["_packed"] = (blob, prompts, matrix.shape[1])
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        # لقطات مترجمة قبل إضافة عداد الرسائل الملتبسة
+        self.stats.setdefault("ambiguous", 0)
+        self._lock = threading.Lock()
+        self._warm_lock = threading.Lock()
+
+    def warm(self) -> None:
+        """
+        تجهيز الفهرس المؤجل (فك اللقطة المترجمة أو البناء، وكلاهما يستورد scikit-learn) قبل أول طلب
+        """
+        if self._packed is None and self._pending is None:
+            return
+        with self._warm_lock:
+            packed, pending = self._packed, self._pending
+            if packed is not None:
+                started = time.perf_counter()
+                blob, prompts, _ = packed
+                vectorizer, matrix = pickle.loads(blob)
+                self._publish((vectorizer, matrix, prompts))
+                logger.info(f"تم فك فهرس الأسئلة الشائعة المترجم خلال {(time.perf_counter() - started) * 1000:.1f}ms")
+            elif pending is not None:
+                self.build(pending)
+
+    @property
+    def ready(self) -> bool:
+        """
+        هل الفهرس مبني أو مؤجل وجاهز للبحث
+        """
+        return self._state is not None or self._packed is not None or self._pending is not None
+
+    def rank(self, query: str) -> Tuple[Optional[Dict[str, Any]], float, float]:
+        """
+        أقرب سؤال للرسالة وهامشه على أقرب سؤال مختلف (بدون تحديث الإحصائيات)
+
+        :param query: رسالة المستخدم
+        :return: السؤال والجواب الأقرب (أو None) ودرجة التشابه والفرق بينها وبين أقرب سؤال ليس صياغة أخرى له
+        """
+        if not query or not query.strip():
+            return None, 0.0, 0.0
+        if self._packed is not None or self._pending is not None:
+            self.warm()
+        state = self._state
+        if state is None:
+            return None, 0.0, 0.0
+
+        vectorizer, matrix, prompts = state
+        # المتجهات مطبعة (L2) فحاصل الضرب هو تشابه جيب التمام
+        scores = (matrix @ vectorizer.transform([query]).T).toarray().ravel()
+        best = int(scores.argmax())
+        score = float(scores[best])
+        if score <= 0.0:
+            return None, 0.0, 0.0
+
+        # الأسئلة التي هي صياغات أخرى للسؤال الأقرب لا تنافسه
+        duplicates = (matrix @ matrix[best].T).toarray().ravel() >= DUPLICATE_QUESTION_SIMILARITY
+        rivals = scores[~duplicates]
+        runner_up = float(rivals.max()) if rivals.size else 0.0
+        return prompts[best], score, score - runner_up
+
+    def search(self, query: str) -> Tuple[Optional[Dict[str, Any]], float]:
+        """
+        البحث عن أقرب سؤال للرسالة (بدون تحديث الإحصائيات)
+
+        :param query: رسالة المستخدم
+        :return: زوج من السؤال والجواب الأقرب (أو None) ودرجة التشابه بين 0 و 1
+        """
+        match, score, _ = self.rank(query)
+        return match, score
+
+    def answer(self, query: str, threshold: float, min_margin: float = 0.0) -> Optional[Dict[str, Any]]:
+        """
+        الإجابة محلياً إذا تجاوز التشابه الحد وتقدم السؤال الأقرب بوضوح (كل إصابة تعني استدعاء API تم تجنبه)
+
+        :param query: رسالة المستخدم
+        :param threshold: حد التشابه الأدنى
+        :param min_margin: أقل فرق مقبول بين السؤال الأقرب وأقرب سؤال مختلف
+        :return: السؤال والجواب المطابق أو None
+        """
+        started = time.perf_counter()
+        match, score, margin = self.rank(query)
+        close = match is not None and score >= threshold
+        hit = close and margin >= min_margin
+        elapsed_us = (time.perf_counter() - started) * 1_000_000
+
+        with self._lock:
+            self.stats["lookups"] += 1
+            self.stats["total_lookup_us"] += elapsed_us
+            if hit:
+                self.stats["hits"] += 1
+            elif close:
+                self.stats["ambiguous"] += 1
+
+        if hit:
+            logger.debug(f"إجابة محلية بدرجة تشابه {score:.2f} وهامش {margin:.2f} خلال {elapsed_us:.0f} ميكروثانية")
+            return match
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        إحصائيات الفهرس
+
+        :return: قاموس يحتوي على عدد الاستعلامات والإصابات ونسبتها والاستدعاءات التي تم تجنبها
+        """
+        with self._lock:
+            stats = dict(self.stats)
+
+        lookups = stats["lookups"]
+        state = self._state
+        packed = self._packed
+        pending = self._pending
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["avoided_llm_calls"] = stats["hits"]
+        total_lookup_us = stats.pop("total_lookup_us")
+        stats["avg_lookup_us"] = round(total_lookup_us / lookups, 1) if lookups else 0.0
+        if state is not None:
+            stats["documents"], stats["features"] = len(state[2]), state[1].shape[1]
+        elif packed is not None:
+            stats["documents"], stats["features"] = len(packed[1]), packed[2]
+        else:
+            stats["documents"], stats["features"] = len(pending or []), 0
+        stats["warm"] = packed is None and pending is None
+        return stats
@@ -0,0 +1,31 @@
+"""
+إعدادات gunicorn لخادم شات بوت مجمع عمال مصر
+يتم تحميل هذا الملف تلقائياً عند تشغيل gunicorn server:app من مجلد المشروع
+"""
+
+import os
+import sys
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+# ChatBot يحمل حالة كل طلب في ConversationContext فأصبح آمناً للعمل بعدة خيوط
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+worker_class = "gthread"
+
+# يجب تحميل التطبيق داخل كل عامل حتى تعمل خيوط معالجة webhook بعد fork
+preload_app = False
+
+# مهلة الإيقاف الهادئ أكبر من مهلة تفريغ طابور webhook ومهلة كتابة المحادثات المعلقة
+graceful_timeout = int(
+    float(os.getenv("WEBHOOK_SHUTDOWN_TIMEOUT", "25")) + float(os.getenv("PERSISTENCE_SHUTDOWN_TIMEOUT", "10"))
+) + 5
+
+
+def worker_exit(server, worker):
+    """
+    تفريغ طابور أحداث webhook وكتابة المحادثات المعلقة قبل خروج العامل
+    """
+    server_module = sys.modules.get("server")
+    if server_module is not None and hasattr(server_module, "shutdown_background_workers"):
+        server_module.shutdown_background_workers()
@@ -0,0 +1,181 @@
+"""
+طبقة نقل HTTP مشتركة لاستدعاءات واجهات نماذج اللغة
+توفر جلسة requests واحدة بتجمع اتصالات دائمة (keep-alive) لكل مضيف
+حتى لا يدفع كل رد على ماسنجر تكلفة مصافحة TCP و TLS جديدة
+"""
+
+import logging
+import threading
+from typing import Dict, Any, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import API_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+
+class PooledHTTPClient:
+    """
+    عميل HTTP يعيد استخدام الاتصالات عبر جلسة requests مشتركة
+    """
+
+    def __init__(self, pool_connections: int = None, pool_maxsize: int = None,
+                 connect_timeout: float = None, read_timeout: float = None):
+        """
+        تهيئة عميل HTTP بتجمع اتصالات
+
+        :param pool_connections: عدد المضيفين الذين يحتفظ لهم بتجمع اتصالات
+        :param pool_maxsize: الحد الأقصى للاتصالات المفتوحة لكل مضيف
+        :param connect_timeout: مهلة إنشاء الاتصال بالثواني
+        :param read_timeout: مهلة قراءة الاستجابة بالثواني
+        """
+        self.pool_connections = pool_connections or API_SETTINGS.get("HTTP_POOL_CONNECTIONS", 10)
+        self.pool_maxsize = pool_maxsize or API_SETTINGS.get("HTTP_POOL_MAXSIZE", 20)
+        self.connect_timeout = connect_timeout or API_SETTINGS.get("HTTP_CONNECT_TIMEOUT", 5)
+        self.read_timeout = read_timeout or API_SETTINGS.get("HTTP_READ_TIMEOUT", 60)
+
+        self.session = requests.Session()
+        self.session.headers.update({"Connection": "keep-alive"})
+
+        # محول واحد لكل بروتوكول حتى تتشارك كل الطلبات نفس التجمع
+        self.adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=False
+        )
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "errors": 0
+        }
+
+        logger.info(
+            f"تم تهيئة تجمع اتصالات HTTP: {self.pool_maxsize} اتصال لكل مضيف، "
+            f"مهلة الاتصال {self.connect_timeout}ث، مهلة القراءة {self.read_timeout}ث"
+        )
+
+    @property
+    def timeout(self) -> Tuple[float, float]:
+        """
+        مهلة الطلب الافتراضية بصيغة (مهلة الاتصال، مهلة القراءة)
+        """
+        return (self.connect_timeout, self.read_timeout)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        تنفيذ طلب HTTP عبر الجلسة المشتركة
+
+        :param method: طريقة الطلب (GET، POST، إلخ)
+        :param url: عنوان الطلب
+        :return: استجابة requests
+        :raises: requests.exceptions.RequestException في حالة فشل الاتصال
+        """
+        kwargs.setdefault("timeout", self.timeout)
+
+        with self._lock:
+            self._stats["requests"] += 1
+
+        try:
+            return self.session.request(method, url, **kwargs)
+        except requests.exceptions.RequestException:
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """
+        تنفيذ طلب POST عبر الجلسة المشتركة
+
+        :param url: عنوان الطلب
+        :return: استجابة requests
+        """
+        return self.request("POST", url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """
+        تنفيذ طلب GET عبر الجلسة المشتركة
+
+        :param url: عنوان الطلب
+        :return: استجابة requests
+        """
+        return self.request("GET", url, **kwargs)
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """
+        إحصائيات تجمع الاتصالات للتأكد من إعادة استخدام الاتصالات
+
+        :return: قاموس بعدد الطلبات والاتصالات المفتوحة لكل مضيف
+        """
+        hosts = {}
+        pools = self.adapter.poolmanager.pools
+
+        for pool_key in list(pools.keys()):
+            pool = pools.get(pool_key)
+            if pool is None:
+                continue
+
+            host = f"{pool_key.key_scheme}://{pool_key.key_host}:{pool_key.key_port}"
+            opened = getattr(pool, "num_connections", 0)
+            served = getattr(pool, "num_requests", 0)
+            idle = pool.pool.qsize() if getattr(pool, "pool", None) is not None else 0
+
+            hosts[host] = {
+                "connections_opened": opened,
+                "requests": served,
+                "reused_requests": max(0, served - opened),
+                "idle_connections": idle
+            }
+
+        with self._lock:
+            stats = dict(self._stats)
+
+        stats.update({
+            "pool_connections": self.pool_connections,
+            "pool_maxsize": self.pool_maxsize,
+            "timeout": {"connect": self.connect_timeout, "read": self.read_timeout},
+            "hosts": hosts
+        })
+        return stats
+
+    def close(self) -> None:
+        """
+        إغلاق الجلسة وكل الاتصالات المفتوحة
+        """
+        self.session.close()
+
+
+# العميل المشترك على مستوى العملية
+_shared_client: Optional[PooledHTTPClient] = None
+_shared_client_lock = threading.Lock()
+
+
+def get_http_client() -> PooledHTTPClient:
+    """
+    الحصول على عميل HTTP المشترك (يتم إنشاؤه عند أول استخدام)
+
+    :return: كائن PooledHTTPClient
+    """
+    global _shared_client
+
+    if _shared_client is None:
+        with _shared_client_lock:
+            if _shared_client is None:
+                _shared_client = PooledHTTPClient()
+
+    return _shared_client
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """
+    إحصائيات تجمع الاتصالات للعميل المشترك
+
+    :return: قاموس بالإحصائيات أو قاموس فارغ إذا لم يتم إنشاء العميل بعد
+    """
+    if _shared_client is None:
+        return {}
+    return _shared_client.get_pool_stats()
@@ -0,0 +1,181 @@
+"""
+مطابق كلمات مفتاحية متعدد الأنماط لتوجيه الرسائل وتصنيف التعليقات
+تُسجل مجموعات الكلمات (خدمة العملاء، القوائم، الثناء، فئات التعليقات...) في مطابق واحد مشترك
+يُبنى مرة واحدة، ثم تُفحص الرسالة في مرور واحد لإرجاع كل الفئات المطابقة
+بدلاً من البحث عن كل كلمة على حدة في كل قائمة
+"""
+
+import re
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Any, Iterable, Optional, Tuple, Union
+
+from text_sanitizer import build_trie_pattern
+
+logger = logging.getLogger(__name__)
+
+# نتيجة المطابقة: الفئة -> قائمة (الكلمة، القيمة) مرتبة حسب ترتيب التسجيل في المجموعة
+KeywordMatches = Dict[str, List[Tuple[str, Any]]]
+
+
+class _CompiledMatcher:
+    """
+    البنية المترجمة لمجموعة ثابتة من الكلمات (تُستبدل كاملة عند إعادة البناء)
+    """
+
+    __slots__ = ("regex", "prefix_entries", "version")
+
+    def __init__(self, entries: Dict[str, List[Tuple[str, int, Any]]], version: int):
+        # لكل كلمة: مدخلاتها ومدخلات كل الكلمات الأقصر التي تمثل بادئة لها
+        # (التعبير الجشع يرجع أطول كلمة عند كل موضع، والأقصر منها بنفس البداية معروفة مسبقاً)
+        self.prefix_entries: Dict[str, List[Tuple[str, int, str, Any]]] = {}
+        for keyword in entries:
+            self.prefix_entries[keyword] = [
+                (category, priority, keyword[:length], value)
+                for length in range(1, len(keyword) + 1)
+                if keyword[:length] in entries
+                for category, priority, value in entries[keyword[:length]]
+            ]
+
+        pattern = build_trie_pattern(list(entries))
+        self.regex = re.compile(pattern) if pattern else None
+        self.version = version
+
+    def scan(self, text: str) -> KeywordMatches:
+        if self.regex is None or not text:
+            return {}
+
+        # البحث يتم بمحرك التعبيرات (C)، ويُستأنف من الحرف التالي لبداية كل مطابقة
+        # حتى لا تضيع الكلمات المتداخلة (مثل "عمال" داخل "توفير عمال")
+        search = self.regex.search
+        hits = []
+        match = search(text)
+        while match is not None:
+            hits.extend(self.prefix_entries[match.group()])
+            match = search(text, match.start() + 1)
+
+        if not hits:
+            return {}
+
+        found: Dict[str, Dict[int, Tuple[str, Any]]] = {}
+        for category, priority, keyword, value in hits:
+            found.setdefault(category, {}).setdefault(priority, (keyword, value))
+
+        return {
+            category: [by_priority[priority] for priority in sorted(by_priority)]
+            for category, by_priority in found.items()
+        }
+
+
+class KeywordMatcher:
+    """
+    مطابق مشترك لعدة مجموعات من الكلمات المفتاحية
+    """
+
+    def __init__(self):
+        self._groups: "OrderedDict[str, List[Tuple[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._compiled: Optional[_CompiledMatcher] = None
+        self._version = 0
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # القفل لا يُحفظ مع المطابق المترجم مسبقاً (knowledge_snapshot)
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """
+        تطبيع النص قبل المطابقة (نفس التطبيع المستخدم للكلمات)
+
+        :param text: النص
+        :return: النص بعد التطبيع
+        """
+        return text.strip().lower() if text else ""
+
+    def set_group(self, category: str, keywords: Union[Iterable[str], Dict[str, Any]]) -> None:
+        """
+        تسجيل أو استبدال مجموعة كلمات (يلزم استدعاء build بعدها)
+
+        :param category: اسم الفئة
+        :param keywords: قائمة كلمات، أو قاموس كلمة -> قيمة (مثل مفتاح القائمة)؛ الترتيب يحدد الأولوية
+        """
+        items = keywords.items() if isinstance(keywords, dict) else ((keyword, None) for keyword in keywords)
+        with self._lock:
+            self._groups[category] = [
+                (self.normalize(keyword), value) for keyword, value in items if self.normalize(keyword)
+            ]
+
+    def remove_group(self, category: str) -> None:
+        """
+        حذف مجموعة كلمات (يلزم استدعاء build بعدها)
+
+        :param category: اسم الفئة
+        """
+        with self._lock:
+            self._groups.pop(category, None)
+
+    def build(self) -> None:
+        """
+        بناء المطابق من كل المجموعات المسجلة واستبداله بشكل ذري
+        """
+        with self._lock:
+            entries: Dict[str, List[Tuple[str, int, Any]]] = {}
+            for category, keywords in self._groups.items():
+                for priority, (keyword, value) in enumerate(keywords):
+                    entries.setdefault(keyword, []).append((category, priority, value))
+            self._version += 1
+            compiled = _CompiledMatcher(entries, self._version)
+            self._compiled = compiled
+
+        logger.info(
+            f"تم بناء مطابق الكلمات المفتاحية: {len(entries)} كلمة في {len(self._groups)} مجموعة "
+            f"(الإصدار {compiled.version})"
+        )
+
+    def scan(self, text: str) -> KeywordMatches:
+        """
+        فحص النص في مرور واحد وإرجاع كل الكلمات المطابقة مجمعة حسب الفئة
+
+        :param text: النص (يتم تطبيعه داخلياً)
+        :return: قاموس الفئة -> قائمة (الكلمة، القيمة) مرتبة حسب الأولوية
+        """
+        compiled = self._compiled
+        if compiled is None:
+            self.build()
+            compiled = self._compiled
+        return compiled.scan(self.normalize(text))
+
+    def categories(self, text: str) -> set:
+        """
+        الفئات التي تطابق النص
+
+        :param text: النص
+        :return: مجموعة أسماء الفئات
+        """
+        return set(self.scan(text))
+
+    @property
+    def version(self) -> int:
+        """
+        رقم إصدار البنية المترجمة (يزيد مع كل إعادة بناء)
+        """
+        return self._compiled.version if self._compiled is not None else 0
+
+
+def first_match(matches: KeywordMatches, category: str) -> Optional[Tuple[str, Any]]:
+    """
+    أول كلمة مطابقة في فئة حسب ترتيب التسجيل
+
+    :param matches: نتيجة KeywordMatcher.scan
+    :param category: اسم الفئة
+    :return: (الكلمة، القيمة) أو None
+    """
+    found = matches.get(category)
+    return found[0] if found else None
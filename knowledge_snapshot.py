@@ -0,0 +1,289 @@
+"""
+لقطة قاعدة المعرفة: بيانات data.json مع كل الفهارس المشتقة منها
+(فهرس الأسئلة الشائعة، مطابق الكلمات المفتاحية، محركات التنقية، جدول القوائم)
+تُبنى اللقطة كاملة بعيداً عن الطلبات الجارية ثم تُستبدل بمرجع واحد،
+فلا يرى أي طلب حالة نصف مبنية عند إعادة التحميل
+
+يمكن أيضاً ترجمة اللقطة مسبقاً في خطوة البناء إلى ملف ثنائي (pickle) يُحمّل عند الإقلاع
+بدلاً من تحليل data.json وبناء الفهارس في كل عملية جديدة:
+    python knowledge_snapshot.py [--output knowledge.snapshot]
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import pickle
+import hashlib
+import logging
+import argparse
+from importlib import metadata
+from typing import Dict, List, Any, Optional, Tuple
+
+from config import BOT_SETTINGS
+from faq_index import FAQIndex
+from keyword_matcher import KeywordMatcher
+from text_sanitizer import TextSanitizer
+import services_data
+
+logger = logging.getLogger(__name__)
+
+# حقول البيانات التي تُقرأ من data.json كما هي (مع قيمها الافتراضية)
+KNOWLEDGE_FIELDS = {
+    "prompts": list,
+    "human_expressions": dict,
+    "contact_info": dict,
+    "requires_human_contact": list,
+    "user_categories": list,
+    "job_sectors": list,
+    "service_links": dict,
+    "service_categories": dict,
+    "keyword_groups": dict
+}
+
+# إصدار صيغة الملف المترجم (يُزاد عند تغيير بنية KnowledgeSnapshot أو الفهارس)
+SNAPSHOT_FORMAT = 1
+
+# جدول القوائم: النص بعد التطبيع -> (مفتاح القائمة الرئيسية، مفتاح القائمة الفرعية)
+# (None, None) تعني القائمة الرئيسية كاملة
+MenuLookup = Dict[str, Tuple[Optional[str], Optional[str]]]
+
+
+def build_menu_lookup(main_menu: Dict[str, Any], main_menu_aliases: List[str]) -> MenuLookup:
+    """
+    بناء جدول بحث مباشر لطلبات القوائم بنفس أولوية الفحص السابق
+    (عبارات القائمة الرئيسية، ثم عناصر القائمة الرئيسية، ثم عناصر القوائم الفرعية)
+
+    :param main_menu: هيكل القائمة الرئيسية
+    :param main_menu_aliases: العبارات التي تطلب القائمة الرئيسية
+    :return: جدول البحث
+    """
+    lookup: MenuLookup = {}
+    for alias in main_menu_aliases:
+        lookup.setdefault(alias.strip().lower(), (None, None))
+
+    for key, item in main_menu.items():
+        for name in (key, item.get("title", key)):
+            lookup.setdefault(name.strip().lower(), (key, None))
+
+    for main_key, main_item in main_menu.items():
+        for sub_key, sub_item in main_item.get("submenu", {}).items():
+            for name in (sub_key, sub_item.get("title", sub_key)):
+                lookup.setdefault(name.strip().lower(), (main_key, sub_key))
+
+    return lookup
+
+
+def build_service_index() -> Dict[str, Dict[str, Any]]:
+    """
+    فهرس خدمات المجمع من services_data حسب المعرف (بدلاً من البحث الخطي في كل الفئات)
+
+    :return: قاموس معرف الخدمة -> تفاصيلها (أول ظهور للمعرف له الأولوية)
+    """
+    index: Dict[str, Dict[str, Any]] = {}
+    for service in services_data.get_all_services():
+        index.setdefault(service["id"], service)
+    return index
+
+
+class KnowledgeSnapshot:
+    """
+    نسخة ثابتة من قاعدة المعرفة وفهارسها (لا تُعدل بعد البناء)
+    """
+
+    def __init__(self, data: Dict[str, Any], version: int, faq_index: FAQIndex,
+                 keyword_matcher: KeywordMatcher, ai_sanitizer: TextSanitizer,
+                 comment_sanitizer: TextSanitizer, menu_lookup: MenuLookup, build_ms: float,
+                 services_by_id: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.data = data
+        self.version = version
+        for field, default in KNOWLEDGE_FIELDS.items():
+            setattr(self, field, data.get(field) or default())
+        self.faq_index = faq_index
+        self.keyword_matcher = keyword_matcher
+        self.ai_sanitizer = ai_sanitizer
+        self.comment_sanitizer = comment_sanitizer
+        self.menu_lookup = menu_lookup
+        self.services_by_id = services_by_id or {}
+        self.build_ms = build_ms
+        self.loaded_at = time.time()
+        # مصدر اللقطة: "json" عند البناء من البيانات أو "compiled" عند التحميل من الملف المترجم
+        self.source = "json"
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        ملخص اللقطة لنقطة الحالة
+
+        :return: قاموس يحتوي على الإصدار وزمن البناء وأحجام الفهارس
+        """
+        return {
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "build_ms": self.build_ms,
+            "source": self.source,
+            "prompts": len(self.prompts),
+            "services": len(self.services_by_id),
+            "faq_documents": self.faq_index.get_stats()["documents"],
+            "keyword_matcher_version": self.keyword_matcher.version,
+            "menu_entries": len(self.menu_lookup)
+        }
+
+
+def build_knowledge_snapshot(data: Dict[str, Any], version: int, keyword_groups: Dict[str, Any],
+                             main_menu: Dict[str, Any], main_menu_aliases: List[str],
+                             previous: Optional[KnowledgeSnapshot] = None,
+                             defer_faq: bool = False) -> KnowledgeSnapshot:
+    """
+    بناء لقطة كاملة من البيانات (بدون تعديل أي حالة مشتركة)
+
+    :param data: محتوى data.json
+    :param version: رقم إصدار اللقطة
+    :param keyword_groups: مجموعات الكلمات المفتاحية المسجلة (تتجاوزها مجموعات keyword_groups في البيانات)
+    :param main_menu: هيكل القائمة الرئيسية
+    :param main_menu_aliases: العبارات التي تطلب القائمة الرئيسية
+    :param previous: اللقطة الحالية (لاستمرار إحصائيات فهرس الأسئلة)
+    :param defer_faq: تأجيل بناء فهرس الأسئلة إلى faq_index.warm() أو أول بحث
+    :return: اللقطة الجديدة
+    """
+    started = time.perf_counter()
+
+    faq_index = FAQIndex(
+        data.get("prompts") or [], previous=previous.faq_index if previous else None, defer=defer_faq
+    )
+
+    matcher = KeywordMatcher()
+    groups = dict(keyword_groups)
+    groups.update(data.get("keyword_groups") or {})
+    for category, keywords in groups.items():
+        matcher.set_group(category, keywords)
+    matcher.build()
+
+    # ترجمة محركات التنقية (تُستخدم القيم الافتراضية إذا لم تحدد في البيانات أو كانت غير صالحة)
+    filter_config = data.get("ai_reference_filter") or {}
+    try:
+        ai_sanitizer = TextSanitizer.from_config(filter_config)
+        comment_sanitizer = TextSanitizer.for_comments(filter_config)
+    except (re.error, ValueError) as e:
+        logger.error(f"خطأ في إعدادات ai_reference_filter، سيتم استخدام القيم الافتراضية: {e}")
+        ai_sanitizer = TextSanitizer.from_config()
+        comment_sanitizer = TextSanitizer.for_comments()
+
+    menu_lookup = build_menu_lookup(main_menu, main_menu_aliases)
+
+    build_ms = round((time.perf_counter() - started) * 1000, 3)
+    return KnowledgeSnapshot(
+        data, version, faq_index, matcher, ai_sanitizer, comment_sanitizer, menu_lookup, build_ms,
+        services_by_id=build_service_index()
+    )
+
+
+def _package_version(name: str) -> str:
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return ""
+
+
+def snapshot_fingerprint(raw_data: bytes, keyword_groups: Dict[str, Any],
+                         main_menu: Dict[str, Any], main_menu_aliases: List[str]) -> str:
+    """
+    بصمة كل مدخلات اللقطة: محتوى data.json والقوائم والكلمات المفتاحية المعرفة في الكود
+    وكتالوج الخدمات، مع إصدار الصيغة وإصدار Python و scikit-learn (المحول محفوظ داخل الملف)
+
+    :param raw_data: محتوى ملف البيانات كما هو على القرص
+    :param keyword_groups: مجموعات الكلمات المفتاحية المسجلة
+    :param main_menu: هيكل القائمة الرئيسية
+    :param main_menu_aliases: العبارات التي تطلب القائمة الرئيسية
+    :return: البصمة (sha256)
+    """
+    code_inputs = json.dumps(
+        [keyword_groups, main_menu, main_menu_aliases, services_data.get_all_services()],
+        ensure_ascii=False, sort_keys=True, default=str
+    )
+    digest = hashlib.sha256()
+    digest.update(f"{SNAPSHOT_FORMAT}|{sys.version_info[:2]}|{_package_version('scikit-learn')}|".encode("utf-8"))
+    digest.update(hashlib.sha256(raw_data).digest())
+    digest.update(code_inputs.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def save_compiled_snapshot(snapshot: KnowledgeSnapshot, path: str, fingerprint: str) -> int:
+    """
+    حفظ اللقطة في ملف ثنائي (الكتابة في ملف مؤقت ثم استبداله حتى لا يُقرأ ملف ناقص)
+
+    :param snapshot: اللقطة
+    :param path: مسار الملف المترجم
+    :param fingerprint: بصمة المدخلات التي بُنيت منها اللقطة
+    :return: حجم الملف بالبايت
+    """
+    payload = {"format": SNAPSHOT_FORMAT, "fingerprint": fingerprint, "snapshot": snapshot}
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)
+    return os.path.getsize(path)
+
+
+def load_compiled_snapshot(path: str, fingerprint: str) -> Optional[KnowledgeSnapshot]:
+    """
+    تحميل اللقطة المترجمة إذا كانت مبنية من نفس المدخلات الحالية
+    (الملف يُنتج في خطوة البناء على نفس الخادم ولا يُقرأ من مصدر غير موثوق)
+
+    :param path: مسار الملف المترجم
+    :param fingerprint: بصمة المدخلات الحالية
+    :return: اللقطة، أو None إذا لم يكن الملف موجوداً أو كان قديماً أو تالفاً
+    """
+    if not path or not os.path.exists(path):
+        return None
+
+    started = time.perf_counter()
+    try:
+        with open(path, "rb") as f:
+            payload = pickle.load(f)
+    except Exception as e:
+        # ملف تالف أو بُني من إصدار مختلف من الكود
+        logger.warning(f"تعذر قراءة اللقطة المترجمة {path}، سيتم البناء من JSON: {e}")
+        return None
+
+    if (not isinstance(payload, dict) or payload.get("format") != SNAPSHOT_FORMAT
+            or payload.get("fingerprint") != fingerprint):
+        logger.info(f"اللقطة المترجمة {path} قديمة (تغيرت البيانات أو الكود)، سيتم البناء من JSON")
+        return None
+
+    snapshot = payload["snapshot"]
+    snapshot.source = "compiled"
+    snapshot.loaded_at = time.time()
+    snapshot.build_ms = round((time.perf_counter() - started) * 1000, 3)
+    return snapshot
+
+
+def main() -> int:
+    """
+    خطوة البناء: ترجمة قاعدة المعرفة الحالية إلى ملف ثنائي
+    """
+    parser = argparse.ArgumentParser(description="ترجمة data.json وقوائم الشات بوت إلى لقطة ثنائية للإقلاع السريع")
+    parser.add_argument("--output", default=BOT_SETTINGS.get("KNOWLEDGE_SNAPSHOT_FILE") or "knowledge.snapshot",
+                        help="مسار الملف المترجم")
+    parser.add_argument("--data-file", default=None, help="ملف البيانات (افتراضياً DATA_FILE)")
+    args = parser.parse_args()
+
+    # استيراد متأخر: الشات بوت يعرف القوائم والكلمات المفتاحية التي تدخل في اللقطة
+    from bot import ChatBot
+    from state_store import InMemoryStateStore
+
+    chatbot = ChatBot(data_file=args.data_file, state_store=InMemoryStateStore())
+    try:
+        size = chatbot.save_knowledge_snapshot(args.output)
+    finally:
+        chatbot.shutdown()
+
+    if size is None:
+        print(f"فشل في ترجمة قاعدة المعرفة من {chatbot.data_file}")
+        return 1
+    print(f"تم حفظ اللقطة المترجمة في {args.output} ({size} بايت)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
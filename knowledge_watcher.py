@@ -0,0 +1,160 @@
+"""
+مراقب ملفات قاعدة المعرفة لإعادة التحميل دون إعادة تشغيل العمال
+يفحص توقيع الملف (وقت التعديل والحجم) كل فترة في خيط خلفي، وعند تغيره
+يطلب من الشات بوت بناء لقطة جديدة واستبدالها بشكل ذري
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Dict, List, Any, Optional, Tuple
+
+from config import BOT_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+
+class KnowledgeWatcher:
+    """
+    خيط خلفي يراقب ملفات قاعدة المعرفة ويعيد تحميلها عند تغيرها
+    """
+
+    def __init__(self, chatbot, paths: Optional[List[str]] = None, poll_interval: Optional[float] = None):
+        """
+        تهيئة المراقب
+
+        :param chatbot: كائن الشات بوت (يوفر reload_knowledge)
+        :param paths: الملفات المراقبة (افتراضياً ملف بيانات الشات بوت)
+        :param poll_interval: الفترة بين فحصين بالثواني (0 لتعطيل المراقبة)
+        """
+        self.chatbot = chatbot
+        self.paths = [os.path.abspath(path) for path in (paths or [chatbot.data_file])]
+        self.poll_interval = (
+            poll_interval if poll_interval is not None
+            else BOT_SETTINGS.get("KNOWLEDGE_RELOAD_INTERVAL", 5.0)
+        )
+
+        self._signatures: Dict[str, Optional[Tuple[int, int]]] = {
+            path: self._signature(path) for path in self.paths
+        }
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self._stats = {
+            "checks": 0,
+            "changes_detected": 0,
+            "reloads": 0,
+            "failures": 0,
+            "last_reload_ms": 0.0,
+            "last_reload_at": None,
+            "last_error": None
+        }
+
+    @staticmethod
+    def _signature(path: str) -> Optional[Tuple[int, int]]:
+        """
+        توقيع الملف (وقت التعديل بالنانو ثانية، الحجم) أو None إذا لم يكن موجوداً
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def start(self) -> bool:
+        """
+        تشغيل خيط المراقبة
+
+        :return: True إذا تم التشغيل، False إذا كانت المراقبة معطلة أو تعمل بالفعل
+        """
+        if self.poll_interval <= 0:
+            logger.info("مراقبة ملفات قاعدة المعرفة معطلة (KNOWLEDGE_RELOAD_INTERVAL=0)")
+            return False
+
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="knowledge-watcher", daemon=True)
+            self._thread.start()
+
+        logger.info(f"تم تشغيل مراقب قاعدة المعرفة: {len(self.paths)} ملف كل {self.poll_interval} ثانية")
+        return True
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """
+        إيقاف خيط المراقبة
+
+        :param timeout: أقصى مدة انتظار لانتهاء الخيط بالثواني
+        """
+        self._stop_event.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                self.check_now()
+            except Exception as e:
+                # لا يجب أن يتوقف المراقب بسبب خطأ غير متوقع
+                logger.error(f"خطأ في مراقب قاعدة المعرفة: {e}")
+
+    def check_now(self) -> bool:
+        """
+        فحص الملفات فوراً وإعادة التحميل إذا تغير أي منها
+
+        :return: True إذا تم اكتشاف تغيير وإعادة التحميل بنجاح
+        """
+        changed = []
+        with self._lock:
+            self._stats["checks"] += 1
+            for path in self.paths:
+                signature = self._signature(path)
+                if signature is not None and signature != self._signatures.get(path):
+                    self._signatures[path] = signature
+                    changed.append(path)
+            if not changed:
+                return False
+            self._stats["changes_detected"] += 1
+
+        logger.info(f"تم اكتشاف تغيير في ملفات قاعدة المعرفة: {', '.join(changed)}")
+        started = time.perf_counter()
+        try:
+            reloaded = self.chatbot.reload_knowledge()
+            error = None if reloaded else "تعذر تحميل الملف، تم الإبقاء على النسخة الحالية"
+        except Exception as e:
+            reloaded = False
+            error = str(e)
+        reload_ms = round((time.perf_counter() - started) * 1000, 3)
+
+        with self._lock:
+            self._stats["last_reload_ms"] = reload_ms
+            if reloaded:
+                self._stats["reloads"] += 1
+                self._stats["last_reload_at"] = time.time()
+                self._stats["last_error"] = None
+            else:
+                self._stats["failures"] += 1
+                self._stats["last_error"] = error
+
+        if reloaded:
+            logger.info(f"تمت إعادة تحميل قاعدة المعرفة خلال {reload_ms:.1f}ms")
+        else:
+            logger.error(f"فشلت إعادة تحميل قاعدة المعرفة: {error}")
+        return reloaded
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        حالة المراقب
+
+        :return: قاموس يحتوي على عدد الفحوص والتغييرات وإعادات التحميل وآخر خطأ
+        """
+        with self._lock:
+            status = dict(self._stats)
+        status["running"] = self._thread is not None and self._thread.is_alive()
+        status["poll_interval"] = self.poll_interval
+        status["paths"] = list(self.paths)
+        return status
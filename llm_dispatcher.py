@@ -0,0 +1,309 @@
+"""
+موزع طلبات نموذج اللغة بين مزود أساسي (DeepSeek) ومزود ثانوي (OpenAI) حسب زمن الاستجابة
+إذا تأخر المزود الأساسي عن نسبة مئوية من زمنه المعتاد (p95 افتراضياً) يُرسل طلب احتياطي (hedge)
+للمزود الثانوي، ويُؤخذ أول رد صالح ويُلغى الآخر. وإذا فشل الأساسي يُرسل الطلب للثانوي فوراً (failover)
+
+الطلبات الاحتياطية محدودة بميزانية (نسبة من الطلبات) حتى لا تتضاعف التكلفة عند بطء المزود الأساسي لفترة طويلة
+"""
+
+import math
+import bisect
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Dict, List, Any, AsyncIterator, Optional
+
+from config import API_SETTINGS
+from async_api import AsyncLLMClient, LLMDeadlineExceeded
+from resilience import RetryBudget, CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+# حدود فئات مدرج زمن الاستجابة بالمللي ثانية (الفئة الأخيرة لما يتجاوز آخر حد)
+LATENCY_BUCKETS_MS = (50, 100, 200, 350, 500, 750, 1000, 1500, 2000, 3000, 5000, 8000, 13000, 20000, 30000, 60000)
+
+
+class LatencyHistogram:
+    """
+    مدرج زمن استجابة مزود: فئات تراكمية للمقاييس ونافذة لآخر القيم لحساب النسب المئوية
+    """
+
+    def __init__(self, window: int = None):
+        """
+        تهيئة المدرج
+
+        :param window: عدد آخر القيم المستخدمة في حساب النسب المئوية
+        """
+        self.window = window or API_SETTINGS.get("HEDGE_LATENCY_WINDOW", 500)
+        self._recent = deque(maxlen=self.window)
+        self._buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self._count = 0
+        self._errors = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, ok: bool = True) -> None:
+        """
+        تسجيل زمن طلب
+
+        :param seconds: الزمن بالثواني
+        :param ok: نجح الطلب (زمن الطلبات الفاشلة لا يدخل في النسب المئوية)
+        """
+        ms = seconds * 1000
+        with self._lock:
+            self._count += 1
+            self._buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+            if ok:
+                self._recent.append(ms)
+            else:
+                self._errors += 1
+
+    def samples(self) -> int:
+        with self._lock:
+            return len(self._recent)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        نسبة مئوية من آخر القيم الناجحة
+
+        :param q: النسبة (0-100)
+        :return: الزمن بالمللي ثانية أو None إذا لم توجد قيم
+        """
+        with self._lock:
+            values = sorted(self._recent)
+        if not values:
+            return None
+        # الرتبة الأقرب (nearest-rank)
+        index = max(0, math.ceil(q / 100 * len(values)) - 1)
+        return values[index]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        إحصائيات المدرج
+
+        :return: قاموس بعدد الطلبات والأخطاء والنسب المئوية وعدد كل فئة
+        """
+        with self._lock:
+            buckets = list(self._buckets)
+            count, errors = self._count, self._errors
+        labels = [f"<={bound}ms" for bound in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        return {
+            "count": count,
+            "errors": errors,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "buckets": dict(zip(labels, buckets))
+        }
+
+
+class HedgeBudget(RetryBudget):
+    """
+    ميزانية الطلبات الاحتياطية: كل طلب يضيف ratio من الرصيد (حتى burst) وكل طلب احتياطي يستهلك 1
+    فلا تتجاوز الطلبات الاحتياطية على المدى الطويل ratio من عدد الطلبات
+    """
+
+    def __init__(self, ratio: float = None, burst: float = None):
+        """
+        تهيئة الميزانية
+
+        :param ratio: أقصى نسبة للطلبات الاحتياطية من عدد الطلبات
+        :param burst: أقصى رصيد متراكم
+        """
+        super().__init__(
+            ratio if ratio is not None else API_SETTINGS.get("HEDGE_BUDGET_RATIO", 0.1),
+            burst if burst is not None else API_SETTINGS.get("HEDGE_BUDGET_BURST", 10)
+        )
+
+
+class HedgedLLMClient:
+    """
+    عميل غير متزامن بنفس عقد AsyncLLMClient يوزع الطلب بين مزودين مع طلبات احتياطية وتحويل عند الفشل
+    """
+
+    def __init__(self, primary: AsyncLLMClient, secondary: AsyncLLMClient, percentile: float = None,
+                 initial_delay: float = None, min_samples: int = None, budget: Optional[HedgeBudget] = None):
+        """
+        تهيئة الموزع
+
+        :param primary: المزود الأساسي
+        :param secondary: المزود الثانوي
+        :param percentile: النسبة المئوية لزمن الأساسي التي يُرسل بعدها الطلب الاحتياطي
+        :param initial_delay: مهلة الطلب الاحتياطي بالثواني قبل تجمع قيم كافية
+        :param min_samples: أقل عدد قيم لاستخدام النسبة المئوية
+        :param budget: ميزانية الطلبات الاحتياطية (اختياري، من الإعدادات)
+        """
+        self.primary = primary
+        self.secondary = secondary
+        self.percentile = percentile or API_SETTINGS.get("HEDGE_PERCENTILE", 95)
+        self.initial_delay = initial_delay if initial_delay is not None else API_SETTINGS.get("HEDGE_INITIAL_DELAY", 2.0)
+        self.min_samples = min_samples if min_samples is not None else API_SETTINGS.get("HEDGE_MIN_SAMPLES", 20)
+        self.budget = budget if budget is not None else HedgeBudget()
+        self.histograms = {primary.provider: LatencyHistogram(), secondary.provider: LatencyHistogram()}
+
+        # نفس خصائص المزود الأساسي (مفتاح الذاكرة والواجهة المتزامنة تعتمد عليها)
+        self.provider = primary.provider
+        self.api_key = primary.api_key
+        self.default_model = primary.default_model
+        self.max_tokens = primary.max_tokens
+        self.temperature = primary.temperature
+        self.deadline = primary.deadline
+
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "hedged": 0,
+            "hedge_denied": 0,
+            "failover": 0,
+            "won_primary": 0,
+            "won_secondary": 0,
+            "failed": 0
+        }
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def hedge_delay(self) -> float:
+        """
+        المدة بالثواني قبل إرسال الطلب الاحتياطي (النسبة المئوية لزمن المزود الأساسي)
+
+        :return: المدة
+        """
+        histogram = self.histograms[self.primary.provider]
+        if histogram.samples() < self.min_samples:
+            return self.initial_delay
+        return histogram.percentile(self.percentile) / 1000
+
+    async def _timed(self, client: AsyncLLMClient, prompt: str, context: Optional[str],
+                     model: Optional[str], deadline: float) -> str:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            response = await client.generate_response(prompt, context=context, model=model, deadline=deadline)
+        except asyncio.CancelledError:
+            # الطلب الخاسر استغرق هذه المدة على الأقل: تسجيلها يمنع النسبة المئوية من الانخفاض
+            # إذا كانت الطلبات البطيئة تُلغى دائماً
+            self.histograms[client.provider].record(loop.time() - started)
+            raise
+        except CircuitOpenError:
+            # رُفض دون طلب فعلي: لا زمن يُسجل (والتحويل للمزود الآخر فوري)
+            raise
+        except Exception:
+            self.histograms[client.provider].record(loop.time() - started, ok=False)
+            raise
+        if not isinstance(response, str) or not response.strip():
+            self.histograms[client.provider].record(loop.time() - started, ok=False)
+            raise Exception(f"رد فارغ من {client.provider} API")
+        self.histograms[client.provider].record(loop.time() - started)
+        return response
+
+    async def generate_response(self, prompt: str, context: str = None, model: str = None,
+                                deadline: float = None) -> str:
+        """
+        توليد رد من أول مزود يرد رداً صالحاً
+
+        :param prompt: سؤال المستخدم
+        :param context: سياق المحادثة (اختياري)
+        :param model: اسم نموذج المزود الأساسي (اختياري، المزود الثانوي يستخدم نموذجه الافتراضي)
+        :param deadline: مهلة الطلب كاملاً بالثواني (اختياري)
+        :return: النص المولد
+        :raises: آخر خطأ إذا فشل المزودان
+        """
+        deadline = deadline or self.deadline
+        loop = asyncio.get_running_loop()
+        expires = loop.time() + deadline
+        self._count("requests")
+        self.budget.deposit()
+
+        primary = asyncio.ensure_future(self._timed(self.primary, prompt, context, model, deadline))
+        secondary = None
+        pending = {primary}
+
+        def start_secondary() -> None:
+            nonlocal secondary
+            remaining = max(expires - loop.time(), 0.001)
+            secondary = asyncio.ensure_future(self._timed(self.secondary, prompt, context, None, remaining))
+            pending.add(secondary)
+
+        errors: List[BaseException] = []
+        try:
+            done, _ = await asyncio.wait(pending, timeout=self.hedge_delay())
+            if not done:
+                if self.budget.withdraw():
+                    self._count("hedged")
+                    logger.debug(f"طلب احتياطي إلى {self.secondary.provider} بعد تأخر {self.primary.provider}")
+                    start_secondary()
+                else:
+                    self._count("hedge_denied")
+
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    pending.discard(task)
+                    if task.exception() is None:
+                        self._count("won_primary" if task is primary else "won_secondary")
+                        return task.result()
+                    errors.append(task.exception())
+                    if task is primary and secondary is None and loop.time() < expires:
+                        self._count("failover")
+                        logger.warning(f"فشل {self.primary.provider} API، التحويل إلى {self.secondary.provider}: {task.exception()}")
+                        start_secondary()
+        finally:
+            # إلغاء الطلب الخاسر (أو كل الطلبات إذا أُلغي المستدعي)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        self._count("failed")
+        raise errors[-1] if errors else LLMDeadlineExceeded("تجاوز الطلب المهلة")
+
+    async def stream_response(self, prompt: str, context: str = None, model: str = None,
+                              deadline: float = None) -> AsyncIterator[str]:
+        """
+        توليد رد كبث من المزود الأساسي، مع التحويل إلى الثانوي إذا فشل قبل أول جزء
+        (لا طلبات احتياطية للبث لأن الأجزاء تُرسل للمستخدم فور وصولها)
+
+        :return: مولد غير متزامن لأجزاء النص
+        """
+        self._count("requests")
+        started = False
+        try:
+            async for part in self.primary.stream_response(prompt, context=context, model=model, deadline=deadline):
+                started = True
+                yield part
+            self._count("won_primary")
+            return
+        except Exception as e:
+            if started:
+                self._count("failed")
+                raise
+            self._count("failover")
+            logger.warning(f"فشل بث {self.primary.provider} API، التحويل إلى {self.secondary.provider}: {e}")
+
+        async for part in self.secondary.stream_response(prompt, context=context, deadline=deadline):
+            yield part
+        self._count("won_secondary")
+
+    async def aclose(self) -> None:
+        await self.primary.aclose()
+        await self.secondary.aclose()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        إحصائيات الموزع
+
+        :return: قاموس بعدد الطلبات والاحتياطية والمرفوضة بالميزانية والتحويلات والفائز ومدرج كل مزود
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            "hedge_delay_ms": round(self.hedge_delay() * 1000, 1),
+            "budget_balance": self.budget.balance,
+            "providers": {
+                client.provider: dict(client.get_stats(), latency=self.histograms[client.provider].get_stats())
+                for client in (self.primary, self.secondary)
+            }
+        })
+        return stats
@@ -11,11 +11,11 @@ import random
 import datetime
 import subprocess
 import logging
-import re
 from typing import Dict, Any, Optional, Tuple, List
 
 from bot import ChatBot
 from config import BOT_SETTINGS, APP_SETTINGS, init
+from data_repository import get_data_repository
 
 # تهيئة الإعدادات
 init()
@@ -121,14 +121,13 @@ def test_connection() -> bool:
 
 def load_data_file(data_file: str = "data.json") -> Dict:
     """
-    تحميل بيانات من ملف JSON
+    تحميل بيانات من ملف JSON (من المستودع المشترك، يعاد التحليل فقط عند تغير الملف)
     
     :param data_file: مسار ملف البيانات
-    :return: البيانات المحملة كقاموس
+    :return: البيانات المحملة كقاموس (مشتركة، يجب عدم تعديلها)
     """
     try:
-        with open(data_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return get_data_repository().load(data_file)
     except Exception as e:
         print(f"خطأ في تحميل ملف البيانات: {e}")
         return {}
@@ -147,6 +146,119 @@ def match_keywords(message: str, keywords: List[str]) -> bool:
             return True
     return False
 
+# درجة إضافية عندما يرد نص السؤال كاملاً داخل الرسالة
+FAQ_EXACT_MATCH_BONUS = 0.3
+
+# عدد الرسائل التي تُضرب في مصفوفة الأسئلة في كل دفعة (للحد من حجم مصفوفة النتائج)
+FAQ_BATCH_CHUNK = 256
+
+_WORD_PATTERN = r'\b\w+\b'
+
+
+class _FAQMatrix:
+    """
+    كلمات الأسئلة الشائعة محسوبة مرة واحدة في مصفوفة متفرقة (سؤال × كلمة)
+    """
+
+    def __init__(self, prompts: List[Dict]):
+        # استيراد متأخر: المكتبات مطلوبة فقط عند البحث في الأسئلة
+        import numpy as np
+        from sklearn.feature_extraction.text import CountVectorizer
+
+        self.np = np
+        self.prompts = prompts
+        self.questions = [prompt.get("question", "").lower() for prompt in prompts]
+        self.vectorizer = CountVectorizer(binary=True, token_pattern=_WORD_PATTERN, dtype=np.float64)
+        try:
+            # مصفوفة ثنائية منقولة (كلمة × سؤال) ليكون ضرب الرسائل فيها مباشراً
+            self.matrix_t = self.vectorizer.fit_transform(self.questions).T.tocsr()
+        except ValueError:
+            # لا توجد أي كلمات في الأسئلة
+            self.matrix_t = None
+            return
+
+        # عدد الكلمات الفريدة في كل سؤال (مقام درجة التطابق) وطول نصه (لفحص التطابق الدقيق)
+        self.word_counts = np.asarray(self.matrix_t.sum(axis=0)).ravel()
+        self.question_lengths = np.array([len(question) for question in self.questions])
+
+    def search(self, messages: List[str], top_k: int) -> List[List[Tuple[Dict, float]]]:
+        """
+        أفضل k أسئلة لكل رسالة (الترتيب تنازلي حسب الثقة، والتعادل لصالح السؤال الأسبق)
+        """
+        np = self.np
+        results = []
+        for offset in range(0, len(messages), FAQ_BATCH_CHUNK):
+            chunk = [message.lower() for message in messages[offset:offset + FAQ_BATCH_CHUNK]]
+            if self.matrix_t is None:
+                results.extend([] for _ in chunk)
+                continue
+
+            # عدد الكلمات المشتركة بين كل رسالة وكل سؤال في ضرب واحد (رسالة × سؤال)
+            common = (self.vectorizer.transform(chunk) @ self.matrix_t).tocsr()
+            for row, message in enumerate(chunk):
+                row_start, row_end = common.indptr[row], common.indptr[row + 1]
+                candidates = common.indices[row_start:row_end]
+                if not len(candidates):
+                    results.append([])
+                    continue
+
+                scores = common.data[row_start:row_end] / self.word_counts[candidates]
+
+                # التطابق الدقيق يُفحص فقط للأسئلة التي قد تدخل أفضل k بعد إضافة الدرجة
+                kth_best = np.partition(scores, -min(top_k, len(scores)))[-min(top_k, len(scores))]
+                reachable = np.flatnonzero(
+                    (scores + FAQ_EXACT_MATCH_BONUS >= kth_best)
+                    & (self.question_lengths[candidates] <= len(message))
+                )
+                for position in reachable:
+                    if self.questions[candidates[position]] in message:
+                        scores[position] += FAQ_EXACT_MATCH_BONUS
+
+                order = np.lexsort((candidates, -scores))[:top_k]
+                results.append([(self.prompts[candidates[i]], float(scores[i])) for i in order])
+        return results
+
+
+# آخر مصفوفة مبنية: (قائمة الأسئلة، نصوصها، المصفوفة)
+_faq_matrix_cache: Optional[Tuple[List[Dict], Tuple[str, ...], _FAQMatrix]] = None
+
+
+def _get_faq_matrix(prompts: List[Dict]) -> _FAQMatrix:
+    """
+    مصفوفة الأسئلة المبنية مسبقاً (يعاد بناؤها فقط عند تغير نصوص الأسئلة)
+    """
+    global _faq_matrix_cache
+    cached = _faq_matrix_cache
+    if cached is not None and cached[0] is prompts:
+        return cached[2]
+
+    key = tuple(prompt.get("question", "") for prompt in prompts)
+    if cached is not None and cached[1] == key:
+        _faq_matrix_cache = (prompts, key, cached[2])
+        return cached[2]
+
+    matrix = _FAQMatrix(prompts)
+    _faq_matrix_cache = (prompts, key, matrix)
+    logger.debug(f"تم بناء مصفوفة الأسئلة الشائعة: {len(prompts)} سؤال")
+    return matrix
+
+
+def search_faq_batch(messages: List[str], data: Dict, top_k: int = 1) -> List[List[Tuple[Dict, float]]]:
+    """
+    البحث عن أفضل الإجابات لمجموعة رسائل في ضرب مصفوفات واحد (لتقييم الأداء على دفعات كبيرة)
+    درجة الثقة = نسبة كلمات السؤال الموجودة في الرسالة + 0.3 إذا ورد السؤال كاملاً فيها
+    
+    :param messages: قائمة رسائل المستخدمين
+    :param data: بيانات المجمع
+    :param top_k: عدد النتائج لكل رسالة
+    :return: لكل رسالة قائمة من (السؤال والجواب، درجة الثقة) مرتبة تنازلياً
+    """
+    prompts = data.get("prompts", [])
+    if not prompts or not messages:
+        return [[] for _ in messages]
+    return _get_faq_matrix(prompts).search(list(messages), max(1, top_k))
+
+
 def search_faq(user_message: str, data: Dict) -> Tuple[Optional[str], float]:
     """
     البحث عن إجابة في قائمة الأسئلة الشائعة
@@ -155,39 +267,12 @@ def search_faq(user_message: str, data: Dict) -> Tuple[Optional[str], float]:
     :param data: بيانات المجمع
     :return: زوج من الإجابة ودرجة الثقة
     """
-    prompts = data.get("prompts", [])
-    best_match = None
-    best_confidence = 0.0
-    
-    user_message = user_message.lower()
-    
-    for prompt in prompts:
-        question = prompt.get("question", "").lower()
-        answer = prompt.get("answer", "")
-        
-        # البحث عن كلمات متطابقة
-        question_words = set(re.findall(r'\b\w+\b', question))
-        message_words = set(re.findall(r'\b\w+\b', user_message))
-        
-        if not question_words:
-            continue
-        
-        # حساب درجة التطابق
-        common_words = question_words.intersection(message_words)
-        
-        if len(common_words) > 0:
-            confidence = len(common_words) / len(question_words)
-            
-            # زيادة الثقة إذا كانت هناك تطابقات دقيقة
-            if question in user_message:
-                confidence += 0.3
-            
-            # تحديث أفضل تطابق
-            if confidence > best_confidence:
-                best_confidence = confidence
-                best_match = answer
+    matches = search_faq_batch([user_message], data)[0]
+    if not matches:
+        return None, 0.0
     
-    return best_match, best_confidence
+    prompt, confidence = matches[0]
+    return prompt.get("answer", ""), confidence
 
 def get_contact_info(data: Dict) -> str:
     """
@@ -558,8 +643,7 @@ def get_predefined_responses():
     """الحصول على الردود المحفوظة مسبقًا من ملف البيانات"""
     try:
         # قراءة بيانات الأسئلة والأجوبة من ملف البيانات
-        with open(BOT_SETTINGS.get("DATA_FILE", "data.json"), 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = get_data_repository().load(BOT_SETTINGS.get("DATA_FILE", "data.json"))
         
         # تحويل بيانات الأسئلة والأجوبة إلى تنسيق مناسب للواجهة
         responses = {}
@@ -4,11 +4,15 @@
 """
 
 import json
+import time
 import logging
+import threading
 import requests
-from typing import Dict, List, Any, Optional, Union
+from urllib3.exceptions import NewConnectionError
+from typing import Dict, List, Any, Callable, Optional, Union
 
-from config import FACEBOOK_SETTINGS, APP_SETTINGS
+from config import API_SETTINGS, FACEBOOK_SETTINGS, APP_SETTINGS
+from resilience import CircuitOpenError, get_endpoint, upstream_error
 
 # إعداد التسجيل
 logging.basicConfig(
@@ -18,9 +22,46 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def _failed_before_sending(error: requests.exceptions.RequestException) -> bool:
+    """
+    هل فشل الطلب قبل إرسال أي بايت (تعذر إنشاء الاتصال أو انتهاء مهلته)
+    أما انقطاع الاتصال بعد الإرسال فقد تكون الرسالة وصلت، وإعادتها ترسلها للمستخدم مرتين
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(error, requests.exceptions.ConnectionError) and isinstance(reason, NewConnectionError)
+
+def _post_message(url: str, payload: Dict, recipient_id: str) -> Dict:
+    """
+    محاولة واحدة لإرسال رسالة
+
+    :return: استجابة API أو قاموس خطأ للأخطاء الدائمة (مثل مستخدم حظر الصفحة)
+    :raises: UpstreamError للأخطاء المؤقتة (تعذر الاتصال، 429، 5xx) حتى يعاد إرسالها،
+             وللأخطاء بعد الإرسال (انقطاع الاتصال، انتهاء مهلة القراءة) دون إعادة
+    """
+    try:
+        response = requests.post(
+            url, json=payload, headers={"Content-Type": "application/json"},
+            timeout=(API_SETTINGS.get("HTTP_CONNECT_TIMEOUT", 5), FACEBOOK_SETTINGS.get("SEND_TIMEOUT", 10))
+        )
+    except requests.exceptions.RequestException as e:
+        # الإرسال طلب POST غير متكرر الأثر: يعاد فقط إذا لم يغادر الطلب الجهاز
+        raise upstream_error(str(e), retryable=_failed_before_sending(e))
+
+    if response.status_code == 200:
+        logger.info(f"تم إرسال رسالة بنجاح إلى المستخدم {recipient_id}")
+        return response.json()
+
+    logger.error(f"فشل إرسال الرسالة: {response.status_code} - {response.text}")
+    error = upstream_error(f"Failed to send message: {response.status_code} - {response.text}", response)
+    if error.retryable:
+        raise error
+    return {"error": str(error)}
+
 def send_messenger_message(recipient_id: str, message_data: Dict) -> Dict:
     """
-    إرسال رسالة إلى مستخدم ماسنجر
+    إرسال رسالة إلى مستخدم ماسنجر (مع إعادة المحاولة للأخطاء المؤقتة وقاطع دائرة لـ Graph API)
     
     :param recipient_id: معرف المستخدم
     :param message_data: بيانات الرسالة
@@ -39,16 +80,11 @@ def send_messenger_message(recipient_id: str, message_data: Dict) -> Dict:
             "message": message_data
         }
         
-        headers = {"Content-Type": "application/json"}
-        
-        response = requests.post(url, json=payload, headers=headers)
-        
-        if response.status_code == 200:
-            logger.info(f"تم إرسال رسالة بنجاح إلى المستخدم {recipient_id}")
-            return response.json()
-        else:
-            logger.error(f"فشل إرسال الرسالة: {response.status_code} - {response.text}")
-            return {"error": f"Failed to send message: {response.status_code} - {response.text}"}
+        return get_endpoint("messenger").call(lambda: _post_message(url, payload, recipient_id))
+    
+    except CircuitOpenError as e:
+        logger.warning(f"لم يتم إرسال رسالة إلى المستخدم {recipient_id}: {e}")
+        return {"error": str(e)}
     
     except Exception as e:
         logger.error(f"حدث خطأ أثناء إرسال رسالة: {e}")
@@ -449,6 +485,235 @@ def format_text_with_quick_replies(text: str, quick_replies_data: List[Dict]) ->
         "quick_replies": quick_replies_data
     }
 
+# حد أقصى لعدد الأحرف في رسالة ماسنجر فيسبوك (استناداً على حدود منصة فيسبوك)
+MAX_MESSAGE_LENGTH = 2000
+
+def split_message(text: str, max_length: int = MAX_MESSAGE_LENGTH) -> List[str]:
+    """
+    تقسيم ذكي للرسالة الطويلة على أساس الفقرات والجمل لتجنب قطع الجمل
+    
+    :param text: نص الرسالة
+    :param max_length: الحد الأقصى لطول الجزء
+    :return: أجزاء الرسالة (الرسالة كاملة إذا كانت ضمن الحد)
+    """
+    # تقسيم الرسائل الطويلة فقط عند تجاوز حد الأحرف المسموح به
+    if len(text) <= max_length:
+        return [text]
+    
+    message_parts = []
+    current_part = ""
+    
+    # تقسيم الرسالة إلى فقرات أولاً
+    paragraphs = text.split('\n\n')
+    
+    for paragraph in paragraphs:
+        # إذا كانت الفقرة نفسها أكبر من الحد الأقصى، نقسمها إلى جمل
+        if len(paragraph) > max_length:
+            sentences = paragraph.replace('\n', ' ').split('. ')
+            for sentence in sentences:
+                if len(current_part + sentence + '. ') <= max_length:
+                    current_part += sentence + '. '
+                else:
+                    # إذا كانت الجملة الواحدة أكبر من الحد الأقصى، نقسمها
+                    if len(sentence) > max_length:
+                        sentence_chunks = [sentence[i:i+max_length] 
+                                          for i in range(0, len(sentence), max_length)]
+                        
+                        # إضافة الجزء الحالي إذا لم يكن فارغاً
+                        if current_part:
+                            message_parts.append(current_part)
+                            current_part = ""
+                        
+                        # إضافة أجزاء الجملة الطويلة
+                        message_parts.extend(sentence_chunks[:-1])
+                        current_part = sentence_chunks[-1] + '. '
+                    else:
+                        # حفظ الجزء الحالي وبدء جزء جديد
+                        message_parts.append(current_part)
+                        current_part = sentence + '. '
+        else:
+            # التحقق مما إذا كانت إضافة الفقرة ستتجاوز الحد الأقصى
+            if len(current_part + '\n\n' + paragraph) <= max_length:
+                if current_part:
+                    current_part += '\n\n'
+                current_part += paragraph
+            else:
+                # حفظ الجزء الحالي وبدء جزء جديد
+                message_parts.append(current_part)
+                current_part = paragraph
+    
+    # إضافة الجزء الأخير إذا لم يكن فارغاً
+    if current_part:
+        message_parts.append(current_part)
+    
+    logger.info(f"تم تقسيم الرسالة ({len(text)} حرف) إلى {len(message_parts)} أجزاء")
+    return message_parts
+
+# إحصائيات زمن أول رسالة لكل طريقة إرسال (بث تدريجي أو رد كامل)
+_delivery_lock = threading.Lock()
+_delivery_stats = {
+    mode: {"responses": 0, "messages": 0, "failed_messages": 0, "total_first_message_ms": 0.0,
+           "max_first_message_ms": 0.0}
+    for mode in ("streamed", "buffered", "interrupted")
+}
+
+def _record_delivery(mode: str, first_message_ms: Optional[float], messages: int, failed: int = 0) -> None:
+    with _delivery_lock:
+        stats = _delivery_stats[mode]
+        stats["messages"] += messages
+        stats["failed_messages"] += failed
+        if first_message_ms is not None:
+            stats["responses"] += 1
+            stats["total_first_message_ms"] += first_message_ms
+            stats["max_first_message_ms"] = max(stats["max_first_message_ms"], first_message_ms)
+
+def get_delivery_stats() -> Dict[str, Any]:
+    """
+    إحصائيات إرسال ردود ماسنجر
+    
+    :return: لكل طريقة: عدد الردود والرسائل المرسلة والتي تعذر إرسالها ومتوسط وأقصى زمن أول رسالة بالمللي ثانية
+    """
+    with _delivery_lock:
+        result = {}
+        for mode, stats in _delivery_stats.items():
+            stats = dict(stats)
+            total = stats.pop("total_first_message_ms")
+            stats["avg_first_message_ms"] = round(total / stats["responses"], 1) if stats["responses"] else 0.0
+            stats["max_first_message_ms"] = round(stats["max_first_message_ms"], 1)
+            result[mode] = stats
+        return result
+
+class MessengerDelivery:
+    """
+    مرحلة إرسال رد إلى مستخدم ماسنجر، كاملاً أو تدريجياً أثناء بث الرد من نموذج اللغة:
+    أول فقرة مكتملة تُرسل فوراً، والفقرات التالية تُجمع في رسائل حتى حد الأحرف
+    وتُنقى كل فقرة (من إشارات الذكاء الاصطناعي مثلاً) قبل إرسالها
+    """
+    
+    def __init__(self, recipient_id: str, sanitize: Optional[Callable[[str], str]] = None,
+                 send: Optional[Callable[[str, str], Any]] = None, max_length: int = MAX_MESSAGE_LENGTH,
+                 started: Optional[float] = None):
+        """
+        تهيئة مرحلة الإرسال
+        
+        :param recipient_id: معرف المستخدم
+        :param sanitize: دالة تنقية لكل فقرة قبل إرسالها (اختياري)
+        :param send: دالة الإرسال (اختياري، send_text_message افتراضياً)
+        :param max_length: الحد الأقصى لطول الرسالة
+        :param started: وقت استلام رسالة المستخدم من time.perf_counter() (لقياس زمن أول رسالة)
+        """
+        self.recipient_id = recipient_id
+        self.sanitize = sanitize
+        self.send = send or send_text_message
+        self.max_length = max_length
+        self.started = started if started is not None else time.perf_counter()
+        
+        # النص المبثوث الذي لم تكتمل فقرته بعد، والفقرات المنقاة التي لم تُرسل بعد
+        self._buffer = ""
+        self._pending = ""
+        # الرسائل التي وصلت فعلاً والتي تعذر إرسالها (send_messenger_message تعيد {"error": ...})
+        self.sent: List[str] = []
+        self.failed: List[str] = []
+        self.first_message_ms: Optional[float] = None
+        self.finished = False
+    
+    @property
+    def text(self) -> str:
+        """
+        النص الذي وصل للمستخدم فعلاً (بعد التنقية)
+        """
+        return "\n\n".join(self.sent)
+    
+    def _send(self, text: str) -> bool:
+        result = self.send(self.recipient_id, text)
+        if isinstance(result, dict) and "error" in result:
+            logger.warning(f"تعذر إرسال جزء من الرد إلى المستخدم {self.recipient_id}: {result['error']}")
+            self.failed.append(text)
+            return False
+        if self.first_message_ms is None:
+            self.first_message_ms = round((time.perf_counter() - self.started) * 1000, 2)
+        self.sent.append(text)
+        return True
+    
+    def _flush_pending(self) -> None:
+        if self._pending:
+            self._send(self._pending)
+            self._pending = ""
+    
+    def _add_paragraph(self, paragraph: str) -> None:
+        if self.sanitize is not None:
+            paragraph = self.sanitize(paragraph)
+        paragraph = paragraph.strip()
+        if not paragraph:
+            return
+        
+        if not self.sent:
+            # أول فقرة تُرسل فور اكتمالها
+            for part in split_message(paragraph, self.max_length):
+                self._send(part)
+            return
+        
+        if self._pending and len(self._pending) + 2 + len(paragraph) <= self.max_length:
+            self._pending += "\n\n" + paragraph
+            return
+        
+        self._flush_pending()
+        parts = split_message(paragraph, self.max_length)
+        for part in parts[:-1]:
+            self._send(part)
+        self._pending = parts[-1]
+    
+    def feed(self, text: str) -> None:
+        """
+        إضافة جزء من الرد المبثوث وإرسال ما اكتمل
+        
+        :param text: جزء النص
+        """
+        self._buffer += text
+        while "\n\n" in self._buffer:
+            paragraph, self._buffer = self._buffer.split("\n\n", 1)
+            self._add_paragraph(paragraph)
+    
+    def finish(self) -> str:
+        """
+        إرسال ما تبقى من الرد المبثوث وتسجيل زمن أول رسالة
+        (finished صحيحة فقط إذا وصلت كل الرسائل)
+        
+        :return: النص الذي وصل للمستخدم فعلاً
+        """
+        self._add_paragraph(self._buffer)
+        self._buffer = ""
+        self._flush_pending()
+        self.finished = not self.failed
+        _record_delivery("streamed", self.first_message_ms, len(self.sent), len(self.failed))
+        return self.text
+    
+    def interrupt(self, note: str) -> str:
+        """
+        إنهاء بث انقطع بعد إرسال جزء من الرد: تُرسل الفقرات المكتملة ثم ملاحظة قصيرة،
+        وتُهمل الفقرة غير المكتملة (قد تنتهي في منتصف جملة)
+        
+        :param note: ملاحظة الاعتذار أو الاستمرار
+        :return: النص الذي وصل للمستخدم فعلاً
+        """
+        self._buffer = ""
+        self._add_paragraph(note)
+        self._flush_pending()
+        self.finished = not self.failed
+        _record_delivery("interrupted", self.first_message_ms, len(self.sent), len(self.failed))
+        return self.text
+    
+    def deliver(self, text: str) -> None:
+        """
+        إرسال رد كامل (غير مبثوث) مع تقسيمه عند تجاوز حد الأحرف
+        
+        :param text: الرد
+        """
+        for part in split_message(text, self.max_length):
+            self._send(part)
+        self.finished = not self.failed
+        _record_delivery("buffered", self.first_message_ms, len(self.sent), len(self.failed))
+
 # اختبار وظائف الملف عند تشغيله مباشرة
 if __name__ == "__main__":
     # اختبار التنسيق
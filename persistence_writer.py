@@ -0,0 +1,246 @@
+"""
+كاتب خلفي (write-behind) لحفظ المحادثات دون تعطيل مسار الرد
+يجمع السجلات في مخزن مؤقت محدود السعة ويكتبها على دفعات (group commit)
+كل N سجل أو كل T مللي ثانية، حتى لا يعتمد زمن الرد على زمن القرص
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+from typing import Dict, List, Any, Callable, Optional
+
+from config import BOT_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+# أوضاع المتانة المدعومة
+# async: الكتابة في الخلفية على دفعات (قد تُفقد آخر دفعة عند توقف مفاجئ)
+# sync: الكتابة فوراً في خيط المستدعي قبل العودة
+DURABILITY_MODES = ("async", "sync")
+
+
+class WriteBehindWriter:
+    """
+    مخزن مؤقت محدود السعة يفرغ السجلات إلى دالة كتابة على دفعات في خيط خلفي
+    """
+
+    def __init__(self, sink: Callable[[List[Dict[str, Any]]], None], batch_size: int = None,
+                 flush_interval_ms: float = None, max_buffer: int = None,
+                 durability: str = None, name: str = "persistence"):
+        """
+        تهيئة الكاتب الخلفي
+
+        :param sink: دالة تكتب دفعة من السجلات (مثل ConversationJournal.append_many)
+        :param batch_size: عدد السجلات الذي يستدعي الكتابة فوراً
+        :param flush_interval_ms: أقصى مدة بقاء سجل في المخزن المؤقت بالمللي ثانية
+        :param max_buffer: السعة القصوى للمخزن المؤقت (تُسقط السجلات الزائدة)
+        :param durability: وضع المتانة ("async" أو "sync")
+        :param name: اسم الكاتب لأغراض التسجيل واسم الخيط
+        """
+        self.sink = sink
+        self.batch_size = batch_size or BOT_SETTINGS.get("PERSISTENCE_BATCH_SIZE", 50)
+        self.flush_interval_ms = flush_interval_ms or BOT_SETTINGS.get("PERSISTENCE_FLUSH_INTERVAL_MS", 200)
+        self.max_buffer = max_buffer or BOT_SETTINGS.get("PERSISTENCE_BUFFER_SIZE", 10000)
+        self.durability = durability or BOT_SETTINGS.get("PERSISTENCE_MODE", "async")
+        self.name = name
+
+        if self.durability not in DURABILITY_MODES:
+            logger.warning(f"وضع متانة غير معروف '{self.durability}'، سيتم استخدام async")
+            self.durability = "async"
+
+        self._buffer = deque()
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._closed = False
+        self._flush_requested = False
+        self._writing = 0
+
+        self._stats = {
+            "accepted": 0,
+            "flushed": 0,
+            "dropped": 0,
+            "failed": 0,
+            "batches": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0
+        }
+
+    def start(self) -> None:
+        """
+        تشغيل خيط الكتابة الخلفي (لا يلزم في وضع sync)
+        """
+        with self._condition:
+            if self._running or self.durability == "sync":
+                return
+            self._running = True
+
+        self._thread = threading.Thread(target=self._run, name=f"{self.name}-writer", daemon=True)
+        self._thread.start()
+        logger.info(
+            f"تم تشغيل الكاتب الخلفي {self.name}: دفعة {self.batch_size} سجل أو كل "
+            f"{self.flush_interval_ms} مللي ثانية (سعة المخزن: {self.max_buffer})"
+        )
+
+    def write(self, record: Dict[str, Any]) -> bool:
+        """
+        إضافة سجل للحفظ
+
+        :param record: السجل المراد حفظه
+        :return: True إذا تم قبول السجل، False إذا تم إسقاطه أو فشلت كتابته
+        """
+        # في وضع sync أو بعد الإيقاف تتم الكتابة مباشرة في خيط المستدعي
+        if self.durability == "sync" or self._closed:
+            return self._write_batch([record], direct=True)
+
+        if not self._running:
+            self.start()
+
+        with self._condition:
+            if len(self._buffer) >= self.max_buffer:
+                self._stats["dropped"] += 1
+                logger.warning(f"تم إسقاط سجل {self.name}: المخزن المؤقت ممتلئ ({self.max_buffer})")
+                return False
+
+            self._buffer.append(record)
+            self._stats["accepted"] += 1
+
+            if len(self._buffer) >= self.batch_size:
+                self._condition.notify_all()
+        return True
+
+    def _write_batch(self, batch: List[Dict[str, Any]], direct: bool = False) -> bool:
+        """
+        كتابة دفعة واحدة عبر دالة الكتابة مع تحديث الإحصائيات
+
+        :param batch: قائمة السجلات
+        :param direct: السجلات لم تمر بالمخزن المؤقت (تُحسب كمقبولة هنا)
+        :return: True إذا نجحت الكتابة
+        """
+        started = time.perf_counter()
+        try:
+            self.sink(batch)
+            success = True
+        except Exception as e:
+            success = False
+            logger.error(f"خطأ أثناء كتابة دفعة {self.name} ({len(batch)} سجل): {e}")
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._condition:
+            if success:
+                self._stats["flushed"] += len(batch)
+            else:
+                self._stats["failed"] += len(batch)
+            if direct:
+                self._stats["accepted"] += len(batch)
+            self._stats["batches"] += 1
+            self._stats["last_flush_ms"] = elapsed_ms
+            if elapsed_ms > self._stats["max_flush_ms"]:
+                self._stats["max_flush_ms"] = elapsed_ms
+        return success
+
+    def _run(self) -> None:
+        """
+        حلقة الخيط الخلفي: انتظار امتلاء الدفعة أو انتهاء المهلة ثم الكتابة
+        """
+        interval = self.flush_interval_ms / 1000.0
+
+        while True:
+            with self._condition:
+                if self._running and not self._flush_requested and len(self._buffer) < self.batch_size:
+                    self._condition.wait(interval)
+
+                if not self._buffer:
+                    self._flush_requested = False
+                    if not self._running:
+                        self._condition.notify_all()
+                        return
+                    continue
+
+                batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                self._writing += 1
+
+            try:
+                self._write_batch(batch)
+            finally:
+                with self._condition:
+                    self._writing -= 1
+                    self._condition.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        انتظار كتابة كل السجلات الموجودة في المخزن المؤقت
+
+        :param timeout: أقصى مدة انتظار بالثواني (اختياري)
+        :return: True إذا تم تفريغ المخزن المؤقت
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+
+        with self._condition:
+            if not self._running:
+                pending = list(self._buffer)
+                self._buffer.clear()
+            else:
+                pending = None
+                self._flush_requested = True
+                self._condition.notify_all()
+                while self._buffer or self._writing:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._condition.wait(remaining)
+
+        # الخيط الخلفي غير مشغل: الكتابة مباشرة في خيط المستدعي
+        if pending:
+            return self._write_batch(pending)
+        return True
+
+    def shutdown(self, timeout: Optional[float] = None) -> bool:
+        """
+        إيقاف الخيط الخلفي بعد كتابة كل السجلات المتبقية
+
+        :param timeout: أقصى مدة انتظار بالثواني (اختياري، من الإعدادات افتراضياً)
+        :return: True إذا تمت كتابة كل السجلات قبل انتهاء المهلة
+        """
+        timeout = timeout if timeout is not None else BOT_SETTINGS.get("PERSISTENCE_SHUTDOWN_TIMEOUT", 10)
+
+        with self._condition:
+            pending = len(self._buffer)
+            self._running = False
+            self._closed = True
+            self._condition.notify_all()
+
+        thread = self._thread
+        if thread is not None:
+            logger.info(f"جاري تفريغ الكاتب الخلفي {self.name}: {pending} سجل متبقٍ")
+            thread.join(timeout)
+            if thread.is_alive():
+                logger.warning(f"انتهت مهلة تفريغ الكاتب الخلفي {self.name}، بقي {len(self._buffer)} سجل")
+                return False
+            self._thread = None
+
+        # سجلات أضيفت بعد توقف الخيط
+        return self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        إحصائيات الكاتب الخلفي
+
+        :return: قاموس بعدد السجلات المقبولة والمكتوبة والمُسقطة وأزمنة الكتابة
+        """
+        with self._condition:
+            stats = dict(self._stats)
+            stats["buffered"] = len(self._buffer)
+            stats["running"] = self._running
+
+        stats["avg_batch_size"] = round(stats["flushed"] / stats["batches"], 2) if stats["batches"] else 0.0
+        stats["last_flush_ms"] = round(stats["last_flush_ms"], 2)
+        stats["max_flush_ms"] = round(stats["max_flush_ms"], 2)
+        stats.update({
+            "durability": self.durability,
+            "batch_size": self.batch_size,
+            "flush_interval_ms": self.flush_interval_ms,
+            "max_buffer": self.max_buffer
+        })
+        return stats
@@ -0,0 +1,379 @@
+"""
+بناء سياق المحادثة لنموذج اللغة بميزانية رموز (tokens)
+بدلاً من لصق آخر التبادلات كاملة بعد موجه النظام: تُحذف العبارات المتكررة من الردود السابقة
+(روابط الخدمات الموجودة في موجه النظام وعبارات الاستمرارية)، وتُختصر آخر التبادلات لحد أقصى،
+وتُلخص التبادلات الأقدم إلى أول جملة، ويُحذف الأقدم إذا تجاوز السياق الميزانية
+مع تسجيل عدد الرموز لكل طلب والتوفير مقارنة بالسياق الكامل
+
+موجهات النظام قوالب بإصدارات: بادئة ثابتة متطابقة في كل الطلبات (ذاكرة البادئات لدى المزود تصيبها)
+ثم الأجزاء الخاصة بالطلب (اسم المستخدم ثم تاريخ المحادثة)
+"""
+
+import re
+import bisect
+import hashlib
+import functools
+import itertools
+import logging
+import threading
+from typing import Dict, List, Any, Callable, Iterable, Optional, Tuple
+
+from config import BOT_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+BOT_NAME = "محمد سلامة"
+
+# كلمات عربية، كلمات لاتينية، أرقام، ثم أي رمز منفرد (علامات الترقيم وأجزاء الروابط والرموز التعبيرية)
+_ARABIC_PATTERN = re.compile(r"[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF]+")
+_LATIN_PATTERN = re.compile(r"[A-Za-z]+")
+_DIGITS_PATTERN = re.compile(r"[0-9]+")
+_OTHER_PATTERN = re.compile(r"[^\s\u0600-\u06FF\u0750-\u077F\u08A0-\u08FFA-Za-z0-9]")
+_URL_PATTERN = re.compile(r"https?://\S+")
+# الجمل تنتهي بعلامة ترقيم يليها فراغ أو بنهاية السطر (النقطة داخل الروابط والأرقام لا تنهي الجملة)
+_SENTENCE_SPLIT_PATTERN = re.compile(r"(?:[^.!?؟\n]|[.!?؟](?=\S))+[.!?؟]*")
+_LETTER_PATTERN = re.compile(r"[^\W\d_]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    تقدير محلي لعدد الرموز: كلمة عربية ≈ رمز لكل 3 أحرف، لاتينية ≈ رمز لكل 4 أحرف،
+    أرقام ≈ رمز لكل 3 خانات، وكل علامة ترقيم أو رمز آخر رمز واحد
+
+    :param text: النص
+    :return: عدد الرموز التقديري
+    """
+    if not text:
+        return 0
+    return (sum((len(word) + 2) // 3 for word in _ARABIC_PATTERN.findall(text))
+            + sum((len(word) + 3) // 4 for word in _LATIN_PATTERN.findall(text))
+            + sum((len(digits) + 2) // 3 for digits in _DIGITS_PATTERN.findall(text))
+            + len(_OTHER_PATTERN.findall(text)))
+
+
+def create_token_counter(name: str = None) -> Callable[[str], int]:
+    """
+    دالة عد الرموز حسب PROMPT_TOKENIZER: "estimate" (التقدير المحلي) أو "tiktoken" (إذا كانت المكتبة مثبتة)
+
+    :param name: اسم المعد (اختياري، من الإعدادات)
+    :return: دالة تعيد عدد رموز النص
+    """
+    name = (name or BOT_SETTINGS.get("PROMPT_TOKENIZER", "estimate")).lower()
+    if name == "tiktoken":
+        try:
+            import tiktoken
+            encoding = tiktoken.get_encoding("cl100k_base")
+            return lambda text: len(encoding.encode(text or ""))
+        except ImportError:
+            logger.error("مكتبة tiktoken غير مثبتة، سيتم استخدام التقدير المحلي لعدد الرموز")
+        except Exception as e:
+            logger.error(f"تعذر تحميل ترميز tiktoken، سيتم استخدام التقدير المحلي لعدد الرموز: {e}")
+    return estimate_tokens
+
+
+# تعليمات ماسنجر وقائمة الخدمات المشتركة بين الإصدارين
+_MESSENGER_RULES = """مهمتك هي فهم احتياجات العميل وتوجيهه للخدمة المناسبة من خدمات مجمع عمال مصر.
+
+معلومات مهمة:
+- لا تذكر أبداً أنك ذكاء اصطناعي، بل اظهر نفسك كممثل خدمة عملاء محترف.
+- كن ودوداً ومهنياً في ردودك.
+- شجع المستخدم على طلب المزيد من المعلومات عند الاقتضاء.
+- تجنب الكتابة بطريقة رسمية جداً، اكتب بشكل طبيعي مثل شخص حقيقي.
+- تأكد من إعطاء رابط الخدمة المناسبة عند الإجابة.
+- لا تستخدم مصطلحات أجنبية إذا كانت لها بديل عربي شائع.
+
+الخدمات الرئيسية لمجمع عمال مصر:
+1. بوابة التوظيف للباحثين عن عمل: https://omalmisrservices.com/ar/jobs
+2. بوابة توفير الموظفين للشركات: https://omalmisrservices.com/ar/workers
+3. خدمات الشركات والمستثمرين: https://omalmisrservices.com/ar/companies
+4. بوابة فض وتسوية المنازعات: https://omalmisrservices.com/ar/dispute
+
+"""
+
+# الإصدار 1 (السابق): اسم المستخدم في السطر الأول فلا تتطابق بادئة طلبين لمستخدمين مختلفين
+_MESSENGER_V1 = """أنت 'محمد سلامة'، المساعد الرسمي لمجمع عمال مصر. تتحدث مع {user_name} على ماسنجر فيسبوك.
+""" + _MESSENGER_RULES
+
+_COMMENT_V1 = """أنت 'محمد سلامة'، المساعد الرسمي لمجمع عمال مصر. تقوم بالرد على تعليقات الفيسبوك بأسلوب ودود واحترافي.
+مهمتك هي فهم استفسار العميل وتوجيهه للخدمة المناسبة من خدمات مجمع عمال مصر.
+
+معلومات مهمة:
+- لا تذكر أبداً أنك ذكاء اصطناعي، بل اظهر نفسك كممثل خدمة عملاء محترف.
+- كن مختصراً في ردودك على التعليقات (2-4 أسطر بحد أقصى).
+- قدم رابط صفحة الخدمة المناسبة عند الرد.
+- شجع المستخدم على طلب المزيد من المعلومات في نهاية الرد.
+- تعامل بأسلوب رسمي لكن ودود مع المستفسرين.
+
+استفسار المستخدم في تعليق على فيسبوك: {comment_text}
+"""
+
+# الإصدار 2: التعليمات الثابتة أولاً (بادئة متطابقة بايتاً ببايت في كل الطلبات) ثم الأجزاء الخاصة بالطلب
+_MESSENGER_V2_PREFIX = """أنت 'محمد سلامة'، المساعد الرسمي لمجمع عمال مصر. تتحدث مع العملاء على ماسنجر فيسبوك.
+""" + _MESSENGER_RULES
+
+_COMMENT_V2_PREFIX = _COMMENT_V1[:_COMMENT_V1.index("استفسار المستخدم في تعليق")]
+
+
+class PromptTemplate:
+    """
+    موجه نظام بإصدار: بادئة ثابتة لا تتغير بين الطلبات (تستفيد من ذاكرة البادئات لدى المزود مثل
+    context caching في DeepSeek) ثم جزء متغير بقيم الطلب
+    """
+
+    def __init__(self, name: str, version: str, prefix: str, dynamic: str = ""):
+        """
+        :param name: اسم القالب ("messenger" أو "comment")
+        :param version: الإصدار
+        :param prefix: البادئة الثابتة
+        :param dynamic: الجزء المتغير (صيغة str.format)
+        """
+        self.name = name
+        self.version = version
+        self.prefix = prefix
+        self.dynamic = dynamic
+        self.prefix_hash = hashlib.sha256(prefix.encode("utf-8")).hexdigest()[:12]
+
+    def render(self, **values) -> str:
+        """
+        موجه النظام لطلب واحد
+
+        :param values: قيم الجزء المتغير
+        :return: البادئة الثابتة متبوعة بالجزء المتغير
+        """
+        return self.prefix + self.dynamic.format(**values)
+
+    def info(self) -> Dict[str, Any]:
+        """
+        :return: اسم القالب وإصداره وبصمة بادئته وحجمها بالرموز
+        """
+        return {
+            "name": self.name,
+            "version": self.version,
+            "prefix_hash": self.prefix_hash,
+            "prefix_tokens": estimate_tokens(self.prefix)
+        }
+
+
+PROMPT_TEMPLATES = {
+    ("messenger", "1"): PromptTemplate("messenger", "1", "", _MESSENGER_V1),
+    ("messenger", "2"): PromptTemplate("messenger", "2", _MESSENGER_V2_PREFIX,
+                                       "اسم العميل في هذه المحادثة: {user_name}\n"),
+    ("comment", "1"): PromptTemplate("comment", "1", "", _COMMENT_V1),
+    # نص التعليق يُرسل كرسالة المستخدم فلا يتكرر في موجه النظام
+    ("comment", "2"): PromptTemplate("comment", "2", _COMMENT_V2_PREFIX)
+}
+
+
+def get_template(name: str, version: str = None) -> PromptTemplate:
+    """
+    قالب موجه النظام بالإصدار المحدد في PROMPT_TEMPLATE_VERSION (أو آخر إصدار إذا لم يكن موجوداً)
+
+    :param name: اسم القالب
+    :param version: الإصدار (اختياري، من الإعدادات)
+    :return: القالب
+    """
+    version = str(version or BOT_SETTINGS.get("PROMPT_TEMPLATE_VERSION", "2"))
+    template = PROMPT_TEMPLATES.get((name, version))
+    if template is None:
+        latest = max(v for n, v in PROMPT_TEMPLATES if n == name)
+        logger.warning(f"إصدار قالب الموجه {version} غير موجود لـ {name}، سيتم استخدام الإصدار {latest}")
+        template = PROMPT_TEMPLATES[(name, latest)]
+    return template
+
+
+def format_exchange(user_message: str, bot_response: str) -> str:
+    """
+    تبادل واحد بصيغة تاريخ المحادثة في السياق
+    """
+    return f"المستخدم: {user_message}\n{BOT_NAME}: {bot_response}\n"
+
+
+def legacy_context(system_prompt: str, history: List[Dict[str, str]]) -> str:
+    """
+    السياق الكامل السابق (موجه النظام وكل التبادلات كما هي) للمقارنة
+
+    :param system_prompt: موجه النظام
+    :param history: التبادلات بالترتيب الزمني
+    :return: نص السياق
+    """
+    context = system_prompt
+    if history:
+        context += "\nتاريخ المحادثة السابق:\n"
+        for exchange in history:
+            context += format_exchange(exchange.get('user_message', ''), exchange.get('bot_response', ''))
+    return context
+
+
+class PromptBuilder:
+    """
+    بناء سياق المحادثة بميزانية رموز مع إحصائيات الرموز والتوفير
+    """
+
+    def __init__(self, max_tokens: int = None, full_turns: int = None, max_turn_tokens: int = None,
+                 summary_tokens: int = None, boilerplate: Iterable[str] = (),
+                 count_tokens: Optional[Callable[[str], int]] = None):
+        """
+        تهيئة الباني
+
+        :param max_tokens: ميزانية السياق كاملاً بالرموز (موجه النظام والتاريخ)
+        :param full_turns: عدد آخر التبادلات التي تبقى كاملة (مختصرة لحد max_turn_tokens)
+        :param max_turn_tokens: أقصى عدد رموز لكل رسالة في التبادلات الأخيرة
+        :param summary_tokens: أقصى عدد رموز لكل رسالة في التبادلات الأقدم الملخصة
+        :param boilerplate: عبارات متكررة تُحذف من الردود السابقة (مثل عبارات الاستمرارية)
+        :param count_tokens: دالة عد الرموز (اختياري، حسب PROMPT_TOKENIZER)
+        """
+        self.max_tokens = max_tokens or BOT_SETTINGS.get("PROMPT_TOKEN_BUDGET", 1200)
+        self.full_turns = full_turns if full_turns is not None else BOT_SETTINGS.get("PROMPT_FULL_TURNS", 2)
+        self.max_turn_tokens = max_turn_tokens or BOT_SETTINGS.get("PROMPT_MAX_TURN_TOKENS", 150)
+        self.summary_tokens = summary_tokens or BOT_SETTINGS.get("PROMPT_SUMMARY_TOKENS", 40)
+        self.boilerplate = {phrase.strip() for phrase in boilerplate if phrase.strip()}
+        self.count_tokens = count_tokens or create_token_counter()
+        # رموز كل كلمة عند الاختصار (الكلمات تتكرر كثيراً بين الردود)
+        self._word_tokens = functools.lru_cache(maxsize=65536)(self.count_tokens)
+        self._lock = threading.Lock()
+
+        self._stats = {
+            "requests": 0,
+            "tokens": 0,
+            "baseline_tokens": 0,
+            "truncated_turns": 0,
+            "summarized_turns": 0,
+            "dropped_turns": 0,
+            "over_budget": 0
+        }
+
+    def _strip_boilerplate(self, text: str, known_urls: set) -> str:
+        """
+        حذف العبارات المتكررة من رد سابق: عبارات الاستمرارية والروابط الموجودة في موجه النظام
+        (والسطر كله إذا لم يبق فيه إلا ترقيم أو رقم بند)
+        """
+        lines = []
+        for line in (text or "").splitlines():
+            if line.strip() in self.boilerplate:
+                continue
+            stripped = _URL_PATTERN.sub(lambda match: "" if match.group(0).rstrip(".,،)") in known_urls
+                                        else match.group(0), line)
+            if stripped != line and len(_LETTER_PATTERN.findall(stripped)) < 3:
+                continue
+            lines.append(stripped.rstrip())
+        return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+    def truncate(self, text: str, max_tokens: int) -> Tuple[str, bool]:
+        """
+        اختصار النص لحد أقصى من الرموز عند حدود الكلمات
+
+        :param text: النص
+        :param max_tokens: أقصى عدد رموز
+        :return: (النص، True إذا تم اختصاره)
+        """
+        if self.count_tokens(text) <= max_tokens:
+            return text, False
+        # كل كلمة رمز واحد على الأقل: لا تتسع أكثر من max_tokens كلمة
+        words = text.split()[:max_tokens]
+        # أطول بادئة من الكلمات ضمن الحد (عدد رموز الكلمات تراكمياً مع رمز لعلامة الاختصار)
+        totals = list(itertools.accumulate(self._word_tokens(word) for word in words))
+        low = bisect.bisect_right(totals, max_tokens - 1)
+        # بعض الترميزات (tiktoken) تدمج الرموز عبر الكلمات فيكون المجموع تقديراً أعلى، وليس أقل
+        while low and self.count_tokens(" ".join(words[:low])) + 1 > max_tokens:
+            low -= 1
+        return " ".join(words[:low]) + "…", True
+
+    def summarize(self, text: str) -> str:
+        """
+        تلخيص رد سابق محلياً إلى أول جملة ذات معنى (تتجاوز التحية القصيرة في بدايته) مختصرة لحد summary_tokens
+
+        :param text: الرد بعد حذف العبارات المتكررة
+        :return: الملخص
+        """
+        sentences = [sentence.strip() for sentence in _SENTENCE_SPLIT_PATTERN.findall(text) if sentence.strip()]
+        summary = next((sentence for sentence in sentences if len(sentence.split()) >= 4),
+                       sentences[0] if sentences else "")
+        return self.truncate(summary, self.summary_tokens)[0]
+
+    def build(self, system_prompt: str, history: List[Dict[str, str]]) -> Tuple[str, Dict[str, Any]]:
+        """
+        بناء السياق ضمن الميزانية
+
+        :param system_prompt: موجه النظام
+        :param history: التبادلات بالترتيب الزمني (آخر CONTEXT_HISTORY_TURNS تبادل)
+        :return: (نص السياق، تقرير بعدد الرموز والتوفير والتبادلات المختصرة والملخصة والمحذوفة)
+        """
+        known_urls = {url.rstrip(".,،)") for url in _URL_PATTERN.findall(system_prompt)}
+        header = "\nتاريخ المحادثة السابق:\n"
+        system_tokens = self.count_tokens(system_prompt)
+        header_tokens = self.count_tokens(header)
+        used = system_tokens + header_tokens
+        report = {"truncated": 0, "summarized": 0, "dropped": 0}
+
+        # من الأحدث إلى الأقدم: الأحدث أهم للإجابة ويُحذف الأقدم أولاً عند تجاوز الميزانية
+        turns: List[str] = []
+        for age, exchange in enumerate(reversed(history or [])):
+            user_message = (exchange.get('user_message') or "").strip()
+            bot_response = self._strip_boilerplate(exchange.get('bot_response', ''), known_urls)
+
+            if age < self.full_turns:
+                short_user, cut_user = self.truncate(user_message, self.max_turn_tokens)
+                short_bot, cut_bot = self.truncate(bot_response, self.max_turn_tokens)
+                full, cut = format_exchange(short_user, short_bot), cut_user or cut_bot
+                full_cost = self.count_tokens(full)
+                if used + full_cost <= self.max_tokens:
+                    turns.append(full)
+                    used += full_cost
+                    report["truncated"] += cut
+                    continue
+
+            # الصيغة الملخصة للتبادلات الأقدم، وبديل للتبادل الأخير إذا لم يتسع كاملاً
+            summary = format_exchange(self.truncate(user_message, self.summary_tokens)[0],
+                                      self.summarize(bot_response))
+            summary_cost = self.count_tokens(summary)
+            if used + summary_cost > self.max_tokens:
+                report["dropped"] = len(history) - age
+                break
+            turns.append(summary)
+            used += summary_cost
+            report["summarized"] += 1
+
+        context = system_prompt
+        if turns:
+            context += header + "".join(reversed(turns))
+
+        # مجموع رموز الأجزاء (يساوي عد السياق كاملاً مع التقدير المحلي، وتقريبي مع tiktoken)
+        report["tokens"] = used if turns else system_tokens
+        report["baseline_tokens"] = system_tokens + (header_tokens + sum(
+            self.count_tokens(format_exchange(exchange.get('user_message', ''), exchange.get('bot_response', '')))
+            for exchange in history) if history else 0)
+        report["saved_tokens"] = report["baseline_tokens"] - report["tokens"]
+
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["tokens"] += report["tokens"]
+            self._stats["baseline_tokens"] += report["baseline_tokens"]
+            self._stats["truncated_turns"] += report["truncated"]
+            self._stats["summarized_turns"] += report["summarized"]
+            self._stats["dropped_turns"] += report["dropped"]
+            if report["tokens"] > self.max_tokens:
+                # موجه النظام وحده يتجاوز الميزانية
+                self._stats["over_budget"] += 1
+
+        logger.info(
+            f"سياق الطلب: {report['tokens']} رمز بدلاً من {report['baseline_tokens']} "
+            f"(توفير {report['saved_tokens']}، مختصر {report['truncated']}، ملخص {report['summarized']}، "
+            f"محذوف {report['dropped']})"
+        )
+        return context, report
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        إحصائيات بناء السياق
+
+        :return: قاموس بعدد الطلبات ومتوسط الرموز قبل وبعد ونسبة التوفير
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        requests = stats["requests"]
+        stats["max_tokens"] = self.max_tokens
+        stats["avg_tokens"] = round(stats["tokens"] / requests, 1) if requests else 0.0
+        stats["avg_baseline_tokens"] = round(stats["baseline_tokens"] / requests, 1) if requests else 0.0
+        stats["saved_ratio"] = (round(1 - stats["tokens"] / stats["baseline_tokens"], 4)
+                                if stats["baseline_tokens"] else 0.0)
+        return stats
@@ -0,0 +1,501 @@
+"""
+قواطع الدائرة (circuit breakers) وسياسة إعادة المحاولة للواجهات الخارجية (DeepSeek و OpenAI و ماسنجر)
+عند تعطل مزود لا تنتظر كل رسالة فشلاً جديداً: بعد عدد من الإخفاقات المتتالية تُفتح الدائرة
+وتُرفض الطلبات فوراً (CircuitOpenError) حتى انتهاء مهلة التعافي، ثم يمر طلب اختباري (نصف مفتوحة)
+يغلقها إذا نجح أو يعيد فتحها إذا فشل
+
+إعادة المحاولة للأخطاء المؤقتة فقط (الاتصال، 408، 429، 5xx) بتأخير أسي عشوائي (full jitter)
+يحترم ترويسة Retry-After، وبميزانية تمنع إعادة المحاولة من مضاعفة الحمل على مزود متعطل
+"""
+
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Awaitable, Callable, Optional
+
+from config import API_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# رموز HTTP المؤقتة التي تستحق إعادة المحاولة (بالإضافة إلى كل 5xx)
+RETRYABLE_STATUSES = {408, 425, 429}
+
+
+class UpstreamError(Exception):
+    """
+    فشل استدعاء واجهة خارجية مع رمز الحالة ومهلة Retry-After (إن وجدت) وهل الخطأ مؤقت
+    """
+
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[float] = None,
+                 retryable: bool = False):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.retryable = retryable
+
+
+class CircuitOpenError(Exception):
+    """
+    الدائرة مفتوحة: رُفض الطلب دون الاتصال بالواجهة
+    """
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"الدائرة مفتوحة لـ {name}، إعادة المحاولة بعد {retry_after:.1f} ث")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    تحويل ترويسة Retry-After (ثوانٍ أو تاريخ HTTP) إلى ثوانٍ
+
+    :param value: قيمة الترويسة
+    :return: عدد الثواني أو None إذا كانت غير موجودة أو غير صالحة
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+def upstream_error(message: str, response=None, retryable: bool = False) -> UpstreamError:
+    """
+    إنشاء UpstreamError من استجابة HTTP فاشلة (requests أو httpx) أو من خطأ اتصال
+
+    :param message: رسالة الخطأ
+    :param response: الاستجابة الفاشلة (اختياري)
+    :param retryable: هل الخطأ مؤقت (لأخطاء الاتصال بدون استجابة)
+    :return: الخطأ
+    """
+    if response is None:
+        return UpstreamError(message, retryable=retryable)
+    status = response.status_code
+    return UpstreamError(
+        message,
+        status=status,
+        retry_after=parse_retry_after(response.headers.get("Retry-After")),
+        retryable=status in RETRYABLE_STATUSES or status >= 500
+    )
+
+
+def _is_failure(error: BaseException) -> bool:
+    # أخطاء العميل الدائمة (4xx غير المؤقتة) وحدها تعني أن الواجهة تعمل؛ انتهاء المهلة وأخطاء الاتصال و5xx
+    # إخفاقات تُحسب ضد الدائرة حتى عندما لا يُعاد الطلب
+    if isinstance(error, UpstreamError):
+        return error.status is None or error.retryable or error.status >= 500
+    return True
+
+
+class CircuitBreaker:
+    """
+    قاطع دائرة لواجهة واحدة بثلاث حالات: مغلقة ومفتوحة ونصف مفتوحة
+    """
+
+    def __init__(self, name: str, failure_threshold: int = None, recovery_timeout: float = None,
+                 half_open_max_calls: int = None, clock: Callable[[], float] = time.monotonic):
+        """
+        تهيئة القاطع
+
+        :param name: اسم الواجهة
+        :param failure_threshold: عدد الإخفاقات المتتالية الذي يفتح الدائرة
+        :param recovery_timeout: مدة بقاء الدائرة مفتوحة قبل الطلب الاختباري بالثواني
+        :param half_open_max_calls: عدد الطلبات الاختبارية المسموح بها معاً في حالة نصف مفتوحة
+        :param clock: مصدر الوقت (للاختبارات)
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold or API_SETTINGS.get("CIRCUIT_FAILURE_THRESHOLD", 5)
+        self.recovery_timeout = recovery_timeout or API_SETTINGS.get("CIRCUIT_RECOVERY_TIMEOUT", 30)
+        self.half_open_max_calls = half_open_max_calls or API_SETTINGS.get("CIRCUIT_HALF_OPEN_MAX_CALLS", 1)
+        self._clock = clock
+
+        self._state = CLOSED
+        self._failures = 0
+        self._open_until = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+        self._transitions: Dict[str, int] = {}
+        self._recent = deque(maxlen=20)
+        self._stats = {
+            "successes": 0,
+            "failures": 0,
+            "rejected": 0
+        }
+
+    def _transition(self, state: str) -> None:
+        # يُستدعى والقفل محجوز
+        key = f"{self._state}->{state}"
+        self._transitions[key] = self._transitions.get(key, 0) + 1
+        self._recent.append({"transition": key, "at": time.time()})
+        self._state = state
+        if state == OPEN:
+            logger.warning(f"فُتحت دائرة {self.name} لمدة {self._open_until - self._clock():.1f} ث "
+                           f"بعد {self._failures} إخفاق متتالٍ")
+        else:
+            logger.info(f"دائرة {self.name}: {key}")
+
+    @property
+    def state(self) -> str:
+        """
+        الحالة الحالية (المفتوحة تظهر نصف مفتوحة بعد انتهاء مهلة التعافي)
+        """
+        with self._lock:
+            if self._state == OPEN and self._clock() >= self._open_until:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self) -> None:
+        """
+        حجز إذن لطلب (يجب أن يتبعه record_success أو record_failure أو release)
+
+        :raises: CircuitOpenError إذا كانت الدائرة مفتوحة أو كانت الطلبات الاختبارية مشغولة
+        """
+        with self._lock:
+            if self._state == OPEN:
+                now = self._clock()
+                if now < self._open_until:
+                    self._stats["rejected"] += 1
+                    raise CircuitOpenError(self.name, self._open_until - now)
+                self._transition(HALF_OPEN)
+                self._probes = 0
+            if self._state == HALF_OPEN:
+                if self._probes >= self.half_open_max_calls:
+                    self._stats["rejected"] += 1
+                    raise CircuitOpenError(self.name, 0.0)
+                self._probes += 1
+
+    def record_success(self) -> None:
+        """
+        تسجيل نجاح طلب (يغلق الدائرة إذا كان طلباً اختبارياً)
+        """
+        with self._lock:
+            self._stats["successes"] += 1
+            self._failures = 0
+            if self._state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                self._transition(CLOSED)
+
+    def record_failure(self, retry_after: Optional[float] = None) -> None:
+        """
+        تسجيل فشل طلب (يفتح الدائرة عند بلوغ الحد أو إذا فشل الطلب الاختباري)
+
+        :param retry_after: مهلة Retry-After من الواجهة (تطيل بقاء الدائرة مفتوحة إن كانت أطول)
+        """
+        with self._lock:
+            self._stats["failures"] += 1
+            self._failures += 1
+            if self._state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._open_until = self._clock() + max(self.recovery_timeout, retry_after or 0)
+                self._transition(OPEN)
+
+    def release(self) -> None:
+        """
+        تحرير إذن طلب انتهى دون نتيجة (مثل إلغائه)
+        """
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        حالة القاطع وانتقالاته
+
+        :return: قاموس بالحالة والإخفاقات المتتالية وعدد كل انتقال وآخر الانتقالات
+        """
+        state = self.state
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "state": state,
+                "consecutive_failures": self._failures,
+                "open_for": round(max(0.0, self._open_until - self._clock()), 3) if self._state == OPEN else 0.0,
+                "transitions": dict(self._transitions),
+                "recent_transitions": list(self._recent)
+            })
+        return stats
+
+
+class RetryBudget:
+    """
+    ميزانية إعادة المحاولة: كل طلب يضيف ratio من الرصيد (حتى burst) وكل إعادة محاولة تستهلك 1
+    فلا تتجاوز المحاولات الإضافية على المدى الطويل ratio من عدد الطلبات
+    """
+
+    def __init__(self, ratio: float = None, burst: float = None):
+        """
+        تهيئة الميزانية
+
+        :param ratio: أقصى نسبة للمحاولات الإضافية من عدد الطلبات
+        :param burst: أقصى رصيد متراكم
+        """
+        self.ratio = ratio if ratio is not None else API_SETTINGS.get("RETRY_BUDGET_RATIO", 0.2)
+        self.burst = burst if burst is not None else API_SETTINGS.get("RETRY_BUDGET_BURST", 10)
+        self._balance = self.burst
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._balance = min(self.burst, self._balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        """
+        :return: True إذا سمحت الميزانية بمحاولة إضافية
+        """
+        with self._lock:
+            if self._balance >= 1:
+                self._balance -= 1
+                return True
+            return False
+
+    @property
+    def balance(self) -> float:
+        with self._lock:
+            return round(self._balance, 3)
+
+
+class RetryPolicy:
+    """
+    سياسة إعادة المحاولة: تأخير أسي عشوائي يحترم Retry-After بحد أقصى للمحاولات وللتأخير
+    """
+
+    def __init__(self, max_attempts: int = None, base_delay: float = None, max_delay: float = None,
+                 budget: Optional[RetryBudget] = None):
+        """
+        تهيئة السياسة
+
+        :param max_attempts: أقصى عدد للمحاولات (شاملة الأولى)
+        :param base_delay: التأخير الأساسي بالثواني (يتضاعف مع كل محاولة)
+        :param max_delay: أقصى تأخير بالثواني (Retry-After أطول منه يعني عدم إعادة المحاولة)
+        :param budget: ميزانية إعادة المحاولة
+        """
+        self.max_attempts = max_attempts or API_SETTINGS.get("RETRY_MAX_ATTEMPTS", 3)
+        self.base_delay = base_delay if base_delay is not None else API_SETTINGS.get("RETRY_BASE_DELAY", 0.5)
+        self.max_delay = max_delay if max_delay is not None else API_SETTINGS.get("RETRY_MAX_DELAY", 8)
+        self.budget = budget if budget is not None else RetryBudget()
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> Optional[float]:
+        """
+        التأخير قبل المحاولة التالية
+
+        :param attempt: رقم المحاولة الفاشلة (يبدأ من 1)
+        :param retry_after: مهلة Retry-After من الواجهة (اختياري)
+        :return: التأخير بالثواني أو None إذا لا يجب إعادة المحاولة
+        """
+        if attempt >= self.max_attempts:
+            return None
+        if retry_after is not None:
+            if retry_after > self.max_delay:
+                return None
+            return retry_after + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class ResilientEndpoint:
+    """
+    واجهة خارجية واحدة بقاطع دائرة وسياسة إعادة محاولة مشتركين بين كل مستدعيها
+    """
+
+    def __init__(self, name: str, breaker: Optional[CircuitBreaker] = None, policy: Optional[RetryPolicy] = None,
+                 sleep: Callable[[float], None] = time.sleep):
+        """
+        تهيئة الواجهة
+
+        :param name: اسم الواجهة
+        :param breaker: قاطع الدائرة (اختياري)
+        :param policy: سياسة إعادة المحاولة (اختياري)
+        :param sleep: دالة الانتظار بين المحاولات المتزامنة (للاختبارات)
+        """
+        self.name = name
+        self.breaker = breaker or CircuitBreaker(name)
+        self.policy = policy or RetryPolicy()
+        self._sleep = sleep
+        self._lock = threading.Lock()
+
+        self._stats = {
+            "calls": 0,
+            "retries": 0,
+            "retries_denied": 0,
+            "gave_up": 0
+        }
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def _next_delay(self, attempt: int, error: Exception) -> Optional[float]:
+        """
+        تسجيل نتيجة محاولة فاشلة في القاطع وحساب التأخير قبل التالية
+
+        :return: التأخير بالثواني أو None إذا لا يجب إعادة المحاولة
+        """
+        retry_after = getattr(error, "retry_after", None)
+        if _is_failure(error):
+            self.breaker.record_failure(retry_after)
+        else:
+            # الواجهة ردت بخطأ دائم من جانب العميل: هي تعمل
+            self.breaker.record_success()
+            return None
+
+        # الدائرة فُتحت بهذا الفشل: إعادة الخطأ الحقيقي بدلاً من الانتظار ثم الرفض
+        if not getattr(error, "retryable", False) or self.breaker.state == OPEN:
+            return None
+        delay = self.policy.backoff(attempt, retry_after)
+        if delay is None:
+            self._count("gave_up")
+            return None
+        if not self.policy.budget.withdraw():
+            self._count("retries_denied")
+            return None
+        self._count("retries")
+        logger.warning(f"إعادة محاولة {self.name} بعد {delay:.2f} ث (المحاولة {attempt + 1}): {error}")
+        return delay
+
+    def call(self, fn: Callable[[], Any], settle_later: bool = False) -> Any:
+        """
+        تنفيذ استدعاء متزامن عبر القاطع مع إعادة المحاولة للأخطاء المؤقتة
+
+        :param fn: محاولة واحدة (تُستدعى بدون معاملات)
+        :param settle_later: عدم تسجيل نجاح المحاولة الناجحة، فيسجل المستدعي نتيجتها بعد استهلاكها
+                             (record_success أو record_failure أو release) مثل البث
+        :return: نتيجة أول محاولة ناجحة
+        :raises: CircuitOpenError إذا كانت الدائرة مفتوحة، أو خطأ آخر محاولة
+        """
+        self._count("calls")
+        self.policy.budget.deposit()
+        attempt = 0
+        while True:
+            attempt += 1
+            self.breaker.allow()
+            try:
+                result = fn()
+            except Exception as e:
+                delay = self._next_delay(attempt, e)
+                if delay is None:
+                    raise
+                self._sleep(delay)
+                continue
+            except BaseException:
+                self.breaker.release()
+                raise
+            if not settle_later:
+                self.breaker.record_success()
+            return result
+
+    async def acall(self, fn: Callable[[], Awaitable[Any]], expires: Optional[float] = None,
+                    settle_later: bool = False) -> Any:
+        """
+        نفس call لاستدعاء غير متزامن (الانتظار بين المحاولات لا يحجز حلقة الأحداث)
+
+        :param fn: دالة تعيد coroutine لمحاولة واحدة
+        :param expires: وقت انتهاء مهلة الطلب على ساعة حلقة الأحداث (اختياري)
+        :param settle_later: كما في call
+        :return: نتيجة أول محاولة ناجحة
+        :raises: CircuitOpenError إذا كانت الدائرة مفتوحة، asyncio.TimeoutError إذا انتهت المهلة،
+                 أو خطأ آخر محاولة
+        """
+        loop = asyncio.get_running_loop()
+        self._count("calls")
+        self.policy.budget.deposit()
+        attempt = 0
+        while True:
+            attempt += 1
+            if expires is not None and loop.time() >= expires:
+                raise asyncio.TimeoutError()
+            self.breaker.allow()
+            try:
+                if expires is None:
+                    result = await fn()
+                else:
+                    result = await asyncio.wait_for(fn(), timeout=expires - loop.time())
+            except asyncio.TimeoutError:
+                # المهلة قطعت محاولة تحجز إذناً من القاطع: الواجهة لم ترد في الوقت
+                self.breaker.record_failure()
+                raise
+            except Exception as e:
+                delay = self._next_delay(attempt, e)
+                if delay is None:
+                    raise
+                if expires is not None and loop.time() + delay >= expires:
+                    # الانتظار سيتجاوز المهلة (وفشل المحاولة سُجل بالفعل في _next_delay)
+                    raise asyncio.TimeoutError() from e
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self.breaker.release()
+                raise
+            if not settle_later:
+                self.breaker.record_success()
+            return result
+
+    def record_success(self) -> None:
+        """
+        تسجيل نجاح محاولة أُجلت نتيجتها (settle_later) مثل بث اكتمل
+        """
+        self.breaker.record_success()
+
+    def record_failure(self, error: Optional[Exception] = None) -> None:
+        """
+        تسجيل فشل محاولة أُجلت نتيجتها (settle_later) مثل بث انقطع أو توقف بعد بدئه
+
+        :param error: الخطأ (اختياري، أخطاء العميل الدائمة لا تُحسب)
+        """
+        if error is None or _is_failure(error):
+            self.breaker.record_failure(getattr(error, "retry_after", None))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        إحصائيات الواجهة
+
+        :return: قاموس بعدد الاستدعاءات وإعادة المحاولات ورصيد الميزانية وحالة القاطع
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats["retry_budget"] = self.policy.budget.balance
+        stats["circuit"] = self.breaker.get_stats()
+        return stats
+
+
+_endpoints: Dict[str, ResilientEndpoint] = {}
+_endpoints_lock = threading.Lock()
+
+
+def get_endpoint(name: str) -> ResilientEndpoint:
+    """
+    الواجهة المشتركة بالاسم (قاطع واحد لكل واجهة مهما تعدد عملاؤها)
+
+    :param name: اسم الواجهة ("deepseek" أو "openai" أو "messenger")
+    :return: الواجهة
+    """
+    with _endpoints_lock:
+        endpoint = _endpoints.get(name)
+        if endpoint is None:
+            endpoint = _endpoints[name] = ResilientEndpoint(name)
+        return endpoint
+
+
+def get_resilience_stats() -> Dict[str, Any]:
+    """
+    حالة قواطع الدائرة وإعادة المحاولة لكل الواجهات
+
+    :return: قاموس باسم كل واجهة وإحصائياتها
+    """
+    with _endpoints_lock:
+        endpoints = dict(_endpoints)
+    return {name: endpoint.get_stats() for name, endpoint in endpoints.items()}
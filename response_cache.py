@@ -0,0 +1,364 @@
+"""
+ذاكرة مؤقتة لردود نموذج اللغة بالمطابقة التامة أمام عميل DeepSeek API
+المفتاح هو نص المستخدم بعد التطبيع مع بصمة سياق النظام ومعاملات النموذج،
+فالرسائل المتكررة ("السلام عليكم"، "عايز شغل"، "فين العنوان") تُجاب من الذاكرة دون رحلة شبكة.
+مع مهلة صلاحية (TTL) وإخراج LRU وسقف للذاكرة، ولا تُخزن ردود السياقات الشخصية إلا إذا سُمح بذلك
+"""
+
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Callable, Iterable, Iterator, Optional, Tuple
+
+from config import BOT_SETTINGS
+from faq_index import normalize_text
+from single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# تكلفة تقريبية ثابتة لكل مدخل (المفتاح والقاموس والطوابع الزمنية) بالبايت
+ENTRY_OVERHEAD_BYTES = 200
+
+_WHITESPACE = re.compile(r"\s+")
+_EDGE_PUNCTUATION = re.compile(r"^[\s\.,!?؟،:;…]+|[\s\.,!?؟،:;…]+$")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    تطبيع نص المستخدم لمفتاح الذاكرة (حالة الأحرف والتشكيل والمسافات وعلامات الترقيم في الأطراف)
+
+    :param prompt: نص المستخدم
+    :return: النص بعد التطبيع
+    """
+    text = _WHITESPACE.sub(" ", normalize_text(prompt or ""))
+    return _EDGE_PUNCTUATION.sub("", text)
+
+
+def make_cache_key(prompt: str, context: Optional[str], params: Dict[str, Any]) -> str:
+    """
+    مفتاح الذاكرة: النص بعد التطبيع + بصمة السياق + معاملات النموذج
+
+    :param prompt: نص المستخدم
+    :param context: سياق النظام
+    :param params: معاملات النموذج (النموذج، max_tokens، temperature...)
+    :return: المفتاح
+    """
+    context_digest = hashlib.sha256((context or "").encode("utf-8")).hexdigest()
+    params_part = json.dumps(params, sort_keys=True, ensure_ascii=False)
+    return f"{normalize_prompt(prompt)}\x00{context_digest}\x00{params_part}"
+
+
+class _CacheEntry:
+    """
+    رد محفوظ مع وقت انتهاء صلاحيته وحجمه
+    """
+
+    __slots__ = ("value", "expires_at", "bytes")
+
+    def __init__(self, value: str, expires_at: float, size: int):
+        self.value = value
+        self.expires_at = expires_at
+        self.bytes = size
+
+
+class ResponseCache:
+    """
+    ذاكرة LRU للردود بمهلة صلاحية وسقف للذاكرة
+    """
+
+    def __init__(self, max_entries: int = None, max_bytes: int = None, ttl: float = None,
+                 allow_personalized: bool = None):
+        """
+        تهيئة الذاكرة
+
+        :param max_entries: الحد الأقصى لعدد الردود المحفوظة
+        :param max_bytes: سقف الذاكرة التقريبي بالبايت
+        :param ttl: مدة صلاحية الرد بالثواني
+        :param allow_personalized: السماح بتخزين ردود السياقات الشخصية (اسم المستخدم أو تاريخ محادثته)
+        """
+        self.max_entries = max_entries or BOT_SETTINGS.get("RESPONSE_CACHE_MAX_ENTRIES", 2000)
+        self.max_bytes = max_bytes or BOT_SETTINGS.get("RESPONSE_CACHE_MAX_BYTES", 16 * 1024 * 1024)
+        self.ttl = ttl if ttl is not None else BOT_SETTINGS.get("RESPONSE_CACHE_TTL", 3600)
+        self.allow_personalized = (
+            allow_personalized if allow_personalized is not None
+            else BOT_SETTINGS.get("RESPONSE_CACHE_ALLOW_PERSONALIZED", False)
+        )
+
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "skipped_personalized": 0,
+            "expired": 0,
+            "evicted_lru": 0,
+            "evicted_memory": 0
+        }
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.bytes
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        قراءة رد محفوظ وتحديثه كالأحدث استخداماً
+
+        :param key: المفتاح
+        :return: الرد أو None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self._stats["expired"] += 1
+                entry = None
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry.value
+
+    def put(self, key: str, value: str) -> bool:
+        """
+        حفظ رد مع إخراج الأقل استخداماً عند تجاوز الحدود
+
+        :param key: المفتاح
+        :param value: الرد
+        :return: True إذا تم الحفظ (الرد الأكبر من سقف الذاكرة لا يُحفظ)
+        """
+        size = ENTRY_OVERHEAD_BYTES + len(key.encode("utf-8")) + len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return False
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _CacheEntry(value, time.monotonic() + self.ttl, size)
+            self._bytes += size
+            self._stats["stores"] += 1
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._stats["evicted_lru"] += 1
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._stats["evicted_memory"] += 1
+        return True
+
+    def skip_personalized(self) -> None:
+        """
+        احتساب طلب لم يُستخدم فيه التخزين لأن سياقه شخصي
+        """
+        with self._lock:
+            self._stats["skipped_personalized"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        إحصائيات الذاكرة
+
+        :return: قاموس بعدد الإصابات والإخفاقات ونسبة الإصابة والذاكرة المستخدمة وعمليات الإخراج
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "allow_personalized": self.allow_personalized
+            })
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+class CachedLLMClient:
+    """
+    غلاف أمام عميل نموذج اللغة (DeepSeekAPI) يجيب من الذاكرة قبل استدعاء API
+    (المطابقة التامة أولاً ثم الذاكرة الدلالية إن وُجدت)، والطلبات المتطابقة المتزامنة تتشارك استدعاءً واحداً،
+    باقي خصائص العميل ودواله (api_key، validate_connection...) تمر إليه كما هي
+    """
+
+    def __init__(self, api, cache: Optional[ResponseCache] = None, enabled: bool = None, semantic=None,
+                 single_flight: Optional[SingleFlight] = None):
+        """
+        تهيئة الغلاف
+
+        :param api: عميل نموذج اللغة
+        :param cache: الذاكرة المؤقتة (اختياري، يتم إنشاؤها من الإعدادات)
+        :param enabled: تفعيل التخزين (اختياري، RESPONSE_CACHE_ENABLED افتراضياً)
+        :param semantic: الذاكرة الدلالية SemanticCache (اختياري، بعد المطابقة التامة)
+        :param single_flight: دمج الطلبات المتزامنة (اختياري، يتم إنشاؤه إذا كان SINGLE_FLIGHT_ENABLED مفعلاً)
+        """
+        self.api = api
+        self.cache = cache if cache is not None else ResponseCache()
+        self.semantic = semantic
+        self.enabled = enabled if enabled is not None else BOT_SETTINGS.get("RESPONSE_CACHE_ENABLED", True)
+        if single_flight is None and BOT_SETTINGS.get("SINGLE_FLIGHT_ENABLED", True):
+            single_flight = SingleFlight()
+        self.single_flight = single_flight
+
+    def __getattr__(self, name: str) -> Any:
+        # يُستدعى فقط للخصائص غير الموجودة في الغلاف نفسه
+        if name == "api":
+            raise AttributeError(name)
+        return getattr(self.api, name)
+
+    def _model_params(self, model: Optional[str]) -> Dict[str, Any]:
+        return {
+            "model": model or getattr(self.api, "default_model", None),
+            "max_tokens": getattr(self.api, "max_tokens", None),
+            "temperature": getattr(self.api, "temperature", None)
+        }
+
+    def _fetch(self, key: str, prompt: str, context: Optional[str], model: Optional[str],
+               store: Optional[Callable[[str], None]] = None) -> str:
+        """
+        استدعاء API مرة واحدة لكل مفتاح بين الطلبات المتزامنة
+
+        :param key: مفتاح الطلب (نفس مفتاح الذاكرة)
+        :param store: حفظ الرد (ينفذه الطلب المنفذ فقط، قبل إعلان النتيجة للمنتظرين)
+        :return: النص المولد
+        """
+        def call() -> str:
+            response = self.api.generate_response(prompt, context=context, model=model)
+            if store is not None and isinstance(response, str) and response.strip():
+                store(response)
+            return response
+
+        if self.single_flight is None:
+            return call()
+        response, shared = self.single_flight.do(key, call)
+        if shared:
+            logger.debug(f"رد مشترك من طلب متزامن مطابق دون استدعاء API: {prompt[:30]}")
+        return response
+
+    def _lookup(self, prompt: str, context: Optional[str], model: Optional[str], personalized: bool,
+                intents: Optional[Iterable[str]]) -> Tuple[str, Optional[str], Optional[Callable[[str], None]]]:
+        """
+        البحث في الذاكرة التامة ثم الدلالية
+
+        :return: (مفتاح الطلب، الرد المحفوظ أو None، دالة حفظ الرد الجديد أو None إذا كان لا يُخزن)
+        """
+        params = self._model_params(model)
+        key = make_cache_key(prompt, context, params)
+
+        if not self.enabled:
+            return key, None, None
+
+        if personalized and not self.cache.allow_personalized:
+            self.cache.skip_personalized()
+            return key, None, None
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            logger.debug(f"رد من ذاكرة الردود دون استدعاء API: {prompt[:30]}")
+            return key, cached, None
+
+        semantic_group = None
+        if self.semantic is not None:
+            if self.semantic.eligible(intents):
+                # نفس السياق ومعاملات النموذج والنية فقط (السؤال المشابه في سياق آخر لا يُعاد استخدام رده)
+                semantic_group = make_cache_key("", context, params) + "\x00" + ",".join(sorted(intents or ()))
+                match = self.semantic.lookup(prompt, semantic_group)
+                if match is not None:
+                    response, score, cached_prompt = match
+                    logger.debug(f"رد من الذاكرة الدلالية (تشابه {score:.2f} مع: {cached_prompt[:30]}): {prompt[:30]}")
+                    self.cache.put(key, response)
+                    return key, response, None
+            else:
+                self.semantic.skip_intent()
+
+        def store(response: str) -> None:
+            self.cache.put(key, response)
+            if semantic_group is not None:
+                self.semantic.put(prompt, response, semantic_group)
+
+        return key, None, store
+
+    def generate_response(self, prompt: str, context: str = None, model: str = None,
+                          personalized: bool = False, intents: Optional[Iterable[str]] = None) -> str:
+        """
+        توليد رد من الذاكرة أو من API (ثم حفظه)
+
+        :param prompt: سؤال المستخدم
+        :param context: سياق المحادثة (اختياري)
+        :param model: اسم النموذج (اختياري)
+        :param personalized: السياق يحتوي على بيانات المستخدم (لا يُخزن إلا إذا سمحت الإعدادات)
+        :param intents: فئات الكلمات المفتاحية المطابقة للرسالة (لتقسيم الذاكرة الدلالية واستثناء بعضها)
+        :return: النص المولد
+        :raises: Exception في حالة وجود خطأ (الأخطاء لا تُخزن)
+        """
+        key, cached, store = self._lookup(prompt, context, model, personalized, intents)
+        if cached is not None:
+            return cached
+        return self._fetch(key, prompt, context, model, store)
+
+    def stream_response(self, prompt: str, context: str = None, model: str = None,
+                        personalized: bool = False, intents: Optional[Iterable[str]] = None) -> Iterator[str]:
+        """
+        توليد رد كبث من API (الرد المحفوظ يُعاد كجزء واحد، ويُحفظ الرد المبثوث بعد اكتماله)
+        الطلب المتطابق المتزامن ينتظر البث الجاري ويأخذ الرد كاملاً كجزء واحد
+
+        :param prompt: سؤال المستخدم
+        :param context: سياق المحادثة (اختياري)
+        :param model: اسم النموذج (اختياري)
+        :param personalized: السياق يحتوي على بيانات المستخدم
+        :param intents: فئات الكلمات المفتاحية المطابقة للرسالة
+        :return: مولد لأجزاء النص
+        :raises: Exception في حالة وجود خطأ (الأخطاء لا تُخزن)
+        """
+        key, cached, store = self._lookup(prompt, context, model, personalized, intents)
+        if cached is not None:
+            yield cached
+            return
+
+        stream = getattr(self.api, "stream_response", None)
+        if stream is None:
+            # العميل لا يدعم البث
+            yield self._fetch(key, prompt, context, model, store)
+            return
+
+        flight = None
+        if self.single_flight is not None:
+            flight, leader = self.single_flight.begin(key)
+            if not leader:
+                yield self.single_flight.wait(flight)
+                return
+
+        parts = []
+        try:
+            for part in stream(prompt, context=context, model=model):
+                parts.append(part)
+                yield part
+        except BaseException as e:
+            if flight is not None:
+                if isinstance(e, GeneratorExit):
+                    # المستهلك أوقف البث قبل اكتماله، فلا نتيجة كاملة يتشاركها المنتظرون
+                    e = Exception("توقف بث الرد قبل اكتماله")
+                self.single_flight.finish(key, flight, error=e)
+            raise
+
+        response = "".join(parts)
+        if store is not None and response.strip():
+            store(response)
+        if flight is not None:
+            self.single_flight.finish(key, flight, response)
@@ -0,0 +1,365 @@
+"""
+ذاكرة دلالية لردود نموذج اللغة بعد الذاكرة التامة (response_cache)
+تحول كل سؤال إلى متجه TF-IDF لمقاطع الأحرف (مقاطع مجزأة في عدد ثابت من الأبعاد، بدون تدريب مسبق)
+وتبحث عن أقرب سؤال محفوظ بتشابه جيب التمام (numpy)، فإذا تجاوز الحد يُعاد استخدام رده
+حتى مع اختلاف الصياغة ("ازاي اقدم على وظيفة" و "عايز اقدم في شغل")
+
+التقييم دون اتصال على المحادثات المحفوظة لاختيار الحد المناسب قبل التفعيل:
+    python semantic_cache.py evaluate --thresholds 0.7 0.8 0.9
+"""
+
+import math
+import time
+import zlib
+import logging
+import argparse
+import threading
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+
+from config import BOT_SETTINGS
+from response_cache import normalize_prompt
+
+logger = logging.getLogger(__name__)
+
+# نفس مقاطع فهرس الأسئلة الشائعة (تتحمل السوابق واللواحق العربية)
+SEMANTIC_NGRAM_RANGE = (3, 4)
+
+# السعة الأولية للمصفوفة (تتضاعف حتى max_entries)
+INITIAL_CAPACITY = 64
+
+
+def char_ngrams(text: str) -> List[str]:
+    """
+    مقاطع الأحرف داخل حدود الكلمات بعد التطبيع (مثل char_wb في scikit-learn)
+
+    :param text: النص
+    :return: قائمة المقاطع
+    """
+    min_n, max_n = SEMANTIC_NGRAM_RANGE
+    grams = []
+    for word in normalize_prompt(text).split():
+        padded = f" {word} "
+        for n in range(min_n, max_n + 1):
+            if len(padded) < n:
+                grams.append(padded)
+                break
+            grams.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return grams
+
+
+class SemanticCache:
+    """
+    ذاكرة دلالية بحد تشابه ومهلة صلاحية وإخراج LRU، مقسمة حسب السياق والنية
+    """
+
+    def __init__(self, threshold: float = None, max_entries: int = None, ttl: float = None,
+                 dimensions: int = None, excluded_intents: Optional[Iterable[str]] = None):
+        """
+        تهيئة الذاكرة
+
+        :param threshold: أقل تشابه لإعادة استخدام رد محفوظ (بين 0 و 1)
+        :param max_entries: الحد الأقصى لعدد الأسئلة المحفوظة
+        :param ttl: مدة صلاحية الرد بالثواني
+        :param dimensions: عدد أبعاد المتجه (المقاطع تُجزأ إليها)
+        :param excluded_intents: النوايا (فئات الكلمات المفتاحية) التي لا تستخدم الذاكرة الدلالية
+        """
+        self.threshold = threshold if threshold is not None else BOT_SETTINGS.get("SEMANTIC_CACHE_THRESHOLD", 0.85)
+        self.max_entries = max_entries or BOT_SETTINGS.get("SEMANTIC_CACHE_MAX_ENTRIES", 2000)
+        self.ttl = ttl if ttl is not None else BOT_SETTINGS.get("SEMANTIC_CACHE_TTL", 3600)
+        self.dimensions = dimensions or BOT_SETTINGS.get("SEMANTIC_CACHE_DIMENSIONS", 2048)
+        self.excluded_intents = set(
+            excluded_intents if excluded_intents is not None
+            else BOT_SETTINGS.get("SEMANTIC_CACHE_EXCLUDED_INTENTS", [])
+        )
+
+        self._lock = threading.Lock()
+        # المصفوفات تُنشأ مع أول حفظ (استيراد numpy متأخر)
+        self._tf = None          # تكرار المقاطع (بعد اللوغاريتم) لكل سؤال محفوظ
+        self._present = None     # المقاطع الموجودة في كل سؤال (لحساب تكرار المستندات)
+        self._df = None          # عدد الأسئلة المحفوظة التي تحتوي كل بُعد
+        self._groups = None      # رقم مجموعة (السياق + النية) لكل صف
+        self._expires = None
+        self._last_used = None
+        self._rows: List[Optional[Tuple[str, str]]] = []
+        self._free: List[int] = []
+        self._group_ids: Dict[str, int] = {}
+        self._count = 0
+
+        self._stats = {
+            "lookups": 0,
+            "hits": 0,
+            "stores": 0,
+            "skipped_intent": 0,
+            "expired": 0,
+            "evicted_lru": 0,
+            "total_lookup_us": 0.0
+        }
+
+    # ------------------------------------------------------------------
+    # المتجهات
+    # ------------------------------------------------------------------
+
+    def _vector(self, text: str):
+        import numpy as np
+
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for gram in char_ngrams(text):
+            vector[zlib.crc32(gram.encode("utf-8")) % self.dimensions] += 1.0
+        # تكرار لوغاريتمي (sublinear tf) كما في فهرس الأسئلة الشائعة
+        np.log1p(vector, out=vector)
+        return vector
+
+    def _ensure_capacity(self) -> None:
+        import numpy as np
+
+        if self._tf is None:
+            capacity = min(INITIAL_CAPACITY, self.max_entries)
+            self._tf = np.zeros((capacity, self.dimensions), dtype=np.float32)
+            self._present = np.zeros((capacity, self.dimensions), dtype=bool)
+            self._df = np.zeros(self.dimensions, dtype=np.float32)
+            self._groups = np.full(capacity, -1, dtype=np.int64)
+            self._expires = np.zeros(capacity, dtype=np.float64)
+            self._last_used = np.zeros(capacity, dtype=np.float64)
+            self._rows = [None] * capacity
+            self._free = list(range(capacity - 1, -1, -1))
+            return
+
+        capacity = len(self._rows)
+        if self._free or capacity >= self.max_entries:
+            return
+
+        new_capacity = min(capacity * 2, self.max_entries)
+        extra = new_capacity - capacity
+        self._tf = np.vstack([self._tf, np.zeros((extra, self.dimensions), dtype=np.float32)])
+        self._present = np.vstack([self._present, np.zeros((extra, self.dimensions), dtype=bool)])
+        self._groups = np.concatenate([self._groups, np.full(extra, -1, dtype=np.int64)])
+        self._expires = np.concatenate([self._expires, np.zeros(extra)])
+        self._last_used = np.concatenate([self._last_used, np.zeros(extra)])
+        self._rows.extend([None] * extra)
+        self._free = list(range(new_capacity - 1, capacity - 1, -1))
+
+    def _release(self, row: int) -> None:
+        """
+        تفريغ صف (يُستدعى مع الاحتفاظ بالقفل)
+        """
+        self._df -= self._present[row]
+        self._present[row] = False
+        self._tf[row] = 0.0
+        self._groups[row] = -1
+        self._rows[row] = None
+        self._free.append(row)
+        self._count -= 1
+
+    def _expire(self, now: float) -> None:
+        import numpy as np
+
+        for row in np.flatnonzero((self._groups >= 0) & (self._expires <= now)):
+            self._release(int(row))
+            self._stats["expired"] += 1
+
+    # ------------------------------------------------------------------
+    # الواجهة
+    # ------------------------------------------------------------------
+
+    def eligible(self, intents: Optional[Iterable[str]] = None) -> bool:
+        """
+        هل يمكن استخدام الذاكرة الدلالية لهذه النوايا
+
+        :param intents: فئات الكلمات المفتاحية المطابقة للرسالة
+        :return: False إذا كانت إحدى النوايا مستثناة
+        """
+        return not (self.excluded_intents and self.excluded_intents.intersection(intents or ()))
+
+    def skip_intent(self) -> None:
+        """
+        احتساب طلب لم تُستخدم فيه الذاكرة الدلالية لأن نيته مستثناة
+        """
+        with self._lock:
+            self._stats["skipped_intent"] += 1
+
+    def lookup(self, query: str, group: str = "") -> Optional[Tuple[str, float, str]]:
+        """
+        البحث عن أقرب سؤال محفوظ في نفس المجموعة
+
+        :param query: سؤال المستخدم
+        :param group: مفتاح المجموعة (بصمة السياق ومعاملات النموذج والنية)
+        :return: (الرد المحفوظ، درجة التشابه، السؤال المحفوظ) أو None
+        """
+        import numpy as np
+
+        started = time.perf_counter()
+        query_vector = self._vector(query)
+        result = None
+
+        with self._lock:
+            self._stats["lookups"] += 1
+            group_id = self._group_ids.get(group)
+            if self._tf is not None and group_id is not None and self._count:
+                now = time.monotonic()
+                self._expire(now)
+                candidates = np.flatnonzero(self._groups == group_id)
+                if len(candidates) and query_vector.any():
+                    # وزن IDF من الأسئلة المحفوظة حالياً (تنعيم مثل scikit-learn)
+                    idf = np.log((1.0 + self._count) / (1.0 + self._df)) + 1.0
+                    weighted = self._tf[candidates] * idf
+                    query_weighted = query_vector * idf
+                    norms = np.linalg.norm(weighted, axis=1) * np.linalg.norm(query_weighted)
+                    scores = (weighted @ query_weighted) / np.maximum(norms, 1e-12)
+                    best = int(scores.argmax())
+                    score = float(scores[best])
+                    if score >= self.threshold:
+                        row = int(candidates[best])
+                        self._last_used[row] = now
+                        self._stats["hits"] += 1
+                        cached_query, response = self._rows[row]
+                        result = (response, score, cached_query)
+
+            self._stats["total_lookup_us"] += (time.perf_counter() - started) * 1_000_000
+        return result
+
+    def put(self, query: str, response: str, group: str = "") -> None:
+        """
+        حفظ سؤال ورده مع إخراج الأقل استخداماً عند الامتلاء
+
+        :param query: سؤال المستخدم
+        :param response: الرد
+        :param group: مفتاح المجموعة
+        """
+        vector = self._vector(query)
+        if not vector.any():
+            return
+
+        with self._lock:
+            self._ensure_capacity()
+            now = time.monotonic()
+            if not self._free:
+                self._expire(now)
+            if not self._free:
+                import numpy as np
+                active = np.flatnonzero(self._groups >= 0)
+                self._release(int(active[self._last_used[active].argmin()]))
+                self._stats["evicted_lru"] += 1
+
+            row = self._free.pop()
+            group_id = self._group_ids.setdefault(group, len(self._group_ids))
+            self._tf[row] = vector
+            self._present[row] = vector > 0
+            self._df += self._present[row]
+            self._groups[row] = group_id
+            self._expires[row] = now + self.ttl
+            self._last_used[row] = now
+            self._rows[row] = (query, response)
+            self._count += 1
+            self._stats["stores"] += 1
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._count
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        إحصائيات الذاكرة الدلالية
+
+        :return: قاموس بعدد عمليات البحث والإصابات ونسبتها وزمن البحث وعمليات الإخراج
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "entries": self._count,
+                "capacity": len(self._rows),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "ttl": self.ttl,
+                "excluded_intents": sorted(self.excluded_intents)
+            })
+        lookups = stats["lookups"]
+        total_lookup_us = stats.pop("total_lookup_us")
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["avg_lookup_us"] = round(total_lookup_us / lookups, 1) if lookups else 0.0
+        return stats
+
+
+def evaluate(records: Iterable[Dict[str, Any]], thresholds: List[float],
+             max_entries: int = None, examples: int = 5) -> List[Dict[str, Any]]:
+    """
+    إعادة تشغيل المحادثات المحفوظة بالترتيب وقياس نسبة الإصابة لكل حد تشابه
+    (السياق الكامل لا يُحفظ في السجل، فكل الرسائل تُعامل كمجموعة واحدة)
+
+    :param records: تبادلات المحادثات (user_message و bot_response)
+    :param thresholds: حدود التشابه المراد مقارنتها
+    :param max_entries: سعة الذاكرة أثناء التقييم
+    :param examples: عدد أمثلة الإصابات بصياغة مختلفة المعروضة للمراجعة
+    :return: نتيجة لكل حد
+    """
+    exchanges = [
+        (record["user_message"], record["bot_response"]) for record in records
+        if record.get("user_message") and record.get("bot_response")
+    ]
+
+    results = []
+    for threshold in thresholds:
+        cache = SemanticCache(threshold=threshold, max_entries=max_entries, ttl=math.inf, excluded_intents=())
+        seen_exact = set()
+        exact_hits = semantic_hits = 0
+        samples = []
+        for message, response in exchanges:
+            normalized = normalize_prompt(message)
+            if normalized in seen_exact:
+                # إصابة تامة (تُجاب من response_cache قبل الذاكرة الدلالية)
+                exact_hits += 1
+                continue
+            seen_exact.add(normalized)
+
+            match = cache.lookup(message)
+            if match is not None:
+                semantic_hits += 1
+                if len(samples) < examples:
+                    samples.append({"query": message, "matched": match[2], "score": round(match[1], 3)})
+            else:
+                cache.put(message, response)
+
+        total = len(exchanges)
+        results.append({
+            "threshold": threshold,
+            "messages": total,
+            "exact_hits": exact_hits,
+            "semantic_hits": semantic_hits,
+            "exact_hit_rate": round(exact_hits / total, 4) if total else 0.0,
+            "combined_hit_rate": round((exact_hits + semantic_hits) / total, 4) if total else 0.0,
+            "avg_lookup_us": cache.get_stats()["avg_lookup_us"],
+            "examples": samples
+        })
+    return results
+
+
+def main():
+    """
+    أداة سطر أوامر لتقييم الذاكرة الدلالية على المحادثات المحفوظة
+    """
+    import json
+    from conversation_journal import ConversationJournal
+
+    parser = argparse.ArgumentParser(description="تقييم الذاكرة الدلالية لردود شات بوت مجمع عمال مصر")
+    parser.add_argument("--dir", help="مجلد مقاطع سجل المحادثات")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    evaluate_parser = subparsers.add_parser("evaluate", help="إعادة تشغيل المحادثات وقياس نسبة الإصابة")
+    evaluate_parser.add_argument("--thresholds", type=float, nargs="+", default=[0.7, 0.8, 0.85, 0.9])
+    evaluate_parser.add_argument("--source", default=None, help="تصفية حسب المصدر (messenger أو facebook_comment)")
+    evaluate_parser.add_argument("--max-entries", type=int, default=None)
+    evaluate_parser.add_argument("--examples", type=int, default=5)
+
+    args = parser.parse_args()
+    journal = ConversationJournal(directory=args.dir)
+    records = [
+        record for record in journal.iter_records()
+        if args.source is None or record.get("source") == args.source
+    ]
+
+    if args.command == "evaluate":
+        for result in evaluate(records, args.thresholds, args.max_entries, args.examples):
+            print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,22 +4,40 @@
 ويتعامل مع أحداث Webhook لماسنجر فيسبوك
 """
 
+import time
+from startup_profile import StartupProfiler
+
+# قياس زمن الإقلاع (STARTUP_PROFILE=1) يبدأ قبل استيراد باقي الوحدات
+startup_profiler = StartupProfiler.from_env()
+
 import os
 import json
+import atexit
 import logging
 import hmac
 import hashlib
+import threading
+from collections import OrderedDict
 from typing import Dict, Any, Optional
 
 from flask import Flask, request, jsonify, Response
 from bot import ChatBot
+from conversation_context import ConversationContext
+from http_client import get_pool_stats
+from data_repository import get_repository_stats
+from knowledge_watcher import KnowledgeWatcher
+from webhook_queue import ShardedEventScheduler
+from resilience import get_resilience_stats
+from api import get_usage_stats
 from messenger_utils import (
     send_text_message, 
     send_button_template, 
     send_quick_replies,
     handle_postback,
     extract_menu_quick_replies,
-    send_menu_message
+    send_menu_message,
+    MessengerDelivery,
+    get_delivery_stats
 )
 from config import (
     SERVER_SETTINGS, 
@@ -40,7 +58,14 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 
 # إنشاء كائن الشات بوت
+_phase_started = time.perf_counter()
 chatbot = ChatBot()
+if startup_profiler:
+    startup_profiler.phase("chatbot_init", _phase_started)
+
+# إعادة تحميل قاعدة المعرفة عند تغير data.json دون إعادة تشغيل العامل
+knowledge_watcher = KnowledgeWatcher(chatbot)
+knowledge_watcher.start()
 
 @app.route('/', methods=['GET'])
 def index():
@@ -93,7 +118,8 @@ def api_status():
             "api_status": api_status,
             "bot_name": chatbot.bot_name,
             "version": APP_SETTINGS.get("VERSION", "1.0.0"),
-            "environment": APP_SETTINGS.get("ENVIRONMENT", "development")
+            "environment": APP_SETTINGS.get("ENVIRONMENT", "development"),
+            "http_pool": get_pool_stats()
         }
         
         return jsonify(status_data)
@@ -164,6 +190,65 @@ def verify_facebook_signature(request_data: bytes, signature_header: str) -> boo
     
     return True
 
+# معرفات الأحداث المقبولة مؤخراً: عند رفض أي حدث يُرد بـ 503 فيعيد فيسبوك إرسال الدفعة كاملة،
+# فتُتخطى الأحداث التي قُبلت في المحاولة السابقة بدلاً من معالجتها مرتين
+ACCEPTED_EVENTS_MAX = 10000
+_accepted_events: "OrderedDict[str, None]" = OrderedDict()
+_webhook_lock = threading.Lock()
+_webhook_stats = {"requests": 0, "rejected_requests": 0, "rejected_events": 0, "duplicate_events": 0}
+
+def _event_key(event: Dict[str, Any]) -> Optional[str]:
+    """
+    معرف الحدث الفريد (mid للرسائل والأوامر الخلفية) أو None إذا لم يكن له معرف
+    """
+    for field in ('message', 'postback'):
+        mid = (event.get(field) or {}).get('mid')
+        if mid:
+            return mid
+    return None
+
+def enqueue_webhook_events(entries) -> int:
+    """
+    إضافة أحداث webhook إلى طابور المعالجة مع تخطي الأحداث المقبولة سابقاً
+    
+    :param entries: قائمة entry من طلب webhook
+    :return: عدد الأحداث المرفوضة (الطابور ممتلئ أو متوقف)
+    """
+    rejected = duplicates = 0
+    for entry in entries:
+        for event in entry.get('messaging', []):
+            key = _event_key(event)
+            if key is not None:
+                # الحجز في نفس قسم الفحص: إعادتا إرسال متزامنتان لنفس الحدث لا تمران معاً
+                with _webhook_lock:
+                    if key in _accepted_events:
+                        duplicates += 1
+                        continue
+                    _accepted_events[key] = None
+                    if len(_accepted_events) > ACCEPTED_EVENTS_MAX:
+                        _accepted_events.popitem(last=False)
+            if not webhook_pool.submit(event):
+                rejected += 1
+                if key is not None:
+                    # فيسبوك سيعيد إرسال الحدث المرفوض فيجب ألا يُعد مكرراً
+                    with _webhook_lock:
+                        _accepted_events.pop(key, None)
+    
+    with _webhook_lock:
+        _webhook_stats["requests"] += 1
+        _webhook_stats["rejected_events"] += rejected
+        _webhook_stats["duplicate_events"] += duplicates
+        if rejected:
+            _webhook_stats["rejected_requests"] += 1
+    return rejected
+
+def get_webhook_stats() -> Dict[str, int]:
+    """
+    إحصائيات طلبات webhook: عددها والمرفوض منها (رُد عليه بـ 503) والأحداث المكررة المتخطاة
+    """
+    with _webhook_lock:
+        return dict(_webhook_stats)
+
 @app.route(SERVER_SETTINGS.get("WEBHOOK_ROUTE", "/webhook"), methods=['POST'])
 def webhook_handler():
     """
@@ -180,7 +265,11 @@ def webhook_handler():
             return "توقيع غير صالح", 403
     
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True)
+        
+        if not data:
+            logger.warning("طلب webhook بدون بيانات JSON صالحة")
+            return "بيانات غير صالحة", 400
         
         if data.get('object') != 'page':
             logger.warning(f"نوع كائن غير مدعوم: {data.get('object')}")
@@ -188,9 +277,13 @@ def webhook_handler():
         
         entries = data.get('entry', [])
         
-        for entry in entries:
-            for event in entry.get('messaging', []):
-                process_messenger_event(event)
+        # إضافة الأحداث إلى طابور المعالجة والرد على فيسبوك فوراً
+        # حتى لا يتسبب بطء نموذج اللغة في انتهاء مهلة webhook وإعادة الإرسال
+        rejected = enqueue_webhook_events(entries)
+        if rejected:
+            # عدم تأكيد الاستلام حتى يعيد فيسبوك إرسال الأحداث بدلاً من ضياعها
+            logger.warning(f"تم رفض {rejected} حدث webhook (الطابور ممتلئ)، الرد بـ 503 لإعادة الإرسال")
+            return "الطابور ممتلئ، أعد المحاولة لاحقاً", 503
         
         return "OK"
     
@@ -235,6 +328,9 @@ def handle_messenger_message(sender_id: str, message_data: Dict[str, Any]) -> No
     :param sender_id: معرف المرسل
     :param message_data: بيانات الرسالة
     """
+    # بداية قياس زمن أول رسالة
+    message_started = time.perf_counter()
+    
     # تجاهل الإصدار المتكرر لنفس الرسالة
     if message_data.get('is_echo', False):
         return
@@ -259,7 +355,20 @@ def handle_messenger_message(sender_id: str, message_data: Dict[str, Any]) -> No
         
         # توليد رد باستخدام الشات بوت
         try:
-            response = chatbot.generate_messenger_response(sender_id, message_text)
+            request_context = ConversationContext(sender_id, "messenger", message_text)
+            
+            # رد نموذج اللغة يُبث ويُرسل فقرة بفقرة أثناء توليده (باقي الردود تُرسل كاملة)
+            delivery = MessengerDelivery(sender_id, started=message_started)
+            response = chatbot.generate_messenger_response(
+                sender_id, message_text, request_context,
+                delivery=delivery if BOT_SETTINGS.get("STREAM_RESPONSES", True) else None
+            )
+            if delivery.finished:
+                return
+            if delivery.failed:
+                # تعذر إرسال جزء من الرد المبثوث: لا يُعاد إرساله كاملاً حتى لا يتكرر ما وصل منه
+                logger.error(f"تعذر إرسال {len(delivery.failed)} من رسائل الرد للمستخدم {sender_id}")
+                return
             
             # التحقق من وجود طلب قائمة في الرد
             if "###MENU:" in response:
@@ -283,69 +392,9 @@ def handle_messenger_message(sender_id: str, message_data: Dict[str, Any]) -> No
                 from messenger_utils import process_messenger_text, send_formatted_message
                 send_formatted_message(sender_id, response)
             
-            # إرسال رد نصي عادي
+            # إرسال رد نصي عادي (مع تقسيم الرسائل التي تتجاوز حد أحرف ماسنجر)
             else:
-                # حد أقصى لعدد الأحرف في رسالة ماسنجر فيسبوك (استناداً على حدود منصة فيسبوك)
-                MAX_MESSAGE_LENGTH = 2000
-                
-                # تقسيم الرسائل الطويلة فقط عند تجاوز حد الأحرف المسموح به
-                if len(response) > MAX_MESSAGE_LENGTH:
-                    logger.info(f"الرسالة تجاوزت الحد الأقصى ({len(response)} حرف)، سيتم تقسيمها")
-                    
-                    # تقسيم ذكي للرسالة على أساس الفقرات والجمل لتجنب قطع الجمل
-                    message_parts = []
-                    current_part = ""
-                    
-                    # تقسيم الرسالة إلى فقرات أولاً
-                    paragraphs = response.split('\n\n')
-                    
-                    for paragraph in paragraphs:
-                        # إذا كانت الفقرة نفسها أكبر من الحد الأقصى، نقسمها إلى جمل
-                        if len(paragraph) > MAX_MESSAGE_LENGTH:
-                            sentences = paragraph.replace('\n', ' ').split('. ')
-                            for sentence in sentences:
-                                if len(current_part + sentence + '. ') <= MAX_MESSAGE_LENGTH:
-                                    current_part += sentence + '. '
-                                else:
-                                    # إذا كانت الجملة الواحدة أكبر من الحد الأقصى، نقسمها
-                                    if len(sentence) > MAX_MESSAGE_LENGTH:
-                                        sentence_chunks = [sentence[i:i+MAX_MESSAGE_LENGTH] 
-                                                          for i in range(0, len(sentence), MAX_MESSAGE_LENGTH)]
-                                        
-                                        # إضافة الجزء الحالي إذا لم يكن فارغاً
-                                        if current_part:
-                                            message_parts.append(current_part)
-                                            current_part = ""
-                                        
-                                        # إضافة أجزاء الجملة الطويلة
-                                        message_parts.extend(sentence_chunks[:-1])
-                                        current_part = sentence_chunks[-1] + '. '
-                                    else:
-                                        # حفظ الجزء الحالي وبدء جزء جديد
-                                        message_parts.append(current_part)
-                                        current_part = sentence + '. '
-                        else:
-                            # التحقق مما إذا كانت إضافة الفقرة ستتجاوز الحد الأقصى
-                            if len(current_part + '\n\n' + paragraph) <= MAX_MESSAGE_LENGTH:
-                                if current_part:
-                                    current_part += '\n\n'
-                                current_part += paragraph
-                            else:
-                                # حفظ الجزء الحالي وبدء جزء جديد
-                                message_parts.append(current_part)
-                                current_part = paragraph
-                    
-                    # إضافة الجزء الأخير إذا لم يكن فارغاً
-                    if current_part:
-                        message_parts.append(current_part)
-                    
-                    # إرسال كل جزء كرسالة منفصلة
-                    logger.info(f"تم تقسيم الرسالة إلى {len(message_parts)} أجزاء")
-                    for part in message_parts:
-                        send_text_message(sender_id, part)
-                else:
-                    # إرسال الرسالة كاملة إذا كانت ضمن الحد المسموح
-                    send_text_message(sender_id, response)
+                delivery.deliver(response)
         
         except Exception as e:
             logger.error(f"خطأ في توليد الرد للمستخدم {sender_id}: {e}")
@@ -405,6 +454,58 @@ def handle_messenger_quick_reply(sender_id: str, payload: str) -> None:
     # معالجة الأمر الخلفي مع بيانات القائمة الرئيسية
     handle_postback(sender_id, payload, chatbot.main_menu)
 
+# موزع أحداث ماسنجر: شريحة ثابتة لكل مرسل حتى تبقى رسائل المستخدم الواحد مرتبة
+# بينما تُعالج رسائل المستخدمين المختلفين بالتوازي
+webhook_pool = ShardedEventScheduler(
+    process_messenger_event,
+    key_func=lambda event: event.get('sender', {}).get('id', '')
+)
+webhook_pool.start()
+
+def shutdown_background_workers() -> None:
+    """
+    تفريغ طابور webhook أولاً ثم كتابة المحادثات المعلقة على القرص
+    """
+    knowledge_watcher.stop()
+    webhook_pool.shutdown()
+    chatbot.shutdown()
+
+atexit.register(shutdown_background_workers)
+
+@app.route('/api/metrics', methods=['GET'])
+def api_metrics():
+    """مقاييس التشغيل لمكونات الخادم والشات بوت"""
+    return jsonify({
+        "webhook_queue": webhook_pool.get_stats(),
+        "webhook_requests": get_webhook_stats(),
+        "http_pool": get_pool_stats(),
+        "persistence": chatbot.persistence.get_stats(),
+        "conversation_cache": chatbot.conversation_history.get_stats(),
+        "faq_index": chatbot.faq_index.get_stats(),
+        "response_cache": chatbot.api.cache.get_stats(),
+        "semantic_cache": chatbot.api.semantic.get_stats() if chatbot.api.semantic is not None else None,
+        "single_flight": chatbot.api.single_flight.get_stats() if chatbot.api.single_flight is not None else None,
+        "messenger_delivery": get_delivery_stats(),
+        "llm_client": chatbot.api.api.get_stats() if hasattr(chatbot.api.api, "get_stats") else None,
+        "resilience": get_resilience_stats(),
+        "prompt_builder": chatbot.prompt_builder.get_stats(),
+        "prompt_templates": [chatbot.messenger_template.info(), chatbot.comment_template.info()],
+        "prompt_cache": get_usage_stats(),
+        "data_repository": get_repository_stats(),
+        "startup": startup_profiler.get_report() if startup_profiler else None
+    })
+
+@app.route('/api/knowledge/status', methods=['GET'])
+def api_knowledge_status():
+    """حالة قاعدة المعرفة المحملة (الإصدار وزمن البناء) ومراقب إعادة التحميل"""
+    return jsonify({
+        "knowledge": chatbot.get_knowledge_status(),
+        "watcher": knowledge_watcher.get_status()
+    })
+
+if startup_profiler:
+    startup_profiler.finish()
+
 if __name__ == '__main__':
     # تشغيل الخادم
     host = SERVER_SETTINGS.get("HOST", "0.0.0.0")
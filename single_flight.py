@@ -0,0 +1,152 @@
+"""
+دمج الطلبات المتطابقة المتزامنة (single-flight) أمام عميل نموذج اللغة
+أثناء انتشار منشور يسأل العشرات نفس السؤال خلال ثوان: أول طلب بمفتاح معين يستدعي API
+وباقي الطلبات بنفس المفتاح تنتظره وتتشارك نتيجته (أو خطأه) بدلاً من استدعاء API مرة لكل منها
+"""
+
+import logging
+import threading
+from typing import Dict, Any, Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _copy_error(error: BaseException) -> BaseException:
+    """
+    نسخة من خطأ الطلب لكل منتظر بنفس النوع والسمات (دون استدعاء __init__ الذي قد يتطلب معاملات أخرى)
+    رفع نفس الكائن من عدة خيوط يخلط __traceback__ و __context__ بين الخيوط
+
+    :param error: خطأ الطلب
+    :return: النسخة
+    """
+    clone = type(error).__new__(type(error))
+    clone.__dict__.update(error.__dict__)
+    clone.args = error.args
+    return clone
+
+
+class _Flight:
+    """
+    طلب جارٍ ونتيجته أو خطأه بعد انتهائه
+    """
+
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    تنفيذ دالة مرة واحدة لكل مفتاح بين الطلبات المتزامنة
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+
+        self._stats = {
+            "calls": 0,
+            "executed": 0,
+            "coalesced": 0,
+            "shared_errors": 0,
+            "max_waiters": 0
+        }
+
+    def begin(self, key: str) -> Tuple[_Flight, bool]:
+        """
+        بدء طلب بمفتاح أو الانضمام إلى طلب جارٍ
+        (للمنفذ الذي لا يمكن تغليفه بدالة واحدة مثل البث، ويجب أن ينهيه بـ finish)
+
+        :param key: مفتاح الطلب
+        :return: (الطلب، True إذا كان المستدعي هو المنفذ)
+        """
+        with self._lock:
+            self._stats["calls"] += 1
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.waiters += 1
+                self._stats["coalesced"] += 1
+                self._stats["max_waiters"] = max(self._stats["max_waiters"], flight.waiters)
+                return flight, False
+            flight = self._flights[key] = _Flight()
+            self._stats["executed"] += 1
+            return flight, True
+
+    def wait(self, flight: _Flight) -> Any:
+        """
+        انتظار انتهاء طلب جارٍ
+
+        :param flight: الطلب من begin
+        :return: نتيجته
+        :raises: نسخة من الاستثناء الذي انتهى به الطلب (الأصلي في __cause__)
+        """
+        flight.done.wait()
+        if flight.error is not None:
+            with self._lock:
+                self._stats["shared_errors"] += 1
+            raise _copy_error(flight.error) from flight.error
+        return flight.result
+
+    def finish(self, key: str, flight: _Flight, result: Any = None, error: Optional[BaseException] = None) -> None:
+        """
+        إنهاء طلب وإعلان نتيجته أو خطأه للمنتظرين
+
+        :param key: مفتاح الطلب
+        :param flight: الطلب من begin
+        :param result: النتيجة
+        :param error: الخطأ (إن فشل الطلب)
+        """
+        flight.result = result
+        flight.error = error
+        # الإزالة قبل الإعلان: أي طلب جديد بعد الانتهاء يبدأ تنفيذاً جديداً
+        with self._lock:
+            del self._flights[key]
+        if flight.waiters:
+            logger.debug(f"تمت مشاركة نتيجة طلب واحد مع {flight.waiters} طلب متزامن")
+        flight.done.set()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        تنفيذ الدالة أو انتظار تنفيذ جارٍ بنفس المفتاح
+
+        :param key: مفتاح الطلب
+        :param fn: الدالة (تُستدعى بدون معاملات)
+        :return: (النتيجة، True إذا كانت مشتركة من طلب آخر)
+        :raises: الاستثناء الذي رفعته الدالة (ونسخة منه لكل طلب منتظر)
+        """
+        flight, leader = self.begin(key)
+        if not leader:
+            return self.wait(flight), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            self.finish(key, flight, error=e)
+            raise
+        self.finish(key, flight, result)
+        return result, False
+
+    def in_flight(self) -> int:
+        """
+        عدد الطلبات الجارية حالياً
+
+        :return: عدد المفاتيح الجارية
+        """
+        with self._lock:
+            return len(self._flights)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        إحصائيات دمج الطلبات
+
+        :return: قاموس بعدد الطلبات والمنفذة والمدمجة والأخطاء المشتركة
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._flights)
+        stats["coalesce_rate"] = round(stats["coalesced"] / stats["calls"], 4) if stats["calls"] else 0.0
+        return stats
@@ -0,0 +1,163 @@
+"""
+قياس زمن إقلاع الخادم: زمن استيراد كل وحدة ومراحل التهيئة
+يُفعل بمتغير البيئة STARTUP_PROFILE=1 (يُقرأ مباشرة من البيئة لأن القياس يبدأ قبل استيراد config و .env)
+ويُطبع التقرير في السجل عند انتهاء استيراد server.py ويظهر في /api/metrics
+
+لا يعتمد على أي مكتبة خارجية حتى لا يغير زمن الإقلاع الذي يقيسه
+(بديل سريع من سطر الأوامر: python -X importtime server.py)
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+from importlib.abc import MetaPathFinder
+from typing import Dict, List, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _TimingLoader:
+    """
+    غلاف حول محمل الوحدة يقيس زمن تنفيذها (شامل الوحدات التي تستوردها)
+    """
+
+    def __init__(self, loader, profiler: "StartupProfiler"):
+        self._loader = loader
+        self._profiler = profiler
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module) -> None:
+        self._profiler._enter()
+        started = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler._exit(module.__name__, time.perf_counter() - started)
+            # إعادة المحمل الأصلي حتى لا يظهر الغلاف لمن يفحص __loader__ لاحقاً
+            module.__loader__ = self._loader
+            if getattr(module, "__spec__", None) is not None:
+                module.__spec__.loader = self._loader
+
+
+class StartupProfiler(MetaPathFinder):
+    """
+    مسجل أزمنة الاستيراد ومراحل الإقلاع
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished_ms: Optional[float] = None
+        # الوحدة -> (الزمن الشامل، الزمن الذاتي) بالمللي ثانية
+        self.imports: Dict[str, Dict[str, float]] = {}
+        self.phases: List[Dict[str, Any]] = []
+        self._local = threading.local()
+        self._installed = False
+
+    @classmethod
+    def from_env(cls) -> Optional["StartupProfiler"]:
+        """
+        إنشاء المسجل وتثبيته إذا كان STARTUP_PROFILE مفعلاً
+
+        :return: المسجل أو None
+        """
+        if os.getenv("STARTUP_PROFILE", "").lower() not in ("true", "1", "yes"):
+            return None
+        profiler = cls()
+        profiler.install()
+        return profiler
+
+    def install(self) -> None:
+        """
+        تثبيت المسجل في أول sys.meta_path
+        """
+        if not self._installed:
+            sys.meta_path.insert(0, self)
+            self._installed = True
+
+    def uninstall(self) -> None:
+        """
+        إزالة المسجل من sys.meta_path
+        """
+        if self._installed:
+            sys.meta_path.remove(self)
+            self._installed = False
+
+    def find_spec(self, fullname, path, target=None):
+        # البحث بباقي الباحثين ثم تغليف المحمل (المسجل نفسه لا يجد أي وحدة)
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimingLoader(spec.loader, self)
+                return spec
+        return None
+
+    def _enter(self) -> None:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        # زمن الوحدات الفرعية يُجمع في الإطار الحالي لطرحه من الزمن الذاتي للأب
+        stack.append(0.0)
+
+    def _exit(self, name: str, elapsed: float) -> None:
+        stack = self._local.stack
+        children = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        self.imports[name] = {
+            "total_ms": round(elapsed * 1000, 3),
+            "self_ms": round((elapsed - children) * 1000, 3)
+        }
+
+    def phase(self, name: str, started: float) -> None:
+        """
+        تسجيل مرحلة تهيئة (مثل إنشاء ChatBot)
+
+        :param name: اسم المرحلة
+        :param started: وقت بداية المرحلة من time.perf_counter()
+        """
+        self.phases.append({"name": name, "ms": round((time.perf_counter() - started) * 1000, 3)})
+
+    def finish(self, top: int = 25) -> Dict[str, Any]:
+        """
+        إنهاء القياس وكتابة التقرير في السجل
+
+        :param top: عدد الوحدات الأبطأ (حسب الزمن الذاتي) في التقرير
+        :return: التقرير
+        """
+        self.uninstall()
+        self.finished_ms = round((time.perf_counter() - self.started) * 1000, 3)
+        report = self.get_report(top)
+
+        lines = [f"{item['module']}: {item['self_ms']:.1f}ms (شامل {item['total_ms']:.1f}ms)" for item in report["slowest_imports"]]
+        phases = ", ".join(f"{phase['name']}={phase['ms']:.1f}ms" for phase in self.phases)
+        logger.info(
+            f"زمن الإقلاع {self.finished_ms:.1f}ms ({len(self.imports)} وحدة مستوردة، المراحل: {phases})\n"
+            + "\n".join(lines)
+        )
+        return report
+
+    def get_report(self, top: int = 25) -> Dict[str, Any]:
+        """
+        تقرير الإقلاع
+
+        :param top: عدد الوحدات الأبطأ
+        :return: قاموس يحتوي على الزمن الكلي والمراحل وأبطأ الوحدات
+        """
+        slowest = sorted(self.imports.items(), key=lambda item: item[1]["self_ms"], reverse=True)[:top]
+        return {
+            "total_ms": self.finished_ms,
+            "modules_imported": len(self.imports),
+            "imports_ms": round(sum(stats["self_ms"] for stats in self.imports.values()), 3),
+            "phases": list(self.phases),
+            "slowest_imports": [dict(module=name, **stats) for name, stats in slowest]
+        }
@@ -0,0 +1,403 @@
+"""
+مخزن حالة المحادثات والمستخدمين
+يوفر واجهة موحدة لتاريخ المحادثات وحالة المستخدم (مثل الاسم) وحالة مصادقة المطور
+مع تنفيذ في الذاكرة للاختبارات وتنفيذ SQLite (وضع WAL) يبقى بعد إعادة التشغيل
+ويُشارك بين عمال gunicorn على نفس الجهاز
+"""
+
+import os
+import json
+import sqlite3
+import logging
+import threading
+from collections.abc import MutableMapping
+from typing import Dict, List, Any, Iterator, Optional
+
+from config import BOT_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+# أنواع الحالة المخزنة لكل مستخدم
+STATE_KINDS = ("user_state", "dev_auth")
+
+
+class InMemoryStateStore:
+    """
+    مخزن حالة في الذاكرة (للاختبارات والتشغيل بعامل واحد)
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._exchanges: Dict[str, List[Dict[str, Any]]] = {}
+        self._states: Dict[str, Dict[str, Dict[str, Any]]] = {kind: {} for kind in STATE_KINDS}
+
+    def append_exchanges(self, records: List[Dict[str, Any]]) -> None:
+        """
+        حفظ مجموعة تبادلات (كل سجل يحتوي user_id)
+
+        :param records: قائمة التبادلات
+        """
+        with self._lock:
+            for record in records:
+                self._exchanges.setdefault(record["user_id"], []).append(dict(record))
+
+    def append_exchange(self, record: Dict[str, Any]) -> None:
+        """
+        حفظ تبادل واحد
+
+        :param record: التبادل (يحتوي user_id)
+        """
+        self.append_exchanges([record])
+
+    def get_recent_exchanges(self, user_id: str, limit: int) -> List[Dict[str, Any]]:
+        """
+        آخر N تبادل لمستخدم مرتبة من الأقدم إلى الأحدث
+
+        :param user_id: معرف المستخدم
+        :param limit: عدد التبادلات المطلوبة
+        :return: قائمة التبادلات
+        """
+        if limit <= 0:
+            return []
+        with self._lock:
+            return [dict(record) for record in self._exchanges.get(user_id, [])[-limit:]]
+
+    def count_exchanges(self, user_id: Optional[str] = None) -> int:
+        """
+        عدد التبادلات المحفوظة
+
+        :param user_id: معرف المستخدم (اختياري، كل المستخدمين افتراضياً)
+        :return: عدد التبادلات
+        """
+        with self._lock:
+            if user_id is not None:
+                return len(self._exchanges.get(user_id, []))
+            return sum(len(records) for records in self._exchanges.values())
+
+    def get_state(self, kind: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        قراءة حالة مستخدم
+
+        :param kind: نوع الحالة ("user_state" أو "dev_auth")
+        :param user_id: معرف المستخدم
+        :return: نسخة من الحالة أو None
+        """
+        with self._lock:
+            state = self._states[kind].get(user_id)
+            return dict(state) if state is not None else None
+
+    def set_state(self, kind: str, user_id: str, state: Dict[str, Any]) -> None:
+        """
+        استبدال حالة مستخدم
+
+        :param kind: نوع الحالة
+        :param user_id: معرف المستخدم
+        :param state: الحالة الجديدة
+        """
+        with self._lock:
+            self._states[kind][user_id] = dict(state)
+
+    def delete_state(self, kind: str, user_id: str) -> bool:
+        """
+        حذف حالة مستخدم
+
+        :param kind: نوع الحالة
+        :param user_id: معرف المستخدم
+        :return: True إذا كانت الحالة موجودة
+        """
+        with self._lock:
+            return self._states[kind].pop(user_id, None) is not None
+
+    def state_user_ids(self, kind: str) -> List[str]:
+        """
+        معرفات المستخدمين الذين لهم حالة من نوع معين
+
+        :param kind: نوع الحالة
+        :return: قائمة المعرفات
+        """
+        with self._lock:
+            return list(self._states[kind].keys())
+
+    def close(self) -> None:
+        """
+        لا توجد موارد لإغلاقها في الذاكرة
+        """
+        return None
+
+
+class SQLiteStateStore:
+    """
+    مخزن حالة SQLite بوضع WAL مع فهارس على user_id و timestamp
+    """
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS exchanges (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            source TEXT,
+            user_message TEXT,
+            bot_response TEXT
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_exchanges_user_ts ON exchanges (user_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_exchanges_ts ON exchanges (timestamp)",
+        """
+        CREATE TABLE IF NOT EXISTS user_states (
+            kind TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            data TEXT NOT NULL,
+            updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (kind, user_id)
+        )
+        """
+    )
+
+    # استعلامات ثابتة بمعاملات حتى يعيد sqlite3 استخدام الجمل المُجهزة من ذاكرته المؤقتة
+    SQL_INSERT_EXCHANGE = (
+        "INSERT INTO exchanges (user_id, timestamp, source, user_message, bot_response) "
+        "VALUES (?, ?, ?, ?, ?)"
+    )
+    SQL_RECENT_EXCHANGES = (
+        "SELECT user_id, timestamp, source, user_message, bot_response FROM exchanges "
+        "WHERE user_id = ? ORDER BY timestamp DESC, id DESC LIMIT ?"
+    )
+    SQL_COUNT_USER = "SELECT COUNT(*) FROM exchanges WHERE user_id = ?"
+    SQL_COUNT_ALL = "SELECT COUNT(*) FROM exchanges"
+    SQL_GET_STATE = "SELECT data FROM user_states WHERE kind = ? AND user_id = ?"
+    SQL_SET_STATE = (
+        "INSERT INTO user_states (kind, user_id, data, updated_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP) "
+        "ON CONFLICT (kind, user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at"
+    )
+    SQL_DELETE_STATE = "DELETE FROM user_states WHERE kind = ? AND user_id = ?"
+    SQL_STATE_USERS = "SELECT user_id FROM user_states WHERE kind = ?"
+
+    def __init__(self, db_path: str = None, busy_timeout_ms: int = None):
+        """
+        تهيئة مخزن SQLite
+
+        :param db_path: مسار ملف قاعدة البيانات (اختياري، من الإعدادات افتراضياً)
+        :param busy_timeout_ms: مهلة انتظار القفل عند الكتابة من عدة عمليات
+        """
+        self.db_path = db_path or BOT_SETTINGS.get("STATE_DB_PATH", "conversations/state.db")
+        self.busy_timeout_ms = busy_timeout_ms or BOT_SETTINGS.get("STATE_DB_BUSY_TIMEOUT_MS", 5000)
+
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # اتصال لكل خيط، مع قائمة بكل الاتصالات لإغلاقها عند الإيقاف
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+
+        connection = self._connection()
+        with connection:
+            for statement in self.SCHEMA:
+                connection.execute(statement)
+
+        logger.info(f"تم تهيئة مخزن الحالة SQLite: {self.db_path}")
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        اتصال SQLite الخاص بالخيط الحالي (يتم إنشاؤه عند أول استخدام)
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.db_path,
+                timeout=self.busy_timeout_ms / 1000.0,
+                check_same_thread=False,
+                cached_statements=64
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    def append_exchanges(self, records: List[Dict[str, Any]]) -> None:
+        """
+        حفظ مجموعة تبادلات في معاملة واحدة
+
+        :param records: قائمة التبادلات (كل سجل يحتوي user_id)
+        """
+        if not records:
+            return
+
+        rows = [
+            (
+                record["user_id"],
+                record.get("timestamp", ""),
+                record.get("source"),
+                record.get("user_message"),
+                record.get("bot_response")
+            )
+            for record in records
+        ]
+        connection = self._connection()
+        with connection:
+            connection.executemany(self.SQL_INSERT_EXCHANGE, rows)
+
+    def append_exchange(self, record: Dict[str, Any]) -> None:
+        """
+        حفظ تبادل واحد
+
+        :param record: التبادل (يحتوي user_id)
+        """
+        self.append_exchanges([record])
+
+    def get_recent_exchanges(self, user_id: str, limit: int) -> List[Dict[str, Any]]:
+        """
+        آخر N تبادل لمستخدم مرتبة من الأقدم إلى الأحدث (يستخدم فهرس user_id و timestamp)
+
+        :param user_id: معرف المستخدم
+        :param limit: عدد التبادلات المطلوبة
+        :return: قائمة التبادلات
+        """
+        if limit <= 0:
+            return []
+
+        rows = self._connection().execute(self.SQL_RECENT_EXCHANGES, (user_id, limit)).fetchall()
+        return [
+            {
+                "user_id": row[0],
+                "timestamp": row[1],
+                "source": row[2],
+                "user_message": row[3],
+                "bot_response": row[4]
+            }
+            for row in reversed(rows)
+        ]
+
+    def count_exchanges(self, user_id: Optional[str] = None) -> int:
+        """
+        عدد التبادلات المحفوظة
+
+        :param user_id: معرف المستخدم (اختياري، كل المستخدمين افتراضياً)
+        :return: عدد التبادلات
+        """
+        if user_id is not None:
+            return self._connection().execute(self.SQL_COUNT_USER, (user_id,)).fetchone()[0]
+        return self._connection().execute(self.SQL_COUNT_ALL).fetchone()[0]
+
+    def get_state(self, kind: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        قراءة حالة مستخدم
+
+        :param kind: نوع الحالة ("user_state" أو "dev_auth")
+        :param user_id: معرف المستخدم
+        :return: الحالة أو None
+        """
+        row = self._connection().execute(self.SQL_GET_STATE, (kind, user_id)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_state(self, kind: str, user_id: str, state: Dict[str, Any]) -> None:
+        """
+        استبدال حالة مستخدم
+
+        :param kind: نوع الحالة
+        :param user_id: معرف المستخدم
+        :param state: الحالة الجديدة
+        """
+        connection = self._connection()
+        with connection:
+            connection.execute(self.SQL_SET_STATE, (kind, user_id, json.dumps(state, ensure_ascii=False)))
+
+    def delete_state(self, kind: str, user_id: str) -> bool:
+        """
+        حذف حالة مستخدم
+
+        :param kind: نوع الحالة
+        :param user_id: معرف المستخدم
+        :return: True إذا كانت الحالة موجودة
+        """
+        connection = self._connection()
+        with connection:
+            cursor = connection.execute(self.SQL_DELETE_STATE, (kind, user_id))
+        return cursor.rowcount > 0
+
+    def state_user_ids(self, kind: str) -> List[str]:
+        """
+        معرفات المستخدمين الذين لهم حالة من نوع معين
+
+        :param kind: نوع الحالة
+        :return: قائمة المعرفات
+        """
+        return [row[0] for row in self._connection().execute(self.SQL_STATE_USERS, (kind,))]
+
+    def close(self) -> None:
+        """
+        إغلاق كل اتصالات قاعدة البيانات
+        """
+        with self._connections_lock:
+            for connection in self._connections:
+                try:
+                    connection.close()
+                except sqlite3.Error:
+                    pass
+            self._connections = []
+        self._local = threading.local()
+
+
+class UserStateView(MutableMapping):
+    """
+    واجهة شبيهة بالقاموس فوق نوع حالة في المخزن
+    تعيد نسخة من الحالة عند القراءة، لذلك يجب إعادة تعيين الحالة كاملة لحفظ أي تعديل
+    """
+
+    def __init__(self, store, kind: str):
+        """
+        :param store: مخزن الحالة
+        :param kind: نوع الحالة ("user_state" أو "dev_auth")
+        """
+        self.store = store
+        self.kind = kind
+
+    def __getitem__(self, user_id: str) -> Dict[str, Any]:
+        state = self.store.get_state(self.kind, user_id)
+        if state is None:
+            raise KeyError(user_id)
+        return state
+
+    def __setitem__(self, user_id: str, state: Dict[str, Any]) -> None:
+        self.store.set_state(self.kind, user_id, state)
+
+    def __delitem__(self, user_id: str) -> None:
+        if not self.store.delete_state(self.kind, user_id):
+            raise KeyError(user_id)
+
+    def __contains__(self, user_id) -> bool:
+        return self.store.get_state(self.kind, user_id) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.store.state_user_ids(self.kind))
+
+    def __len__(self) -> int:
+        return len(self.store.state_user_ids(self.kind))
+
+
+def create_state_store(backend: str = None):
+    """
+    إنشاء مخزن الحالة حسب الإعدادات
+
+    :param backend: نوع المخزن ("sqlite" أو "memory")، من STATE_BACKEND افتراضياً
+    :return: كائن مخزن الحالة
+    """
+    backend = (backend or BOT_SETTINGS.get("STATE_BACKEND", "sqlite")).lower()
+
+    if backend == "memory":
+        return InMemoryStateStore()
+
+    if backend == "sqlite":
+        try:
+            return SQLiteStateStore()
+        except sqlite3.Error as e:
+            logger.error(f"فشل فتح مخزن الحالة SQLite، سيتم استخدام الذاكرة: {e}")
+            return InMemoryStateStore()
+
+    logger.warning(f"نوع مخزن حالة غير معروف '{backend}'، سيتم استخدام الذاكرة")
+    return InMemoryStateStore()
@@ -0,0 +1,147 @@
+"""
+اختبارات عميل نموذج اللغة غير المتزامن والواجهة المتزامنة
+"""
+import json
+import time
+import asyncio
+
+import httpx
+import pytest
+
+from async_api import AsyncLLMClient, SyncLLMFacade, LLMDeadlineExceeded
+from resilience import ResilientEndpoint, CircuitBreaker, RetryPolicy, RetryBudget, CLOSED
+
+
+def make_client(delay=0.0, max_concurrency=4, deadline=5.0, stream_parts=None, resilience=None):
+    """عميل بنقل وهمي يرد بعد تأخير ويسجل أقصى عدد طلبات متزامنة"""
+    state = {"active": 0, "max_active": 0}
+
+    async def handler(request):
+        state["active"] += 1
+        state["max_active"] = max(state["max_active"], state["active"])
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            state["active"] -= 1
+        payload = json.loads(request.content)
+        if payload.get("stream"):
+            body = "".join(
+                f"data: {json.dumps({'choices': [{'delta': {'content': part}}]}, ensure_ascii=False)}\n\n"
+                for part in stream_parts
+            ) + "data: [DONE]\n\n"
+            return httpx.Response(200, content=body.encode("utf-8"), headers={"content-type": "text/event-stream"})
+        prompt = payload["messages"][-1]["content"]
+        return httpx.Response(200, json={"choices": [{"message": {"content": f"رد على {prompt}"}}]})
+
+    client = AsyncLLMClient(
+        "deepseek", api_key="test_api_key", max_concurrency=max_concurrency, deadline=deadline,
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        resilience=resilience or ResilientEndpoint("deepseek-test")
+    )
+    return client, state
+
+
+class TestAsyncLLMClient:
+    """
+    اختبارات حد الطلبات المتزامنة والمهلة والإلغاء والواجهة المتزامنة
+    """
+
+    def test_concurrency_cap(self):
+        """اختبار عدم تجاوز حد الطلبات المتزامنة للمزود مع إكمال كل الطلبات"""
+        client, state = make_client(delay=0.02, max_concurrency=4)
+
+        async def run():
+            return await asyncio.gather(*(client.generate_response(f"سؤال {i}") for i in range(20)))
+
+        responses = asyncio.run(run())
+        assert responses[7] == "رد على سؤال 7"
+        assert state["max_active"] == 4
+        stats = client.get_stats()
+        assert stats["completed"] == 20
+        assert stats["max_in_flight"] == 4
+        assert stats["in_flight"] == 0
+
+    def test_hundreds_of_concurrent_calls(self):
+        """اختبار حمل مئات الطلبات الجارية على حلقة أحداث واحدة"""
+        client, state = make_client(delay=0.2, max_concurrency=500)
+
+        async def run():
+            return await asyncio.gather(*(client.generate_response("سؤال") for _ in range(300)))
+
+        started = time.perf_counter()
+        assert len(asyncio.run(run())) == 300
+        assert state["max_active"] == 300
+        # الطلبات تنتظر معاً وليس بالتتابع
+        assert time.perf_counter() - started < 5
+
+    def test_deadline_cancels_request(self):
+        """اختبار إلغاء الطلب عند تجاوز المهلة وتحرير مكانه في الحد"""
+        client, state = make_client(delay=1.0, max_concurrency=1)
+
+        async def run():
+            with pytest.raises(LLMDeadlineExceeded):
+                await client.generate_response("سؤال", deadline=0.05)
+            # الطلب الثاني انتظر في الطابور حتى تجاوز مهلته
+            results = await asyncio.gather(
+                client.generate_response("أول", deadline=0.05),
+                client.generate_response("ثاني", deadline=0.05),
+                return_exceptions=True
+            )
+            return results
+
+        results = asyncio.run(run())
+        assert all(isinstance(result, LLMDeadlineExceeded) for result in results)
+        stats = client.get_stats()
+        assert stats["deadline_exceeded"] == 3
+        assert stats["in_flight"] == 0
+        assert stats["queued"] == 0
+        assert state["active"] == 0
+
+    def test_local_deadlines_are_not_breaker_failures(self):
+        """انتهاء المهلة في الطابور أو أثناء الانتظار بين المحاولات لا يُحسب فشلاً إضافياً في القاطع"""
+        endpoint = ResilientEndpoint("deepseek-queue", breaker=CircuitBreaker("deepseek-queue", failure_threshold=2))
+        client, _ = make_client(delay=0.3, max_concurrency=1, resilience=endpoint)
+
+        async def saturate():
+            return await asyncio.gather(
+                client.generate_response("أول", deadline=2.0),
+                *(client.generate_response("ينتظر", deadline=0.05) for _ in range(3)),
+                return_exceptions=True
+            )
+
+        results = asyncio.run(saturate())
+        assert results[0] == "رد على أول"
+        assert all(isinstance(result, LLMDeadlineExceeded) for result in results[1:])
+        assert endpoint.breaker.state == CLOSED
+        assert endpoint.breaker.get_stats()["failures"] == 0
+
+        # 503 مع Retry-After أطول من المهلة: الفشل يُسجل مرة واحدة ولا انتظار بعد المهلة
+        async def unavailable(request):
+            return httpx.Response(503, headers={"Retry-After": "1"})
+
+        endpoint = ResilientEndpoint(
+            "deepseek-backoff", breaker=CircuitBreaker("deepseek-backoff", failure_threshold=2),
+            policy=RetryPolicy(max_attempts=3, base_delay=0.1, budget=RetryBudget(ratio=1, burst=100))
+        )
+        client = AsyncLLMClient("deepseek", api_key="test_api_key", resilience=endpoint,
+                                http_client=httpx.AsyncClient(transport=httpx.MockTransport(unavailable)))
+
+        started = time.perf_counter()
+        with pytest.raises(LLMDeadlineExceeded):
+            asyncio.run(client.generate_response("سؤال", deadline=0.2))
+        assert time.perf_counter() - started < 0.5
+        assert endpoint.breaker.get_stats()["failures"] == 1
+        assert endpoint.breaker.state == CLOSED
+
+    def test_sync_facade(self):
+        """اختبار عمل المستدعين المتزامنين عبر الواجهة مع البث"""
+        client, _ = make_client(stream_parts=["أهلاً", " بك"])
+        facade = SyncLLMFacade(client)
+        try:
+            assert facade.generate_response("سؤال", context="سياق") == "رد على سؤال"
+            assert list(facade.stream_response("سؤال")) == ["أهلاً", " بك"]
+            assert facade.api_key == "test_api_key"
+            assert facade.get_stats()["completed"] == 2
+        finally:
+            facade.close()
+        assert not facade._thread.is_alive()
@@ -6,6 +6,7 @@ import pytest
 import json
 from unittest.mock import MagicMock, patch
 from bot import ChatBot
+from state_store import InMemoryStateStore
 
 class TestChatBot:
     """
@@ -16,7 +17,7 @@ class TestChatBot:
     def bot(self):
         """تهيئة شات بوت للاختبار"""
         # استخدام ملف بيانات الاختبار
-        bot = ChatBot(data_file="data.json", api_key="test_api_key")
+        bot = ChatBot(data_file="data.json", api_key="test_api_key", state_store=InMemoryStateStore())
         return bot
     
     def test_initialization(self, bot):
@@ -237,4 +238,57 @@ class TestChatBot:
         assert len(investor_question) > 10
         
         # التحقق من أن لكل فئة أسئلة مختلفة
-        assert job_question != investor_question
\ No newline at end of file
+        assert job_question != investor_question
+    
+    def test_developer_mode_is_per_user(self, bot):
+        """اختبار أن وضع المطور لا يتسرب بين المستخدمين"""
+        developer_id = "dev_user"
+        other_id = "regular_user"
+        
+        bot.generate_messenger_response(developer_id, "افتح يا سمسم انا محمد شعبان")
+        assert bot._is_developer_mode(developer_id)
+        assert not bot._is_developer_mode(other_id)
+        
+        # أوامر المطور لا تعمل لمستخدم آخر
+        with patch.object(bot, "_generate_stats_report", return_value="تقرير") as mock_report:
+            with patch("bot.DeepSeekAPI.generate_response", return_value="رد عادي"):
+                bot.generate_messenger_response(other_id, "statistics")
+            mock_report.assert_not_called()
+            
+            assert bot.generate_messenger_response(developer_id, "statistics") == "تقرير"
+        
+        bot.generate_messenger_response(developer_id, "العودة")
+        assert not bot._is_developer_mode(developer_id)
+    
+    def test_request_context_source(self, bot):
+        """اختبار حفظ مصدر المحادثة من سياق الطلب دون تعديل الحالة المشتركة"""
+        from conversation_context import ConversationContext
+        
+        ctx = ConversationContext("ctx_user", "facebook_comment", "رسالة")
+        bot._save_conversation("ctx_user", "رسالة", "رد", ctx)
+        
+        assert bot.conversation_history["ctx_user"][-1]["source"] == "facebook_comment"
+        assert bot.conversation_source == "messenger"
+    
+    def test_history_falls_back_to_state_store(self, bot):
+        """اختبار قراءة آخر التبادلات من مخزن الحالة عند غياب المستخدم من الذاكرة"""
+        for i in range(8):
+            bot._save_conversation("store_user", f"رسالة {i}", f"رد {i}")
+        bot.persistence.flush(timeout=5)
+        
+        # محاكاة عامل آخر أو إعادة تشغيل: الذاكرة فارغة والمخزن مشترك
+        bot.conversation_history.clear()
+        history = bot._get_user_conversation_history("store_user")
+        
+        assert len(history) == bot.context_history_turns
+        assert history[-1]["user_message"] == "رسالة 7"
+    
+    @patch("bot.DeepSeekAPI.generate_response")
+    def test_faq_answered_locally(self, mock_api, bot):
+        """اختبار الرد على سؤال شائع من الفهرس المحلي دون استدعاء API"""
+        question = next(prompt for prompt in bot.prompts if prompt["question"] == "أين يقع مقر المجمع؟")
+        response = bot.generate_messenger_response("faq_user", "فين مقر المجمع؟")
+        
+        assert response == question["answer"]
+        mock_api.assert_not_called()
+        assert bot.faq_index.get_stats()["avoided_llm_calls"] == 1
@@ -0,0 +1,109 @@
+"""
+اختبارات الذاكرة المؤقتة المحدودة لتاريخ المحادثات
+"""
+import time
+
+from conversation_cache import ConversationHistoryCache
+
+
+def _record(index, size=10):
+    return {
+        "timestamp": f"2024-01-01T00:00:{index:02d}",
+        "user_message": "س" * size,
+        "bot_response": f"رد {index}",
+        "source": "messenger"
+    }
+
+
+class TestConversationHistoryCache:
+    """
+    اختبارات الحلقة لكل مستخدم وسياسات الإخراج وحساب الذاكرة
+    """
+
+    def test_ring_buffer_depth(self):
+        """اختبار الاحتفاظ بآخر N تبادل فقط لكل مستخدم"""
+        cache = ConversationHistoryCache(depth=3, max_users=10, max_bytes=10 ** 6, idle_ttl=0)
+        for i in range(10):
+            cache.append("user_1", _record(i))
+
+        history = cache["user_1"]
+        assert len(history) == 3
+        assert history[-1]["bot_response"] == "رد 9"
+        assert history[0]["bot_response"] == "رد 7"
+
+    def test_lru_eviction_by_user_count(self):
+        """اختبار إخراج المستخدم الأقل استخداماً عند تجاوز عدد المستخدمين"""
+        cache = ConversationHistoryCache(depth=5, max_users=2, max_bytes=10 ** 6, idle_ttl=0)
+        cache.append("user_1", _record(1))
+        cache.append("user_2", _record(2))
+
+        # الوصول إلى user_1 يجعله الأحدث استخداماً
+        assert "user_1" in cache
+        cache.append("user_3", _record(3))
+
+        assert "user_2" not in cache
+        assert "user_1" in cache and "user_3" in cache
+        assert cache.get_stats()["evicted_lru"] == 1
+
+    def test_memory_ceiling(self):
+        """اختبار بقاء الذاكرة المحسوبة تحت السقف"""
+        cache = ConversationHistoryCache(depth=5, max_users=1000, max_bytes=20000, idle_ttl=0)
+        for user in range(100):
+            for i in range(5):
+                cache.append(f"user_{user}", _record(i, size=200))
+
+        stats = cache.get_stats()
+        assert stats["bytes"] <= 20000
+        assert stats["evicted_memory"] > 0
+        assert "user_99" in cache
+
+    def test_bytes_accounting_on_overwrite_and_delete(self):
+        """اختبار دقة حساب الذاكرة عند إخراج التبادلات القديمة والحذف"""
+        cache = ConversationHistoryCache(depth=2, max_users=10, max_bytes=10 ** 6, idle_ttl=0)
+        for i in range(10):
+            cache.append("user_1", _record(i))
+        single_user_bytes = cache.get_stats()["bytes"]
+
+        cache.append("user_2", _record(0))
+        del cache["user_2"]
+        assert cache.get_stats()["bytes"] == single_user_bytes
+
+        cache.clear()
+        assert cache.get_stats()["bytes"] == 0
+
+    def test_idle_ttl(self):
+        """اختبار إخراج المستخدمين الخاملين"""
+        cache = ConversationHistoryCache(depth=5, max_users=10, max_bytes=10 ** 6, idle_ttl=0.05)
+        cache.append("user_1", _record(1))
+        time.sleep(0.1)
+
+        assert cache.get("user_1") is None
+        assert cache.get_stats()["evicted_idle"] == 1
+
+    def test_setdefault_creates_user(self):
+        """اختبار أن setdefault ينشئ حلقة المستخدم ويعيد تبادلاته"""
+        cache = ConversationHistoryCache(depth=5, max_users=10, max_bytes=10 ** 6, idle_ttl=0)
+        assert cache.setdefault("user_1", [_record(0)]) == [_record(0)]
+        cache.append("user_1", _record(1))
+        assert len(cache.setdefault("user_1", [])) == 2
+
+    def test_reads_are_snapshots(self):
+        """اختبار أن القراءة تعيد نسخة لا تتأثر بالإضافات اللاحقة ولا تعدل الحلقة"""
+        cache = ConversationHistoryCache(depth=5, max_users=10, max_bytes=10 ** 6, idle_ttl=0)
+        cache.append("user_1", _record(1))
+        bytes_before = cache.get_stats()["bytes"]
+
+        history = cache["user_1"]
+        cache.append("user_1", _record(2))
+        assert len(history) == 1
+
+        # التعديل على النسخة لا يتجاوز حساب الذاكرة
+        history.append(_record(3, size=1000))
+        assert len(cache["user_1"]) == 2
+        assert cache.get_stats()["bytes"] > bytes_before
+
+        # الإضافة أثناء التكرار على items() لا تغير النسخة الجاري قراءتها
+        for user_id, records in cache.items():
+            cache.append(user_id, _record(4))
+            for _ in records:
+                pass
@@ -0,0 +1,124 @@
+"""
+اختبارات سجل المحادثات بإلحاق فقط
+"""
+import os
+import json
+from unittest.mock import patch
+
+from conversation_journal import ConversationJournal, SEAL_SUFFIX
+
+
+class TestConversationJournal:
+    """
+    اختبارات الكتابة والتدوير والقراءة والضغط
+    """
+
+    def _record(self, user_id, index):
+        return {
+            "timestamp": f"2024-01-01T00:00:{index:02d}",
+            "user_id": user_id,
+            "user_message": f"رسالة {index}",
+            "bot_response": f"رد {index}",
+            "source": "messenger"
+        }
+
+    def test_append_writes_one_line_per_exchange(self, tmp_path):
+        """اختبار أن كل تبادل يُكتب كسطر واحد دون إعادة كتابة التاريخ"""
+        journal = ConversationJournal(directory=str(tmp_path), fsync_every=0)
+        for i in range(5):
+            journal.append(self._record("user_1", i))
+        journal.close()
+
+        segments = journal.list_segments()
+        assert len(segments) == 1
+        with open(segments[0], encoding="utf-8") as f:
+            lines = f.readlines()
+        assert len(lines) == 5
+        assert json.loads(lines[-1])["user_message"] == "رسالة 4"
+
+    def test_rotation_by_size(self, tmp_path):
+        """اختبار تدوير المقاطع عند تجاوز الحجم"""
+        journal = ConversationJournal(directory=str(tmp_path), max_segment_bytes=200, fsync_every=0)
+        for i in range(10):
+            journal.append(self._record("user_1", i))
+        journal.close()
+
+        assert len(journal.list_segments()) > 1
+        assert journal.get_stats()["segments_rotated"] >= 1
+
+    def test_read_user_history(self, tmp_path):
+        """اختبار إعادة بناء تاريخ مستخدم بالترتيب عبر عدة مقاطع"""
+        journal = ConversationJournal(directory=str(tmp_path), max_segment_bytes=300, fsync_every=2)
+        for i in range(12):
+            journal.append(self._record("user_1" if i % 2 == 0 else "user_2", i))
+
+        history = journal.read_user_history("user_1")
+        assert [r["user_message"] for r in history] == [f"رسالة {i}" for i in range(0, 12, 2)]
+        assert len(journal.read_user_history("user_2", limit=2)) == 2
+        assert journal.read_user_history("user_1", limit=1)[0]["user_message"] == "رسالة 10"
+        journal.close()
+
+    def test_compact_merges_closed_segments(self, tmp_path):
+        """اختبار دمج المقاطع المغلقة مع الحفاظ على تاريخ كل مستخدم"""
+        journal = ConversationJournal(directory=str(tmp_path), max_segment_bytes=200, fsync_every=0)
+        for i in range(20):
+            journal.append(self._record(f"user_{i % 3}", i))
+        before = {uid: journal.read_user_history(uid) for uid in ("user_0", "user_1", "user_2")}
+        segments_before = len(journal.list_segments())
+
+        summary = journal.compact()
+        assert summary["segments_merged"] == segments_before - 1
+        assert summary["records_before"] == summary["records_after"]
+        assert len(journal.list_segments()) == 2
+
+        for uid, history in before.items():
+            assert journal.read_user_history(uid) == history
+
+        # يجب أن تستمر الكتابة بعد الضغط
+        journal.append(self._record("user_0", 99))
+        assert journal.read_user_history("user_0", limit=1)[0]["user_message"] == "رسالة 99"
+        journal.close()
+
+    def test_reopen_continues_sequence(self, tmp_path):
+        """اختبار أن فتح السجل مجدداً لا يكتب فوق المقاطع الموجودة"""
+        first = ConversationJournal(directory=str(tmp_path))
+        first.append(self._record("user_1", 1))
+        first.close()
+
+        second = ConversationJournal(directory=str(tmp_path))
+        second.append(self._record("user_1", 2))
+        second.close()
+
+        segments = second.list_segments()
+        assert len(segments) == 2
+        assert all(os.path.exists(path + SEAL_SUFFIX) for path in segments)
+        assert len(second.read_user_history("user_1")) == 2
+
+    def test_compact_never_touches_live_segments_of_other_writers(self, tmp_path):
+        """الضغط من عملية منفصلة لا يلمس المقاطع المفتوحة لدى كتاب آخرين ولا يضيع ما يُكتب بعده"""
+        with patch("conversation_journal.writer_id", return_value="host-a-100"):
+            writer_a = ConversationJournal(directory=str(tmp_path), max_segment_bytes=200, fsync_every=0)
+            for i in range(10):
+                writer_a.append(self._record("user_a", i))
+        with patch("conversation_journal.writer_id", return_value="host-b-200"):
+            writer_b = ConversationJournal(directory=str(tmp_path), fsync_every=0)
+            writer_b.append(self._record("user_b", 0))
+        live = {writer_a._file.name, writer_b._file.name}
+
+        # أداة الضغط (مثل سطر الأوامر) عملية لا تكتب شيئاً
+        summary = ConversationJournal(directory=str(tmp_path)).compact()
+        assert summary["segments_merged"] >= 2
+        assert live <= set(writer_a.list_segments())
+
+        # الكتابة المستمرة في المقاطع المفتوحة بعد الضغط لا تضيع
+        writer_a.append(self._record("user_a", 10))
+        writer_b.append(self._record("user_b", 1))
+        writer_a.close()
+        writer_b.close()
+
+        reader = ConversationJournal(directory=str(tmp_path))
+        assert [r["user_message"] for r in reader.read_user_history("user_a")] == [f"رسالة {i}" for i in range(11)]
+        assert len(reader.read_user_history("user_b")) == 2
+
+        # آخر مقطع لكل كاتب لا يُضغط حتى بعد ختمه
+        assert not set(reader.sealed_segments()) & live
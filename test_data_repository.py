@@ -0,0 +1,94 @@
+"""
+اختبارات مستودع ملفات البيانات المشترك
+"""
+import os
+import json
+
+import pytest
+
+from data_repository import DataRepository
+
+
+def write_json(path, data, mtime_offset=0):
+    """كتابة ملف JSON مع إمكانية تقديم وقت التعديل لضمان اختلافه"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    if mtime_offset:
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + mtime_offset))
+
+
+class TestDataRepository:
+    """
+    اختبارات التحليل مرة واحدة وإعادة التحميل عند التغير فقط
+    """
+
+    def test_parses_once_until_file_changes(self, tmp_path):
+        """اختبار القراءة من الذاكرة ثم إعادة التحليل بعد تعديل الملف"""
+        path = str(tmp_path / "data.json")
+        write_json(path, {"prompts": [1]})
+        repository = DataRepository(check_interval=0)
+
+        first = repository.load(path)
+        assert repository.load(path) is first
+
+        write_json(path, {"prompts": [1, 2]}, mtime_offset=10 ** 9)
+        assert repository.load(path) == {"prompts": [1, 2]}
+
+        stats = repository.get_stats()["files"][os.path.abspath(path)]
+        assert stats["loads"] == 2
+        assert stats["cache_hits"] == 1
+
+    def test_touch_without_content_change_skips_parse(self, tmp_path):
+        """اختبار عدم إعادة التحليل عند تغير وقت التعديل فقط"""
+        path = str(tmp_path / "data.json")
+        write_json(path, {"a": 1})
+        repository = DataRepository(check_interval=0)
+        first = repository.load(path)
+
+        write_json(path, {"a": 1}, mtime_offset=10 ** 9)
+        assert repository.load(path) is first
+
+        stats = repository.get_stats()["files"][os.path.abspath(path)]
+        assert stats["loads"] == 1
+        assert stats["unchanged_reads"] == 1
+
+    def test_invalid_update_keeps_last_good_version(self, tmp_path):
+        """اختبار الاستمرار بآخر نسخة صالحة إذا أصبح الملف غير صالح"""
+        path = str(tmp_path / "data.json")
+        write_json(path, {"a": 1})
+        repository = DataRepository(check_interval=0)
+        repository.load(path)
+
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("{ غير صالح")
+        assert repository.load(path) == {"a": 1}
+        assert repository.get_stats()["files"][os.path.abspath(path)]["parse_errors"] == 1
+
+    def test_missing_or_invalid_first_load(self, tmp_path):
+        """اختبار رفع الاستثناءات في التحميل الأول وإرجاع القيمة الافتراضية مع get"""
+        repository = DataRepository(check_interval=0)
+        missing = str(tmp_path / "missing.json")
+
+        with pytest.raises(FileNotFoundError):
+            repository.load(missing)
+        assert repository.get(missing, []) == []
+
+        path = str(tmp_path / "broken.json")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("[1,")
+        with pytest.raises(json.JSONDecodeError):
+            repository.load(path)
+
+    def test_check_interval_throttles_stat(self, tmp_path):
+        """اختبار عدم فحص الملف مرة أخرى قبل انقضاء الفترة"""
+        path = str(tmp_path / "data.json")
+        write_json(path, {"v": 1})
+        repository = DataRepository(check_interval=3600)
+        repository.load(path)
+
+        write_json(path, {"v": 2}, mtime_offset=10 ** 9)
+        assert repository.load(path) == {"v": 1}
+
+        repository.invalidate(path)
+        assert repository.load(path) == {"v": 2}
@@ -0,0 +1,105 @@
+"""
+اختبارات فهرس الأسئلة الشائعة المحلي
+"""
+import json
+
+from config import BOT_SETTINGS
+from faq_index import FAQIndex, normalize_text
+
+PROMPTS = [
+    {"id": 1, "question": "ما هو مجمع عمال مصر؟", "answer": "مجمع عمال مصر منظومة صناعية واقتصادية."},
+    {"id": 2, "question": "كيف يمكنني التقديم للوظائف؟", "answer": "يمكنك التقديم من خلال موقعنا."},
+    {"id": 3, "question": "ما هي خدمات المستثمرين؟", "answer": "نقدم دراسات الجدوى والشراكات."}
+]
+
+
+class TestFAQIndex:
+    """
+    اختبارات البحث والإجابة المحلية والإحصائيات
+    """
+
+    def test_normalize_text(self):
+        """اختبار توحيد أشكال الألف والتاء المربوطة وحذف التشكيل"""
+        assert normalize_text("إستثمارٌ في الجودة") == normalize_text("استثمار في الجوده")
+
+    def test_search_ranks_closest_question(self):
+        """اختبار إرجاع أقرب سؤال حتى مع اختلاف الصياغة"""
+        index = FAQIndex(PROMPTS)
+
+        match, score = index.search("ما هو مجمع عمال مصر؟")
+        assert match["id"] == 1
+        assert score > 0.99
+
+        match, score = index.search("عايز اعرف ازاي اقدم على الوظائف")
+        assert match["id"] == 2
+        assert 0 < score < 1
+
+    def test_answer_respects_threshold_and_counts_hits(self):
+        """اختبار الإجابة فوق الحد فقط واحتساب الاستدعاءات التي تم تجنبها"""
+        index = FAQIndex(PROMPTS)
+
+        assert index.answer("ما هو مجمع عمال مصر", 0.4)["id"] == 1
+        assert index.answer("حالة الطقس غداً", 0.4) is None
+
+        stats = index.get_stats()
+        assert stats["lookups"] == 2
+        assert stats["hits"] == 1
+        assert stats["avoided_llm_calls"] == 1
+        assert stats["hit_rate"] == 0.5
+        assert stats["documents"] == 3
+
+    def test_deferred_build(self):
+        """اختبار تأجيل البناء حتى أول بحث"""
+        index = FAQIndex(PROMPTS, defer=True)
+        assert index.ready
+        assert not index.get_stats()["warm"]
+        assert index.get_stats()["builds"] == 0
+
+        match, _ = index.search("ما هو مجمع عمال مصر؟")
+        assert match["id"] == 1
+        assert index.get_stats()["warm"]
+        assert index.get_stats()["builds"] == 1
+
+    def test_empty_index(self):
+        """اختبار سلوك الفهرس بدون أسئلة"""
+        index = FAQIndex()
+        assert not index.ready
+        assert index.search("أي سؤال") == (None, 0.0)
+        assert index.answer("أي سؤال", 0.1) is None
+
+    def test_thresholds_on_real_prompts(self):
+        """الحدود الافتراضية على أسئلة data.json، والحدود الأشد التي لا تجيب عن رسالة لا يغطيها سؤال"""
+        with open("data.json", "r", encoding="utf-8") as f:
+            index = FAQIndex(json.load(f)["prompts"])
+        local = (BOT_SETTINGS["SIMILARITY_THRESHOLD"], BOT_SETTINGS["FAQ_MIN_MARGIN"])
+        fallback = (BOT_SETTINGS["FALLBACK_FAQ_THRESHOLD"], BOT_SETTINGS["FALLBACK_FAQ_MIN_MARGIN"])
+
+        assert index.answer("مبادرات المجمع", *local)["question"] == "ما هي مبادرات المجمع؟"
+        assert index.answer("محتاج استشارة قانونية", *fallback)["question"] == "خدمات الاستشارات القانونية"
+
+        # صياغتان لنفس السؤال في data.json لا تجعلان الرسالة ملتبسة
+        assert index.answer("التقديم للوظائف", *local)["question"] in ("كيفية التقديم للوظائف؟",
+                                                                     "كيف يمكنني التقديم للوظائف؟")
+
+        # فوق الحد لكن قريبة بنفس القدر من سؤالين مختلفين
+        assert index.answer("خدمات النقل والشحن", *local) is None
+
+        # الحدود الأشد (على حساب بعض الإجابات الصحيحة): كلمات عامة مشتركة مع سؤال غير متعلق
+        # ("الخدمات"، "هل يوجد") أو تشابه ضعيف مع كل الأسئلة
+        for message in ("كم سعر الخدمة", "فين العنوان", "اسعار الخدمات", "الخدمات الطبية",
+                        "هل يوجد فرع في اسكندرية", "خدمات النقل والشحن", "هل المجمع حكومي"):
+            assert index.answer(message, 0.62, 0.1) is None, message
+            assert index.answer(message, 0.5, 0.4) is None, message
+
+    def test_margin_rejects_ambiguous_messages(self):
+        """رسالة قريبة من سؤالين مختلفين لا تُجاب محلياً وتُحسب ملتبسة"""
+        index = FAQIndex([
+            {"id": 1, "question": "خدمات الشركات", "answer": "أ"},
+            {"id": 2, "question": "خدمات المستثمرين", "answer": "ب"}
+        ])
+        match, score, margin = index.rank("خدمات")
+        assert match is not None and margin < 0.2
+
+        assert index.answer("خدمات", 0.3, min_margin=0.2) is None
+        assert index.answer("خدمات الشركات", 0.3, min_margin=0.2)["id"] == 1
+        assert index.get_stats()["ambiguous"] == 1
@@ -0,0 +1,68 @@
+"""
+اختبارات طبقة نقل HTTP المشتركة
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from http_client import PooledHTTPClient
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    """معالج بسيط يدعم HTTP/1.1 حتى تبقى الاتصالات مفتوحة"""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        body = b'{"choices": [{"message": {"content": "ok"}}]}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestPooledHTTPClient:
+    """
+    اختبارات إعادة استخدام الاتصالات في تجمع HTTP
+    """
+
+    @pytest.fixture
+    def server_url(self):
+        """تشغيل خادم محلي مؤقت"""
+        server = HTTPServer(("127.0.0.1", 0), _KeepAliveHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield f"http://127.0.0.1:{server.server_port}/v1/chat/completions"
+        server.shutdown()
+        server.server_close()
+
+    def test_connection_reuse(self, server_url):
+        """اختبار أن الطلبات المتتالية تعيد استخدام نفس الاتصال"""
+        client = PooledHTTPClient(pool_maxsize=2, connect_timeout=2, read_timeout=2)
+
+        for _ in range(5):
+            response = client.post(server_url, json={"messages": []})
+            assert response.status_code == 200
+            assert response.json()["choices"][0]["message"]["content"] == "ok"
+
+        stats = client.get_pool_stats()
+        assert stats["requests"] == 5
+        assert stats["errors"] == 0
+
+        host_stats = list(stats["hosts"].values())[0]
+        assert host_stats["connections_opened"] == 1
+        assert host_stats["reused_requests"] == 4
+
+        client.close()
+
+    def test_default_timeout(self):
+        """اختبار تطبيق مهلة الاتصال والقراءة الافتراضية"""
+        client = PooledHTTPClient(connect_timeout=1.5, read_timeout=7)
+        assert client.timeout == (1.5, 7)
+        client.close()
@@ -0,0 +1,81 @@
+"""
+اختبارات مطابق الكلمات المفتاحية متعدد الأنماط
+"""
+from keyword_matcher import KeywordMatcher, first_match
+
+
+class TestKeywordMatcher:
+    """
+    اختبارات الفحص في مرور واحد وترتيب الأولوية وإعادة البناء
+    """
+
+    def _legacy_scan(self, groups, text):
+        """التنفيذ السابق: البحث عن كل كلمة على حدة في كل قائمة"""
+        text = text.strip().lower()
+        result = {}
+        for category, keywords in groups.items():
+            found = [keyword for keyword in keywords if keyword.lower() in text]
+            if found:
+                result[category] = found
+        return result
+
+    def test_matches_same_keywords_as_substring_loops(self):
+        """اختبار تطابق النتائج مع حلقات البحث السابقة بما فيها الكلمات المتداخلة"""
+        groups = {
+            "job": ["بحث عن عمل", "فرصة عمل", "عمل", "شغل", "سيرة ذاتية"],
+            "workers": ["عمال", "عمالة", "توفير عمال"],
+            "latin": ["AI", "thanks", "thank"]
+        }
+        matcher = KeywordMatcher()
+        for category, keywords in groups.items():
+            matcher.set_group(category, keywords)
+        matcher.build()
+
+        texts = [
+            "أنا في بحث عن عمل وعندي سيرة ذاتية",
+            "نحتاج توفير عمالة للمصنع",
+            "Thanks a lot",
+            "لا شيء هنا",
+            ""
+        ]
+        for text in texts:
+            matches = matcher.scan(text)
+            expected = self._legacy_scan(groups, text)
+            assert {category: [keyword for keyword, _ in found] for category, found in matches.items()} == {
+                category: [keyword.lower() for keyword in found] for category, found in expected.items()
+            }
+
+    def test_first_match_follows_registration_order(self):
+        """اختبار أن أول نتيجة في الفئة هي أول كلمة مسجلة وليست أول كلمة في النص"""
+        matcher = KeywordMatcher()
+        matcher.set_group("menu", {"وظائف": "أبحث عن عمل", "عمال": "أبحث عن موظفين وعمال"})
+        matcher.build()
+
+        matches = matcher.scan("نوفر عمال ونعلن عن وظائف")
+        assert first_match(matches, "menu") == ("وظائف", "أبحث عن عمل")
+        assert first_match(matches, "praise") is None
+
+    def test_shared_keyword_in_several_groups(self):
+        """اختبار ظهور الكلمة نفسها في كل المجموعات المسجلة لها"""
+        matcher = KeywordMatcher()
+        matcher.set_group("a", ["شكرا"])
+        matcher.set_group("b", ["جميل", "شكرا"])
+        matcher.build()
+
+        assert matcher.categories("شكرا جزيلا") == {"a", "b"}
+
+    def test_rebuild_swaps_groups(self):
+        """اختبار استبدال مجموعة وحذف أخرى ثم إعادة البناء"""
+        matcher = KeywordMatcher()
+        matcher.set_group("job", ["وظيفة"])
+        matcher.set_group("media", ["صحفي"])
+        matcher.build()
+        version = matcher.version
+
+        matcher.set_group("job", ["شغل"])
+        matcher.remove_group("media")
+        matcher.build()
+
+        assert matcher.version == version + 1
+        assert matcher.categories("صحفي يبحث عن وظيفة") == set()
+        assert matcher.categories("عايز شغل") == {"job"}
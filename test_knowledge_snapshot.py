@@ -0,0 +1,92 @@
+"""
+اختبارات اللقطة المترجمة لقاعدة المعرفة (الإقلاع السريع)
+"""
+import os
+import json
+
+import pytest
+
+from bot import ChatBot
+from config import BOT_SETTINGS
+from state_store import InMemoryStateStore
+from knowledge_snapshot import load_compiled_snapshot, save_compiled_snapshot
+
+
+PROMPT = {"question": "ما هي مواعيد العمل في المجمع؟", "answer": "من التاسعة صباحاً"}
+
+
+def write_json(path, data, mtime_offset=0):
+    """كتابة ملف JSON مع تقديم وقت التعديل لضمان اختلاف التوقيع"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    if mtime_offset:
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + mtime_offset))
+
+
+class TestKnowledgeSnapshot:
+    """
+    اختبارات حفظ اللقطة وتحميلها والرجوع إلى JSON عند تقادمها
+    """
+
+    @pytest.fixture
+    def paths(self, tmp_path, monkeypatch):
+        """ملف بيانات مؤقت ومسار اللقطة المترجمة"""
+        data_file = str(tmp_path / "data.json")
+        snapshot_file = str(tmp_path / "knowledge.snapshot")
+        write_json(data_file, {"prompts": [PROMPT]})
+        monkeypatch.setitem(BOT_SETTINGS, "KNOWLEDGE_SNAPSHOT_FILE", snapshot_file)
+        return data_file, snapshot_file
+
+    def make_bot(self, data_file):
+        """شات بوت يقرأ ملف البيانات المؤقت"""
+        return ChatBot(data_file=data_file, api_key="test_api_key", state_store=InMemoryStateStore())
+
+    def test_roundtrip(self, tmp_path):
+        """اختبار حفظ اللقطة وتحميلها بنفس البصمة فقط"""
+        data_file = str(tmp_path / "data.json")
+        write_json(data_file, {"prompts": [PROMPT]})
+        bot = self.make_bot(data_file)
+        path = str(tmp_path / "snap")
+
+        assert save_compiled_snapshot(bot.knowledge, path, "abc") > 0
+        assert load_compiled_snapshot(path, "other") is None
+
+        snapshot = load_compiled_snapshot(path, "abc")
+        assert snapshot.source == "compiled"
+        assert not snapshot.faq_index.get_stats()["warm"]
+        assert snapshot.faq_index.answer(PROMPT["question"], 0.4)["answer"] == PROMPT["answer"]
+        assert "customer_service" in snapshot.keyword_matcher.scan("عايز اكلم موظف")
+        assert snapshot.menu_lookup == bot.knowledge.menu_lookup
+
+    def test_startup_uses_compiled_snapshot(self, paths):
+        """اختبار الإقلاع من اللقطة المترجمة دون تحليل JSON"""
+        data_file, snapshot_file = paths
+        assert self.make_bot(data_file).save_knowledge_snapshot(snapshot_file) > 0
+
+        bot = self.make_bot(data_file)
+        assert bot.knowledge.source == "compiled"
+        assert bot.prompts == [PROMPT]
+        assert bot.faq_index.answer(PROMPT["question"], 0.4) is not None
+
+    def test_stale_snapshot_falls_back_to_json(self, paths):
+        """اختبار تجاهل اللقطة بعد تعديل data.json"""
+        data_file, snapshot_file = paths
+        self.make_bot(data_file).save_knowledge_snapshot(snapshot_file)
+
+        updated = {"prompts": [PROMPT, {"question": "كيف أسجل شركتي؟", "answer": "من النموذج"}]}
+        write_json(data_file, updated, mtime_offset=10 ** 9)
+
+        bot = self.make_bot(data_file)
+        assert bot.knowledge.source == "json"
+        assert len(bot.prompts) == 2
+
+    def test_corrupt_snapshot_falls_back_to_json(self, paths):
+        """اختبار تجاهل ملف لقطة تالف"""
+        data_file, snapshot_file = paths
+        with open(snapshot_file, "wb") as f:
+            f.write(b"not a pickle")
+
+        bot = self.make_bot(data_file)
+        assert bot.knowledge.source == "json"
+        assert bot.prompts == [PROMPT]
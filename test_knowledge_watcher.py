@@ -0,0 +1,104 @@
+"""
+اختبارات إعادة تحميل قاعدة المعرفة دون إعادة التشغيل
+"""
+import os
+import json
+
+import pytest
+
+from bot import ChatBot
+from facebook_comments import FacebookCommentsHandler
+from knowledge_watcher import KnowledgeWatcher
+from state_store import InMemoryStateStore
+
+
+def write_json(path, data, mtime_offset=0):
+    """كتابة ملف JSON مع تقديم وقت التعديل لضمان اختلاف التوقيع"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    if mtime_offset:
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + mtime_offset))
+
+
+PROMPT_A = {"question": "ما هي مواعيد العمل في المجمع؟", "answer": "من التاسعة صباحاً"}
+PROMPT_B = {"question": "كيف أسجل شركتي في المجمع؟", "answer": "من خلال نموذج التسجيل"}
+
+
+class TestKnowledgeReload:
+    """
+    اختبارات استبدال لقطة قاعدة المعرفة ومراقب الملفات
+    """
+
+    @pytest.fixture
+    def data_file(self, tmp_path):
+        """ملف بيانات مؤقت بسؤال واحد"""
+        path = str(tmp_path / "data.json")
+        write_json(path, {"prompts": [PROMPT_A]})
+        return path
+
+    @pytest.fixture
+    def bot(self, data_file):
+        """شات بوت يقرأ ملف البيانات المؤقت"""
+        return ChatBot(data_file=data_file, api_key="test_api_key", state_store=InMemoryStateStore())
+
+    def test_reload_swaps_snapshot(self, bot, data_file):
+        """اختبار بناء لقطة جديدة بإصدار أعلى مع استمرار إحصائيات الفهرس"""
+        old = bot.knowledge
+        assert bot.faq_index.answer(PROMPT_A["question"], 0.4) is not None
+
+        write_json(data_file, {"prompts": [PROMPT_A, PROMPT_B]}, mtime_offset=10 ** 9)
+        assert bot.reload_knowledge()
+
+        assert bot.knowledge is not old
+        assert bot.knowledge.version == old.version + 1
+        assert len(bot.prompts) == 2
+        assert bot.faq_index.answer(PROMPT_B["question"], 0.4)["answer"] == PROMPT_B["answer"]
+        assert bot.faq_index.get_stats()["hits"] == 2
+
+        # الملف لم يتغير: لا حاجة لإعادة البناء
+        assert bot.reload_knowledge()
+        assert bot.knowledge.version == old.version + 1
+
+    def test_invalid_file_keeps_current_snapshot(self, bot, data_file):
+        """اختبار الإبقاء على اللقطة الحالية عند كتابة ملف غير صالح"""
+        old = bot.knowledge
+        with open(data_file, "w", encoding="utf-8") as f:
+            f.write("{ غير صالح")
+        os.utime(data_file, ns=(0, os.stat(data_file).st_mtime_ns + 10 ** 9))
+
+        bot.reload_knowledge()
+        assert bot.knowledge is old
+        assert bot.prompts == [PROMPT_A]
+
+    def test_registered_groups_survive_reload(self, bot, data_file):
+        """اختبار بقاء مجموعات كلمات التعليقات المسجلة بعد إعادة التحميل"""
+        handler = FacebookCommentsHandler(bot)
+        assert handler.get_comment_category("ممكن وظيفة") == "باحث عن عمل"
+
+        write_json(data_file, {"prompts": [PROMPT_B]}, mtime_offset=10 ** 9)
+        bot.reload_knowledge()
+
+        assert "comment_job" in bot.keyword_matcher.scan("ممكن وظيفة")
+        assert handler.get_comment_category("ممكن وظيفة") == "باحث عن عمل"
+
+    def test_menu_lookup(self, bot):
+        """اختبار جدول القوائم: القائمة الرئيسية والعناصر الفرعية"""
+        assert bot.knowledge.menu_lookup["القائمة"] == (None, None)
+        main_key, main_item = next(iter(bot.main_menu.items()))
+        assert bot.knowledge.menu_lookup[main_item["title"].lower()] == (main_key, None)
+        assert bot.process_menu_request("الخدمات") == bot.generate_menu_buttons(menu_type="main")
+
+    def test_watcher_detects_change(self, bot, data_file):
+        """اختبار اكتشاف المراقب لتغير الملف وإعادة التحميل"""
+        watcher = KnowledgeWatcher(bot, poll_interval=0)
+        assert not watcher.start()
+        assert not watcher.check_now()
+
+        write_json(data_file, {"prompts": [PROMPT_A, PROMPT_B]}, mtime_offset=10 ** 9)
+        assert watcher.check_now()
+
+        status = watcher.get_status()
+        assert status["reloads"] == 1
+        assert status["checks"] == 2
+        assert len(bot.prompts) == 2
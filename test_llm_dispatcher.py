@@ -0,0 +1,110 @@
+"""
+اختبارات موزع الطلبات الاحتياطية والتحويل بين مزودي نموذج اللغة
+"""
+import asyncio
+
+from llm_dispatcher import HedgedLLMClient, HedgeBudget, LatencyHistogram
+
+
+class FakeProvider:
+    """مزود وهمي يرد بعد تأخير أو يفشل ويسجل الطلبات الملغاة"""
+
+    def __init__(self, provider, delay=0.0, fail=False):
+        self.provider = provider
+        self.delay = delay
+        self.fail = fail
+        self.api_key = "test_api_key"
+        self.default_model = f"{provider}-model"
+        self.max_tokens = 1000
+        self.temperature = 0.7
+        self.deadline = 5.0
+        self.calls = []
+        self.cancelled = 0
+
+    async def generate_response(self, prompt, context=None, model=None, deadline=None):
+        self.calls.append(model)
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise Exception(f"خطأ في {self.provider}")
+        return f"رد {self.provider}"
+
+    async def aclose(self):
+        pass
+
+    def get_stats(self):
+        return {"requests": len(self.calls)}
+
+
+def make_dispatcher(primary, secondary, **kwargs):
+    """موزع بمهلة احتياطية قصيرة قبل تجمع القيم"""
+    kwargs.setdefault("initial_delay", 0.05)
+    kwargs.setdefault("budget", HedgeBudget(ratio=1.0, burst=10))
+    return HedgedLLMClient(primary, secondary, **kwargs)
+
+
+class TestHedgedLLMClient:
+    """
+    اختبارات الطلب الاحتياطي والإلغاء والتحويل والميزانية والمدرج
+    """
+
+    def test_fast_primary_not_hedged(self):
+        """اختبار عدم إرسال طلب احتياطي إذا رد المزود الأساسي قبل المهلة"""
+        primary, secondary = FakeProvider("deepseek"), FakeProvider("openai")
+        dispatcher = make_dispatcher(primary, secondary)
+
+        assert asyncio.run(dispatcher.generate_response("سؤال")) == "رد deepseek"
+        assert secondary.calls == []
+        assert dispatcher.get_stats()["won_primary"] == 1
+
+    def test_slow_primary_hedged_and_cancelled(self):
+        """اختبار أخذ أول رد من المزود الثانوي وإلغاء طلب الأساسي المتأخر"""
+        primary, secondary = FakeProvider("deepseek", delay=2.0), FakeProvider("openai", delay=0.01)
+        dispatcher = make_dispatcher(primary, secondary)
+
+        assert asyncio.run(dispatcher.generate_response("سؤال", model="deepseek-chat")) == "رد openai"
+        assert primary.cancelled == 1
+        # المزود الثانوي يستخدم نموذجه الافتراضي
+        assert secondary.calls == [None]
+        stats = dispatcher.get_stats()
+        assert stats["hedged"] == 1
+        assert stats["won_secondary"] == 1
+
+    def test_failover_on_primary_error(self):
+        """اختبار التحويل الفوري إلى المزود الثانوي عند فشل الأساسي"""
+        primary, secondary = FakeProvider("deepseek", fail=True), FakeProvider("openai")
+        dispatcher = make_dispatcher(primary, secondary, initial_delay=1.0)
+
+        assert asyncio.run(dispatcher.generate_response("سؤال")) == "رد openai"
+        stats = dispatcher.get_stats()
+        assert stats["failover"] == 1
+        assert stats["hedged"] == 0
+
+    def test_budget_caps_hedging(self):
+        """اختبار رفض الطلبات الاحتياطية بعد استهلاك الميزانية"""
+        primary, secondary = FakeProvider("deepseek", delay=0.1), FakeProvider("openai", delay=0.01)
+        dispatcher = make_dispatcher(primary, secondary, initial_delay=0.02, budget=HedgeBudget(ratio=0.0, burst=1))
+
+        async def run():
+            return [await dispatcher.generate_response("سؤال") for _ in range(3)]
+
+        assert asyncio.run(run()) == ["رد openai", "رد deepseek", "رد deepseek"]
+        stats = dispatcher.get_stats()
+        assert stats["hedged"] == 1
+        assert stats["hedge_denied"] == 2
+
+    def test_hedge_delay_follows_primary_percentile(self):
+        """اختبار حساب مهلة الطلب الاحتياطي من p95 لزمن المزود الأساسي"""
+        histogram = LatencyHistogram(window=100)
+        for ms in range(1, 101):
+            histogram.record(ms / 1000)
+        assert histogram.percentile(95) == 95
+        assert histogram.get_stats()["buckets"]["<=50ms"] == 50
+
+        dispatcher = make_dispatcher(FakeProvider("deepseek"), FakeProvider("openai"), min_samples=100)
+        assert dispatcher.hedge_delay() == 0.05
+        dispatcher.histograms["deepseek"] = histogram
+        assert abs(dispatcher.hedge_delay() - 0.095) < 1e-9
@@ -0,0 +1,62 @@
+"""
+اختبارات البحث المتجه في الأسئلة الشائعة للواجهة المحلية
+"""
+import local_response
+from local_response import search_faq, search_faq_batch
+
+DATA = {
+    "prompts": [
+        {"id": 1, "question": "ما هو مجمع عمال مصر؟", "answer": "إجابة المجمع"},
+        {"id": 2, "question": "كيف يمكنني التقديم للوظائف؟", "answer": "إجابة الوظائف"},
+        {"id": 3, "question": "ما هي خدمات المستثمرين؟", "answer": "إجابة المستثمرين"},
+        {"id": 4, "question": "", "answer": "سؤال فارغ"}
+    ]
+}
+
+
+class TestSearchFAQ:
+    """
+    اختبارات درجات الثقة والنتائج المتعددة والدفعات
+    """
+
+    def test_confidence_matches_word_overlap_scoring(self):
+        """اختبار أن الثقة هي نسبة كلمات السؤال الموجودة في الرسالة مع إضافة التطابق الدقيق"""
+        answer, confidence = search_faq("ما هو مجمع عمال مصر؟", DATA)
+        assert answer == "إجابة المجمع"
+        assert confidence == 1.0 + local_response.FAQ_EXACT_MATCH_BONUS
+
+        answer, confidence = search_faq("كيف التقديم", DATA)
+        assert answer == "إجابة الوظائف"
+        assert confidence == 2 / 4
+
+        assert search_faq("حالة الطقس", DATA) == (None, 0.0)
+
+    def test_ties_prefer_earlier_question(self):
+        """اختبار تقديم السؤال الأسبق عند تساوي الدرجات"""
+        data = {"prompts": [
+            {"id": 1, "question": "مواعيد العمل", "answer": "أ"},
+            {"id": 2, "question": "مواعيد الزيارة", "answer": "ب"},
+            {"id": 3, "question": "مواعيد العمل اليوم", "answer": "ج"}
+        ]}
+        matches = search_faq_batch(["ما هي المواعيد؟ مواعيد فقط"], data, top_k=3)[0]
+        assert [prompt["id"] for prompt, _ in matches] == [1, 2, 3]
+        assert matches[0][1] == matches[1][1] == 0.5
+
+    def test_batch_top_k(self):
+        """اختبار نتائج الدفعة مرتبة تنازلياً ومطابقة للبحث الفردي"""
+        messages = ["ما هي خدمات المستثمرين؟", "كيف يمكنني العمل", "لا شيء"]
+        results = search_faq_batch(messages, DATA, top_k=3)
+
+        assert len(results) == 3
+        assert results[0][0][0]["id"] == 3
+        assert all(a[1] >= b[1] for a, b in zip(results[0], results[0][1:]))
+        assert results[2] == []
+        for message, matches in zip(messages, results):
+            expected = search_faq(message, DATA)
+            assert (matches[0][0]["answer"], matches[0][1]) == expected if matches else expected == (None, 0.0)
+
+    def test_matrix_rebuilt_when_questions_change(self):
+        """اختبار إعادة بناء المصفوفة عند تغير الأسئلة"""
+        search_faq("الوظائف", DATA)
+        changed = {"prompts": [{"question": "أين يقع المقر؟", "answer": "إجابة المقر"}]}
+        assert search_faq("أين المقر", changed)[0] == "إجابة المقر"
@@ -0,0 +1,92 @@
+"""
+اختبارات الكاتب الخلفي لحفظ المحادثات
+"""
+import time
+import threading
+
+from persistence_writer import WriteBehindWriter
+
+
+class TestWriteBehindWriter:
+    """
+    اختبارات الكتابة على دفعات والإسقاط عند الامتلاء والتفريغ عند الإيقاف
+    """
+
+    def test_group_commit_by_batch_size(self):
+        """اختبار كتابة السجلات على دفعات بحجم الدفعة المحدد"""
+        batches = []
+        writer = WriteBehindWriter(batches.append, batch_size=10, flush_interval_ms=5000, max_buffer=100)
+
+        for i in range(30):
+            assert writer.write({"id": i})
+
+        assert writer.flush(timeout=5)
+        assert [r["id"] for batch in batches for r in batch] == list(range(30))
+        assert all(len(batch) <= 10 for batch in batches)
+
+        stats = writer.get_stats()
+        assert stats["flushed"] == 30
+        assert stats["dropped"] == 0
+        assert stats["buffered"] == 0
+        writer.shutdown(timeout=5)
+
+    def test_flush_interval(self):
+        """اختبار كتابة دفعة غير مكتملة بعد انتهاء المهلة"""
+        written = threading.Event()
+        writer = WriteBehindWriter(lambda batch: written.set(), batch_size=100, flush_interval_ms=20)
+
+        writer.write({"id": 1})
+        assert written.wait(2)
+        writer.shutdown(timeout=5)
+
+    def test_write_does_not_wait_for_slow_sink(self):
+        """اختبار أن زمن الإضافة لا يعتمد على زمن الكتابة على القرص"""
+        def slow_sink(batch):
+            time.sleep(0.2)
+
+        writer = WriteBehindWriter(slow_sink, batch_size=1, flush_interval_ms=10, max_buffer=100)
+
+        started = time.perf_counter()
+        for i in range(5):
+            writer.write({"id": i})
+        assert time.perf_counter() - started < 0.1
+
+        assert writer.shutdown(timeout=5)
+        assert writer.get_stats()["flushed"] == 5
+
+    def test_full_buffer_drops_records(self):
+        """اختبار إسقاط السجلات عند امتلاء المخزن المؤقت"""
+        release = threading.Event()
+        writer = WriteBehindWriter(lambda batch: release.wait(5), batch_size=1,
+                                   flush_interval_ms=10, max_buffer=2)
+
+        results = [writer.write({"id": i}) for i in range(10)]
+        assert results.count(False) >= 1
+        assert writer.get_stats()["dropped"] == results.count(False)
+
+        release.set()
+        writer.shutdown(timeout=5)
+
+    def test_sync_mode_writes_inline(self):
+        """اختبار أن وضع sync يكتب قبل العودة دون خيط خلفي"""
+        batches = []
+        writer = WriteBehindWriter(batches.append, durability="sync")
+
+        writer.write({"id": 1})
+        assert batches == [[{"id": 1}]]
+        assert writer.get_stats()["running"] is False
+
+    def test_shutdown_flushes_pending(self):
+        """اختبار كتابة السجلات المتبقية عند الإيقاف"""
+        batches = []
+        writer = WriteBehindWriter(batches.extend, batch_size=1000, flush_interval_ms=60000)
+
+        for i in range(25):
+            writer.write({"id": i})
+
+        assert writer.shutdown(timeout=5)
+        assert len(batches) == 25
+
+        # السجلات المتأخرة بعد الإيقاف تُكتب مباشرة
+        writer.write({"id": 99})
+        assert batches[-1] == {"id": 99}
@@ -0,0 +1,159 @@
+"""
+اختبارات بناء سياق المحادثة بميزانية رموز
+"""
+from unittest.mock import MagicMock
+
+from api import DeepSeekAPI, build_chat_request, get_usage_stats, stream_event_content
+from resilience import CircuitBreaker, ResilientEndpoint
+from prompt_builder import PromptBuilder, get_template, estimate_tokens, legacy_context
+
+CONTINUE_PHRASES = ["هل لديك أسئلة أخرى؟", "هل ترغب في معرفة المزيد؟"]
+
+
+def make_history(count, reply_words=200):
+    """تبادلات بردود طويلة تتضمن قائمة روابط الخدمات وعبارة استمرارية"""
+    return [
+        {
+            "user_message": f"سؤال رقم {index} عن التوظيف",
+            "bot_response": (f"أهلاً بك!\nإجابة السؤال {index} عن التقديم على الوظائف المتاحة. "
+                             + "تفاصيل إضافية " * (reply_words // 2)
+                             + "\n1. بوابة التوظيف للباحثين عن عمل: https://omalmisrservices.com/ar/jobs"
+                             + "\n\nهل لديك أسئلة أخرى؟")
+        }
+        for index in range(count)
+    ]
+
+
+class TestPromptBuilder:
+    """
+    اختبارات الميزانية والاختصار والتلخيص وحذف العبارات المتكررة
+    """
+
+    def test_estimate_tokens(self):
+        """التقدير المحلي: العربية رمز لكل 3 أحرف واللاتينية لكل 4 وكل علامة ترقيم رمز"""
+        assert estimate_tokens("") == 0
+        assert estimate_tokens("مرحبا") == 2
+        assert estimate_tokens("hello world") == 4
+        assert estimate_tokens("2024!") == 3
+        # العد جمعي عبر الكلمات
+        text = "الخدمات الرئيسية: https://omalmisrservices.com/ar/jobs"
+        assert estimate_tokens(text) == sum(estimate_tokens(word) for word in text.split())
+
+    def test_budget_keeps_recent_turns_and_summarizes_older(self):
+        """آخر التبادلات مختصرة والأقدم ملخصة والسياق لا يتجاوز الميزانية"""
+        builder = PromptBuilder(max_tokens=900, full_turns=2, max_turn_tokens=80, summary_tokens=30,
+                                boilerplate=CONTINUE_PHRASES, count_tokens=estimate_tokens)
+        system_prompt = get_template("messenger").render(user_name="أحمد")
+        history = make_history(5)
+
+        context, report = builder.build(system_prompt, history)
+
+        assert context.startswith(system_prompt)
+        assert report["tokens"] == estimate_tokens(context) <= 900
+        assert report["baseline_tokens"] == estimate_tokens(legacy_context(system_prompt, history))
+        assert report["saved_tokens"] > report["baseline_tokens"] / 2
+        assert report["truncated"] == 2
+        assert report["summarized"] == 3
+        assert report["dropped"] == 0
+
+        # الترتيب الزمني محفوظ، والملخص أول جملة ذات معنى وليس التحية
+        positions = [context.index(f"سؤال رقم {index}") for index in range(5)]
+        assert positions == sorted(positions)
+        assert "محمد سلامة: إجابة السؤال 0 عن التقديم على الوظائف المتاحة." in context
+
+        stats = builder.get_stats()
+        assert stats["requests"] == 1
+        assert stats["saved_ratio"] > 0.5
+
+    def test_drops_oldest_turns_over_budget(self):
+        """عند ضيق الميزانية يُحذف الأقدم أولاً ويبقى الأحدث"""
+        system_prompt = get_template("messenger").render(user_name="أحمد")
+        budget = estimate_tokens(system_prompt) + 120
+        builder = PromptBuilder(max_tokens=budget, full_turns=1, max_turn_tokens=60, summary_tokens=20,
+                                count_tokens=estimate_tokens)
+
+        context, report = builder.build(system_prompt, make_history(5))
+
+        assert report["tokens"] <= budget
+        assert report["dropped"] > 0
+        assert "سؤال رقم 4" in context
+        assert "سؤال رقم 0" not in context
+        assert report["truncated"] + report["summarized"] + report["dropped"] == 5
+
+    def test_strips_repeated_boilerplate(self):
+        """روابط الخدمات الموجودة في موجه النظام وعبارات الاستمرارية لا تتكرر في التاريخ"""
+        builder = PromptBuilder(boilerplate=CONTINUE_PHRASES, count_tokens=estimate_tokens)
+        history = [{
+            "user_message": "عايز اشتغل",
+            "bot_response": ("قدم من خلال بوابة التوظيف.\n"
+                             "1. بوابة التوظيف للباحثين عن عمل: https://omalmisrservices.com/ar/jobs\n"
+                             "https://omalmisrservices.com/ar/workers\n"
+                             "وتابعنا على https://www.facebook.com/omalmisr\n\n"
+                             "هل ترغب في معرفة المزيد؟")
+        }]
+
+        context, _ = builder.build(get_template("messenger").render(user_name="أحمد"), history)
+        history_text = context.split("تاريخ المحادثة السابق:")[1]
+
+        assert "قدم من خلال بوابة التوظيف." in history_text
+        assert "omalmisrservices.com" not in history_text
+        assert "https://www.facebook.com/omalmisr" in history_text
+        assert "هل ترغب في معرفة المزيد؟" not in history_text
+        assert not builder.build(get_template("messenger").prefix, [])[0].endswith("تاريخ المحادثة السابق:\n")
+
+
+class TestPromptCaching:
+    """
+    اختبارات ثبات بادئة موجه النظام وتسجيل إصابات ذاكرة البادئات
+    """
+
+    def test_static_prefix_is_identical_across_users(self):
+        """الإصدار 2: التعليمات الثابتة أولاً ومتطابقة لكل المستخدمين والتعليقات، والإصدار 1 متاح للتراجع"""
+        template = get_template("messenger", "2")
+        first = template.render(user_name="أحمد")
+        second = template.render(user_name="سارة")
+
+        assert first.startswith(template.prefix) and second.startswith(template.prefix)
+        assert "أحمد" not in template.prefix
+        assert first.endswith("أحمد\n")
+        assert estimate_tokens(template.prefix) >= 64
+
+        # السياق الكامل يبدأ بنفس البادئة مهما اختلف التاريخ
+        builder = PromptBuilder(count_tokens=estimate_tokens)
+        context, _ = builder.build(first, make_history(3))
+        assert context.startswith(template.prefix)
+
+        comment = get_template("comment", "2")
+        assert comment.render(comment_text="كم الراتب؟") == comment.prefix
+        assert "كم الراتب؟" in get_template("comment", "1").render(comment_text="كم الراتب؟")
+
+        legacy = get_template("messenger", "1")
+        assert legacy.prefix == "" and "تتحدث مع أحمد" in legacy.render(user_name="أحمد")
+        assert template.info()["prefix_hash"] != legacy.info()["prefix_hash"]
+        assert get_template("messenger", "99") is template
+
+    def test_records_cache_hit_tokens(self):
+        """تسجيل رموز الإصابة من رد DeepSeek ومن حدث usage الأخير في بث OpenAI"""
+        before = get_usage_stats().get("deepseek", {"cache_hit_tokens": 0, "cache_miss_tokens": 0})
+        http_client = MagicMock()
+        http_client.post.return_value.json.return_value = {
+            "choices": [{"message": {"content": "رد"}}],
+            "usage": {"prompt_tokens": 500, "completion_tokens": 40,
+                      "prompt_cache_hit_tokens": 384, "prompt_cache_miss_tokens": 116}
+        }
+        api = DeepSeekAPI(api_key="test_api_key", http_client=http_client,
+                          resilience=ResilientEndpoint("deepseek-test", breaker=CircuitBreaker("deepseek-test")))
+        assert api.generate_response("سؤال", context=get_template("messenger").render(user_name="أحمد")) == "رد"
+
+        after = get_usage_stats()["deepseek"]
+        assert after["cache_hit_tokens"] - before["cache_hit_tokens"] == 384
+        assert after["cache_miss_tokens"] - before["cache_miss_tokens"] == 116
+
+        # البث يطلب حدث usage، والحدث الأخير بلا choices
+        _, payload = build_chat_request("test_api_key", "سؤال", stream=True)
+        assert payload["stream_options"] == {"include_usage": True}
+        event = '{"choices": [], "usage": {"prompt_tokens": 1000, "prompt_tokens_details": {"cached_tokens": 768}}}'
+        assert stream_event_content(event, provider="openai-test") == []
+        stats = get_usage_stats()["openai-test"]
+        assert (stats["cache_hit_tokens"], stats["cache_miss_tokens"]) == (768, 232)
+        assert stats["cache_hit_ratio"] == 0.768
@@ -0,0 +1,317 @@
+"""
+اختبارات قواطع الدائرة وسياسة إعادة المحاولة
+"""
+from email.utils import formatdate
+from unittest.mock import MagicMock, patch
+
+import time
+import asyncio
+import httpx
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+
+from resilience import (
+    CircuitBreaker, CircuitOpenError, ResilientEndpoint, RetryBudget, RetryPolicy, UpstreamError,
+    parse_retry_after, CLOSED, OPEN, HALF_OPEN
+)
+from api import DeepSeekAPI
+from async_api import AsyncLLMClient, LLMDeadlineExceeded
+from messenger_utils import send_messenger_message
+
+
+class FakeClock:
+    """ساعة يدوية للتحكم في مهلة التعافي"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_endpoint(name="test", threshold=3, recovery=10, budget=None, max_delay=8):
+    """واجهة بساعة يدوية ودالة انتظار تسجل التأخيرات بدلاً من النوم"""
+    clock = FakeClock()
+    sleeps = []
+    endpoint = ResilientEndpoint(
+        name,
+        breaker=CircuitBreaker(name, failure_threshold=threshold, recovery_timeout=recovery, clock=clock),
+        policy=RetryPolicy(max_attempts=3, base_delay=0.1, max_delay=max_delay,
+                           budget=budget or RetryBudget(ratio=1, burst=100)),
+        sleep=sleeps.append
+    )
+    return endpoint, clock, sleeps
+
+
+def http_response(status, headers=None):
+    """استجابة requests فاشلة برمز حالة وترويسات"""
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    return response
+
+
+class TestResilience:
+    """
+    اختبارات حالات القاطع وإعادة المحاولة والميزانية وتكاملها مع DeepSeek وماسنجر
+    """
+
+    def test_breaker_opens_probes_and_closes(self):
+        """الدائرة تُفتح بعد الإخفاقات المتتالية وتسمح بطلب اختباري واحد بعد مهلة التعافي"""
+        clock = FakeClock()
+        breaker = CircuitBreaker("deepseek", failure_threshold=3, recovery_timeout=10, clock=clock)
+
+        for _ in range(3):
+            breaker.allow()
+            breaker.record_failure()
+        assert breaker.state == OPEN
+        with pytest.raises(CircuitOpenError) as error:
+            breaker.allow()
+        assert error.value.retry_after == pytest.approx(10)
+
+        # بعد مهلة التعافي: طلب اختباري واحد فقط والباقي يُرفض
+        clock.now += 10
+        assert breaker.state == HALF_OPEN
+        breaker.allow()
+        with pytest.raises(CircuitOpenError):
+            breaker.allow()
+
+        # فشل الطلب الاختباري يعيد فتحها، ونجاح التالي يغلقها
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        clock.now += 10
+        breaker.allow()
+        breaker.record_success()
+        assert breaker.state == CLOSED
+
+        stats = breaker.get_stats()
+        assert stats["transitions"] == {"closed->open": 1, "open->half_open": 2, "half_open->open": 1,
+                                        "half_open->closed": 1}
+        assert stats["rejected"] == 2
+        assert [item["transition"] for item in stats["recent_transitions"]][-1] == "half_open->closed"
+
+    def test_retry_respects_retry_after_and_skips_permanent_errors(self):
+        """إعادة المحاولة تنتظر Retry-After، ولا تعيد أخطاء العميل الدائمة ولا تحسبها ضد الدائرة"""
+        endpoint, clock, sleeps = make_endpoint()
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise UpstreamError("مشغول", status=429, retry_after=2, retryable=True)
+            return "تم"
+
+        assert endpoint.call(flaky) == "تم"
+        assert len(attempts) == 2
+        assert 2 <= sleeps[0] <= 2.1
+
+        # Retry-After أطول من الحد الأقصى: لا إعادة محاولة
+        def overloaded():
+            raise UpstreamError("صيانة", status=503, retry_after=60, retryable=True)
+
+        with pytest.raises(UpstreamError):
+            endpoint.call(overloaded)
+        assert len(sleeps) == 1
+
+        # 400 خطأ دائم: لا إعادة محاولة والدائرة لا تتأثر
+        def bad_request():
+            raise UpstreamError("طلب غير صالح", status=400)
+
+        for _ in range(5):
+            with pytest.raises(UpstreamError):
+                endpoint.call(bad_request)
+        assert endpoint.breaker.state == CLOSED
+        assert endpoint.get_stats()["retries"] == 1
+
+        assert parse_retry_after("7") == 7
+        assert 25 <= parse_retry_after(formatdate(time.time() + 30, usegmt=True)) <= 30
+        assert parse_retry_after("غير صالح") is None
+
+    def test_retry_budget_caps_extra_attempts(self):
+        """ميزانية إعادة المحاولة تمنع مضاعفة الحمل على مزود متعطل"""
+        endpoint, clock, sleeps = make_endpoint(threshold=100, budget=RetryBudget(ratio=0, burst=1))
+
+        def down():
+            raise UpstreamError("خطأ داخلي", status=500, retryable=True)
+
+        for _ in range(3):
+            with pytest.raises(UpstreamError):
+                endpoint.call(down)
+
+        stats = endpoint.get_stats()
+        assert stats["retries"] == 1
+        assert stats["retries_denied"] == 3
+        assert stats["circuit"]["failures"] == 4
+
+    def test_deepseek_rejects_immediately_while_open(self):
+        """بعد فتح الدائرة لا يتصل DeepSeekAPI بالواجهة حتى انتهاء مهلة Retry-After"""
+        endpoint, clock, sleeps = make_endpoint(name="deepseek", threshold=2, recovery=5)
+        response = http_response(503, {"Retry-After": "6"})
+        http_client = MagicMock()
+        http_client.post.return_value = response
+        api = DeepSeekAPI(api_key="test_api_key", http_client=http_client, resilience=endpoint)
+
+        with pytest.raises(UpstreamError) as error:
+            api.generate_response("سؤال")
+        assert error.value.status == 503
+        assert http_client.post.call_count == 2
+        assert endpoint.breaker.state == OPEN
+
+        with pytest.raises(CircuitOpenError):
+            api.generate_response("سؤال")
+        assert http_client.post.call_count == 2
+
+        # الدائرة تبقى مفتوحة مدة Retry-After (أطول من مهلة التعافي)
+        clock.now += 5
+        assert endpoint.breaker.state == OPEN
+        clock.now += 1
+        http_client.post.return_value = MagicMock(status_code=200)
+        http_client.post.return_value.json.return_value = {"choices": [{"message": {"content": "متصل"}}]}
+        assert api.generate_response("سؤال") == "متصل"
+        assert endpoint.breaker.state == CLOSED
+
+    def test_timeouts_open_the_circuit(self):
+        """انتهاء مهلة القراءة لا يُعاد لكنه فشل يفتح الدائرة (المزود المعلق هو الحالة المتدهورة)"""
+        endpoint, clock, sleeps = make_endpoint(name="deepseek", threshold=3)
+        http_client = MagicMock()
+        http_client.post.side_effect = requests.exceptions.ReadTimeout("Read timed out")
+        api = DeepSeekAPI(api_key="test_api_key", http_client=http_client, resilience=endpoint)
+
+        for _ in range(3):
+            with pytest.raises(UpstreamError):
+                api.generate_response("سؤال")
+        assert http_client.post.call_count == 3
+        assert sleeps == []
+        assert endpoint.breaker.state == OPEN
+        assert endpoint.breaker.get_stats()["failures"] == 3
+        with pytest.raises(CircuitOpenError):
+            api.generate_response("سؤال")
+        assert http_client.post.call_count == 3
+
+        # العميل غير المتزامن: المهلة تُلغي الطلب المعلق قبل ReadTimeout وتُحسب فشلاً أيضاً
+        async def hang(request):
+            await asyncio.sleep(1)
+
+        async_endpoint, _, _ = make_endpoint(name="deepseek-async", threshold=2)
+        client = AsyncLLMClient("deepseek", api_key="test_api_key", resilience=async_endpoint,
+                                http_client=httpx.AsyncClient(transport=httpx.MockTransport(hang)))
+
+        async def run():
+            for _ in range(2):
+                with pytest.raises(LLMDeadlineExceeded):
+                    await client.generate_response("سؤال", deadline=0.05)
+
+        asyncio.run(run())
+        assert async_endpoint.breaker.state == OPEN
+
+    def test_stream_interrupted_midway_opens_the_circuit(self):
+        """انقطاع البث بعد بدئه (مسار الرد الافتراضي) فشل يُحسب في القاطع ويُرفع كـ UpstreamError"""
+        endpoint, _, _ = make_endpoint(name="deepseek", threshold=2)
+        response = MagicMock()
+        response.__enter__.return_value = response
+        response.iter_lines.side_effect = requests.exceptions.ConnectionError("Read timed out")
+        http_client = MagicMock()
+        http_client.post.return_value = response
+        api = DeepSeekAPI(api_key="test_api_key", http_client=http_client, resilience=endpoint)
+
+        for _ in range(2):
+            with pytest.raises(UpstreamError):
+                list(api.stream_response("سؤال"))
+        assert endpoint.breaker.state == OPEN
+        with pytest.raises(CircuitOpenError):
+            list(api.stream_response("سؤال"))
+        assert http_client.post.call_count == 2
+
+        # العميل غير المتزامن: خطأ قراءة بعد أول جزء
+        async def stalled_body():
+            yield b'data: {"choices": [{"delta": {"content": "\\u0623\\u0647\\u0644\\u0627\\u064b"}}]}\n\n'
+            raise httpx.ReadError("connection reset")
+
+        async def handler(request):
+            return httpx.Response(200, content=stalled_body(), headers={"content-type": "text/event-stream"})
+
+        async_endpoint, _, _ = make_endpoint(name="deepseek-async", threshold=2)
+        client = AsyncLLMClient("deepseek", api_key="test_api_key", resilience=async_endpoint,
+                                http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+        async def run():
+            for _ in range(2):
+                parts = []
+                with pytest.raises(UpstreamError):
+                    async for part in client.stream_response("سؤال"):
+                        parts.append(part)
+                assert parts == ["أهلاً"]
+
+        asyncio.run(run())
+        assert async_endpoint.breaker.state == OPEN
+
+        # البث المكتمل يُسجل نجاحاً، والمستهلك الذي توقف مبكراً يحرر الإذن دون نتيجة
+        endpoint, _, _ = make_endpoint(name="deepseek-ok", threshold=2)
+        response.iter_lines.side_effect = None
+        response.iter_lines.return_value = [
+            'data: {"choices": [{"delta": {"content": "أ"}}]}', 'data: {"choices": [{"delta": {"content": "ب"}}]}',
+            "data: [DONE]"
+        ]
+        api = DeepSeekAPI(api_key="test_api_key", http_client=http_client, resilience=endpoint)
+        stream = api.stream_response("سؤال")
+        assert next(stream) == "أ"
+        stream.close()
+        assert endpoint.breaker.get_stats()["successes"] == 0
+        assert list(api.stream_response("سؤال")) == ["أ", "ب"]
+        assert endpoint.breaker.get_stats()["successes"] == 1
+
+    def test_messenger_send_retries_and_short_circuits(self):
+        """إرسال ماسنجر يعيد المحاولة عند 5xx ويعيد خطأ فوراً عندما تكون الدائرة مفتوحة"""
+        endpoint, clock, sleeps = make_endpoint(name="messenger", threshold=2)
+        ok = MagicMock(status_code=200)
+        ok.json.return_value = {"message_id": "m1"}
+
+        with patch.dict("messenger_utils.FACEBOOK_SETTINGS", {"PAGE_TOKEN": "token"}), \
+                patch("messenger_utils.get_endpoint", return_value=endpoint), \
+                patch("messenger_utils.requests.post") as post:
+            post.side_effect = [http_response(502), ok]
+            assert send_messenger_message("user", {"text": "مرحبا"}) == {"message_id": "m1"}
+            assert post.call_count == 2
+
+            post.side_effect = None
+            post.return_value = http_response(503)
+            result = send_messenger_message("user", {"text": "مرحبا"})
+            assert result["error"].startswith("Failed to send message: 503")
+            assert endpoint.breaker.state == OPEN
+
+            calls = post.call_count
+            result = send_messenger_message("user", {"text": "مرحبا"})
+            assert "الدائرة مفتوحة" in result["error"]
+            assert post.call_count == calls
+
+    def test_messenger_send_retries_only_before_the_request_is_sent(self):
+        """الإرسال غير متكرر الأثر: يعاد عند تعذر الاتصال فقط، لا بعد انقطاعه (قد تكون الرسالة وصلت)"""
+        endpoint, clock, sleeps = make_endpoint(name="messenger", threshold=5)
+        ok = MagicMock(status_code=200)
+        ok.json.return_value = {"message_id": "m1"}
+        refused = requests.exceptions.ConnectionError(
+            MaxRetryError(None, "/me/messages", reason=NewConnectionError(None, "Connection refused")))
+        aborted = requests.exceptions.ConnectionError(
+            ProtocolError("Connection aborted.", ConnectionResetError("Remote end closed connection")))
+
+        with patch.dict("messenger_utils.FACEBOOK_SETTINGS", {"PAGE_TOKEN": "token", "SEND_TIMEOUT": 7}), \
+                patch("messenger_utils.get_endpoint", return_value=endpoint), \
+                patch("messenger_utils.requests.post") as post:
+            post.side_effect = [refused, ok]
+            assert send_messenger_message("user", {"text": "مرحبا"}) == {"message_id": "m1"}
+            assert post.call_count == 2
+            assert post.call_args.kwargs["timeout"][1] == 7
+
+            post.reset_mock()
+            post.side_effect = [aborted, ok]
+            assert "Connection aborted" in send_messenger_message("user", {"text": "مرحبا"})["error"]
+            assert post.call_count == 1
+
+            post.reset_mock()
+            post.side_effect = requests.exceptions.ReadTimeout("Read timed out")
+            assert "error" in send_messenger_message("user", {"text": "مرحبا"})
+            assert post.call_count == 1
+
+        # الانقطاع وانتهاء المهلة إخفاقات في القاطع رغم عدم إعادتهما
+        assert endpoint.breaker.get_stats()["failures"] == 3
@@ -0,0 +1,98 @@
+"""
+اختبارات ذاكرة ردود نموذج اللغة
+"""
+import time
+from unittest.mock import MagicMock
+
+from response_cache import ResponseCache, CachedLLMClient, make_cache_key, normalize_prompt
+
+
+def make_client(**cache_kwargs):
+    """غلاف حول عميل وهمي يرجع رداً مختلفاً في كل استدعاء"""
+    api = MagicMock()
+    api.default_model = "deepseek-chat"
+    api.max_tokens = 1000
+    api.temperature = 0.7
+    api.api_key = "test_api_key"
+    api.generate_response.side_effect = lambda prompt, context=None, model=None: f"رد {api.generate_response.call_count}"
+    return api, CachedLLMClient(api, ResponseCache(**cache_kwargs), enabled=True)
+
+
+class TestResponseCache:
+    """
+    اختبارات المفتاح والإصابة والإخراج والسياقات الشخصية
+    """
+
+    def test_key_normalization(self):
+        """اختبار تطابق المفتاح مع اختلاف المسافات والترقيم والتشكيل فقط"""
+        assert normalize_prompt("  السلامُ   عليكم!! ") == normalize_prompt("السلام عليكم")
+        params = {"model": "deepseek-chat"}
+        assert make_cache_key("عايز شغل؟", "سياق", params) == make_cache_key("عايز  شغل", "سياق", params)
+        assert make_cache_key("عايز شغل", "سياق", params) != make_cache_key("عايز شغل", "سياق آخر", params)
+        assert make_cache_key("عايز شغل", "سياق", params) != make_cache_key("عايز شغل", "سياق", {"model": "other"})
+
+    def test_hit_after_first_call(self):
+        """اختبار الإجابة من الذاكرة في الاستدعاء الثاني ومرور الخصائص للعميل"""
+        api, client = make_client()
+        first = client.generate_response("السلام عليكم", context="سياق")
+        second = client.generate_response("السلام عليكم؟", context="سياق")
+
+        assert first == second
+        assert api.generate_response.call_count == 1
+        assert client.api_key == "test_api_key"
+
+        stats = client.cache.get_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    def test_personalized_skipped_unless_allowed(self):
+        """اختبار عدم تخزين السياقات الشخصية إلا بعد السماح"""
+        api, client = make_client(allow_personalized=False)
+        client.generate_response("عايز شغل", context="سياق أحمد", personalized=True)
+        client.generate_response("عايز شغل", context="سياق أحمد", personalized=True)
+        assert api.generate_response.call_count == 2
+        assert client.cache.get_stats()["skipped_personalized"] == 2
+
+        api, client = make_client(allow_personalized=True)
+        client.generate_response("عايز شغل", context="سياق أحمد", personalized=True)
+        client.generate_response("عايز شغل", context="سياق أحمد", personalized=True)
+        assert api.generate_response.call_count == 1
+
+    def test_ttl_lru_and_byte_cap(self):
+        """اختبار انتهاء الصلاحية وإخراج الأقل استخداماً وسقف الذاكرة"""
+        cache = ResponseCache(max_entries=2, max_bytes=10 ** 6, ttl=60)
+        cache.put("a", "1")
+        cache.put("b", "2")
+        assert cache.get("a") == "1"
+        cache.put("c", "3")
+        assert cache.get("b") is None
+        assert cache.get("a") == "1"
+        assert cache.get_stats()["evicted_lru"] == 1
+
+        cache = ResponseCache(max_entries=100, max_bytes=700, ttl=60)
+        cache.put("a", "x" * 200)
+        cache.put("b", "x" * 200)
+        cache.put("c", "x" * 200)
+        assert cache.get_stats()["bytes"] <= 700
+        assert cache.get("a") is None
+        assert cache.get_stats()["evicted_memory"] >= 1
+        assert not cache.put("big", "x" * 1000)
+
+        cache = ResponseCache(ttl=0.01)
+        cache.put("a", "1")
+        time.sleep(0.02)
+        assert cache.get("a") is None
+        assert cache.get_stats()["expired"] == 1
+
+    def test_errors_not_cached(self):
+        """اختبار عدم تخزين الأخطاء"""
+        api, client = make_client()
+        api.generate_response.side_effect = Exception("فشل")
+        for _ in range(2):
+            try:
+                client.generate_response("مرحبا")
+            except Exception:
+                pass
+        assert api.generate_response.call_count == 2
+        assert len(client.cache) == 0
@@ -0,0 +1,86 @@
+"""
+اختبارات الذاكرة الدلالية لردود نموذج اللغة
+"""
+from unittest.mock import MagicMock
+
+from response_cache import ResponseCache, CachedLLMClient
+from semantic_cache import SemanticCache, evaluate
+
+
+def make_client(**semantic_kwargs):
+    """غلاف حول عميل وهمي مع ذاكرة دلالية"""
+    api = MagicMock()
+    api.default_model = "deepseek-chat"
+    api.max_tokens = 1000
+    api.temperature = 0.7
+    api.generate_response.side_effect = lambda prompt, context=None, model=None: f"رد {api.generate_response.call_count}"
+    semantic_kwargs.setdefault("threshold", 0.7)
+    semantic_kwargs.setdefault("excluded_intents", ())
+    return api, CachedLLMClient(api, ResponseCache(), enabled=True, semantic=SemanticCache(**semantic_kwargs))
+
+
+class TestSemanticCache:
+    """
+    اختبارات التشابه والتقسيم واستثناء النوايا والإخراج والتقييم
+    """
+
+    def test_paraphrase_hit(self):
+        """اختبار إعادة استخدام رد سؤال بصياغة مختلفة وعدم الخلط مع سؤال آخر"""
+        api, client = make_client()
+        first = client.generate_response("ازاي اقدم على وظيفة", context="سياق")
+        assert client.generate_response("ممكن اقدم على وظيفة ازاي؟", context="سياق") == first
+        assert api.generate_response.call_count == 1
+
+        client.generate_response("فين عنوان المكتب", context="سياق")
+        assert api.generate_response.call_count == 2
+
+        stats = client.semantic.get_stats()
+        assert stats["hits"] == 1
+        assert stats["entries"] == 2
+
+    def test_context_and_intent_partitioning(self):
+        """اختبار عدم إعادة استخدام الرد في سياق آخر أو لنية مختلفة أو مستثناة"""
+        api, client = make_client(excluded_intents=["comment_job"])
+        client.generate_response("ازاي اقدم على وظيفة", context="سياق", intents=["menu"])
+        client.generate_response("ممكن اقدم على وظيفة ازاي", context="سياق آخر", intents=["menu"])
+        client.generate_response("ممكن اقدم على وظيفة ازاي", context="سياق", intents=[])
+        assert api.generate_response.call_count == 3
+
+        client.generate_response("مواعيد العمل ايه", context="سياق", intents=["comment_job"])
+        client.generate_response("ايه مواعيد العمل", context="سياق", intents=["comment_job"])
+        assert api.generate_response.call_count == 5
+        assert client.semantic.get_stats()["skipped_intent"] == 2
+
+    def test_lru_eviction_and_ttl(self):
+        """اختبار إخراج الأقل استخداماً عند الامتلاء وانتهاء الصلاحية"""
+        cache = SemanticCache(threshold=0.9, max_entries=2, excluded_intents=())
+        cache.put("ازاي اقدم على وظيفة", "وظائف")
+        cache.put("فين عنوان المكتب", "العنوان")
+        assert cache.lookup("ازاي اقدم على وظيفة") is not None
+        cache.put("مواعيد العمل ايه", "المواعيد")
+
+        assert cache.lookup("فين عنوان المكتب") is None
+        assert cache.lookup("ازاي اقدم على وظيفة")[0] == "وظائف"
+        assert cache.get_stats()["evicted_lru"] == 1
+
+        expiring = SemanticCache(threshold=0.9, ttl=0, excluded_intents=())
+        expiring.put("ازاي اقدم على وظيفة", "وظائف")
+        assert expiring.lookup("ازاي اقدم على وظيفة") is None
+        assert len(expiring) == 0
+
+    def test_offline_evaluation(self):
+        """اختبار إعادة تشغيل المحادثات وحساب نسبة الإصابة لكل حد"""
+        records = [
+            {"user_message": "ازاي اقدم على وظيفة", "bot_response": "وظائف"},
+            {"user_message": "ازاي اقدم على وظيفة؟", "bot_response": "وظائف"},
+            {"user_message": "ممكن اقدم على وظيفة ازاي", "bot_response": "وظائف"},
+            {"user_message": "فين عنوان المكتب", "bot_response": "العنوان"},
+        ]
+        loose, strict = evaluate(records, [0.7, 0.99])
+
+        assert loose["messages"] == 4
+        assert loose["exact_hits"] == 1
+        assert loose["semantic_hits"] == 1
+        assert loose["combined_hit_rate"] == 0.5
+        assert loose["examples"][0]["matched"] == "ازاي اقدم على وظيفة"
+        assert strict["semantic_hits"] == 0
@@ -0,0 +1,128 @@
+"""
+اختبارات دمج الطلبات المتطابقة المتزامنة
+"""
+import time
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from resilience import CircuitOpenError
+from single_flight import SingleFlight
+from response_cache import ResponseCache, CachedLLMClient
+
+
+def run_concurrently(count, target):
+    """تشغيل الدالة في عدة خيوط وجمع النتائج أو الأخطاء"""
+    results = [None] * count
+
+    def worker(index):
+        try:
+            results[index] = target()
+        except Exception as e:
+            results[index] = e
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def wait_for_calls(flight, count, timeout=5.0):
+    """انتظار وصول عدد الطلبات إلى SingleFlight"""
+    deadline = time.monotonic() + timeout
+    while flight.get_stats()["calls"] < count and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+class TestSingleFlight:
+    """
+    اختبارات مشاركة النتيجة والخطأ وإحصائيات الدمج
+    """
+
+    def test_concurrent_calls_share_one_execution(self):
+        """اختبار تنفيذ الدالة مرة واحدة ومشاركة نتيجتها مع كل الطلبات المتزامنة"""
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            release.wait(5)
+            return "رد"
+
+        threads, results = run_concurrently(8, lambda: flight.do("مفتاح", slow))
+        wait_for_calls(flight, 8)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert sorted(results, key=lambda result: result[1]) == [("رد", False)] + [("رد", True)] * 7
+        stats = flight.get_stats()
+        assert stats["coalesced"] == 7
+        assert stats["in_flight"] == 0
+
+        # بعد الانتهاء يبدأ الطلب الجديد تنفيذاً جديداً
+        assert flight.do("مفتاح", lambda: "رد جديد") == ("رد جديد", False)
+
+    def test_error_propagates_to_every_waiter(self):
+        """اختبار وصول نفس الخطأ لكل الطلبات المنتظرة"""
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def failing():
+            release.wait(5)
+            raise TimeoutError("انتهت المهلة")
+
+        threads, results = run_concurrently(4, lambda: flight.do("مفتاح", failing))
+        wait_for_calls(flight, 4)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert all(isinstance(result, TimeoutError) for result in results)
+        assert flight.get_stats()["shared_errors"] == 3
+        # كل منتظر يرفع نسخته (لا تتشارك الخيوط __traceback__ واحداً) والأصلي في __cause__
+        assert len({id(result) for result in results}) == 4
+        original = next(result for result in results if result.__cause__ is None)
+        assert all(result.__cause__ is original for result in results if result is not original)
+        assert all(str(result) == "انتهت المهلة" for result in results)
+        with pytest.raises(ValueError):
+            flight.do("مفتاح", lambda: (_ for _ in ()).throw(ValueError("خطأ")))
+
+        # النسخة تحتفظ بنوع الخطأ وسماته حتى لو تطلب __init__ معاملات أخرى
+        error = CircuitOpenError("deepseek", 3.0)
+        leader, _ = flight.begin("مفتاح")
+        waiter, _ = flight.begin("مفتاح")
+        flight.finish("مفتاح", leader, error=error)
+        with pytest.raises(CircuitOpenError) as raised:
+            flight.wait(waiter)
+        assert raised.value is not error and raised.value.__cause__ is error
+        assert raised.value.name == "deepseek" and raised.value.retry_after == 3.0
+
+    def test_client_coalesces_identical_prompts(self):
+        """اختبار دمج الرسائل المتطابقة بعد التطبيع في استدعاء API واحد وحفظ الرد مرة واحدة"""
+        release = threading.Event()
+        api = MagicMock()
+        api.default_model = "deepseek-chat"
+        api.max_tokens = 1000
+        api.temperature = 0.7
+
+        def generate(prompt, context=None, model=None):
+            release.wait(5)
+            return "رد"
+
+        api.generate_response.side_effect = generate
+        client = CachedLLMClient(api, ResponseCache(), enabled=True, single_flight=SingleFlight())
+
+        prompts = ["عايز شغل", "عايز شغل؟", "عايز  شغل"]
+        threads, results = run_concurrently(3, lambda: client.generate_response(prompts.pop(), context="سياق"))
+        wait_for_calls(client.single_flight, 3)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert results == ["رد"] * 3
+        assert api.generate_response.call_count == 1
+        assert client.cache.get_stats()["stores"] == 1
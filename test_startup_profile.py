@@ -0,0 +1,43 @@
+"""
+اختبارات قياس زمن الإقلاع
+"""
+import sys
+
+from startup_profile import StartupProfiler
+
+
+class TestStartupProfiler:
+    """
+    اختبارات تسجيل أزمنة الاستيراد والمراحل
+    """
+
+    def test_records_imports_and_phases(self, tmp_path, monkeypatch):
+        """اختبار تسجيل الزمن الذاتي والشامل لوحدة ووحدة فرعية تستوردها"""
+        (tmp_path / "profiled_child.py").write_text("VALUE = 1\n", encoding="utf-8")
+        (tmp_path / "profiled_parent.py").write_text("import profiled_child\n", encoding="utf-8")
+        monkeypatch.syspath_prepend(str(tmp_path))
+
+        profiler = StartupProfiler()
+        profiler.install()
+        try:
+            import profiled_parent  # noqa: F401
+        finally:
+            report = profiler.finish()
+            sys.modules.pop("profiled_parent", None)
+            sys.modules.pop("profiled_child", None)
+
+        assert profiler not in sys.meta_path
+        assert "profiled_parent" in profiler.imports
+        parent = profiler.imports["profiled_parent"]
+        child = profiler.imports["profiled_child"]
+        assert parent["total_ms"] >= child["total_ms"]
+        assert parent["self_ms"] <= parent["total_ms"]
+        assert report["modules_imported"] >= 2
+
+        # المحمل الأصلي يُعاد بعد التنفيذ
+        assert type(profiled_parent.__loader__).__name__ != "_TimingLoader"
+
+    def test_disabled_without_env(self, monkeypatch):
+        """اختبار عدم التفعيل بدون STARTUP_PROFILE"""
+        monkeypatch.delenv("STARTUP_PROFILE", raising=False)
+        assert StartupProfiler.from_env() is None
@@ -0,0 +1,113 @@
+"""
+اختبارات مخزن حالة المحادثات والمستخدمين
+"""
+import threading
+
+import pytest
+
+from state_store import InMemoryStateStore, SQLiteStateStore, UserStateView
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    """مخزن حالة لكل نوع"""
+    if request.param == "memory":
+        instance = InMemoryStateStore()
+    else:
+        instance = SQLiteStateStore(db_path=str(tmp_path / "state.db"))
+    yield instance
+    instance.close()
+
+
+def _exchange(user_id, index):
+    return {
+        "user_id": user_id,
+        "timestamp": f"2024-01-01T00:{index // 60:02d}:{index % 60:02d}",
+        "source": "messenger",
+        "user_message": f"رسالة {index}",
+        "bot_response": f"رد {index}"
+    }
+
+
+class TestStateStore:
+    """
+    اختبارات مشتركة لتنفيذي الذاكرة و SQLite
+    """
+
+    def test_recent_exchanges(self, store):
+        """اختبار قراءة آخر N تبادل فقط بالترتيب الزمني"""
+        store.append_exchanges([_exchange("user_1", i) for i in range(20)])
+        store.append_exchange(_exchange("user_2", 0))
+
+        recent = store.get_recent_exchanges("user_1", 5)
+        assert [r["user_message"] for r in recent] == [f"رسالة {i}" for i in range(15, 20)]
+        assert store.get_recent_exchanges("unknown", 5) == []
+        assert store.count_exchanges("user_1") == 20
+        assert store.count_exchanges() == 21
+
+    def test_user_state_view(self, store):
+        """اختبار واجهة القاموس لحالة المستخدم"""
+        view = UserStateView(store, "user_state")
+        view["user_1"] = {"user_name": "أحمد"}
+
+        assert "user_1" in view
+        assert view["user_1"]["user_name"] == "أحمد"
+        assert view.get("user_2", {}) == {}
+        assert list(view) == ["user_1"]
+
+        del view["user_1"]
+        assert "user_1" not in view
+
+    def test_state_kinds_are_separate(self, store):
+        """اختبار فصل حالة المستخدم عن حالة مصادقة المطور"""
+        UserStateView(store, "dev_auth")["user_1"] = {"step": 1}
+        assert "user_1" not in UserStateView(store, "user_state")
+
+
+class TestSQLiteStateStore:
+    """
+    اختبارات خاصة بمخزن SQLite
+    """
+
+    def test_state_survives_reopen(self, tmp_path):
+        """اختبار بقاء الحالة بعد إعادة فتح قاعدة البيانات (إعادة التشغيل أو عامل آخر)"""
+        path = str(tmp_path / "state.db")
+        first = SQLiteStateStore(db_path=path)
+        first.set_state("dev_auth", "user_1", {"step": 0, "developer_mode": True})
+        first.append_exchange(_exchange("user_1", 1))
+        first.close()
+
+        second = SQLiteStateStore(db_path=path)
+        assert second.get_state("dev_auth", "user_1")["developer_mode"] is True
+        assert second.get_recent_exchanges("user_1", 5)[0]["user_message"] == "رسالة 1"
+        second.close()
+
+    def test_wal_mode_and_indexes(self, tmp_path):
+        """اختبار تفعيل وضع WAL واستخدام فهرس user_id في الاستعلام"""
+        store = SQLiteStateStore(db_path=str(tmp_path / "state.db"))
+        connection = store._connection()
+
+        assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+        plan = connection.execute(
+            "EXPLAIN QUERY PLAN " + store.SQL_RECENT_EXCHANGES, ("user_1", 5)
+        ).fetchall()
+        assert any("idx_exchanges_user_ts" in str(row) for row in plan)
+        store.close()
+
+    def test_concurrent_writers(self, tmp_path):
+        """اختبار الكتابة من عدة خيوط"""
+        store = SQLiteStateStore(db_path=str(tmp_path / "state.db"))
+
+        def writer(user_id):
+            for i in range(50):
+                store.append_exchange(_exchange(user_id, i))
+
+        threads = [threading.Thread(target=writer, args=(f"user_{n}",)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert store.count_exchanges() == 200
+        store.close()
@@ -0,0 +1,176 @@
+"""
+اختبارات بث ردود نموذج اللغة والإرسال التدريجي إلى ماسنجر
+"""
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from api import iter_sse_data
+from bot import ChatBot
+from messenger_utils import MessengerDelivery, split_message, get_delivery_stats
+from response_cache import ResponseCache, CachedLLMClient
+from single_flight import SingleFlight
+from state_store import InMemoryStateStore
+
+
+def sse_lines(parts):
+    """سطور بث SSE بنفس صيغة DeepSeek API"""
+    lines = [b": keep-alive", b""]
+    for part in parts:
+        event = {"choices": [{"delta": {"content": part}}]}
+        lines += [b"data: " + json.dumps(event, ensure_ascii=False).encode("utf-8"), b""]
+    return lines + [b"data: [DONE]", b"", b"data: {\"choices\": []}"]
+
+
+class FakeStreamingAPI:
+    """عميل وهمي يبث الرد على أجزاء"""
+
+    default_model = "deepseek-chat"
+    max_tokens = 1000
+    temperature = 0.7
+
+    def __init__(self, parts):
+        self.parts = parts
+        self.calls = 0
+
+    def stream_response(self, prompt, context=None, model=None):
+        self.calls += 1
+        for data in iter_sse_data(sse_lines(self.parts)):
+            for choice in json.loads(data)["choices"]:
+                yield choice["delta"]["content"]
+
+    def generate_response(self, prompt, context=None, model=None):
+        return "".join(self.stream_response(prompt, context, model))
+
+
+class FailingStreamingAPI(FakeStreamingAPI):
+    """عميل وهمي ينقطع بثه بعد الأجزاء المحددة"""
+
+    def stream_response(self, prompt, context=None, model=None):
+        yield from super().stream_response(prompt, context, model)
+        raise ConnectionError("انقطع الاتصال أثناء البث")
+
+
+class TestStreaming:
+    """
+    اختبارات قراءة البث والإرسال التدريجي والذاكرة مع البث
+    """
+
+    def test_sse_parsing(self):
+        """اختبار استخراج الأحداث وتجاهل التعليقات والتوقف عند [DONE] وفك UTF-8"""
+        events = list(iter_sse_data(sse_lines(["مرحباً", " بك"])))
+        assert [json.loads(event)["choices"][0]["delta"]["content"] for event in events] == ["مرحباً", " بك"]
+
+    def test_first_paragraph_sent_immediately(self):
+        """اختبار إرسال أول فقرة فور اكتمالها وتجميع الباقي وتنقية كل فقرة"""
+        sent = []
+        delivery = MessengerDelivery("user", sanitize=lambda text: text.replace("DeepSeek", "مجمع عمال مصر"),
+                                     send=lambda recipient, text: sent.append(text), max_length=60)
+
+        delivery.feed("أهلاً بك في Deep")
+        assert sent == []
+        delivery.feed("Seek!\n\nالفقرة")
+        assert sent == ["أهلاً بك في مجمع عمال مصر!"]
+        assert delivery.first_message_ms is not None
+
+        # الفقرات التالية تُجمع في رسالة حتى حد الأحرف
+        delivery.feed(" الثانية\n\nالفقرة الثالثة\n\n")
+        assert len(sent) == 1
+        delivery.feed("جملة طويلة. " * 8)
+
+        text = delivery.finish()
+        assert sent[1] == "الفقرة الثانية\n\nالفقرة الثالثة"
+        assert len(sent) == 4
+        assert all(len(message) <= 60 for message in sent)
+        assert text == "\n\n".join(sent)
+        assert get_delivery_stats()["streamed"]["responses"] >= 1
+
+    def test_split_message_keeps_short_text(self):
+        """اختبار عدم تقسيم الرسالة ضمن الحد وتقسيم الطويلة على الفقرات"""
+        assert split_message("رسالة قصيرة") == ["رسالة قصيرة"]
+        parts = split_message("أ" * 1500 + "\n\n" + "ب" * 1500)
+        assert parts == ["أ" * 1500, "ب" * 1500]
+
+    def test_stream_cached_and_coalesced(self):
+        """اختبار حفظ الرد المبثوث بعد اكتماله وإعادته كجزء واحد من الذاكرة"""
+        api = FakeStreamingAPI(["عندنا ", "وظائف ", "كثيرة"])
+        client = CachedLLMClient(api, ResponseCache(), enabled=True, single_flight=SingleFlight())
+
+        assert list(client.stream_response("عايز شغل", context="سياق")) == ["عندنا ", "وظائف ", "كثيرة"]
+        assert list(client.stream_response("عايز شغل؟", context="سياق")) == ["عندنا وظائف كثيرة"]
+        assert api.calls == 1
+        assert client.single_flight.in_flight() == 0
+
+        # المستهلك الذي يوقف البث لا يترك طلباً معلقاً
+        stream = client.stream_response("سؤال آخر", context="سياق")
+        next(stream)
+        stream.close()
+        assert client.single_flight.in_flight() == 0
+        assert len(client.cache) == 1
+
+    def test_bot_streams_to_messenger(self, tmp_path):
+        """اختبار بث رد الشات بوت إلى ماسنجر وحفظ النص المرسل في المحادثة"""
+        data_file = tmp_path / "data.json"
+        data_file.write_text(json.dumps({"prompts": []}), encoding="utf-8")
+        bot = ChatBot(data_file=str(data_file), api_key="test_api_key", state_store=InMemoryStateStore())
+        bot.api.api = FakeStreamingAPI(["أنا نموذج لغوي", " هنا لمساعدتك.\n\n", "تفضل بسؤالك"])
+        bot.continue_conversation = False
+
+        send = MagicMock()
+        delivery = MessengerDelivery("user-1", send=send)
+        response = bot.generate_messenger_response("user-1", "عندي استفسار عن التقديم", delivery=delivery)
+
+        assert delivery.finished
+        assert send.call_count == 2
+        assert "نموذج لغوي" not in response
+        assert response == "\n\n".join(call.args[1] for call in send.call_args_list)
+        assert bot.conversation_history.get("user-1")[-1]["bot_response"] == response
+
+    def test_stream_failing_midway_is_not_followed_by_fallback(self, tmp_path):
+        """انقطاع البث بعد أول فقرة: ملاحظة قصيرة بدلاً من الرد الاحتياطي، والرد يُحفظ ولا يُرسل مرتين"""
+        data_file = tmp_path / "data.json"
+        data_file.write_text(json.dumps({"prompts": []}), encoding="utf-8")
+        bot = ChatBot(data_file=str(data_file), api_key="test_api_key", state_store=InMemoryStateStore())
+        bot.api.api = FailingStreamingAPI(["يمكنك التقديم من بوابة التوظيف.\n\n", "الخطوة الأولى هي"])
+        bot.continue_conversation = False
+
+        send = MagicMock()
+        delivery = MessengerDelivery("user-2", send=send)
+        response = bot.generate_messenger_response("user-2", "عندي استفسار عن التقديم", delivery=delivery)
+
+        # الفقرة غير المكتملة لا تُرسل، ولا يصل الرد الاحتياطي بعد الجزء المرسل
+        assert delivery.finished
+        sent = [call.args[1] for call in send.call_args_list]
+        assert sent == ["يمكنك التقديم من بوابة التوظيف.", bot.stream_interrupted_message]
+        assert "مشكلة في الاتصال" not in response
+        assert response == "\n\n".join(sent)
+        assert bot.conversation_history.get("user-2")[-1]["bot_response"] == response
+        assert get_delivery_stats()["interrupted"]["responses"] >= 1
+
+    def test_failed_sends_are_not_counted_as_delivered(self, tmp_path):
+        """رسالة أعادت send_messenger_message لها خطأ لا تُحسب مرسلة ولا تبدأ زمن أول رسالة"""
+        send = MagicMock(side_effect=[{"error": "الدائرة مفتوحة"}, {"message_id": "m2"}])
+        delivery = MessengerDelivery("user-3", send=send)
+        failed_before = get_delivery_stats()["streamed"]["failed_messages"]
+
+        delivery.feed("الفقرة الأولى\n\n")
+        assert delivery.sent == [] and delivery.first_message_ms is None
+        delivery.feed("الفقرة الثانية")
+        assert delivery.finish() == "الفقرة الثانية"
+        assert delivery.failed == ["الفقرة الأولى"]
+        assert not delivery.finished
+        assert get_delivery_stats()["streamed"]["failed_messages"] == failed_before + 1
+
+        # انقطاع البث بعد فقرة لم تصل: لا ملاحظة انقطاع عن رد لم يره المستخدم، بل الرد الاحتياطي
+        data_file = tmp_path / "data.json"
+        data_file.write_text(json.dumps({"prompts": []}), encoding="utf-8")
+        bot = ChatBot(data_file=str(data_file), api_key="test_api_key", state_store=InMemoryStateStore())
+        bot.api.api = FailingStreamingAPI(["يمكنك التقديم من بوابة التوظيف.\n\n", "الخطوة الأولى هي"])
+        bot.continue_conversation = False
+
+        delivery = MessengerDelivery("user-4", send=MagicMock(return_value={"error": "لا يوجد رمز وصول"}))
+        response = bot.generate_messenger_response("user-4", "عندي استفسار عن التقديم", delivery=delivery)
+        assert delivery.sent == []
+        assert bot.stream_interrupted_message not in response
+        assert "مشكلة في الاتصال" in response
@@ -0,0 +1,75 @@
+"""
+اختبارات محرك تنقية الإشارات للذكاء الاصطناعي
+"""
+import re
+
+from text_sanitizer import TextSanitizer, build_trie_pattern, DEFAULT_COMMENT_REPLACEMENT
+
+
+class TestTextSanitizer:
+    """
+    اختبارات الاستبدال في مرور واحد وحذف الجمل وحدود الكلمات
+    """
+
+    def test_replacements_case_insensitive(self):
+        """اختبار استبدال العبارات العربية واللاتينية دون اعتبار لحالة الأحرف"""
+        sanitizer = TextSanitizer.from_config()
+        result = sanitizer.sanitize("أنا نموذج لغوي من DeepSeek وأعمل كذكاء اصطناعي")
+
+        assert "نموذج لغوي" not in result
+        assert "DeepSeek" not in result
+        assert "مجمع عمال مصر" in result
+        assert "كمساعد لخدمة العملاء" in result
+
+    def test_longest_term_wins(self):
+        """اختبار تقديم العبارة الأطول على العبارة الأقصر التي تبدأ بنفس الموضع"""
+        sanitizer = TextSanitizer({"ai": "مساعد", "ai assistant": "مساعد خدمة العملاء"})
+        assert sanitizer.sanitize("your AI assistant") == "your مساعد خدمة العملاء"
+
+    def test_shorter_term_used_when_longest_is_not_a_word(self):
+        """اختبار الرجوع إلى العبارة الأقصر عندما لا تقع العبارة الأطول على حدود كلمة"""
+        sanitizer = TextSanitizer.from_config()
+        assert sanitizer.sanitize("our AI assistants help") == "our مساعد assistants help"
+
+        sanitizer = TextSanitizer({"ai": "مساعد", "ai assistant": "مساعد خدمة العملاء", "gpt": "نموذج"})
+        assert sanitizer.sanitize("ai assistantsgpt gpt") == "مساعد assistantsgpt نموذج"
+
+    def test_latin_terms_respect_word_boundaries(self):
+        """اختبار عدم تعديل الكلمات اللاتينية التي تحتوي على العبارة"""
+        sanitizer = TextSanitizer.from_config()
+        text = "Please email us, we are available. AI is here."
+
+        result = sanitizer.sanitize(text)
+        assert "email" in result
+        assert "available" in result
+        assert result.endswith("مساعد is here.")
+
+    def test_statements_removed_before_replacement(self):
+        """اختبار حذف الجمل التي تعرف الرد كذكاء اصطناعي حتى أول نقطة"""
+        sanitizer = TextSanitizer.from_config()
+        result = sanitizer.sanitize("As an AI I cannot feel. مرحباً بك في مجمع عمال مصر.")
+        assert result.strip() == "مرحباً بك في مجمع عمال مصر."
+
+    def test_comment_sanitizer(self):
+        """اختبار استبدال مصطلحات التعليقات عند حدود الكلمات فقط"""
+        sanitizer = TextSanitizer.for_comments()
+        result = sanitizer.sanitize("أنا شات بوت ولست robot")
+
+        assert result == f"أنا {DEFAULT_COMMENT_REPLACEMENT} ولست robot"
+
+    def test_configurable_terms(self):
+        """اختبار تحميل العبارات من إعدادات data.json"""
+        sanitizer = TextSanitizer.from_config({
+            "replacements": {"openai": "مجمع عمال مصر"},
+            "remove_statements": []
+        })
+        assert sanitizer.sanitize("OpenAI") == "مجمع عمال مصر"
+        assert sanitizer.sanitize("As an AI.") == "As an AI."
+
+    def test_trie_pattern_matches_all_terms(self):
+        """اختبار أن نمط شجرة البادئات يطابق كل العبارات كاملة"""
+        terms = ["ai", "ai model", "ai assistant", "gpt", "deep seek", "deepseek"]
+        regex = re.compile(build_trie_pattern(terms))
+        for term in terms:
+            assert regex.fullmatch(term)
+        assert regex.fullmatch("ai mod") is None
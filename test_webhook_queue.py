@@ -0,0 +1,207 @@
+"""
+اختبارات طابور أحداث webhook ومجموعة العمال
+"""
+import time
+import random
+import threading
+from collections import defaultdict
+from unittest.mock import patch
+
+from webhook_queue import WebhookWorkerPool, ShardedEventScheduler
+
+
+class TestWebhookWorkerPool:
+    """
+    اختبارات المعالجة في الخلفية والضغط الخلفي والإيقاف الهادئ
+    """
+
+    def test_events_are_processed(self):
+        """اختبار معالجة كل الأحداث المضافة"""
+        handled = []
+        lock = threading.Lock()
+
+        def handler(event):
+            with lock:
+                handled.append(event["id"])
+
+        pool = WebhookWorkerPool(handler, num_workers=3, max_queue_size=50)
+        pool.start()
+
+        for i in range(20):
+            assert pool.submit({"id": i})
+
+        assert pool.shutdown(timeout=5)
+        assert sorted(handled) == list(range(20))
+
+        stats = pool.get_stats()
+        assert stats["processed"] == 20
+        assert stats["queue_depth"] == 0
+        assert stats["failed"] == 0
+
+    def test_queue_full_rejects_events(self):
+        """اختبار رفض الأحداث عند امتلاء الطابور"""
+        release = threading.Event()
+        pool = WebhookWorkerPool(lambda event: release.wait(5), num_workers=1, max_queue_size=2)
+        pool.start()
+
+        results = [pool.submit({"id": i}) for i in range(6)]
+        time.sleep(0.05)
+
+        assert not all(results)
+        assert pool.get_stats()["rejected"] >= 1
+
+        release.set()
+        assert pool.shutdown(timeout=5)
+
+    def test_webhook_returns_503_when_events_are_rejected(self):
+        """رفض أي حدث لامتلاء الطابور يُرد عليه بـ 503 ليعيد فيسبوك الإرسال، ولا تُعالج الأحداث المقبولة مرتين"""
+        import server
+
+        handled = []
+        release = threading.Event()
+
+        def handler(event):
+            release.wait(5)
+            handled.append(event["message"]["mid"])
+
+        pool = WebhookWorkerPool(handler, num_workers=1, max_queue_size=1)
+        pool.start()
+        body = {"object": "page", "entry": [{"messaging": [
+            {"sender": {"id": "user"}, "message": {"mid": f"m-{i}", "text": "مرحبا"}} for i in range(4)
+        ]}]}
+        client = server.app.test_client()
+        before = server.get_webhook_stats()
+
+        with patch.object(server, "webhook_pool", pool):
+            response = client.post("/webhook", json=body)
+            assert response.status_code == 503
+            stats = server.get_webhook_stats()
+            assert stats["rejected_requests"] == before["rejected_requests"] + 1
+            assert stats["rejected_events"] - before["rejected_events"] >= 1
+
+            # إعادة الإرسال بعد تفريغ الطابور: الأحداث المقبولة سابقاً تُتخطى
+            release.set()
+            assert pool.shutdown(timeout=5)
+            retry_pool = WebhookWorkerPool(lambda event: handled.append(event["message"]["mid"]),
+                                           num_workers=1, max_queue_size=10)
+            retry_pool.start()
+            with patch.object(server, "webhook_pool", retry_pool):
+                assert client.post("/webhook", json=body).status_code == 200
+            assert retry_pool.shutdown(timeout=5)
+
+        assert sorted(handled) == [f"m-{i}" for i in range(4)]
+        assert server.get_webhook_stats()["duplicate_events"] > before["duplicate_events"]
+
+    def test_concurrent_redeliveries_are_processed_once(self):
+        """إعادتا إرسال متزامنتان لنفس الحدث: يُضاف إلى الطابور مرة واحدة، والحدث المرفوض يُقبل عند إعادته"""
+        import server
+
+        class SlowPool:
+            def __init__(self, accept):
+                self.accept = accept
+                self.submitted = []
+
+            def submit(self, event):
+                time.sleep(0.05)
+                self.submitted.append(event["message"]["mid"])
+                return self.accept
+
+        entries = [{"messaging": [{"sender": {"id": "user"}, "message": {"mid": "m-concurrent", "text": "مرحبا"}}]}]
+        pool = SlowPool(accept=True)
+        with patch.object(server, "webhook_pool", pool):
+            threads = [threading.Thread(target=server.enqueue_webhook_events, args=(entries,)) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        assert pool.submitted == ["m-concurrent"]
+
+        entries[0]["messaging"][0]["message"]["mid"] = "m-rejected"
+        with patch.object(server, "webhook_pool", SlowPool(accept=False)):
+            assert server.enqueue_webhook_events(entries) == 1
+        pool = SlowPool(accept=True)
+        with patch.object(server, "webhook_pool", pool):
+            assert server.enqueue_webhook_events(entries) == 0
+        assert pool.submitted == ["m-rejected"]
+
+    def test_handler_errors_are_counted(self):
+        """اختبار أن أخطاء المعالجة لا توقف العامل"""
+        def handler(event):
+            if event["id"] == 0:
+                raise ValueError("خطأ وهمي")
+
+        pool = WebhookWorkerPool(handler, num_workers=1, max_queue_size=10)
+        pool.start()
+        pool.submit({"id": 0})
+        pool.submit({"id": 1})
+        pool.shutdown(timeout=5)
+
+        stats = pool.get_stats()
+        assert stats["failed"] == 1
+        assert stats["processed"] == 1
+
+    def test_submit_after_shutdown(self):
+        """اختبار رفض الأحداث بعد إيقاف مجموعة العمال"""
+        pool = WebhookWorkerPool(lambda event: None, num_workers=1, max_queue_size=10)
+        pool.start()
+        pool.shutdown(timeout=5)
+        assert not pool.submit({"id": 1})
+
+
+class TestShardedEventScheduler:
+    """
+    اختبارات الترتيب لكل مستخدم والتوازي بين المستخدمين
+    """
+
+    def _sender_key(self, event):
+        return event["sender"]["id"]
+
+    def test_same_sender_maps_to_same_shard(self):
+        """اختبار ثبات الشريحة لنفس المرسل"""
+        scheduler = ShardedEventScheduler(lambda e: None, self._sender_key, num_shards=8, max_queue_size=80)
+        assert scheduler.shard_for("12345") == scheduler.shard_for("12345")
+        assert 0 <= scheduler.shard_for("67890") < 8
+
+    def test_per_sender_order_with_thousands_of_senders(self):
+        """اختبار تحميل: آلاف المرسلين مع الحفاظ على ترتيب رسائل كل مرسل"""
+        received = defaultdict(list)
+        active = {"now": 0, "max": 0}
+        lock = threading.Lock()
+
+        def handler(event):
+            with lock:
+                active["now"] += 1
+                active["max"] = max(active["max"], active["now"])
+            # محاكاة زمن معالجة متفاوت
+            if event["seq"] % 50 == 0:
+                time.sleep(0.001)
+            with lock:
+                received[event["sender"]["id"]].append(event["seq"])
+                active["now"] -= 1
+
+        num_senders = 2000
+        messages_per_sender = 5
+        scheduler = ShardedEventScheduler(handler, self._sender_key, num_shards=8, max_queue_size=num_senders * messages_per_sender * 2)
+        scheduler.start()
+
+        # إرسال رسائل المستخدمين بشكل متداخل كما تصل من فيسبوك
+        events = []
+        for seq in range(messages_per_sender):
+            batch = [{"sender": {"id": f"user_{i}"}, "seq": seq} for i in range(num_senders)]
+            random.shuffle(batch)
+            events.extend(batch)
+
+        for event in events:
+            assert scheduler.submit(event)
+
+        assert scheduler.shutdown(timeout=30)
+
+        assert len(received) == num_senders
+        for sender_id, sequence in received.items():
+            assert sequence == list(range(messages_per_sender)), sender_id
+
+        stats = scheduler.get_stats()
+        assert stats["processed"] == num_senders * messages_per_sender
+        assert stats["queue_depth"] == 0
+        assert len(stats["shards"]) == 8
+        assert active["max"] > 1
@@ -0,0 +1,233 @@
+"""
+محرك تنقية النصوص من الإشارات إلى الذكاء الاصطناعي
+يبني من كل العبارات المطلوب استبدالها أو حذفها تعبيراً نمطياً واحداً على شكل شجرة بادئات (trie)
+يُترجم مرة واحدة عند التحميل، ثم يعيد كتابة النص في مرور واحد باستخدام جدول استبدال
+بدلاً من استدعاء re.sub منفصل لكل عبارة
+"""
+
+import re
+import logging
+from typing import Dict, List, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# الاستبدالات الافتراضية لردود ماسنجر (يمكن تجاوزها من مفتاح ai_reference_filter في data.json)
+DEFAULT_AI_REPLACEMENTS = {
+    "كنموذج للذكاء الاصطناعي": "كمساعد لخدمة العملاء",
+    "كذكاء اصطناعي": "كمساعد لخدمة العملاء",
+    "كمساعد ذكاء اصطناعي": "كمساعد لخدمة العملاء",
+    "نموذج لغوي": "مساعد خدمة العملاء",
+    "نموذج لغة كبير": "مساعد خدمة العملاء",
+    "ذكاء اصطناعي": "مساعد خدمة العملاء",
+    "deepseek": "مجمع عمال مصر",
+    "deep seek": "مجمع عمال مصر",
+    "ai assistant": "مساعد خدمة العملاء",
+    "ai model": "مساعد خدمة العملاء",
+    "language model": "مساعد خدمة العملاء",
+    "gpt": "مساعد خدمة العملاء",
+    "llm": "مساعد خدمة العملاء",
+    "ذكاء الاصطناعي": "فريق خدمة العملاء",
+    "artificial intelligence": "فريق خدمة العملاء",
+    "ai": "مساعد",
+    "تم تطويري": "تم تدريبي",
+    "as an ai": "كمساعد لخدمة العملاء",
+    "كمساعد افتراضي": "كمساعد لخدمة العملاء"
+}
+
+# بدايات الجمل التي تُحذف بالكامل حتى أول نقطة
+DEFAULT_AI_STATEMENTS = [
+    "أنا مساعد ذكاء اصطناعي",
+    "أنا لست إنسانًا حقيقيًا",
+    "I'm an AI",
+    "I am an AI",
+    "As an AI",
+    "كنموذج ذكاء اصطناعي"
+]
+
+# مصطلحات ردود تعليقات الفيسبوك وبديلها الموحد
+DEFAULT_COMMENT_TERMS = ["ذكاء اصطناعي", "روبوت", "بوت", "AI", "bot", "شات بوت", "chatbot"]
+DEFAULT_COMMENT_REPLACEMENT = "المساعد الرسمي لمجمع عمال مصر"
+
+# أوضاع حدود الكلمات: none (مطابقة داخل الكلمات)، latin (حدود للمصطلحات اللاتينية فقط)، all
+WORD_BOUNDARY_MODES = ("none", "latin", "all")
+
+_LATIN_TERM = re.compile(r"^[a-z0-9 '\-]+$")
+
+
+def build_trie_pattern(terms: List[str]) -> Optional[str]:
+    """
+    بناء تعبير نمطي على شكل شجرة بادئات لمجموعة عبارات
+    (البادئات المشتركة تُفحص مرة واحدة، والمطابقة الأطول لها الأولوية)
+
+    :param terms: قائمة العبارات
+    :return: نص التعبير النمطي أو None إذا كانت القائمة فارغة
+    """
+    trie: Dict[str, Any] = {}
+    for term in terms:
+        if not term:
+            continue
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def build(node: Dict[str, Any]) -> Optional[str]:
+        alternatives = []
+        single_chars = []
+        for char in sorted(key for key in node if key):
+            child = build(node[char])
+            if child is None:
+                single_chars.append(re.escape(char))
+            else:
+                alternatives.append(re.escape(char) + child)
+
+        if single_chars:
+            alternatives.append(single_chars[0] if len(single_chars) == 1 else "[" + "".join(single_chars) + "]")
+
+        if not alternatives:
+            return None
+
+        pattern = alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")"
+        if "" in node:
+            # نهاية عبارة: الاستمرار اختياري ولكنه جشع فتُفضل العبارة الأطول
+            pattern = "(?:" + pattern + ")?"
+        return pattern
+
+    return build(trie)
+
+
+class TextSanitizer:
+    """
+    مستبدل متعدد العبارات يعمل في مرور واحد
+    """
+
+    def __init__(self, replacements: Dict[str, str], remove_statements: Optional[List[str]] = None,
+                 word_boundary: str = "latin"):
+        """
+        تهيئة المحرك وترجمة التعبير النمطي
+
+        :param replacements: قاموس العبارة -> البديل (المطابقة غير حساسة لحالة الأحرف)
+        :param remove_statements: بدايات جمل تُحذف حتى أول نقطة (اختياري)
+        :param word_boundary: وضع حدود الكلمات للاستبدالات ("none" أو "latin" أو "all")
+        """
+        if word_boundary not in WORD_BOUNDARY_MODES:
+            raise ValueError(f"وضع حدود كلمات غير معروف: {word_boundary}")
+
+        self.word_boundary = word_boundary
+        self.replacements = {term.lower(): replacement for term, replacement in replacements.items() if term}
+        self.remove_statements = [statement.lower() for statement in (remove_statements or []) if statement]
+
+        # العبارات التي يجب أن تقع عند حدود كلمات
+        self._bounded_terms = {
+            term for term in self.replacements
+            if word_boundary == "all" or (word_boundary == "latin" and _LATIN_TERM.match(term))
+        }
+
+        # لكل عبارة: العبارات المسجلة التي تمثل بادئة لها من الأطول للأقصر (بما فيها العبارة نفسها)
+        # التعبير الجشع يرجع الأطول عند كل موضع، فإذا لم تقع على حدود كلمة تُجرب الأقصر منها
+        self._term_prefixes = {
+            term: [term[:length] for length in range(len(term), 0, -1) if term[:length] in self.replacements]
+            for term in self.replacements
+        }
+
+        # تعبير واحد: حذف الجمل أولاً ثم الاستبدالات، والمطابقة على النص بالأحرف الصغيرة
+        parts = []
+        remove_pattern = build_trie_pattern(self.remove_statements)
+        if remove_pattern:
+            parts.append(f"(?P<remove>{remove_pattern}[^.]*\\.)")
+        term_pattern = build_trie_pattern(list(self.replacements))
+        if term_pattern:
+            parts.append(f"(?P<term>{term_pattern})")
+
+        self._regex = re.compile("|".join(parts)) if parts else None
+        self._regex_ignorecase = re.compile("|".join(parts), re.IGNORECASE) if parts else None
+
+    @staticmethod
+    def _is_word_char(char: str) -> bool:
+        return char.isalnum() or char == "_"
+
+    def _at_word_boundary(self, text: str, start: int, end: int) -> bool:
+        """
+        التحقق من أن المطابقة ليست جزءاً من كلمة أطول
+        """
+        if start > 0 and self._is_word_char(text[start - 1]):
+            return False
+        if end < len(text) and self._is_word_char(text[end]):
+            return False
+        return True
+
+    def sanitize(self, text: str) -> str:
+        """
+        تنقية النص في مرور واحد
+
+        :param text: النص الأصلي
+        :return: النص بعد الحذف والاستبدال
+        """
+        if not text or self._regex is None:
+            return text
+
+        regex = self._regex
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            # بعض الأحرف يتغير طولها عند التحويل للأحرف الصغيرة، فتتم المطابقة على النص الأصلي
+            regex = self._regex_ignorecase
+            lowered = text
+
+        pieces = []
+        position = 0
+        match = regex.search(lowered)
+        while match is not None:
+            start, end = match.span()
+
+            if match.lastgroup == "remove":
+                replacement = ""
+            else:
+                replacement = None
+                for term in self._term_prefixes[match.group("term").lower()]:
+                    end = start + len(term)
+                    if term not in self._bounded_terms or self._at_word_boundary(lowered, start, end):
+                        replacement = self.replacements[term]
+                        break
+                if replacement is None:
+                    # لا عبارة صالحة عند هذا الموضع: يُستأنف البحث من الحرف التالي
+                    match = regex.search(lowered, start + 1)
+                    continue
+
+            pieces.append(text[position:start])
+            pieces.append(replacement)
+            position = end
+            match = regex.search(lowered, end)
+
+        if not pieces:
+            return text
+
+        pieces.append(text[position:])
+        return "".join(pieces)
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]] = None) -> "TextSanitizer":
+        """
+        إنشاء محرك ردود ماسنجر من إعدادات ai_reference_filter في data.json
+
+        :param config: الإعدادات (replacements و remove_statements و word_boundary)
+        :return: كائن TextSanitizer
+        """
+        config = config or {}
+        return cls(
+            config.get("replacements") or DEFAULT_AI_REPLACEMENTS,
+            config.get("remove_statements", DEFAULT_AI_STATEMENTS),
+            config.get("word_boundary", "latin")
+        )
+
+    @classmethod
+    def for_comments(cls, config: Optional[Dict[str, Any]] = None) -> "TextSanitizer":
+        """
+        إنشاء محرك ردود تعليقات الفيسبوك (كل المصطلحات تُستبدل ببديل واحد عند حدود الكلمات)
+
+        :param config: الإعدادات (comment_terms و comment_replacement)
+        :return: كائن TextSanitizer
+        """
+        config = config or {}
+        terms = config.get("comment_terms") or DEFAULT_COMMENT_TERMS
+        replacement = config.get("comment_replacement") or DEFAULT_COMMENT_REPLACEMENT
+        return cls({term: replacement for term in terms}, word_boundary="all")
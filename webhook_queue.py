@@ -0,0 +1,331 @@
+"""
+طابور داخلي لاستقبال أحداث webhook ومعالجتها في الخلفية
+يسمح للخادم بالرد على فيسبوك فوراً بينما تقوم مجموعة من العمال
+باستدعاء نموذج اللغة وإرسال الردود
+"""
+
+import time
+import zlib
+import queue
+import logging
+import threading
+from typing import Dict, Any, Callable, List, Optional
+
+from config import SERVER_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+# علامة إيقاف العامل
+_STOP = object()
+
+
+class WebhookWorkerPool:
+    """
+    مجموعة عمال تسحب أحداث webhook من طابور محدود السعة
+    """
+
+    def __init__(self, handler: Callable[[Dict[str, Any]], None], num_workers: int = None,
+                 max_queue_size: int = None, name: str = "webhook"):
+        """
+        تهيئة مجموعة العمال
+
+        :param handler: الدالة التي تعالج الحدث الواحد
+        :param num_workers: عدد العمال (اختياري، من الإعدادات افتراضياً)
+        :param max_queue_size: السعة القصوى للطابور (اختياري، من الإعدادات افتراضياً)
+        :param name: اسم المجموعة لأغراض التسجيل وأسماء الخيوط
+        """
+        self.handler = handler
+        self.num_workers = num_workers or SERVER_SETTINGS.get("WEBHOOK_WORKERS", 4)
+        self.max_queue_size = max_queue_size or SERVER_SETTINGS.get("WEBHOOK_QUEUE_SIZE", 1000)
+        self.name = name
+
+        self._queue = queue.Queue(maxsize=self.max_queue_size)
+        self._threads: List[threading.Thread] = []
+        self._accepting = False
+        self._lock = threading.Lock()
+
+        self._stats = {
+            "submitted": 0,
+            "processed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "in_flight": 0,
+            "total_wait_ms": 0.0,
+            "max_wait_ms": 0.0,
+            "last_wait_ms": 0.0
+        }
+
+    def start(self) -> None:
+        """
+        تشغيل خيوط العمال
+        """
+        with self._lock:
+            if self._threads:
+                return
+            self._accepting = True
+
+        for index in range(self.num_workers):
+            thread = threading.Thread(
+                target=self._worker_loop,
+                name=f"{self.name}-worker-{index}",
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+        logger.info(f"تم تشغيل {self.num_workers} عامل لمعالجة أحداث {self.name} (سعة الطابور: {self.max_queue_size})")
+
+    def submit(self, event: Dict[str, Any]) -> bool:
+        """
+        إضافة حدث إلى الطابور دون انتظار
+
+        :param event: بيانات الحدث
+        :return: True إذا تمت إضافة الحدث، False إذا كان الطابور ممتلئاً أو متوقفاً
+        """
+        if not self._accepting:
+            with self._lock:
+                self._stats["rejected"] += 1
+            logger.warning(f"تم رفض حدث {self.name}: مجموعة العمال متوقفة")
+            return False
+
+        try:
+            self._queue.put_nowait((time.monotonic(), event))
+        except queue.Full:
+            with self._lock:
+                self._stats["rejected"] += 1
+            logger.warning(f"تم رفض حدث {self.name}: الطابور ممتلئ ({self.max_queue_size})")
+            return False
+
+        with self._lock:
+            self._stats["submitted"] += 1
+        return True
+
+    def _worker_loop(self) -> None:
+        """
+        حلقة العامل: سحب الأحداث من الطابور ومعالجتها حتى استلام علامة الإيقاف
+        """
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+
+                enqueued_at, event = item
+                wait_ms = (time.monotonic() - enqueued_at) * 1000
+
+                with self._lock:
+                    self._stats["in_flight"] += 1
+                    self._stats["total_wait_ms"] += wait_ms
+                    self._stats["last_wait_ms"] = wait_ms
+                    if wait_ms > self._stats["max_wait_ms"]:
+                        self._stats["max_wait_ms"] = wait_ms
+
+                try:
+                    self.handler(event)
+                    with self._lock:
+                        self._stats["processed"] += 1
+                except Exception as e:
+                    with self._lock:
+                        self._stats["failed"] += 1
+                    logger.error(f"خطأ في معالجة حدث {self.name}: {e}")
+                finally:
+                    with self._lock:
+                        self._stats["in_flight"] -= 1
+            finally:
+                self._queue.task_done()
+
+    def get_lag_ms(self) -> float:
+        """
+        عمر أقدم حدث ينتظر في الطابور بالمللي ثانية
+
+        :return: زمن الانتظار لأقدم حدث أو صفر إذا كان الطابور فارغاً
+        """
+        with self._queue.mutex:
+            for item in self._queue.queue:
+                if item is not _STOP:
+                    return round((time.monotonic() - item[0]) * 1000, 2)
+        return 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        إحصائيات الطابور ومقاييس الضغط الخلفي
+
+        :return: قاموس بعمق الطابور وأزمنة الانتظار وعدد الأحداث
+        """
+        with self._lock:
+            stats = dict(self._stats)
+
+        started = stats["processed"] + stats["failed"] + stats["in_flight"]
+        total_wait_ms = stats.pop("total_wait_ms")
+        stats["avg_wait_ms"] = round(total_wait_ms / started, 2) if started else 0.0
+        stats["max_wait_ms"] = round(stats["max_wait_ms"], 2)
+        stats["last_wait_ms"] = round(stats["last_wait_ms"], 2)
+        stats.update({
+            "queue_depth": self._queue.qsize(),
+            "lag_ms": self.get_lag_ms(),
+            "max_queue_size": self.max_queue_size,
+            "workers": self.num_workers,
+            "accepting": self._accepting
+        })
+        return stats
+
+    def stop_accepting(self) -> None:
+        """
+        إيقاف استقبال أحداث جديدة مع استمرار العمال في معالجة الطابور
+        """
+        with self._lock:
+            self._accepting = False
+
+    def shutdown(self, timeout: Optional[float] = None) -> bool:
+        """
+        إيقاف استقبال أحداث جديدة وتفريغ الطابور قبل إيقاف العمال
+
+        :param timeout: أقصى مدة انتظار بالثواني (اختياري، من الإعدادات افتراضياً)
+        :return: True إذا تمت معالجة كل الأحداث المتبقية قبل انتهاء المهلة
+        """
+        self.stop_accepting()
+        if not self._threads:
+            return True
+
+        timeout = timeout if timeout is not None else SERVER_SETTINGS.get("WEBHOOK_SHUTDOWN_TIMEOUT", 25)
+        deadline = time.monotonic() + timeout
+        pending = self._queue.qsize()
+        logger.info(f"جاري تفريغ طابور {self.name}: {pending} حدث متبقٍ")
+
+        # إرسال علامة إيقاف لكل عامل بعد الأحداث المتبقية
+        for _ in self._threads:
+            remaining = max(0.0, deadline - time.monotonic())
+            try:
+                self._queue.put(_STOP, timeout=remaining)
+            except queue.Full:
+                break
+
+        drained = True
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+            if thread.is_alive():
+                drained = False
+
+        if drained:
+            logger.info(f"تم تفريغ طابور {self.name} وإيقاف العمال بنجاح")
+        else:
+            logger.warning(f"انتهت مهلة تفريغ طابور {self.name}، بقي {self._queue.qsize()} حدث")
+
+        self._threads = []
+        return drained
+
+
+class ShardedEventScheduler:
+    """
+    موزع أحداث يوجه كل مرسل إلى شريحة ثابتة ذات مستهلك واحد
+    بحيث تُعالج رسائل المستخدمين المختلفين بالتوازي مع الحفاظ على ترتيب رسائل كل مستخدم
+    """
+
+    def __init__(self, handler: Callable[[Dict[str, Any]], None],
+                 key_func: Callable[[Dict[str, Any]], str],
+                 num_shards: int = None, max_queue_size: int = None, name: str = "webhook"):
+        """
+        تهيئة الموزع
+
+        :param handler: الدالة التي تعالج الحدث الواحد
+        :param key_func: دالة تستخرج مفتاح الترتيب من الحدث (معرف المرسل)
+        :param num_shards: عدد الشرائح (اختياري، WEBHOOK_WORKERS من الإعدادات افتراضياً)
+        :param max_queue_size: السعة الإجمالية للطوابير موزعة على الشرائح
+        :param name: اسم الموزع لأغراض التسجيل وأسماء الخيوط
+        """
+        self.key_func = key_func
+        self.num_shards = num_shards or SERVER_SETTINGS.get("WEBHOOK_WORKERS", 4)
+        self.max_queue_size = max_queue_size or SERVER_SETTINGS.get("WEBHOOK_QUEUE_SIZE", 1000)
+        self.name = name
+
+        shard_queue_size = max(1, self.max_queue_size // self.num_shards)
+        self.shards = [
+            WebhookWorkerPool(handler, num_workers=1, max_queue_size=shard_queue_size,
+                              name=f"{name}-shard-{index}")
+            for index in range(self.num_shards)
+        ]
+
+    def shard_for(self, key: str) -> int:
+        """
+        تحديد رقم الشريحة لمفتاح معين باستخدام تجزئة ثابتة
+
+        :param key: مفتاح الترتيب (معرف المرسل)
+        :return: رقم الشريحة
+        """
+        return zlib.crc32(str(key).encode("utf-8")) % self.num_shards
+
+    def start(self) -> None:
+        """
+        تشغيل مستهلكي كل الشرائح
+        """
+        for shard in self.shards:
+            shard.start()
+        logger.info(f"تم تشغيل {self.num_shards} شريحة لمعالجة أحداث {self.name} بالترتيب لكل مستخدم")
+
+    def submit(self, event: Dict[str, Any]) -> bool:
+        """
+        إضافة حدث إلى شريحة المرسل الخاص به
+
+        :param event: بيانات الحدث
+        :return: True إذا تمت إضافة الحدث
+        """
+        key = self.key_func(event) or ""
+        return self.shards[self.shard_for(key)].submit(event)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        إحصائيات مجمعة مع تأخر كل شريحة
+
+        :return: قاموس بالإحصائيات الإجمالية وقائمة إحصائيات الشرائح
+        """
+        shard_stats = [shard.get_stats() for shard in self.shards]
+
+        totals = {
+            key: sum(stats[key] for stats in shard_stats)
+            for key in ("submitted", "processed", "failed", "rejected", "in_flight", "queue_depth")
+        }
+        started = totals["processed"] + totals["failed"] + totals["in_flight"]
+        weighted_wait = sum(
+            stats["avg_wait_ms"] * (stats["processed"] + stats["failed"] + stats["in_flight"])
+            for stats in shard_stats
+        )
+
+        totals.update({
+            "avg_wait_ms": round(weighted_wait / started, 2) if started else 0.0,
+            "max_wait_ms": max((stats["max_wait_ms"] for stats in shard_stats), default=0.0),
+            "max_lag_ms": max((stats["lag_ms"] for stats in shard_stats), default=0.0),
+            "max_queue_size": self.max_queue_size,
+            "num_shards": self.num_shards,
+            "shards": [
+                {
+                    "shard": index,
+                    "queue_depth": stats["queue_depth"],
+                    "lag_ms": stats["lag_ms"],
+                    "processed": stats["processed"],
+                    "failed": stats["failed"],
+                    "rejected": stats["rejected"]
+                }
+                for index, stats in enumerate(shard_stats)
+            ]
+        })
+        return totals
+
+    def shutdown(self, timeout: Optional[float] = None) -> bool:
+        """
+        تفريغ كل الشرائح ضمن مهلة مشتركة
+
+        :param timeout: أقصى مدة انتظار بالثواني (اختياري، من الإعدادات افتراضياً)
+        :return: True إذا تم تفريغ كل الشرائح
+        """
+        timeout = timeout if timeout is not None else SERVER_SETTINGS.get("WEBHOOK_SHUTDOWN_TIMEOUT", 25)
+        deadline = time.monotonic() + timeout
+
+        # إيقاف الاستقبال في كل الشرائح أولاً ثم انتظار التفريغ
+        for shard in self.shards:
+            shard.stop_accepting()
+
+        drained = True
+        for shard in self.shards:
+            if not shard.shutdown(max(0.0, deadline - time.monotonic())):
+                drained = False
+        return drained